@@ -1,23 +1,9 @@
 # -*- coding: utf-8 -*-
 """
 足し算を実行する子エージェントのロジック。
+計算関数は calculator_agent/operations.py の add (演算プラグインの足し算の evaluator) と共通です。
 """
 
-def add(a: float, b: float) -> float:
-    """
-    2つの数値を加算します。
+from calculator_agent.operations import add
 
-    Args:
-        a (float): 1番目の数値。
-        b (float): 2番目の数値。
-
-    Returns:
-        float: 加算結果。
-
-    Raises:
-        TypeError: 引数が数値でない場合。
-    """
-    if not isinstance(a, (int, float)) or not isinstance(b, (int, float)):
-        error_message = f"数値以外の引数が指定されました。関数名: add, 引数a: {a} (型: {type(a)}), 引数b: {b} (型: {type(b)})"
-        raise TypeError(error_message)
-    return a + b
+__all__ = ["add"]
@@ -4,94 +4,98 @@ ADKエージェントのコアロジックを管理するモジュール。
 FastAPIから呼び出されることを想定しています。
 """
 
-import re
-from adk import Agent, Message, IntentHandler
-# 各計算モジュールから関数をインポート
-from .adder_agent import add
-from .subtractor_agent import subtract
-from .multiplier_agent import multiply
-
-# --- インテントハンドラー定義 (main_agent.py からコピー・調整) ---
-
-class AddIntentHandler(IntentHandler):
-    """足し算インテントを処理するハンドラー"""
-    intent_name = "AddIntent"
-
-    def can_handle(self, message: Message) -> bool:
-        text = message.text.lower()
-        return "たす" in text or "足し算" in text or "+" in text or "足して" in text
-
-    def handle(self, message: Message) -> Message:
-        numbers = re.findall(r"[-+]?\d*\.\d+|[-+]?\d+", message.text)
-        num_list = [float(n) for n in numbers]
-        if len(num_list) >= 2:
-            a, b = num_list[0], num_list[1]
-            result = add(a, b)
-            response_text = f"{a} たす {b} は {result} です。"
-        else:
-            response_text = "すみません、足し算する2つの数値を認識できませんでした。"
-        return Message(text=response_text)
-
-class SubtractIntentHandler(IntentHandler):
-    """引き算インテントを処理するハンドラー"""
-    intent_name = "SubtractIntent"
-
-    def can_handle(self, message: Message) -> bool:
-        text = message.text.lower()
-        return "ひく" in text or "引き算" in text or "-" in text or "引いて" in text
-
-    def handle(self, message: Message) -> Message:
-        numbers = re.findall(r"[-+]?\d*\.\d+|[-+]?\d+", message.text)
-        num_list = [float(n) for n in numbers]
-        if len(num_list) >= 2:
-            a, b = num_list[0], num_list[1]
-            result = subtract(a, b)
-            response_text = f"{a} ひく {b} は {result} です。"
-        else:
-            response_text = "すみません、引き算する2つの数値を認識できませんでした。"
-        return Message(text=response_text)
-
-class MultiplyIntentHandler(IntentHandler):
-    """掛け算インテントを処理するハンドラー"""
-    intent_name = "MultiplyIntent"
-
-    def can_handle(self, message: Message) -> bool:
-        text = message.text.lower()
-        return "かける" in text or "掛け算" in text or "*" in text or "掛けて" in text
-
-    def handle(self, message: Message) -> Message:
-        numbers = re.findall(r"[-+]?\d*\.\d+|[-+]?\d+", message.text)
-        num_list = [float(n) for n in numbers]
-        if len(num_list) >= 2:
-            a, b = num_list[0], num_list[1]
-            result = multiply(a, b)
-            response_text = f"{a} かける {b} は {result} です。"
-        else:
-            response_text = "すみません、掛け算する2つの数値を認識できませんでした。"
-        return Message(text=response_text)
+import asyncio
+import inspect
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from time import perf_counter_ns
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+from adk import Agent, Message
+# インテントハンドラーとルーターは各エージェントで共通のもの (演算プラグインのレジストリから作成する) を使う
+from .calculator_agent.handlers import RoutedIntentHandler, create_intent_router
+from .calculator_agent.metrics import COALESCED_REQUESTS, STAGE_DURATION, metrics
+from .calculator_agent.numeric import numeric
+from .calculator_agent.pipeline import TieredPipeline, create_model_tier_from_env
+from .calculator_agent.plugins import OperationPlugin, plugin_registry
+from .calculator_agent.profiler import profiler
+from .request_log import logger
+from .response_cache import create_response_cache_from_env, normalize_utterance
+from .session_store import bind_references, create_session_store_from_env
 
-class FallbackIntentHandler(IntentHandler):
-    """どのインテントにもマッチしなかった場合のフォールバックハンドラー"""
-    intent_name = "FallbackIntent"
+# --- エージェントの初期化 ---
 
-    def can_handle(self, message: Message) -> bool:
-        return True # 他のハンドラーが処理しなかった場合に常に処理
+# 演算プラグインのレジストリ (calculator_agent/plugins.py) の全ハンドラーのキーワードを1つにまとめたルーター。
+# API経由の処理ではエージェントを介さずにこのルーターで1回の走査でハンドラーを選択する。
+# 実行中のプラグインの追加・削除 (load_plugins / unload_plugin) はこのルーターにそのまま反映される
+router = create_intent_router()
 
-    def handle(self, message: Message) -> Message:
-        response_text = "すみません、よく分かりませんでした。足し算、引き算、掛け算のいずれかを含む形で質問してください。（例：「5たす3は？」）"
-        return Message(text=response_text)
+# 手元のハンドラーで確定できた入力はその場で応答し、確定できなかった入力だけをモデルの段に回すパイプライン
+# (モデルの段は環境変数 ADK_MODEL_TIER で設定する。未設定の場合は手元のハンドラーの応答をそのまま返す。
+#  モデルの段の前には言い換えに応答する意味的キャッシュを置く)
+pipeline = TieredPipeline(router, create_model_tier_from_env(router))
 
-# --- エージェントの初期化 ---
+# Agentインスタンスは get_agent_response で最初に必要になったときに作成する (get_agent)。
+# API の /ask はルーターで直接ハンドラーを選択するため、起動時 (コールドスタート) には作成しない
+_agent: Optional[Agent] = None
+_agent_lock = threading.Lock()
+
+
+def get_agent() -> Agent:
+    """インテントハンドラーを登録した Agent インスタンスを返します (初回呼び出し時に作成)。"""
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                agent = Agent(agent_id="calculator_agent_api")
+                # ルーターで選択したハンドラーに処理を委ねるハンドラーを登録する (プラグインの変更もそのまま反映される)
+                agent.register_intent_handler(RoutedIntentHandler(router))
+                _agent = agent
+    return _agent
+
+
+def __getattr__(name: str):
+    # 従来の adk_logic.agent の参照は get_agent() で作成したインスタンスを返す
+    if name == "agent":
+        return get_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# 応答キャッシュ (正規化した発話 -> 応答テキスト。設定は環境変数 ADK_RESPONSE_CACHE_* で行う)。
+# キャッシュが有効な場合、応答は正規化した発話に対して生成するため、
+# 表記ゆれのある発話 (例: "５たす３" と "5たす3") には常に同じ応答を返します。
+response_cache = create_response_cache_from_env()
+
+# 会話のセッションの状態 (直前の計算結果・数値の履歴・直近のやり取り。設定は環境変数 ADK_SESSION_* で行う)。
+# セッション ID を指定したリクエストは、「それに5をかけて」のような前の結果を参照する発話に応答できる
+sessions = create_session_store_from_env()
+
+# ワーカープロセス数 (serve.py がワーカーに ADK_WORKER_PROCESSES を設定する。uvicorn で動かす場合は WEB_CONCURRENCY)。
+# セッションはワーカープロセスのメモリに保持し、接続をどのワーカーが受け付けるかはカーネルが決めるため、
+# 複数のワーカーでは同じセッションのリクエストが前の計算結果を持たないワーカーに届く。
+# 誤った応答を返さないよう、2 以上の場合はセッションを使うリクエストを SessionUnavailableError にする
+WORKER_PROCESSES = int(os.getenv("ADK_WORKER_PROCESSES") or os.getenv("WEB_CONCURRENCY") or "1")
 
-# Agentインスタンスをグローバル（またはシングルトンパターンなど）で作成・保持
-# FastAPIアプリの起動時に一度だけ初期化されるようにする想定
-agent = Agent(agent_id="calculator_agent_api")
 
-# インテントハンドラーを登録
-agent.register_intent_handler(AddIntentHandler())
-agent.register_intent_handler(SubtractIntentHandler())
-agent.register_intent_handler(MultiplyIntentHandler())
-agent.register_intent_handler(FallbackIntentHandler()) # フォールバックは最後に
+class SessionUnavailableError(RuntimeError):
+    """複数のワーカープロセスで動かしているため、セッションを使えない場合に送出されます。"""
+
+
+def _check_sessions_available() -> None:
+    if WORKER_PROCESSES > 1:
+        raise SessionUnavailableError(
+            f"セッションはワーカープロセスごとに保持するため、複数のワーカー ({WORKER_PROCESSES} 個) で動かしている場合は使えません。"
+            "セッションを使う場合はワーカーを 1 つにしてください。"
+        )
+
+
+def _on_plugin_change(old: Optional[OperationPlugin], new: Optional[OperationPlugin]) -> None:
+    # 演算が変わると同じ発話への応答も変わるため、プロセス内の応答キャッシュを破棄する
+    # (共有キャッシュは各ワーカーから破棄できないため、ADK_RESPONSE_CACHE_TTL の有効期間で入れ替わる)
+    response_cache.local.clear()
+
+
+plugin_registry.subscribe(_on_plugin_change)
 
 # --- 応答生成関数 ---
 
@@ -105,6 +109,14 @@ def get_agent_response(user_input: str) -> str:
     Returns:
         str: エージェントからの応答テキスト。
     """
+    # 正規化した発話はキャッシュのキーにだけ使い、エージェントには入力のまま渡す
+    key = user_input
+    if response_cache.enabled:
+        key = normalize_utterance(user_input)
+        cached_response = response_cache.get(key)
+        if cached_response is not None:
+            return cached_response
+
     # ユーザー入力をADKのMessageオブジェクトに変換
     request_message = Message(text=user_input)
 
@@ -117,12 +129,593 @@ def get_agent_response(user_input: str) -> str:
     try:
         # ADKのAgentクラスが直接メッセージを処理して応答を返すメソッドを持っているか確認が必要
         # ここでは仮のメソッド名 `process_message` を使用
-        response_message = agent.handle_message(request_message) # handle_message が Message を返すと仮定
+        # プロファイラーが有効な場合は、抽出されたリクエストの処理中のスタックを採取する
+        profiled_request = profiler.begin() if profiler.enabled else None
+        try:
+            response_message = get_agent().handle_message(request_message) # handle_message が Message を返すと仮定
+        finally:
+            profiler.end(profiled_request)
+        if response_cache.enabled:
+            response_cache.set(key, response_message.text)
         return response_message.text
     except Exception as e:
         # エラーハンドリング (実際の状況に合わせて調整)
-        print(f"エージェント処理中にエラーが発生しました: {e}")
+        logger.error("エージェント処理中にエラーが発生しました: %s", e)
+        return "すみません、処理中にエラーが発生しました。"
+
+class AgentResult(NamedTuple):
+    """バッチ処理における1件分の結果。成功時は response、失敗時は error が設定される。"""
+    response: Optional[str]
+    error: Optional[str]
+
+
+def _route(text: str):
+    """ルーターでハンドラーを選択します (所要時間を route 段階として記録します)。"""
+    if not metrics.enabled:
+        return router.handler_for(text)
+    started = perf_counter_ns()
+    handler = router.handler_for(text)
+    STAGE_DURATION.observe_ns("route", perf_counter_ns() - started)
+    return handler
+
+
+def _handle_with_cache(handler, text: str, key: str) -> str:
+    """
+    プロセス内のキャッシュにない発話について、共有キャッシュを参照し、
+    それでもない場合はパイプライン (手元のハンドラー、確定できなければモデルの段) で応答を生成して
+    キャッシュに登録します。
+
+    Args:
+        handler: ルーターで選択したハンドラー。
+        text (str): ユーザーからの入力テキスト (パイプラインには入力のまま渡す)。
+        key (str): キャッシュのキー (正規化した発話)。
+    """
+    if response_cache.enabled:
+        cached_response = response_cache.get_shared(key)
+        if cached_response is not None:
+            return cached_response
+    response = pipeline.respond(text, handler)
+    if response_cache.enabled:
+        response_cache.set(key, response)
+    return response
+
+
+def _handle_profiled(handler, text: str, key: str) -> str:
+    """_handle_with_cache をプロファイラーの追跡付きで実行します (抽出されなかったリクエストはそのまま実行)。"""
+    profiled_request = profiler.begin()
+    try:
+        return _handle_with_cache(handler, text, key)
+    finally:
+        profiler.end(profiled_request)
+
+
+def _dispatch(user_input: str) -> str:
+    """
+    ルーターで選択したインテントハンドラーで応答テキストを生成します。
+    Agent を経由しないため、バッチ処理でのメッセージごとのオーバーヘッドを抑えられます。
+    """
+    key = user_input
+    if response_cache.enabled:
+        key = normalize_utterance(user_input)
+        cached_response = response_cache.get_local(key)
+        if cached_response is not None:
+            return cached_response
+    if not profiler.enabled:
+        return _handle_with_cache(_route(user_input), user_input, key)
+    # インテントの判定 (トークン化) もプロファイラーの追跡の対象に含める
+    profiled_request = profiler.begin()
+    try:
+        return _handle_with_cache(_route(user_input), user_input, key)
+    finally:
+        profiler.end(profiled_request)
+
+
+def _respond_in_session(session_id: str, user_input: str, request_id: Optional[str] = None) -> str:
+    """
+    セッションの直前の計算結果を参照して発話に応答し、やり取りをセッションに記録します。
+
+    発話中の「それ」「その答え」などは直前の計算結果の数値に置き換えてから処理します。置き換え後の発話は
+    セッションごとに異なるため、応答キャッシュは参照しません。request_id が直前のリクエストと同じ場合 (再試行) は、
+    セッションを更新せずに前回の応答を返します。
+    """
+    replayed_response = sessions.replayed_response(session_id, request_id)
+    if replayed_response is not None:
+        return replayed_response
+    text = bind_references(user_input, sessions.last_result(session_id))
+    result = pipeline.resolve(text, _route(text))
+    last_result = None if result.value is None else numeric.to_literal(result.value)
+    sessions.record(session_id, user_input, result.text, last_result, router.tokenize(text).numbers, request_id)
+    return result.text
+
+
+def get_session(session_id: str, transcript_limit: Optional[int] = None) -> Optional[dict]:
+    """
+    セッションの状態 (直前の計算結果・数値の履歴・直近のやり取り) を返します (セッションがない場合は None)。
+
+    Args:
+        session_id (str): セッション ID。
+        transcript_limit (Optional[int]): 返す直近のメッセージ数 (None の場合は保持しているすべて)。
+
+    Raises:
+        SessionUnavailableError: 複数のワーカープロセスで動かしている場合。
+    """
+    _check_sessions_available()
+    state = sessions.get(session_id, transcript_limit)
+    if state is not None:
+        # 再試行の検出用の記録は返さない
+        del state["last_request_id"], state["last_response"]
+    return state
+
+
+def delete_session(session_id: str) -> bool:
+    """
+    セッションを削除します。削除した場合は True を返します。
+
+    Raises:
+        SessionUnavailableError: 複数のワーカープロセスで動かしている場合。
+    """
+    _check_sessions_available()
+    return sessions.delete(session_id)
+
+
+def get_session_stats() -> dict:
+    """セッションストアの統計情報 (セッション数・概算サイズ・追い出し数など) を返します。"""
+    return sessions.stats()._asdict()
+
+
+def close_sessions() -> None:
+    """セッションストアの終了処理 (ADK_SESSION_SPILL_DIR を指定している場合はディスクへの書き出し) を行います。"""
+    sessions.close()
+
+
+def _plugin_info(plugin: OperationPlugin) -> dict:
+    return {
+        "name": plugin.name,
+        "symbol": plugin.symbol,
+        "keywords": list(plugin.keywords),
+        "arity": plugin.arity,
+        "module": plugin_registry.module_of(plugin.name),
+    }
+
+
+def list_plugins() -> List[dict]:
+    """登録済みの演算プラグイン (名前・記号・キーワード・被演算子の数・読み込んだモジュール) を優先順に返します。"""
+    return [_plugin_info(plugin) for plugin in plugin_registry.plugins()]
+
+
+def load_plugins(module_name: str) -> List[str]:
+    """
+    モジュールの演算プラグイン (PLUGINS) を登録し、登録したプラグインの名前を返します。
+    読み込み済みのモジュールは再読み込みします。ルーターと応答キャッシュには登録と同時に反映されます。
+
+    Raises:
+        ImportError: モジュールをインポートできない場合。
+        ValueError, TypeError: PLUGINS の定義が正しくない場合。
+    """
+    return plugin_registry.load(module_name)
+
+
+def unload_plugin(name: str) -> bool:
+    """演算プラグインの登録を解除します。解除した場合は True を返します。"""
+    try:
+        plugin_registry.unregister(name)
+    except KeyError:
+        return False
+    return True
+
+
+def get_cache_stats() -> dict:
+    """応答キャッシュの統計情報 (ヒット数・ミス数・追い出し数など) を返します。"""
+    return {name: None if stats is None else stats._asdict() for name, stats in response_cache.stats().items()}
+
+
+def get_semantic_cache_stats() -> Optional[dict]:
+    """モデルの段の意味的キャッシュの統計情報を返します (意味的キャッシュを使っていない場合は None)。"""
+    cache = getattr(pipeline.model_tier, "cache", None)
+    return None if cache is None else cache.stats()._asdict()
+
+
+def close_pipeline() -> None:
+    """パイプラインの終了処理 (意味的キャッシュのスナップショットの保存など) を行います。アプリケーション終了時に呼び出します。"""
+    pipeline.close()
+
+
+def get_agent_responses(user_inputs: List[str]) -> List[AgentResult]:
+    """
+    複数のユーザー入力をまとめて処理し、入力と同じ順序で結果を返します。
+
+    インテント判定と数値抽出をバッチ全体に対して1回のループで行います。
+    1件の処理が失敗しても他の入力の処理は継続し、失敗した項目には error が設定されます。
+
+    Args:
+        user_inputs (List[str]): ユーザーからの入力テキストのリスト。
+
+    Returns:
+        List[AgentResult]: 各入力に対応する結果のリスト (入力と同じ順序)。
+    """
+    results = []
+    append = results.append
+    for user_input in user_inputs:
+        try:
+            append(AgentResult(response=_dispatch(user_input), error=None))
+        except Exception as e:
+            append(AgentResult(response=None, error=f"処理中にエラーが発生しました: {e}"))
+    return results
+
+# --- 非同期ディスパッチ ---
+# FastAPI (uvicorn) のイベントループをブロックしないよう、同期ハンドラーは
+# 上限付きのスレッドプールで実行し、async ハンドラーはループ上で直接 await します。
+# 同時処理数の上限を超えたリクエストは AgentBusyError で即座に拒否します (API側で 429 を返す)。
+
+# 同期ハンドラーを実行するスレッド数
+DISPATCH_WORKERS = int(os.getenv("ADK_DISPATCH_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))))
+# 同時に受け付けるリクエスト数の上限 (スレッドプールの実行中 + 待機中を含む)
+MAX_CONCURRENT_REQUESTS = int(os.getenv("ADK_MAX_CONCURRENT_REQUESTS", "256"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_request_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+
+
+class AgentBusyError(RuntimeError):
+    """同時処理数の上限に達しているため、リクエストを受け付けられない場合に送出されます。"""
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """同期ハンドラー用のスレッドプールを返します (初回呼び出し時に作成)。"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=DISPATCH_WORKERS, thread_name_prefix="adk-dispatch"
+                )
+    return _executor
+
+
+def shutdown_dispatcher() -> None:
+    """スレッドプールを停止します。アプリケーション終了時に呼び出します。"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+def _acquire_slot() -> None:
+    """リクエストの処理枠を確保します。空きがない場合は待たずに AgentBusyError を送出します。"""
+    if not _request_slots.acquire(blocking=False):
+        raise AgentBusyError(f"同時処理数の上限 ({MAX_CONCURRENT_REQUESTS}) に達しています。")
+
+
+# --- 同じ発話の処理の共有 (single-flight) ---
+# ダッシュボードの一斉更新などで同じ発話のリクエストが同時に届いた場合、最初のリクエストの処理
+# (モデルの段の呼び出しを含む) を、その処理が終わるまでに届いた同じ発話 (正規化後) のリクエストで共有します。
+# 各リクエストは専用の Future で結果を待つため、1つのリクエストがキャンセル (クライアントの切断など)
+# されても処理は続き、他のリクエストには結果が返ります。発話ごとの期限 (ADK_SINGLE_FLIGHT_TIMEOUT 秒) までに
+# 終わらない処理は、待っているリクエストをすべてタイムアウトにし、以降のリクエストでは新しく処理を開始します。
+# セッション付きのリクエスト (応答が直前の計算結果に依存する) とバッチは共有しません。
+
+# 同じ発話の処理の共有を有効にするかどうか
+SINGLE_FLIGHT = os.getenv("ADK_SINGLE_FLIGHT", "1") != "0"
+# 発話ごとの処理の期限 (秒)。0 の場合は期限なし
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("ADK_SINGLE_FLIGHT_TIMEOUT", "30"))
+
+
+class SingleFlight:
+    """
+    キーごとに処理中の計算を1つだけ保持し、同じキーの呼び出しで結果を共有します。
+    イベントループのスレッドからのみ呼び出すため、ロックは使いません。
+
+    呼び出しごとに専用の Future を返し、計算 (スレッドプールの Future またはコルーチンのタスク) の完了時に
+    そのキーの Future すべてに結果を設定します。asyncio.shield や wait_for (呼び出しごとのタスク・タイマー) は
+    使わず、期限はキーごとに1つのタイマーで扱います。
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        """
+        Args:
+            timeout (Optional[float]): キーごとの処理の期限 (秒)。None の場合は期限なし。
+        """
+        self.timeout = timeout
+        # キー -> 処理中の計算の結果を待っている呼び出しの Future
+        self._flights: Dict[str, List[asyncio.Future]] = {}
+
+    def __len__(self) -> int:
+        """処理中のキーの数を返します。"""
+        return len(self._flights)
+
+    def run(self, key: str, start: Callable[[str], Awaitable[str]]) -> "asyncio.Future[str]":
+        """
+        key の処理中の計算があればその結果を、なければ start(key) で計算を開始してその結果を待つ Future を返します。
+
+        返す Future はこの呼び出し専用のため、キャンセルしても共有している計算や他の呼び出しには影響しません。
+
+        Raises (返した Future の await 時):
+            asyncio.TimeoutError: キーの処理が期限までに完了しなかった場合。
+            Exception: 計算が送出した例外 (共有しているすべての呼び出しに送出されます)。
+        """
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        waiters = self._flights.get(key)
+        if waiters is not None and waiters[0].get_loop() is loop:
+            outcome = "shared"
+            waiters.append(waiter)
+        else:
+            outcome = "leader"
+            self._start(loop, key, start, waiter)
+        if metrics.enabled:
+            COALESCED_REQUESTS.inc(outcome)
+        return waiter
+
+    def _start(
+        self, loop: asyncio.AbstractEventLoop, key: str, start: Callable[[str], Awaitable[str]], waiter: asyncio.Future
+    ) -> None:
+        """計算を開始し、その結果を待つ呼び出しの一覧を登録します。"""
+        waiters = self._flights[key] = [waiter]
+        try:
+            computation = asyncio.ensure_future(start(key))
+        except BaseException:
+            del self._flights[key]
+            raise
+        timer = loop.call_later(self.timeout, self._expire, key, waiters) if self.timeout else None
+
+        def settle(done: asyncio.Future) -> None:
+            if timer is not None:
+                timer.cancel()
+            if self._flights.get(key) is waiters:
+                del self._flights[key]
+            if done.cancelled():
+                for waiter in waiters:
+                    waiter.cancel()
+                return
+            # 待っている呼び出しがすべてキャンセル・期限切れになっていても、取得されなかった例外の警告を出さない
+            error = done.exception()
+            for waiter in waiters:
+                if waiter.done():
+                    continue
+                if error is not None:
+                    waiter.set_exception(error)
+                else:
+                    waiter.set_result(done.result())
+
+        computation.add_done_callback(settle)
+
+    def _expire(self, key: str, waiters: List[asyncio.Future]) -> None:
+        """期限までに完了しなかった計算を処理中の一覧から除き、待っている呼び出しをタイムアウトにします。"""
+        if self._flights.get(key) is waiters:
+            del self._flights[key]
+        if metrics.enabled:
+            COALESCED_REQUESTS.inc("timeout")
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_exception(asyncio.TimeoutError(f"同じ発話の処理が期限 ({self.timeout} 秒) までに完了しませんでした。"))
+
+
+# プロセス共通の single-flight (ADK_SINGLE_FLIGHT=0 の場合は None)
+single_flight: Optional[SingleFlight] = SingleFlight(SINGLE_FLIGHT_TIMEOUT or None) if SINGLE_FLIGHT else None
+
+
+def get_single_flight_stats() -> Optional[dict]:
+    """同じ発話の処理の共有の状態 (処理中のキーの数) を返します (無効の場合は None)。"""
+    if single_flight is None:
+        return None
+    return {"inflight": len(single_flight)}
+
+
+async def _dispatch_async(user_input: str) -> str:
+    """
+    async ハンドラー (handle_async を持つハンドラー) はイベントループ上で await し、
+    同期ハンドラーはスレッドプールで実行して応答テキストを返します。
+    同じ発話の処理が実行中の場合は、その結果を共有します (single_flight)。
+    正規化した発話はキャッシュと共有のキーにだけ使い、ハンドラーには入力のまま渡します。
+    """
+    key = user_input
+    if response_cache.enabled or single_flight is not None:
+        key = normalize_utterance(user_input)
+    if response_cache.enabled:
+        # プロセス内のキャッシュにある場合は、スレッドプールに渡さずにその場で返す
+        cached_response = response_cache.get_local(key)
+        if cached_response is not None:
+            return cached_response
+    if single_flight is None:
+        return await _start_async(user_input, key)
+    return await single_flight.run(key, partial(_start_async, user_input))
+
+
+def _start_async(user_input: str, key: str) -> Awaitable[str]:
+    """
+    キャッシュにない発話のハンドラーを選択して応答の生成を開始し、応答テキストを待つ Awaitable を返します
+    (同期ハンドラーはスレッドプールの Future、async ハンドラーはコルーチン)。key はキャッシュのキーです。
+    """
+    handler = _route(user_input)
+    handle_async = getattr(handler, "handle_async", None)
+    if handle_async is not None and inspect.iscoroutinefunction(handle_async):
+        return _respond_async(handle_async, user_input, key)
+    loop = asyncio.get_running_loop()
+    handle = _handle_profiled if profiler.enabled else _handle_with_cache
+    return loop.run_in_executor(_get_executor(), handle, handler, user_input, key)
+
+
+async def _respond_async(handle_async, user_input: str, key: str) -> str:
+    """async ハンドラーで応答テキストを生成し、プロセス内のキャッシュに登録します。"""
+    response = (await handle_async(Message(text=user_input))).text
+    if response_cache.enabled:
+        # 共有キャッシュへの登録はソケット通信でループをブロックするため、プロセス内のみに登録する
+        response_cache.local.set(key, response)
+    return response
+
+
+async def get_agent_response_async(
+    user_input: str, session_id: Optional[str] = None, request_id: Optional[str] = None
+) -> str:
+    """
+    get_agent_response の非同期版。イベントループをブロックせずに応答テキストを返します。
+
+    Args:
+        user_input (str): ユーザーからの入力テキスト。
+        session_id (Optional[str]): セッション ID (指定した場合は前の計算結果を参照でき、やり取りをセッションに記録する)。
+        request_id (Optional[str]): リクエスト ID (セッションへの再試行を検出するため。session_id を指定した場合のみ使う)。
+
+    Returns:
+        str: エージェントからの応答テキスト。
+
+    Raises:
+        AgentBusyError: 同時処理数の上限に達している場合。
+        SessionUnavailableError: session_id を指定し、複数のワーカープロセスで動かしている場合。
+    """
+    if session_id is not None:
+        _check_sessions_available()
+    _acquire_slot()
+    try:
+        if session_id is None:
+            return await _dispatch_async(user_input)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), _respond_in_session, session_id, user_input, request_id)
+    except Exception as e:
+        logger.error("エージェント処理中にエラーが発生しました: %s", e)
         return "すみません、処理中にエラーが発生しました。"
+    finally:
+        _request_slots.release()
+
+
+async def get_agent_responses_async(user_inputs: List[str]) -> List[AgentResult]:
+    """
+    get_agent_responses の非同期版。バッチ全体を1つの処理枠としてスレッドプールで実行します。
+
+    Raises:
+        AgentBusyError: 同時処理数の上限に達している場合。
+    """
+    _acquire_slot()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), get_agent_responses, user_inputs)
+    finally:
+        _request_slots.release()
+
+# --- ストリーミング ---
+# 大きなバッチの結果を、全件の処理を待たずに少しずつ返します。
+# 入力は STREAM_CHUNK_SIZE 件ずつスレッドプールで処理し、クライアントへの送信中に次のチャンクを処理します。
+# 送信を待っている結果は最大で2チャンク分のため、サーバー側で保持する結果の量はバッチの大きさに依存しません。
+
+# ストリーミングで1回にスレッドプールで処理する入力の件数
+STREAM_CHUNK_SIZE = int(os.getenv("ADK_STREAM_CHUNK_SIZE", "16"))
+
+
+class ResponseStream:
+    """
+    get_agent_responses の結果を (入力の位置, AgentResult) の組として順に返す非同期イテレーター。
+
+    作成時に処理枠を1つ確保し、最後まで読み終えたとき・途中で閉じられたとき・破棄されたときに解放します。
+
+    Raises:
+        AgentBusyError: 作成時に同時処理数の上限に達している場合。
+    """
+
+    def __init__(self, user_inputs: List[str], chunk_size: int = STREAM_CHUNK_SIZE):
+        _acquire_slot()
+        self._released = False
+        self._results = self._iterate(user_inputs, max(1, chunk_size))
+
+    async def _iterate(self, user_inputs: List[str], chunk_size: int):
+        loop = asyncio.get_running_loop()
+        executor = _get_executor()
+        pending = None  # 処理中のチャンク (開始位置, Future)
+        for start in range(0, len(user_inputs) + chunk_size, chunk_size):
+            chunk = user_inputs[start:start + chunk_size]
+            future = loop.run_in_executor(executor, get_agent_responses, chunk) if chunk else None
+            if pending is not None:
+                pending_start, pending_future = pending
+                for offset, result in enumerate(await pending_future):
+                    yield pending_start + offset, result
+            if future is None:
+                break
+            pending = (start, future)
+
+    def _release(self) -> None:
+        if not self._released:
+            self._released = True
+            _request_slots.release()
+
+    def __aiter__(self) -> "ResponseStream":
+        return self
+
+    async def __anext__(self) -> Tuple[int, AgentResult]:
+        try:
+            return await self._results.__anext__()
+        except BaseException:
+            # 終端 (StopAsyncIteration)・エラー・キャンセルのいずれでも処理枠を解放する
+            self._release()
+            raise
+
+    async def aclose(self) -> None:
+        """処理を打ち切り、処理枠を解放します。"""
+        try:
+            await self._results.aclose()
+        finally:
+            self._release()
+
+    def __del__(self):
+        self._release()
+
+
+def stream_agent_responses(user_inputs: List[str], chunk_size: int = STREAM_CHUNK_SIZE) -> ResponseStream:
+    """
+    複数のユーザー入力を処理し、結果を処理が終わったものから入力の順に返す非同期イテレーターを作成します。
+
+    Args:
+        user_inputs (List[str]): ユーザーからの入力テキストのリスト。
+        chunk_size (int): 1回にスレッドプールで処理する入力の件数。
+
+    Returns:
+        ResponseStream: (入力の位置, AgentResult) を順に返す非同期イテレーター。
+
+    Raises:
+        AgentBusyError: 同時処理数の上限に達している場合。
+    """
+    return ResponseStream(user_inputs, chunk_size)
+
+# --- ウォームアップ ---
+# ワーカーがリクエストを受け付ける前に、合成リクエストで全インテントと式エンジンの主な形を1回ずつ処理して、
+# トークナイザー・式のコンパイル結果・応答キャッシュを温めておきます。
+
+# ウォームアップに使う合成リクエスト (全インテントと、括弧・複数の被演算子・動詞の式を含む)。
+# 手元で確定できない発話はモデルの段に回り、起動時にモデルへの問い合わせが発生するため含めない
+_WARMUP_UTTERANCES = (
+    "5たす3は？",
+    "10ひく4",
+    "2かける6",
+    "10わる4",
+    "10を3で割ったあまり",
+    "2の3乗",
+    "(2+3)*4",
+    "1と2と3を足して",
+)
+
+_ready = threading.Event()
+
+
+def warm_up() -> None:
+    """
+    合成リクエストでエージェントを温め、準備完了の状態にします (2回目以降の呼び出しは何もしません)。
+    """
+    if _ready.is_set():
+        return
+    for result in get_agent_responses(list(_WARMUP_UTTERANCES)):
+        if result.error is not None:
+            raise RuntimeError(f"ウォームアップに失敗しました: {result.error}")
+    _get_executor()
+    _ready.set()
+
+
+def is_ready() -> bool:
+    """ウォームアップが完了し、リクエストを受け付けられる状態かどうかを返します。"""
+    return _ready.is_set()
+
+
+def mark_not_ready() -> None:
+    """準備完了の状態を解除します (終了処理の開始時に呼び出し、/ready を失敗させて振り分け対象から外すため)。"""
+    _ready.clear()
 
 # 注意: 上記の `agent.handle_message` は adk-python の実際のAPIに基づいたものではなく、
 #       同期的にリクエストを処理するための仮のメソッド呼び出しです。
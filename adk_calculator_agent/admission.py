@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+リクエストの受け付けの制御 (アドミッションコントロール) のモジュール。
+
+1つのクライアントの過剰なリクエストや過負荷で全体の応答時間が悪化しないよう、/ask・/ask/batch・/ask/stream の
+リクエストをボディの受信・解析の前に ASGI のミドルウェア (AdmissionMiddleware) で選別します。
+
+    クライアントごとのレート制限 (ADK_RATE_LIMIT):
+        クライアント (接続元の IP アドレス、または ADK_RATE_LIMIT_CLIENT_HEADER のヘッダーの値) ごとのトークンバケット。
+        X-Forwarded-For のように複数の値が並ぶヘッダーは、信頼するプロキシの数 (ADK_RATE_LIMIT_TRUSTED_HOPS) だけ
+        右から数えた値を使います (左側の値はクライアントが自由に付けられるため)。
+        1秒あたり ADK_RATE_LIMIT 個のトークンが最大 ADK_RATE_LIMIT_BURST 個までたまり、1リクエストで1個使います。
+        トークンがない場合は 429 (Retry-After は次のトークンがたまるまでの秒数) を返します。
+
+    適応的な同時処理数の上限 (ADK_ADMISSION):
+        処理中のリクエスト数が上限に達している場合は 503 を返します。上限は /ask の応答時間から gradient 方式で
+        調整します。短期の応答時間 (指数移動平均) が長期の応答時間 (負荷が低い間の基準) の ADK_ADMISSION_TOLERANCE 倍を
+        超えるとその比率で上限を下げ、下回っている間は上限を √上限 ずつ上げます
+        (ADK_ADMISSION_MIN_LIMIT〜ADK_ADMISSION_MAX_LIMIT の範囲)。
+
+拒否の応答は作成済みのバイト列をそのまま送るため、FastAPI のルーティングや例外処理を通りません。
+状態はイベントループのスレッドからのみ更新するため、ロックは使いません (1リクエストあたりの判定は数マイクロ秒です)。
+状態はワーカープロセスごとに独立しています。
+"""
+
+import json
+import math
+import os
+from time import monotonic
+from typing import Dict, List, Optional
+
+# 受け付けの制御の対象のパス (これ以外のパス (/metrics・/ready・/admin/... など) は常に受け付ける)
+ADMISSION_PATHS = frozenset(("/ask", "/ask/batch", "/ask/stream"))
+# 応答時間を同時処理数の上限の調整に使うパス
+LATENCY_PATH = "/ask"
+
+
+class TokenBucketLimiter:
+    """クライアントごとのトークンバケットによるレート制限。"""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        """
+        Args:
+            rate (float): 1秒あたりにたまるトークンの数 (クライアントごと)。
+            burst (float): たまるトークンの最大数 (連続して受け付けるリクエスト数)。
+            max_clients (int): 状態を保持するクライアント数の上限 (超えた場合は満杯のバケットから破棄する)。
+        """
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_clients = max_clients
+        # クライアント -> [トークンの数, 最後に更新した時刻]
+        self._buckets: Dict[str, List[float]] = {}
+
+    def __len__(self) -> int:
+        """状態を保持しているクライアントの数を返します。"""
+        return len(self._buckets)
+
+    def acquire(self, client: str) -> float:
+        """
+        クライアントのトークンを1個使います。
+
+        Returns:
+            float: 受け付ける場合は 0、トークンがない場合は次のトークンがたまるまでの秒数。
+        """
+        now = monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            if len(self._buckets) >= self.max_clients:
+                self._evict(now)
+            self._buckets[client] = [self.burst - 1.0, now]
+            return 0.0
+        tokens = bucket[0] + (now - bucket[1]) * self.rate
+        if tokens > self.burst:
+            tokens = self.burst
+        bucket[1] = now
+        if tokens < 1.0:
+            bucket[0] = tokens
+            return (1.0 - tokens) / self.rate
+        bucket[0] = tokens - 1.0
+        return 0.0
+
+    def _evict(self, now: float) -> None:
+        """満杯になっている (しばらくリクエストのない) クライアントの状態を破棄します。なければ最も古いものを破棄します。"""
+        refill = self.burst / self.rate
+        idle = [client for client, (_, updated) in self._buckets.items() if now - updated >= refill]
+        for client in idle:
+            del self._buckets[client]
+        if not idle:
+            del self._buckets[next(iter(self._buckets))]
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    応答時間に応じて同時処理数の上限を調整するリミッター (gradient 方式)。
+
+    応答時間の短期の平均 (直近の約10件) と長期の平均 (無負荷時の基準) の比 (gradient) を
+    許容倍率で補正して 0.5〜1 に収め、新しい上限 = 上限 × gradient + √上限 を平滑化して反映します。
+    応答時間が基準の許容倍率以内の間は上限が増え、超えると比率に応じて減ります。処理中のリクエストが上限の半分未満の間
+    (上限が処理を制限していない間) は上限を増やしません。
+
+    長期の平均は、処理中のリクエストが上限の最小値以下の間 (負荷の影響を受けていない応答時間) だけ更新します。
+    過負荷が続いても基準がその応答時間に追いつかないため、上限は下がったままになります (処理の内容が変わって
+    応答時間が長くなった場合は、上限が最小値まで下がった時点の応答時間で基準が更新されます)。
+    """
+
+    # 短期・長期の応答時間の指数移動平均の係数
+    SHORT_ALPHA = 0.1
+    LONG_ALPHA = 0.01
+    # 新しい上限を反映する割合
+    SMOOTHING = 0.2
+
+    def __init__(self, min_limit: int, max_limit: int, initial_limit: Optional[int] = None, tolerance: float = 2.0):
+        """
+        Args:
+            min_limit (int): 上限の最小値。
+            max_limit (int): 上限の最大値。
+            initial_limit (Optional[int]): 上限の初期値 (省略時は max_limit)。
+            tolerance (float): 長期の応答時間に対して許容する短期の応答時間の倍率。
+        """
+        self.min_limit = max(min_limit, 1)
+        self.max_limit = max(max_limit, self.min_limit)
+        self.limit = float(min(max(initial_limit or self.max_limit, self.min_limit), self.max_limit))
+        self.tolerance = tolerance
+        self.inflight = 0
+        self._short = 0.0
+        self._long = 0.0
+
+    def try_acquire(self) -> bool:
+        """処理中のリクエスト数が上限未満であれば1つ増やして True を返します。"""
+        if self.inflight >= self.limit:
+            return False
+        self.inflight += 1
+        return True
+
+    def release(self) -> None:
+        """処理中のリクエスト数を1つ減らします。"""
+        self.inflight -= 1
+
+    def observe(self, latency: float) -> None:
+        """応答時間 (秒) を1件記録し、上限を調整します。"""
+        if self._long == 0.0:
+            self._short = self._long = latency
+            return
+        self._short += (latency - self._short) * self.SHORT_ALPHA
+        inflight = self.inflight
+        if inflight <= self.min_limit:
+            self._long += (latency - self._long) * self.LONG_ALPHA
+        if self._long > self._short * 2.0:
+            # 負荷が下がった後は、基準が古い (遅い) 応答時間に引きずられないよう早めに下げる
+            self._long *= 0.95
+        gradient = self.tolerance * self._long / self._short
+        if gradient > 1.0:
+            gradient = 1.0
+        elif gradient < 0.5:
+            gradient = 0.5
+        limit = self.limit
+        target = limit * gradient + math.sqrt(limit)
+        if target > limit and inflight < limit / 2:
+            return
+        limit += (target - limit) * self.SMOOTHING
+        self.limit = min(max(limit, self.min_limit), self.max_limit)
+
+    def stats(self) -> dict:
+        """現在の上限・処理中のリクエスト数・応答時間の平均 (ミリ秒) を返します。"""
+        return {
+            "limit": int(self.limit),
+            "inflight": self.inflight,
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "tolerance": self.tolerance,
+            "latency_short_ms": self._short * 1e3,
+            "latency_long_ms": self._long * 1e3,
+        }
+
+
+def _reject_response(status: int, detail: str) -> tuple:
+    """拒否の応答の (ステータス, ヘッダー (Retry-After を除く), ボディ) を作成します (HTTPException と同じ JSON)。"""
+    body = json.dumps({"detail": detail}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("ascii"))]
+    return status, headers, body
+
+
+_RATE_LIMITED = _reject_response(429, "リクエストが多すぎます。しばらくしてから再度お試しください。")
+_OVERLOADED = _reject_response(503, "サーバーが混雑しています。しばらくしてから再度お試しください。")
+
+
+class AdmissionController:
+    """レート制限と同時処理数の上限をまとめて保持し、拒否した件数を数えます。"""
+
+    def __init__(
+        self,
+        rate_limiter: Optional[TokenBucketLimiter] = None,
+        concurrency: Optional[AdaptiveConcurrencyLimiter] = None,
+        client_header: str = "",
+        trusted_hops: int = 1,
+    ):
+        """
+        Args:
+            rate_limiter (Optional[TokenBucketLimiter]): クライアントごとのレート制限 (None の場合は制限しない)。
+            concurrency (Optional[AdaptiveConcurrencyLimiter]): 同時処理数の上限 (None の場合は制限しない)。
+            client_header (str): クライアントの識別に使うヘッダー名 (空の場合は接続元の IP アドレス)。
+            trusted_hops (int): client_header に値を追加する信頼するプロキシの数 (右から数えてこの位置の値を使う)。
+        """
+        self.rate_limiter = rate_limiter
+        self.concurrency = concurrency
+        self.client_header = client_header.lower().encode("latin-1")
+        self.trusted_hops = max(trusted_hops, 1)
+        self.rejected = {"rate": 0, "concurrency": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate_limiter is not None or self.concurrency is not None
+
+    def client_of(self, scope: dict) -> str:
+        """リクエストのクライアントの識別子を返します。"""
+        if self.client_header:
+            # X-Forwarded-For のように複数の値が並ぶ場合、各プロキシは右端に追加するため、信頼するプロキシの数だけ
+            # 右から数えた値を使う (先頭の値はクライアントが偽装できる)。ヘッダーが複数行ある場合は順につなげる
+            values = [
+                item for name, value in scope["headers"] if name == self.client_header for item in value.split(b",")
+            ]
+            if values:
+                return values[-min(self.trusted_hops, len(values))].strip().decode("latin-1")
+        client = scope.get("client")
+        return client[0] if client else ""
+
+    def stats(self) -> dict:
+        """レート制限と同時処理数の上限の状態、拒否した件数を返します。"""
+        rate_limiter = self.rate_limiter
+        return {
+            "rate_limit": None if rate_limiter is None else {
+                "rate": rate_limiter.rate, "burst": rate_limiter.burst, "clients": len(rate_limiter),
+            },
+            "concurrency": None if self.concurrency is None else self.concurrency.stats(),
+            "rejected": dict(self.rejected),
+        }
+
+
+class AdmissionMiddleware:
+    """ADMISSION_PATHS のリクエストを、ボディの受信前に AdmissionController で選別する ASGI ミドルウェア。"""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        controller = self.controller
+        path = scope.get("path")
+        if scope["type"] != "http" or path not in ADMISSION_PATHS or not controller.enabled:
+            await self.app(scope, receive, send)
+            return
+        rate_limiter = controller.rate_limiter
+        if rate_limiter is not None:
+            wait = rate_limiter.acquire(controller.client_of(scope))
+            if wait:
+                controller.rejected["rate"] += 1
+                await _send_reject(send, _RATE_LIMITED, math.ceil(wait))
+                return
+        concurrency = controller.concurrency
+        if concurrency is None:
+            await self.app(scope, receive, send)
+            return
+        if not concurrency.try_acquire():
+            controller.rejected["concurrency"] += 1
+            await _send_reject(send, _OVERLOADED, 1)
+            return
+        started = monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            concurrency.release()
+        if path == LATENCY_PATH:
+            concurrency.observe(monotonic() - started)
+
+
+async def _send_reject(send, response: tuple, retry_after: int) -> None:
+    """作成済みの拒否の応答を送ります。"""
+    status, headers, body = response
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": headers + [(b"retry-after", str(retry_after).encode("ascii"))],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def create_admission_from_env() -> AdmissionController:
+    """
+    環境変数の設定で AdmissionController を作成します。
+
+        ADK_ADMISSION                   0 で同時処理数の上限を無効にする (デフォルト 1)
+        ADK_ADMISSION_MIN_LIMIT         同時処理数の上限の最小値 (デフォルト 8)
+        ADK_ADMISSION_MAX_LIMIT         同時処理数の上限の最大値 (デフォルト ADK_MAX_CONCURRENT_REQUESTS)
+        ADK_ADMISSION_TOLERANCE         長期の応答時間に対して許容する短期の応答時間の倍率 (デフォルト 2)
+        ADK_RATE_LIMIT                  クライアントごとの1秒あたりのリクエスト数 (デフォルト 0 = 制限しない)
+        ADK_RATE_LIMIT_BURST            クライアントごとに連続して受け付けるリクエスト数 (デフォルト ADK_RATE_LIMIT の2倍)
+        ADK_RATE_LIMIT_CLIENT_HEADER    クライアントの識別に使うヘッダー (例: X-Forwarded-For。デフォルトは接続元の IP アドレス)
+        ADK_RATE_LIMIT_TRUSTED_HOPS     ADK_RATE_LIMIT_CLIENT_HEADER に値を追加する信頼するプロキシの数 (デフォルト 1)
+        ADK_RATE_LIMIT_MAX_CLIENTS      状態を保持するクライアント数の上限 (デフォルト 10000)
+    """
+    concurrency = None
+    if os.getenv("ADK_ADMISSION", "1") != "0":
+        concurrency = AdaptiveConcurrencyLimiter(
+            min_limit=int(os.getenv("ADK_ADMISSION_MIN_LIMIT", "8")),
+            max_limit=int(os.getenv("ADK_ADMISSION_MAX_LIMIT", os.getenv("ADK_MAX_CONCURRENT_REQUESTS", "256"))),
+            tolerance=float(os.getenv("ADK_ADMISSION_TOLERANCE", "2")),
+        )
+    rate_limiter = None
+    rate = float(os.getenv("ADK_RATE_LIMIT", "0"))
+    if rate > 0:
+        rate_limiter = TokenBucketLimiter(
+            rate,
+            float(os.getenv("ADK_RATE_LIMIT_BURST") or rate * 2),
+            int(os.getenv("ADK_RATE_LIMIT_MAX_CLIENTS", "10000")),
+        )
+    return AdmissionController(
+        rate_limiter,
+        concurrency,
+        os.getenv("ADK_RATE_LIMIT_CLIENT_HEADER", ""),
+        int(os.getenv("ADK_RATE_LIMIT_TRUSTED_HOPS", "1")),
+    )
+
+
+# プロセス共通の受け付けの制御
+admission = create_admission_from_env()
@@ -4,27 +4,99 @@ ADK計算エージェントのロジックをラップするFastAPIアプリケ
 Streamlit UIからのリクエストを受け付け、エージェントの応答を返します。
 """
 
-from fastapi import FastAPI
-from pydantic import BaseModel # リクエスト/レスポンスのデータ構造定義用
-import uvicorn
+import json
+import os
+import re
+import secrets
+from time import perf_counter_ns
+from typing import List, Optional
+
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError # リクエスト/レスポンスのデータ構造定義用
 
 # ADKエージェントの応答生成関数をインポート
 # 注意: FastAPIサーバーを起動するディレクトリによっては、
 #       相対インポートがうまく機能しない場合があります。
 #       その場合は `from adk_calculator_agent.adk_logic import get_agent_response` のように
 #       絶対パスでのインポートが必要になるかもしれません。
-from .adk_logic import get_agent_response
+from .adk_logic import (
+    AgentBusyError,
+    SessionUnavailableError,
+    close_pipeline,
+    close_sessions,
+    delete_session,
+    get_agent_response_async,
+    get_cache_stats,
+    get_agent_responses_async,
+    get_semantic_cache_stats,
+    get_session,
+    get_session_stats,
+    get_single_flight_stats,
+    is_ready,
+    list_plugins,
+    load_plugins,
+    mark_not_ready,
+    shutdown_dispatcher,
+    stream_agent_responses,
+    unload_plugin,
+    warm_up,
+)
+from .admission import AdmissionMiddleware, admission
+from .calculator_agent.metrics import REQUEST_DURATION, STAGE_DURATION, fallback_ratio, metrics
+from .calculator_agent.operations import operation_memo
+from .calculator_agent.profiler import profiler
+from .calculator_agent.rendering import renderer
+from .request_log import log_sampled, logger, start_logging, stop_logging
+from .wire import WireFormatError, WireFormatUnavailable, request_codec, response_codec
+
+# /ask/batch で一度に受け付ける入力の最大件数
+MAX_BATCH_SIZE = 10000
+# /ask/stream で一度に受け付ける入力の最大件数 (結果は少しずつ返すため、/ask/batch より大きくできる)
+MAX_STREAM_SIZE = 100000
+# 管理用エンドポイント (/admin/...) のトークン。設定した場合は X-Admin-Token ヘッダーで同じ値を送る必要がある
+ADMIN_TOKEN = os.getenv("ADK_ADMIN_TOKEN", "")
+# 終了時にプロファイルを保存するディレクトリ (未設定の場合は保存しない)
+PROFILE_OUTPUT = os.getenv("ADK_PROFILE_OUTPUT", "")
+# セッション ID・リクエスト ID として受け付ける文字列 (英数字・"-"・"_" の 1〜64 文字)
+ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+_ID_REGEX = re.compile(ID_PATTERN)
 
 # --- Pydanticモデル定義 ---
 
 class AskRequest(BaseModel):
     """ /ask エンドポイントへのリクエストボディのスキーマ """
     text: str # ユーザーからの入力テキスト
+    session_id: Optional[str] = Field(default=None, pattern=ID_PATTERN) # セッション ID (指定すると前の計算結果を参照できる)
+    request_id: Optional[str] = Field(default=None, pattern=ID_PATTERN) # リクエスト ID (再試行で同じ値を送ると、セッションを二重に更新しない)
 
 class AskResponse(BaseModel):
     """ /ask エンドポイントのレスポンスボディのスキーマ """
     response: str # エージェントからの応答テキスト
 
+class AskBatchRequest(BaseModel):
+    """ /ask/batch エンドポイントへのリクエストボディのスキーマ """
+    texts: List[str] # ユーザーからの入力テキストのリスト
+
+class AskBatchItem(BaseModel):
+    """ /ask/batch の結果1件分のスキーマ """
+    response: Optional[str] = None # エージェントからの応答テキスト (成功時)
+    error: Optional[str] = None # エラーメッセージ (失敗時)
+
+class AskBatchResponse(BaseModel):
+    """ /ask/batch エンドポイントのレスポンスボディのスキーマ """
+    results: List[AskBatchItem] # 入力と同じ順序の結果リスト
+
+class ProfileSettings(BaseModel):
+    """ /admin/profile の設定変更のリクエストボディのスキーマ """
+    rate: float = Field(ge=0.0, le=1.0) # 追跡するリクエストの割合 (0 で無効)
+    interval: Optional[float] = Field(default=None, gt=0.0) # スタックを採取する間隔 (秒。省略時は変更しない)
+
+class PluginModule(BaseModel):
+    """ /admin/plugins の演算プラグインの読み込みのリクエストボディのスキーマ """
+    module: str = Field(pattern=r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$") # PLUGINS を定義したモジュール名
+
 # --- FastAPIアプリケーションの初期化 ---
 
 app = FastAPI(
@@ -32,25 +104,383 @@ app = FastAPI(
     description="ADK計算エージェントと対話するためのAPI",
     version="0.1.0",
 )
+# /ask などのリクエストを、ボディの受信・解析の前にレート制限と同時処理数の上限で選別する (admission.py)
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
+@app.on_event("startup")
+def _startup():
+    """ログ出力用のスレッドを開始し、リクエストを受け付ける前に合成リクエストでエージェントをウォームアップします。"""
+    start_logging()
+    profiler.start()
+    warm_up()
+
+@app.on_event("shutdown")
+def _shutdown():
+    """
+    アプリケーション終了時に準備完了の状態を解除し、ディスパッチ用スレッドプールを停止して、
+    意味的キャッシュのスナップショット (ADK_SEMANTIC_CACHE_SNAPSHOT) とセッション (ADK_SESSION_SPILL_DIR) を保存します。
+    ADK_PROFILE_OUTPUT が設定されていれば、採取したプロファイルを保存します。
+    """
+    mark_not_ready()
+    shutdown_dispatcher()
+    close_pipeline()
+    close_sessions()
+    profiler.stop()
+    if PROFILE_OUTPUT and profiler.stats()["samples"]:
+        logger.info("プロファイルを保存しました: %s", ", ".join(profiler.save(PROFILE_OUTPUT)))
+    stop_logging()
+
+def _busy_error(e: AgentBusyError) -> HTTPException:
+    """同時処理数の上限超過を 429 Too Many Requests に変換します。"""
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+
+def _session_error(e: SessionUnavailableError) -> HTTPException:
+    """複数のワーカーでのセッションの利用を 501 Not Implemented に変換します (再試行しても同じ結果になるため)。"""
+    return HTTPException(status_code=501, detail=str(e))
 
 # --- APIエンドポイント定義 ---
 
-@app.post("/ask", response_model=AskResponse, summary="エージェントに質問する")
-async def ask_agent(request: AskRequest):
+def _decode_wire(decode, body: bytes):
+    """バイナリ形式 (wire.py) のリクエストのボディを解析します (不正な場合は 400、ライブラリがない場合は 415)。"""
+    try:
+        return decode(body)
+    except WireFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except WireFormatUnavailable as e:
+        raise HTTPException(status_code=415, detail=str(e))
+
+def _check_id(name: str, value: Optional[str]) -> None:
+    """バイナリ形式のリクエストの ID を AskRequest と同じ規則で検査します (不正な場合は 422)。"""
+    if value is not None and not _ID_REGEX.fullmatch(value):
+        raise HTTPException(status_code=422, detail=f"{name} には英数字・\"-\"・\"_\" の 1〜64 文字を指定してください。")
+
+def _request_body_schema(model) -> dict:
+    """エンドポイント内で解析するリクエストボディのスキーマ (ドキュメント用の openapi_extra) を返します。"""
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": model.model_json_schema()}}}}
+
+@app.post(
+    "/ask",
+    response_model=AskResponse,
+    summary="エージェントに質問する",
+    # ボディは解析時間の計測とバイナリ形式への対応のためエンドポイント内で解析する
+    openapi_extra=_request_body_schema(AskRequest),
+)
+async def ask_agent(http_request: Request):
     """
     ユーザーからのテキスト入力を受け取り、ADKエージェントで処理し、
     その応答を返します。
+    session_id を指定した場合は、「それに5をかけて」のように直前の計算結果を参照でき、やり取りをセッションに記録します。
+    Content-Type / Accept に application/msgpack または application/x-adk-struct を指定すると、
+    リクエスト・応答をバイナリ形式 (wire.py) でやり取りします。
     """
-    print(f"API 受信: {request.text}") # 受信ログ
-    # ADKロジック関数を呼び出して応答を取得
-    agent_reply = get_agent_response(request.text)
-    print(f"API 応答: {agent_reply}") # 応答ログ
+    body = await http_request.body()
+    started = perf_counter_ns()
+    headers = http_request.headers
+    codec = request_codec(headers.get("content-type"))
+    if codec is None:
+        try:
+            request = AskRequest.model_validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors())
+        text, session_id, request_id = request.text, request.session_id, request.request_id
+    else:
+        text, session_id, request_id = _decode_wire(codec.decode_ask, body)
+        _check_id("session_id", session_id)
+        _check_id("request_id", request_id)
+    parsed = perf_counter_ns()
+    log_sampled("API 受信: %s", text) # 受信ログ (抽出して非同期に出力)
+    # ADKロジック関数を呼び出して応答を取得 (イベントループをブロックしない非同期版)
+    try:
+        agent_reply = await get_agent_response_async(text, session_id, request_id)
+    except AgentBusyError as e:
+        raise _busy_error(e)
+    except SessionUnavailableError as e:
+        raise _session_error(e)
+    log_sampled("API 応答: %s", agent_reply) # 応答ログ (抽出して非同期に出力)
+    if metrics.enabled:
+        with metrics.lock:
+            STAGE_DURATION._observe("parse", parsed - started)
+            REQUEST_DURATION._observe("/ask", perf_counter_ns() - started)
+    reply_codec = response_codec(headers.get("accept"), codec)
+    if reply_codec is not None:
+        return Response(reply_codec.encode_ask(agent_reply), media_type=reply_codec.media_type)
+    if renderer.raw_json:
+        # 応答の JSON を直接 UTF-8 のバイト列にして返す (レスポンスモデルによる検証と再シリアライズを省く。
+        # バイト列は AskResponse を返した場合と同じ)
+        return Response(renderer.encode_response(agent_reply), media_type="application/json")
     # レスポンスモデルに従って応答を返す
     return AskResponse(response=agent_reply)
 
+@app.post(
+    "/ask/batch",
+    response_model=AskBatchResponse,
+    summary="エージェントにまとめて質問する",
+    openapi_extra=_request_body_schema(AskBatchRequest),
+)
+async def ask_agent_batch(http_request: Request):
+    """
+    複数のテキスト入力をまとめて受け取り、ADKエージェントで処理します。
+    結果は入力と同じ順序で返し、個々の入力の失敗は該当項目の error に格納します。
+    /ask と同様に、Content-Type / Accept でバイナリ形式 (wire.py) を指定できます。
+    """
+    body = await http_request.body()
+    headers = http_request.headers
+    codec = request_codec(headers.get("content-type"))
+    if codec is None:
+        try:
+            texts = AskBatchRequest.model_validate_json(body).texts
+        except ValidationError as e:
+            raise RequestValidationError(e.errors())
+    else:
+        texts = _decode_wire(codec.decode_batch, body)
+    if len(texts) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"一度に送信できる入力は最大 {MAX_BATCH_SIZE} 件です。(受信: {len(texts)} 件)",
+        )
+    reply_codec = response_codec(headers.get("accept"), codec)
+    log_sampled("API バッチ受信: %d 件", len(texts)) # 受信ログ (件数のみ)
+    started = perf_counter_ns()
+    try:
+        results = await get_agent_responses_async(texts)
+    except AgentBusyError as e:
+        raise _busy_error(e)
+    if metrics.enabled:
+        REQUEST_DURATION.observe_ns("/ask/batch", perf_counter_ns() - started)
+    if reply_codec is not None:
+        return Response(reply_codec.encode_batch(results), media_type=reply_codec.media_type)
+    return AskBatchResponse(
+        results=[AskBatchItem(response=r.response, error=r.error) for r in results]
+    )
+
+def _ndjson_line(index: int, response: Optional[str], error: Optional[str]) -> str:
+    """結果1件分の NDJSON の行を作成します。"""
+    item = {"index": index, "response": response, "error": error}
+    return json.dumps(item, ensure_ascii=False) + "\n"
+
+def _sse_event(event: str, data: dict) -> str:
+    """Server-Sent Events のイベント1件分を作成します。"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/ask/stream", summary="エージェントにまとめて質問し、結果を順に受け取る")
+async def ask_agent_stream(request: AskBatchRequest, http_request: Request, format: Optional[str] = None):
+    """
+    複数のテキスト入力をまとめて受け取り、処理が終わった結果から入力の順に1件ずつ返します。
+
+    形式は format クエリパラメーター ("ndjson" または "sse") で指定します。
+    指定がない場合は Accept ヘッダーが text/event-stream なら SSE、それ以外は NDJSON になります。
+    NDJSON は1行に1件の `{"index": ..., "response": ..., "error": ...}` を、
+    SSE は1件ごとに result イベントを送り、最後に done イベント (件数) を送ります。
+    """
+    if len(request.texts) > MAX_STREAM_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"一度に送信できる入力は最大 {MAX_STREAM_SIZE} 件です。(受信: {len(request.texts)} 件)",
+        )
+    if format is None:
+        format = "sse" if "text/event-stream" in http_request.headers.get("accept", "") else "ndjson"
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail=f"format は ndjson または sse を指定してください。(指定: {format})")
+    log_sampled("API ストリーム受信: %d 件 (%s)", len(request.texts), format) # 受信ログ (件数のみ)
+    try:
+        results = stream_agent_responses(request.texts)
+    except AgentBusyError as e:
+        raise _busy_error(e)
+
+    async def ndjson_body():
+        async for index, result in results:
+            yield _ndjson_line(index, result.response, result.error)
+
+    async def sse_body():
+        count = 0
+        async for index, result in results:
+            count += 1
+            yield _sse_event("result", {"index": index, "response": result.response, "error": result.error})
+        yield _sse_event("done", {"count": count})
+
+    if format == "sse":
+        # プロキシでのバッファリングを無効にして、1件ずつクライアントに届くようにする
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        return StreamingResponse(sse_body(), media_type="text/event-stream", headers=headers)
+    return StreamingResponse(ndjson_body(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+@app.get("/metrics", response_class=PlainTextResponse, summary="計測値 (Prometheus 形式)")
+async def get_metrics():
+    """
+    処理段階ごとの所要時間のヒストグラム、インテントごとの件数、フォールバック率、
+    応答キャッシュ・同じ発話の処理の共有・受け付けの制御・演算結果のメモの統計情報を Prometheus のテキスト形式で返します。
+    """
+    gauges = []
+    ratio = fallback_ratio()
+    if ratio is not None:
+        gauges.append(("adk_fallback_ratio", "処理件数のうちフォールバックハンドラーが処理した割合", ratio))
+    local_cache = get_cache_stats()["local"]
+    for key in ("hits", "misses", "evictions", "expirations", "entries", "bytes"):
+        gauges.append((f"adk_response_cache_{key}", f"プロセス内の応答キャッシュの {key}", local_cache[key]))
+    semantic_cache = get_semantic_cache_stats()
+    if semantic_cache is not None:
+        gauges.append(("adk_semantic_cache_entries", "モデルの段の意味的キャッシュの件数", semantic_cache["entries"]))
+        gauges.append(("adk_semantic_cache_evictions", "モデルの段の意味的キャッシュの追い出し数", semantic_cache["evictions"]))
+        lookups = semantic_cache["hits"] + semantic_cache["misses"]
+        if lookups:
+            gauges.append(("adk_semantic_cache_hit_ratio", "モデルの段の意味的キャッシュのヒット率", semantic_cache["hits"] / lookups))
+    session_stats = get_session_stats()
+    gauges.append(("adk_sessions", "メモリ上のセッション数", session_stats["sessions"]))
+    gauges.append(("adk_session_bytes", "メモリ上のセッションの概算サイズ (バイト)", session_stats["bytes"]))
+    gauges.append(("adk_session_evictions", "メモリから追い出したセッションの数", session_stats["evictions"]))
+    concurrency = admission.concurrency
+    if concurrency is not None:
+        gauges.append(("adk_admission_limit", "適応的な同時処理数の上限", int(concurrency.limit)))
+        gauges.append(("adk_admission_inflight", "受け付けの制御の対象の処理中のリクエスト数", concurrency.inflight))
+    for reason, count in admission.rejected.items():
+        gauges.append((f"adk_admission_rejected_{reason}", f"受け付けの制御で拒否したリクエスト数 ({reason})", count))
+    single_flight_stats = get_single_flight_stats()
+    if single_flight_stats is not None:
+        gauges.append(("adk_single_flight_inflight", "処理を共有できる処理中の発話の数", single_flight_stats["inflight"]))
+    operation_memo_stats = operation_memo.stats()
+    for key in ("entries", "hits", "misses", "table_hits"):
+        gauges.append((f"adk_operation_memo_{key}", f"演算結果のメモの {key}", operation_memo_stats[key]))
+    return PlainTextResponse(metrics.render(gauges), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/sessions/{session_id}", summary="セッションの状態")
+async def read_session(session_id: str, limit: int = Query(default=20, ge=0)):
+    """
+    セッションの直前の計算結果・数値の履歴・直近のやり取り (最大 limit 件のメッセージ) を返します。
+    セッションはワーカープロセスごとに保持するため、複数のワーカーで動かしている場合は 501 を返します。
+    """
+    try:
+        state = get_session(session_id, limit)
+    except SessionUnavailableError as e:
+        raise _session_error(e)
+    if state is None:
+        raise HTTPException(status_code=404, detail="セッションが見つかりません。")
+    return state
+
+@app.delete("/sessions/{session_id}", summary="セッションの削除")
+async def remove_session(session_id: str):
+    """セッションを削除します (会話をリセットする場合に使います)。複数のワーカーで動かしている場合は 501 を返します。"""
+    try:
+        deleted = delete_session(session_id)
+    except SessionUnavailableError as e:
+        raise _session_error(e)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="セッションが見つかりません。")
+    return {"deleted": session_id}
+
+def _check_admin_token(token: Optional[str]) -> None:
+    """
+    X-Admin-Token ヘッダーの値が ADK_ADMIN_TOKEN と一致しなければ 403 を返します。
+    管理用エンドポイントはプロファイラーの有効化や内部の状態の取得ができるため、ADK_ADMIN_TOKEN を設定していない場合も 403 を返します。
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="管理用エンドポイントを使うには ADK_ADMIN_TOKEN を設定してください。")
+    if not secrets.compare_digest(token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="管理用トークンが正しくありません。")
+
+@app.get("/admin/profile", summary="プロファイラーの状態 (管理用)")
+async def get_profile_status(x_admin_token: Optional[str] = Header(default=None)):
+    """
+    プロファイラーの設定 (抽出率・採取間隔) と、追跡したリクエスト数・採取したスタック数を返します。
+    プロファイラーはワーカープロセスごとに独立しているため、このリクエストを処理したワーカーの状態です。
+    """
+    _check_admin_token(x_admin_token)
+    return profiler.stats()
+
+@app.put("/admin/profile", summary="プロファイラーの設定変更 (管理用)")
+async def configure_profile(settings: ProfileSettings, x_admin_token: Optional[str] = Header(default=None)):
+    """
+    プロファイラーの抽出率 (rate) と採取間隔 (interval) を変更します。rate を 0 にすると無効になります。
+    本番環境で常時有効にする場合は rate 0.01 (1%) 程度を想定しています。
+    """
+    _check_admin_token(x_admin_token)
+    profiler.configure(settings.rate, settings.interval)
+    return profiler.stats()
+
+@app.delete("/admin/profile", summary="プロファイルの破棄 (管理用)")
+async def reset_profile(x_admin_token: Optional[str] = Header(default=None)):
+    """採取済みのスタックを破棄します (設定は変更しません)。"""
+    _check_admin_token(x_admin_token)
+    profiler.reset()
+    return profiler.stats()
+
+@app.get("/admin/profile/export", summary="プロファイルの出力 (管理用)")
+async def export_profile(format: str = "collapsed", x_admin_token: Optional[str] = Header(default=None)):
+    """
+    採取したスタックをインテントごとに集計して出力します。
+    format は "collapsed" (flamegraph.pl などの入力、1行に1スタック) または "speedscope" (JSON) です。
+    """
+    _check_admin_token(x_admin_token)
+    filename = f"profile-{os.getpid()}"
+    if format == "collapsed":
+        headers = {"Content-Disposition": f'attachment; filename="{filename}.collapsed.txt"'}
+        return PlainTextResponse(profiler.collapsed(), headers=headers)
+    if format == "speedscope":
+        headers = {"Content-Disposition": f'attachment; filename="{filename}.speedscope.json"'}
+        return JSONResponse(profiler.speedscope(), headers=headers)
+    raise HTTPException(status_code=400, detail=f"format は collapsed または speedscope を指定してください。(指定: {format})")
+
+@app.get("/admin/admission", summary="受け付けの制御の状態 (管理用)")
+async def get_admission_status(x_admin_token: Optional[str] = Header(default=None)):
+    """
+    クライアントごとのレート制限 (レート・バースト・状態を保持しているクライアント数)、適応的な同時処理数の上限
+    (現在の上限・処理中のリクエスト数・応答時間の短期と長期の平均)、拒否した件数を返します。
+    状態はワーカープロセスごとに独立しているため、このリクエストを処理したワーカーの状態です。
+    """
+    _check_admin_token(x_admin_token)
+    return admission.stats()
+
+@app.get("/admin/plugins", summary="演算プラグインの一覧 (管理用)")
+async def get_plugins(x_admin_token: Optional[str] = Header(default=None)):
+    """登録済みの演算プラグイン (名前・記号・キーワード・被演算子の数・読み込んだモジュール) を優先順に返します。"""
+    _check_admin_token(x_admin_token)
+    return {"plugins": list_plugins()}
+
+@app.post("/admin/plugins", summary="演算プラグインの読み込み (管理用)")
+def add_plugins(request: PluginModule, x_admin_token: Optional[str] = Header(default=None)):
+    """
+    モジュールの演算プラグイン (PLUGINS) を登録します (読み込み済みのモジュールは再読み込みします)。
+    再起動せずに、処理中のリクエストを止めずにルーターに反映します。モジュールの読み込みはサーバー上のコードの実行になるため、
+    ADK_ADMIN_TOKEN を設定していない場合は受け付けません。プラグインはワーカープロセスごとに登録されるため、
+    すべてのワーカーに反映する場合は ADK_PLUGINS を設定して再起動 (serve.py のグレースフルリロード) してください。
+    """
+    _check_admin_token(x_admin_token)
+    # モジュールのインポートと正規表現のコンパイルでイベントループを止めないよう、同期の関数 (スレッドプールで実行) にしている
+    try:
+        names = load_plugins(request.module)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"演算プラグインの定義が正しくありません: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"モジュールを読み込めません: {e}")
+    return {"loaded": names, "plugins": list_plugins()}
+
+@app.delete("/admin/plugins/{name}", summary="演算プラグインの削除 (管理用)")
+async def remove_plugin(name: str, x_admin_token: Optional[str] = Header(default=None)):
+    """
+    演算プラグインの登録を解除します (組み込みの演算も解除できます)。
+    組み込みの演算を解除すると計算に応答できなくなるため、ADK_ADMIN_TOKEN を設定していない場合は受け付けません。
+    """
+    _check_admin_token(x_admin_token)
+    if not unload_plugin(name):
+        raise HTTPException(status_code=404, detail="演算プラグインが見つかりません。")
+    return {"deleted": name, "plugins": list_plugins()}
+
+@app.get("/ready", summary="準備完了状態の確認")
+async def ready():
+    """
+    ウォームアップが完了していれば 200 を返します。
+    起動中・終了処理中は 503 を返すため、ロードバランサーの振り分け判定に使えます。
+    """
+    if not is_ready():
+        raise HTTPException(status_code=503, detail="ウォームアップ中または終了処理中です。")
+    return {"status": "ready"}
+
 # --- Uvicornでの実行設定 (直接実行用) ---
 # 通常は `uvicorn adk_calculator_agent.api:app --reload` のようにコマンドラインから起動します。
+# 本番環境で複数のワーカーを起動する場合は `python -m adk_calculator_agent.serve` を使います。
 if __name__ == "__main__":
+    # uvicorn は直接実行する場合にのみ使うため、ここでインポートする (アプリケーションのインポートを速くするため)
+    import uvicorn
+
     # ホスト '0.0.0.0' は、ローカルネットワーク内の他のデバイスからのアクセスを許可します。
     # ローカルマシンからのみアクセスする場合は '127.0.0.1' を使用します。
     # ポート8000でリッスンします。
@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+"""
+計算エージェント API (api.py) のクライアントモジュール。
+Streamlit UI (streamlit_app.py) やスクリプトから共通で使います。
+
+接続はキープアライブのコネクションプールで再利用し、タイムアウト・ジッター付きの再試行
+(再試行の総量はリトライバジェットで制限)・HTTP/2 (任意)・同じ質問の重複送信の集約に対応します。
+同期版 (CalculatorClient) と非同期版 (AsyncCalculatorClient) があります。
+
+使用例:
+    client = CalculatorClient("http://127.0.0.1:8000")
+    print(client.ask("5たす3は？"))
+    print(client.ask("5たす3", session_id="s1"), client.ask("それに2をかけて", session_id="s1"))
+    for index, response, error in client.stream(["5たす3", "10ひく4"]):
+        print(index, response, error)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger("adk_calculator_agent.api_client")
+
+# API サーバーのアドレスのデフォルト
+DEFAULT_BASE_URL = os.getenv("ADK_API_URL", "http://127.0.0.1:8000")
+
+# 再試行の対象とする HTTP ステータス (同時処理数の上限超過・準備中)
+_RETRY_STATUS_CODES = (429, 502, 503, 504)
+# Retry-After ヘッダーに従って待つ最大秒数
+_MAX_RETRY_AFTER = 5.0
+
+
+class RetryBudget:
+    """
+    再試行の総量を制限するリトライバジェット。
+
+    リクエストごとに ratio 分のトークンが貯まり (最大 max_tokens)、再試行のたびに1トークンを使います。
+    サーバーの障害時に全クライアントが再試行を繰り返して負荷を増やすことを防ぎます。
+    """
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10.0):
+        """
+        Args:
+            ratio (float): リクエスト1件あたりに貯まるトークン (再試行できるリクエストの割合)。
+            max_tokens (float): 貯められるトークンの上限 (初期値も同じ)。
+        """
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        """リクエスト1件分のトークンを貯めます。"""
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        """再試行1回分のトークンを使います。足りない場合は False を返します (再試行しない)。"""
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class _ClientSettings:
+    """同期版・非同期版で共通の設定と再試行の判定。"""
+
+    def __init__(
+        self,
+        base_url: Optional[str],
+        timeout: Optional[float],
+        connect_timeout: Optional[float],
+        retries: Optional[int],
+        backoff: float,
+        http2: Optional[bool],
+        max_connections: int,
+        coalesce_window: float,
+        retry_budget: Optional[RetryBudget],
+    ):
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        timeout = float(os.getenv("ADK_CLIENT_TIMEOUT", "30")) if timeout is None else timeout
+        connect_timeout = float(os.getenv("ADK_CLIENT_CONNECT_TIMEOUT", "3")) if connect_timeout is None else connect_timeout
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.retries = int(os.getenv("ADK_CLIENT_RETRIES", "2")) if retries is None else retries
+        self.backoff = backoff
+        if http2 is None:
+            http2 = os.getenv("ADK_CLIENT_HTTP2", "").lower() in ("1", "true", "yes")
+        if http2:
+            try:
+                import h2  # noqa: F401  (httpx の HTTP/2 対応に必要)
+            except ImportError:
+                logger.warning("HTTP/2 を使うには `pip install httpx[http2]` が必要です。HTTP/1.1 で接続します。")
+                http2 = False
+        self.http2 = http2
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.coalesce_window = coalesce_window
+        self.retry_budget = retry_budget or RetryBudget()
+
+    def retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> Optional[float]:
+        """
+        再試行までの待ち時間を返します。再試行しない場合は None を返します。
+        待ち時間は指数バックオフにフルジッターを加えたもので、Retry-After ヘッダーがあればそれを優先します。
+        """
+        if attempt >= self.retries or not self.retry_budget.withdraw():
+            return None
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after is not None:
+                try:
+                    return min(float(retry_after), _MAX_RETRY_AFTER) * random.uniform(0.5, 1.0)
+                except ValueError:
+                    pass
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+
+def _session_payload(text: str, session_id: str) -> dict:
+    """
+    セッションを指定した /ask のリクエストボディを作成します。
+    再試行で同じリクエストが二重に処理されない (セッションの直前の結果が二重に更新されない) よう、
+    送信ごとに1つのリクエスト ID を付けます (再試行では同じ ID を送ります)。
+    """
+    return {"text": text, "session_id": session_id, "request_id": uuid.uuid4().hex}
+
+
+def _parse_ndjson_line(line: str) -> Tuple[int, Optional[str], Optional[str]]:
+    item = json.loads(line)
+    return item["index"], item.get("response"), item.get("error")
+
+
+class CalculatorClient:
+    """
+    計算エージェント API の同期クライアント (スレッドセーフ)。
+
+    1つのインスタンスを使い回すことで、接続が再利用されます (Streamlit では st.cache_resource で保持します)。
+    同じ質問が coalesce_window 秒以内に重複して送信された場合は、1回だけ API を呼び出して結果を共有します。
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        timeout: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        backoff: float = 0.1,
+        http2: Optional[bool] = None,
+        max_connections: int = 20,
+        coalesce_window: float = 1.0,
+        retry_budget: Optional[RetryBudget] = None,
+    ):
+        """
+        Args:
+            base_url (Optional[str]): API サーバーのアドレス (デフォルト: 環境変数 ADK_API_URL)。
+            timeout (Optional[float]): 読み書きのタイムアウト秒数 (デフォルト: ADK_CLIENT_TIMEOUT または 30)。
+            connect_timeout (Optional[float]): 接続のタイムアウト秒数 (デフォルト: ADK_CLIENT_CONNECT_TIMEOUT または 3)。
+            retries (Optional[int]): 1リクエストあたりの最大再試行回数 (デフォルト: ADK_CLIENT_RETRIES または 2)。
+            backoff (float): 再試行の待ち時間の基準秒数 (指数バックオフ + ジッター)。
+            http2 (Optional[bool]): HTTP/2 を使うかどうか (デフォルト: ADK_CLIENT_HTTP2)。
+            max_connections (int): コネクションプールの最大接続数。
+            coalesce_window (float): 同じ質問の結果を共有する秒数 (0 で集約しない)。
+            retry_budget (Optional[RetryBudget]): 再試行の総量の制限 (複数のクライアントで共有することもできます)。
+        """
+        self.settings = _ClientSettings(
+            base_url, timeout, connect_timeout, retries, backoff, http2, max_connections, coalesce_window, retry_budget
+        )
+        self._client = httpx.Client(
+            base_url=self.settings.base_url,
+            timeout=self.settings.timeout,
+            limits=self.settings.limits,
+            http2=self.settings.http2,
+        )
+        self._lock = threading.Lock()
+        # 質問 -> (結果の Future, 完了時刻 (処理中の場合は None))
+        self._recent: Dict[str, Tuple[Future, Optional[float]]] = {}
+
+    def _post(self, path: str, payload: dict) -> httpx.Response:
+        """POST リクエストを送信します。接続エラー・タイムアウト・429/503 などは再試行します。"""
+        settings = self.settings
+        settings.retry_budget.deposit()
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = self._client.post(path, json=payload)
+                if response.status_code not in _RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response
+            except (httpx.TransportError, httpx.TimeoutException):
+                delay = settings.retry_delay(attempt, None)
+                if delay is None:
+                    raise
+            else:
+                delay = settings.retry_delay(attempt, response)
+                if delay is None:
+                    response.raise_for_status()
+            time.sleep(delay)
+            attempt += 1
+
+    def ask(self, text: str, session_id: Optional[str] = None) -> str:
+        """
+        質問を1件送信し、応答テキストを返します。
+        session_id を指定した場合は、そのセッションの直前の計算結果を参照できます (「それに5をかけて」など)。
+        セッションを指定した質問は応答がセッションの状態によって変わるため、重複送信の集約は行いません。
+
+        Raises:
+            httpx.HTTPError: 再試行しても API の呼び出しに失敗した場合。
+        """
+        if session_id is not None:
+            return self._post("/ask", _session_payload(text, session_id)).json()["response"]
+        window = self.settings.coalesce_window
+        if window <= 0:
+            return self._post("/ask", {"text": text}).json()["response"]
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._recent.get(text)
+            if entry is not None and (entry[1] is None or now - entry[1] < window):
+                future, owner = entry[0], False
+            else:
+                future, owner = Future(), True
+                self._recent[text] = (future, None)
+        if not owner:
+            return future.result()
+
+        try:
+            result = self._post("/ask", {"text": text}).json()["response"]
+        except BaseException as e:
+            with self._lock:
+                self._recent.pop(text, None)
+            future.set_exception(e)
+            raise
+        future.set_result(result)
+        with self._lock:
+            self._recent[text] = (future, time.monotonic())
+            # 集約の期間を過ぎた結果を削除する
+            expired = [k for k, (_, done) in self._recent.items() if done is not None and now - done >= window]
+            for k in expired:
+                del self._recent[k]
+        return result
+
+    def ask_batch(self, texts: List[str]) -> List[dict]:
+        """
+        質問をまとめて送信し、入力と同じ順序の結果 ({"response": ..., "error": ...}) のリストを返します。
+        """
+        return self._post("/ask/batch", {"texts": texts}).json()["results"]
+
+    def delete_session(self, session_id: str) -> bool:
+        """セッションを削除します (会話のリセット)。セッションがなかった場合は False を返します。"""
+        response = self._client.delete(f"/sessions/{session_id}")
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
+
+    def stream(self, texts: List[str]) -> Iterator[Tuple[int, Optional[str], Optional[str]]]:
+        """
+        質問をまとめて送信し、結果を届いたものから (入力の位置, 応答, エラー) として順に返します。
+        再試行は行いません (途中まで受け取った結果を重複させないため)。
+        """
+        with self._client.stream("POST", "/ask/stream", json={"texts": texts}, params={"format": "ndjson"}) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield _parse_ndjson_line(line)
+
+    def close(self) -> None:
+        """コネクションプールを閉じます。"""
+        self._client.close()
+
+    def __enter__(self) -> "CalculatorClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class AsyncCalculatorClient:
+    """
+    計算エージェント API の非同期クライアント。引数は CalculatorClient と同じです。
+    1つのイベントループの中で使います。
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        timeout: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        backoff: float = 0.1,
+        http2: Optional[bool] = None,
+        max_connections: int = 100,
+        coalesce_window: float = 1.0,
+        retry_budget: Optional[RetryBudget] = None,
+    ):
+        self.settings = _ClientSettings(
+            base_url, timeout, connect_timeout, retries, backoff, http2, max_connections, coalesce_window, retry_budget
+        )
+        self._client = httpx.AsyncClient(
+            base_url=self.settings.base_url,
+            timeout=self.settings.timeout,
+            limits=self.settings.limits,
+            http2=self.settings.http2,
+        )
+        # 質問 -> (結果の Future, 完了時刻 (処理中の場合は None))
+        self._recent: Dict[str, Tuple[asyncio.Future, Optional[float]]] = {}
+
+    async def _post(self, path: str, payload: dict) -> httpx.Response:
+        """POST リクエストを送信します。接続エラー・タイムアウト・429/503 などは再試行します。"""
+        settings = self.settings
+        settings.retry_budget.deposit()
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = await self._client.post(path, json=payload)
+                if response.status_code not in _RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response
+            except (httpx.TransportError, httpx.TimeoutException):
+                delay = settings.retry_delay(attempt, None)
+                if delay is None:
+                    raise
+            else:
+                delay = settings.retry_delay(attempt, response)
+                if delay is None:
+                    response.raise_for_status()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def ask(self, text: str, session_id: Optional[str] = None) -> str:
+        """
+        質問を1件送信し、応答テキストを返します (セッションを指定しない同じ質問の重複送信は集約します)。
+        session_id を指定した場合は、そのセッションの直前の計算結果を参照できます。
+        """
+        if session_id is not None:
+            return (await self._post("/ask", _session_payload(text, session_id))).json()["response"]
+        window = self.settings.coalesce_window
+        if window <= 0:
+            return (await self._post("/ask", {"text": text})).json()["response"]
+
+        now = time.monotonic()
+        entry = self._recent.get(text)
+        if entry is not None and (entry[1] is None or now - entry[1] < window):
+            # 処理中・完了済みの結果を共有する (shield で、この呼び出しのキャンセルが他に波及しないようにする)
+            return await asyncio.shield(entry[0])
+
+        future = asyncio.get_running_loop().create_future()
+        self._recent[text] = (future, None)
+        try:
+            result = (await self._post("/ask", {"text": text})).json()["response"]
+        except BaseException as e:
+            self._recent.pop(text, None)
+            future.set_exception(e)
+            # 待っている呼び出しがない場合に「例外が取得されなかった」警告を出さないようにする
+            future.exception()
+            raise
+        future.set_result(result)
+        self._recent[text] = (future, time.monotonic())
+        expired = [k for k, (_, done) in self._recent.items() if done is not None and now - done >= window]
+        for k in expired:
+            del self._recent[k]
+        return result
+
+    async def ask_batch(self, texts: List[str]) -> List[dict]:
+        """質問をまとめて送信し、入力と同じ順序の結果のリストを返します。"""
+        return (await self._post("/ask/batch", {"texts": texts})).json()["results"]
+
+    async def delete_session(self, session_id: str) -> bool:
+        """セッションを削除します (会話のリセット)。セッションがなかった場合は False を返します。"""
+        response = await self._client.delete(f"/sessions/{session_id}")
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
+
+    async def stream(self, texts: List[str]) -> AsyncIterator[Tuple[int, Optional[str], Optional[str]]]:
+        """質問をまとめて送信し、結果を届いたものから (入力の位置, 応答, エラー) として順に返します。"""
+        async with self._client.stream(
+            "POST", "/ask/stream", json={"texts": texts}, params={"format": "ndjson"}
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line:
+                    yield _parse_ndjson_line(line)
+
+    async def aclose(self) -> None:
+        """コネクションプールを閉じます。"""
+        await self._client.aclose()
+
+    async def __aenter__(self) -> "AsyncCalculatorClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
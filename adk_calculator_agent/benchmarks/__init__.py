@@ -0,0 +1,15 @@
+"""
+計算エージェントのベンチマーク群。
+adk_calculator_agent ディレクトリで `python -m benchmarks.<モジュール名>` として実行します。
+
+    corpus           再現可能な発話コーパスの生成 (各ベンチマークで共通)
+    micro_bench      インテントハンドラーの can_handle / handle と計算関数のマイクロベンチマーク
+    inprocess_bench  adk_logic の get_agent_response / get_agent_responses のベンチマーク
+    load_bench       /ask エンドポイントの負荷試験 (スループットと p50 / p95 / p99 レイテンシ)
+    tokenizer_bench  トークナイザーと従来の方式の比較
+    operations_bench 計算関数のスカラー版と一括演算版の比較
+    coldstart_bench  新しいプロセスでのインポート時間と最初の /ask の応答までの時間 (起動時間の予算の検査)
+
+micro_bench・inprocess_bench・load_bench・coldstart_bench は --save-baseline で結果を JSON に保存し、
+--compare で保存した結果と比較できます (許容範囲を超える悪化があれば終了コード 1)。
+"""
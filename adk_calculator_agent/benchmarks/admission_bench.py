@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+受け付けの制御 (admission.py) のマイクロベンチマーク。
+
+AdmissionMiddleware を通した場合と通さない場合の、何もしない ASGI アプリケーションの呼び出し1回あたりの時間の差
+(ミドルウェアが1リクエストに加える時間) を計測します。
+
+    admission.pass            レート制限と同時処理数の上限の両方を通して受け付ける場合 (/ask、応答時間の記録を含む)
+    admission.concurrency     同時処理数の上限のみ (デフォルトの設定)
+    admission.reject_rate     レート制限で 429 を返す場合 (拒否の応答の送信を含む)
+    admission.reject_overload 同時処理数の上限で 503 を返す場合
+    admission.bypass          対象外のパス (/metrics など)
+
+実行例 (adk_calculator_agent ディレクトリで実行):
+    python -m benchmarks.admission_bench --save-baseline benchmarks/baselines/admission.json
+    python -m benchmarks.admission_bench --compare benchmarks/baselines/admission.json
+"""
+
+import argparse
+import importlib
+
+from .render_bench import import_api, run_coroutine
+from .report import BenchmarkReport, Metric, add_baseline_arguments, best_ns_per_op, finish
+
+# 計測用のリクエストの scope (uvicorn が作成するものと同じ形)
+_HEADERS = [(b"host", b"localhost:8000"), (b"content-type", b"application/json"), (b"content-length", b"20")]
+
+
+def _scope(path: str) -> dict:
+    return {"type": "http", "method": "POST", "path": path, "headers": _HEADERS, "client": ("127.0.0.1", 50000)}
+
+
+async def _app(scope, receive, send):
+    pass
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    pass
+
+
+def _middleware_metrics(admission, number: int, repeat: int):
+    def call(middleware, scope):
+        return lambda: run_coroutine(middleware(scope, _receive, _send))
+
+    baseline = best_ns_per_op(call(_app, _scope("/ask")), number, repeat)
+    # 通常のリクエストはトークンがなくならず、上限にも達しないレートと上限にする
+    unlimited_rate = admission.TokenBucketLimiter(rate=1e12, burst=1e12)
+    cases = (
+        ("pass", admission.AdmissionController(unlimited_rate, admission.AdaptiveConcurrencyLimiter(8, 256)), "/ask"),
+        ("concurrency", admission.AdmissionController(None, admission.AdaptiveConcurrencyLimiter(8, 256)), "/ask"),
+        ("reject_rate", admission.AdmissionController(admission.TokenBucketLimiter(rate=1e-9, burst=1.0)), "/ask"),
+        ("reject_overload", admission.AdmissionController(None, admission.AdaptiveConcurrencyLimiter(1, 1)), "/ask"),
+        ("bypass", admission.AdmissionController(unlimited_rate, admission.AdaptiveConcurrencyLimiter(8, 256)), "/metrics"),
+    )
+    for name, controller, path in cases:
+        if name == "reject_overload":
+            # 処理中のリクエストが上限 (1) に達している状態にする
+            controller.concurrency.inflight = 1
+        middleware = admission.AdmissionMiddleware(_app, controller)
+        elapsed = best_ns_per_op(call(middleware, _scope(path)), number, repeat)
+        yield Metric(f"admission.{name}", max(elapsed - baseline, 0.0), "ns/op")
+
+
+def run(number: int, repeat: int) -> BenchmarkReport:
+    import_api()
+    admission = importlib.import_module("adk_calculator_agent.admission")
+    metrics = list(_middleware_metrics(admission, number, repeat))
+    return BenchmarkReport("admission", metrics, {"number": number, "repeat": repeat})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="受け付けの制御のマイクロベンチマーク")
+    parser.add_argument("--number", type=int, default=50000, help="1回の計測での呼び出し回数")
+    parser.add_argument("--repeat", type=int, default=5, help="計測の繰り返し回数 (最速の回を採用)")
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+    finish(run(args.number, args.repeat), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+コールドスタートのベンチマーク (起動時間の予算の検査)。
+
+毎回新しい Python プロセスを起動して、次の時間を計測します (各 --runs 回の中央値)。
+    python.startup      何もインポートしない Python の起動・終了 (環境の基準値)
+    import.api          adk_calculator_agent.api のインポート
+    cli.run             `python run.py 5たす3` (エージェントを作成しないキーワード計算) の起動から終了まで
+    api.first_response  uvicorn の起動から最初の /ask の応答を受け取るまで
+
+api.first_response が --budget-ms (デフォルト 150 ms) を超えた場合は終了コード 1 で終了します。
+--importtime を指定すると、`python -X importtime` で adk_calculator_agent.api のインポートに
+時間がかかっているモジュールを表示します。
+
+実行例 (adk_calculator_agent ディレクトリで実行):
+    python -m benchmarks.coldstart_bench --runs 5 --budget-ms 150
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+
+import httpx
+
+from .report import BenchmarkReport, Metric, add_baseline_arguments, finish
+
+_REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_AGENT_DIRECTORY = os.path.join(_REPOSITORY_ROOT, "adk_calculator_agent")
+
+# 起動時間の予算のデフォルト (ミリ秒)
+DEFAULT_BUDGET_MS = 150.0
+
+_IMPORT_API = (
+    "import time; started = time.perf_counter(); import adk_calculator_agent.api; "
+    "print((time.perf_counter() - started) * 1000)"
+)
+
+
+def _wall_ms(command: List[str], cwd: str) -> float:
+    """コマンドを実行し、起動から終了までの時間 (ミリ秒) を返します。"""
+    started = time.perf_counter()
+    subprocess.run(command, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - started) * 1000
+
+
+def _import_api_ms() -> float:
+    """新しいプロセスで adk_calculator_agent.api のインポートにかかった時間 (ミリ秒) を返します。"""
+    output = subprocess.run(
+        [sys.executable, "-c", _IMPORT_API], cwd=_REPOSITORY_ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _first_response_ms(timeout: float = 60.0) -> float:
+    """uvicorn で API サーバーを起動し、最初の /ask の応答 (200) を受け取るまでの時間 (ミリ秒) を返します。"""
+    port = _free_port()
+    command = [sys.executable, "-m", "uvicorn", "adk_calculator_agent.api:app", "--port", str(port),
+               "--log-level", "warning"]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=_REPOSITORY_ROOT, stdout=subprocess.DEVNULL)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5) as client:
+            while time.perf_counter() - started < timeout:
+                if process.poll() is not None:
+                    raise RuntimeError(f"API サーバーが起動しませんでした (終了コード {process.returncode})。")
+                try:
+                    if client.post("/ask", json={"text": "5たす3は？"}).status_code == 200:
+                        return (time.perf_counter() - started) * 1000
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.002)
+        raise RuntimeError(f"API サーバーが {timeout} 秒以内に応答しませんでした。")
+    finally:
+        process.terminate()
+        process.wait(30)
+
+
+def print_import_profile(limit: int = 15) -> None:
+    """`python -X importtime` で、adk_calculator_agent.api のインポートに時間がかかっているモジュールを表示します。"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import adk_calculator_agent.api"],
+        cwd=_REPOSITORY_ROOT, check=True, capture_output=True, text=True,
+    ).stderr
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|").split("|"))
+        if self_us.isdigit():
+            entries.append((int(self_us), int(cumulative_us), name))
+    print(f"-- インポート時間 (自身の時間の上位 {limit} 件) --")
+    for self_us, cumulative_us, name in sorted(entries, reverse=True)[:limit]:
+        print(f"  {self_us / 1000:8.1f} ms (累計 {cumulative_us / 1000:8.1f} ms)  {name}")
+
+
+def run(runs: int) -> BenchmarkReport:
+    measurements = {
+        "python.startup": [_wall_ms([sys.executable, "-c", "pass"], _REPOSITORY_ROOT) for _ in range(runs)],
+        "import.api": [_import_api_ms() for _ in range(runs)],
+        "cli.run": [_wall_ms([sys.executable, "run.py", "5たす3"], _AGENT_DIRECTORY) for _ in range(runs)],
+        "api.first_response": [_first_response_ms() for _ in range(runs)],
+    }
+    metrics = [Metric(name, statistics.median(values), "ms") for name, values in measurements.items()]
+    return BenchmarkReport("coldstart", metrics, {"runs": runs})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="コールドスタートのベンチマーク")
+    parser.add_argument("--runs", type=int, default=5, help="計測の回数 (中央値を使う)")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help=f"api.first_response の予算 (ミリ秒。デフォルト: {DEFAULT_BUDGET_MS})")
+    parser.add_argument("--importtime", action="store_true", help="インポートに時間がかかっているモジュールを表示する")
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    if args.importtime:
+        print_import_profile()
+    report = run(args.runs)
+    first_response = next(m.value for m in report.metrics if m.name == "api.first_response")
+    over_budget = first_response > args.budget_ms
+    finish(report, args)
+    if over_budget:
+        print(f"api.first_response ({first_response:.1f} ms) が予算 ({args.budget_ms:.1f} ms) を超えています。")
+        sys.exit(1)
+    print(f"api.first_response は予算 ({args.budget_ms:.1f} ms) 以内です。")
+
+
+if __name__ == "__main__":
+    main()
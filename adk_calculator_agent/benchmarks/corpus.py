@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+ベンチマーク用の発話コーパス生成モジュール。
+
+日本語の計算指示 ("5たす3は？")、記号の式 ("(2+3)*4")、全角数字・漢数字、3つ以上の被演算子、
+0 による割り算、計算以外の雑談などを決まった割合で含むコーパスを作成します。
+同じ seed と件数からは常に同じコーパスが作成されるため、実行ごとの結果を比較できます。
+
+実行例 (adk_calculator_agent ディレクトリで実行。1行に1発話を出力):
+    python -m benchmarks.corpus --count 1000 --seed 0 > corpus.txt
+"""
+
+import argparse
+import hashlib
+import random
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 発話の種類ごとの (重み, テンプレート)。{a} {b} {c} に数値が入る
+CORPUS_KINDS: Dict[str, Tuple[int, Tuple[str, ...]]] = {
+    # 日本語の2項演算 (従来の形式)
+    "japanese": (40, (
+        "{a}たす{b}は？",
+        "{a} ひく {b}",
+        "{a}かける{b}",
+        "{a}わる{b}",
+        "{a}と{b}を足して",
+        "{a}から{b}を引いて",
+        "{a}と{b}を掛けて",
+    )),
+    # 記号の2項演算
+    "symbolic": (20, (
+        "{a}+{b}",
+        "{a} - {b}",
+        "{a} * {b} は？",
+        "{a}/{b}",
+        "{a}×{b}",
+        "{a}÷{b}",
+    )),
+    # 全角数字・漢数字
+    "width": (10, (
+        "{wa}たす{wb}は？",
+        "{wa}＋{wb}",
+        "{ka}たす{kb}",
+        "{ka}かける{kb}",
+    )),
+    # 優先順位・括弧・3つ以上の被演算子・動詞の式
+    "expression": (15, (
+        "({a}+{b})*{c}",
+        "{a}+{b}*{c}",
+        "{a}たす{b}たす{c}",
+        "{a}と{b}と{c}を足して",
+        "{sa}の{sb}乗",
+        "{a}を{sb}で割ったあまり",
+        "{a}%{sb}",
+        "-({a}-{b})",
+    )),
+    # エラーになる計算
+    "error": (5, (
+        "{a}わる0",
+        "{a}/0",
+        "(({a}+{b})",
+    )),
+    # 計算以外の発話 (フォールバック)
+    "chat": (10, (
+        "今日はいい天気ですね",
+        "こんにちは",
+        "ありがとう",
+        "何ができますか？",
+    )),
+}
+
+_FULL_WIDTH_DIGITS = str.maketrans("0123456789.-", "０１２３４５６７８９．－")
+_KANJI_DIGITS = "〇一二三四五六七八九"
+
+
+def _kanji(n: int) -> str:
+    """0〜99 の整数を漢数字 (位取りの表記) にします。"""
+    tens, ones = divmod(n, 10)
+    text = ("" if tens <= 1 else _KANJI_DIGITS[tens]) + ("十" if tens else "")
+    return text + (_KANJI_DIGITS[ones] if ones or not tens else "")
+
+
+def _number(rng: random.Random) -> str:
+    """整数 (多め)・小数・負の数を決まった割合で作成します。"""
+    roll = rng.random()
+    if roll < 0.6:
+        return str(rng.randint(0, 999))
+    if roll < 0.85:
+        return str(round(rng.uniform(0, 100), 2))
+    return str(-rng.randint(1, 99))
+
+
+def make_corpus(count: int, seed: int = 0, kinds: Optional[Iterable[str]] = None) -> List[str]:
+    """
+    再現可能な発話コーパスを作成します (同じ引数なら同じ内容になります)。
+
+    Args:
+        count (int): 発話数。
+        seed (int): 乱数シード。
+        kinds (Optional[Iterable[str]]): 含める発話の種類 (CORPUS_KINDS のキー)。None の場合はすべて。
+
+    Returns:
+        List[str]: 発話のリスト。
+    """
+    names = list(CORPUS_KINDS) if kinds is None else list(kinds)
+    weights = [CORPUS_KINDS[name][0] for name in names]
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        name = rng.choices(names, weights)[0]
+        template = rng.choice(CORPUS_KINDS[name][1])
+        a, b = rng.randint(0, 99), rng.randint(0, 99)
+        corpus.append(template.format(
+            a=_number(rng),
+            b=_number(rng),
+            c=_number(rng),
+            sa=rng.randint(0, 20),
+            sb=rng.randint(1, 9),
+            wa=str(a).translate(_FULL_WIDTH_DIGITS),
+            wb=str(b).translate(_FULL_WIDTH_DIGITS),
+            ka=_kanji(a),
+            kb=_kanji(b),
+        ))
+    return corpus
+
+
+def corpus_digest(corpus: Iterable[str]) -> str:
+    """コーパスの内容のハッシュ (先頭16桁) を返します。ベースラインと同じコーパスかどうかの確認に使います。"""
+    digest = hashlib.sha256()
+    for text in corpus:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()[:16]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ベンチマーク用の発話コーパスを出力します (1行に1発話)")
+    parser.add_argument("--count", type=int, default=1000, help="発話数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument("--kinds", nargs="*", choices=list(CORPUS_KINDS), help="含める発話の種類 (デフォルト: すべて)")
+    args = parser.parse_args()
+    for text in make_corpus(args.count, args.seed, args.kinds):
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+API サーバーを介さずに adk_logic の応答生成関数を計測するベンチマーク。
+
+get_agent_response (Agent 経由) と get_agent_responses (バッチ) の1発話あたりの時間と、
+get_agent_response の発話ごとのレイテンシの分布 (p50 / p95 / p99) を計測します。
+応答キャッシュはデフォルトで無効にして計測します (--cache で有効にできます)。
+
+実行例 (adk_calculator_agent ディレクトリで実行):
+    python -m benchmarks.inprocess_bench --count 20000 --save-baseline benchmarks/baselines/inprocess.json
+"""
+
+import argparse
+import importlib
+import os
+import sys
+import time
+
+from .corpus import corpus_digest, make_corpus
+from .report import BenchmarkReport, Metric, add_baseline_arguments, finish, latency_metrics
+
+
+def _import_adk_logic():
+    """
+    adk_logic をパッケージ (adk_calculator_agent.adk_logic) としてインポートします。
+    adk_logic は相対インポートを使うため、リポジトリのルートを sys.path に追加します。
+    """
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    return importlib.import_module("adk_calculator_agent.adk_logic")
+
+
+def run(count: int, seed: int, cache: bool) -> BenchmarkReport:
+    # 応答キャッシュの設定は adk_logic のインポート時に読み込まれる
+    os.environ["ADK_RESPONSE_CACHE_SIZE"] = os.environ.get("ADK_RESPONSE_CACHE_SIZE", "10000") if cache else "0"
+    adk_logic = _import_adk_logic()
+    corpus = make_corpus(count, seed)
+    adk_logic.get_agent_responses(corpus[:100])  # ウォームアップ
+
+    latencies = []
+    append = latencies.append
+    get_agent_response = adk_logic.get_agent_response
+    perf_counter_ns = time.perf_counter_ns
+    start = perf_counter_ns()
+    for text in corpus:
+        t0 = perf_counter_ns()
+        get_agent_response(text)
+        append((perf_counter_ns() - t0) / 1000)
+    single_elapsed = perf_counter_ns() - start
+
+    start = perf_counter_ns()
+    adk_logic.get_agent_responses(corpus)
+    batch_elapsed = perf_counter_ns() - start
+
+    metrics = [
+        Metric("get_agent_response.mean", single_elapsed / count / 1000, "us"),
+        *latency_metrics("get_agent_response", latencies, "us"),
+        Metric("get_agent_responses.mean", batch_elapsed / count / 1000, "us"),
+        Metric("get_agent_responses.throughput", count / (batch_elapsed / 1e9), "req/s", lower_is_better=False),
+    ]
+    parameters = {"count": count, "seed": seed, "corpus_digest": corpus_digest(corpus), "cache": cache}
+    return BenchmarkReport("inprocess", metrics, parameters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="adk_logic の応答生成関数のベンチマーク")
+    parser.add_argument("--count", type=int, default=20000, help="コーパスの発話数")
+    parser.add_argument("--seed", type=int, default=0, help="コーパス生成の乱数シード")
+    parser.add_argument("--cache", action="store_true", help="応答キャッシュを有効にして計測する")
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+    finish(run(args.count, args.seed, args.cache), args)
+
+
+if __name__ == "__main__":
+    main()
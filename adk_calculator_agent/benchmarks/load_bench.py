@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+/ask エンドポイントの負荷試験 (エンドツーエンドのベンチマーク)。
+
+非同期の負荷生成器が、指定した同時接続数でコーパスの発話を /ask に送り続け、
+スループット (req/s) とレイテンシの分布 (p50 / p95 / p99) を計測します。
+再試行・重複送信の集約は計測を歪めるため、api_client ではなく httpx を直接使います。
+
+実行例 (adk_calculator_agent ディレクトリで実行):
+    # 起動済みのサーバーを計測
+    python -m benchmarks.load_bench --url http://127.0.0.1:8000 --concurrency 64 --duration 10
+    # サーバーをこのスクリプトから起動して計測 (終了時に停止)
+    python -m benchmarks.load_bench --spawn --workers 4 --save-baseline benchmarks/baselines/load.json
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import List, Optional
+
+import httpx
+
+from .corpus import corpus_digest, make_corpus
+from .report import BenchmarkReport, Metric, add_baseline_arguments, finish, latency_metrics
+
+_REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _spawn_server(port: int, workers: int) -> subprocess.Popen:
+    """計測用の API サーバーを起動し、/ready が 200 を返すまで待ちます。"""
+    if workers > 1:
+        command = [sys.executable, "-m", "adk_calculator_agent.serve", "--port", str(port), "--workers", str(workers)]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "adk_calculator_agent.api:app", "--port", str(port),
+                   "--log-level", "warning"]
+    process = subprocess.Popen(command, cwd=_REPOSITORY_ROOT, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API サーバーが起動しませんでした (終了コード {process.returncode})。")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/ready", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("API サーバーが 60 秒以内に準備完了になりませんでした。")
+
+
+async def _generate_load(url: str, corpus: List[str], concurrency: int, duration: float, warmup: float):
+    """
+    concurrency 個のタスクで /ask にリクエストを送り続けます。
+    最初の warmup 秒の結果は集計せず、その後 duration 秒間のレイテンシ (ミリ秒) とステータスを返します。
+    """
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+    next_index = 0
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        async def worker():
+            nonlocal next_index
+            perf_counter = time.perf_counter
+            while True:
+                text = corpus[next_index % len(corpus)]
+                next_index += 1
+                t0 = perf_counter()
+                if t0 >= stop_at:
+                    return
+                try:
+                    response = await client.post("/ask", json={"text": text})
+                    status = response.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                t1 = perf_counter()
+                if t0 >= measure_from:
+                    latencies.append((t1 - t0) * 1000)
+                    statuses[status] += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses
+
+
+def run(url: str, count: int, seed: int, concurrency: int, duration: float, warmup: float,
+        workers: Optional[int] = None) -> BenchmarkReport:
+    corpus = make_corpus(count, seed)
+    latencies, statuses = asyncio.run(_generate_load(url, corpus, concurrency, duration, warmup))
+    total = sum(statuses.values())
+    errors = total - statuses.get(200, 0)
+    metrics = [
+        Metric("ask.throughput", total / duration, "req/s", lower_is_better=False),
+        *latency_metrics("ask.latency", latencies, "ms"),
+        Metric("ask.error_rate", errors / total * 100 if total else 0.0, "%"),
+    ]
+    parameters = {
+        "url": url,
+        "count": count,
+        "seed": seed,
+        "corpus_digest": corpus_digest(corpus),
+        "concurrency": concurrency,
+        "duration": duration,
+        "requests": total,
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)},
+    }
+    if workers is not None:
+        parameters["workers"] = workers
+    return BenchmarkReport("load", metrics, parameters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/ask エンドポイントの負荷試験")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="API サーバーのアドレス")
+    parser.add_argument("--spawn", action="store_true", help="計測用の API サーバーを起動する (--url のポートを使用)")
+    parser.add_argument("--workers", type=int, default=1, help="--spawn で起動するワーカー数")
+    parser.add_argument("--concurrency", type=int, default=64, help="同時接続数")
+    parser.add_argument("--duration", type=float, default=10.0, help="計測する秒数")
+    parser.add_argument("--warmup", type=float, default=2.0, help="計測前のウォームアップの秒数")
+    parser.add_argument("--count", type=int, default=10000, help="コーパスの発話数")
+    parser.add_argument("--seed", type=int, default=0, help="コーパス生成の乱数シード")
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn:
+        server = _spawn_server(httpx.URL(args.url).port or 8000, args.workers)
+    try:
+        report = run(args.url, args.count, args.seed, args.concurrency, args.duration, args.warmup,
+                     args.workers if args.spawn else None)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(30)
+    finish(report, args)
+
+
+if __name__ == "__main__":
+    main()
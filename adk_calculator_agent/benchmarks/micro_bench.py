@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+インテントハンドラーと計算関数のマイクロベンチマーク。
+
+各インテントハンドラーの can_handle / handle と、operations.py の計算関数の1回あたりの時間を計測します。
+numeric.<モード>.* は、数値モード (calculator_agent/numeric.py) ごとの handle の時間です
+(整数の発話では auto モードの int の経路が float モードより遅くないことを確認します)。
+router.plugin_update は、実行中に演算プラグインを1つ追加して削除する (ルーターの対応表を2回更新する) 時間です。
+operation_memo.hit / operation_memo.table_hit は、演算結果のメモ・事前計算の表 (operations.py の OperationMemo) から
+結果を返す時間です (計算関数の時間がこれより長い演算プラグインでメモが有効です)。
+計測は ADK_PLUGINS の設定によらず、組み込みの演算だけを登録したレジストリで行います。
+
+実行例 (adk_calculator_agent ディレクトリで実行):
+    python -m benchmarks.micro_bench --save-baseline benchmarks/baselines/micro.json
+    python -m benchmarks.micro_bench --compare benchmarks/baselines/micro.json
+"""
+
+import argparse
+import math
+import os
+import tempfile
+
+from adk.messages import Message
+
+from calculator_agent import operations
+from calculator_agent.handlers import create_intent_router
+from calculator_agent.numeric import NUMERIC_MODES, numeric
+from calculator_agent.plugins import BUILTIN_PLUGINS, OperationPlugin, PluginRegistry
+
+from .report import BenchmarkReport, Metric, add_baseline_arguments, best_ns_per_op, finish
+
+# インテントごとの計測用の発話
+_SAMPLE_UTTERANCES = {
+    "AddIntent": "523たす87は？",
+    "SubtractIntent": "100 ひく 42",
+    "MultiplyIntent": "12かける34",
+    "ModuloIntent": "10を3で割ったあまり",
+    "DivideIntent": "144わる12",
+    "PowerIntent": "2の10乗",
+    "FallbackIntent": "今日はいい天気ですね",
+}
+
+_OPERATIONS = ("add", "subtract", "multiply", "divide", "power", "modulo")
+
+# router.plugin_update で追加・削除する演算プラグイン
+_SAMPLE_PLUGIN = OperationPlugin(
+    "MaxIntent", "max", ("大きい方",), evaluator=max, formatter="{a} と {b} の大きい方は {result} です。",
+    operation_label="比較",
+)
+
+# 数値モードごとの計測用の発話 (整数・小数・割り算)
+_NUMERIC_UTTERANCES = {
+    "integer": "523たす87は？",
+    "decimal": "0.1たす0.2",
+    "division": "144わる12",
+}
+
+
+def _operation_memo_metrics(number: int, repeat: int):
+    memo = operations.OperationMemo(1024)
+    memoized = memo.wrap("hypot", math.hypot, 2, memoize=True)
+    memoized(7.0, 3.0)
+    yield Metric("operation_memo.hit", best_ns_per_op(lambda: memoized(7.0, 3.0), number, repeat), "ns/op")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "hypot.bin")
+        operations.write_table(path, "hypot", math.hypot, 2, 16)
+        table = operations.SmallIntegerTable(path)
+        try:
+            tabulated = operations.OperationMemo(0, [table]).wrap("hypot", math.hypot, 2)
+            yield Metric("operation_memo.table_hit", best_ns_per_op(lambda: tabulated(7.0, 3.0), number, repeat), "ns/op")
+        finally:
+            table.close()
+
+
+def run(number: int, repeat: int) -> BenchmarkReport:
+    registry = PluginRegistry(BUILTIN_PLUGINS)
+    router = create_intent_router(registry)
+    handlers = router.handlers() + (router.fallback_handler,)
+    metrics = []
+    for handler in handlers:
+        message = Message(text=_SAMPLE_UTTERANCES[handler.intent_name])
+        # can_handle はトークン化の結果を再利用するため、初回 (トークン化を含む) ではなく定常状態を計測する
+        metrics.append(Metric(
+            f"{handler.intent_name}.can_handle",
+            best_ns_per_op(lambda: handler.can_handle(message), number, repeat),
+            "ns/op",
+        ))
+        metrics.append(Metric(
+            f"{handler.intent_name}.handle",
+            best_ns_per_op(lambda: handler.handle(message), number, repeat),
+            "ns/op",
+        ))
+    # トークン化のメモを使わない場合のルーティング (発話ごとに異なる文字列の場合に相当)
+    text = _SAMPLE_UTTERANCES["AddIntent"]
+    metrics.append(Metric(
+        "tokenizer.tokenize",
+        best_ns_per_op(lambda: router.tokenizer.tokenize(text), number, repeat),
+        "ns/op",
+    ))
+
+    def plugin_update():
+        registry.register(_SAMPLE_PLUGIN)
+        registry.unregister(_SAMPLE_PLUGIN.name)
+
+    # 正規表現のコンパイルを含むため、呼び出し回数を減らして計測する
+    metrics.append(Metric(
+        "router.plugin_update",
+        best_ns_per_op(plugin_update, max(number // 1000, 10), repeat),
+        "ns/op",
+    ))
+    for name in _OPERATIONS:
+        func = getattr(operations, name)
+        metrics.append(Metric(
+            f"operations.{name}",
+            best_ns_per_op(lambda: func(7.0, 3.0), number, repeat),
+            "ns/op",
+        ))
+    metrics.extend(_operation_memo_metrics(number, repeat))
+    mode = numeric.mode
+    try:
+        for numeric_mode in NUMERIC_MODES:
+            numeric.configure(numeric_mode)
+            for kind, text in _NUMERIC_UTTERANCES.items():
+                message = Message(text=text)
+                handler = router.handler_for(text)
+                metrics.append(Metric(
+                    f"numeric.{numeric_mode}.{kind}.handle",
+                    best_ns_per_op(lambda: handler.handle(message), number, repeat),
+                    "ns/op",
+                ))
+    finally:
+        numeric.configure(mode)
+    return BenchmarkReport("micro", metrics, {"number": number, "repeat": repeat})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="インテントハンドラーと計算関数のマイクロベンチマーク")
+    parser.add_argument("--number", type=int, default=20000, help="1回の計測での呼び出し回数")
+    parser.add_argument("--repeat", type=int, default=5, help="計測の繰り返し回数 (最速の回を採用)")
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+    finish(run(args.number, args.repeat), args)
+
+
+if __name__ == "__main__":
+    main()
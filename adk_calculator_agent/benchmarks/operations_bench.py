@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+一括演算のマイクロベンチマーク。
+
+スカラー版の関数 (add など) を要素ごとに呼び出す方式と、一括演算版 (add_array など) で
+配列全体をまとめて演算する方式を比較します。一括演算版は out= に確保済みの配列を渡して計測します。
+
+実行例 (adk_calculator_agent ディレクトリで実行):
+    python -m benchmarks.operations_bench --count 1000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from calculator_agent import operations
+
+_OPERATIONS = ("add", "subtract", "multiply", "divide")
+
+
+def _time(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="一括演算のマイクロベンチマーク")
+    parser.add_argument("--count", type=int, default=1_000_000, help="被演算子の組の数")
+    parser.add_argument("--seed", type=int, default=0, help="被演算子生成の乱数シード")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    a = rng.uniform(-1000, 1000, args.count)
+    b = rng.uniform(1, 1000, args.count)
+    a_list, b_list = a.tolist(), b.tolist()
+    out = np.empty_like(a)
+    print(f"被演算子: {args.count} 組 (seed={args.seed})")
+
+    for name in _OPERATIONS:
+        scalar = getattr(operations, name)
+        bulk = getattr(operations, f"{name}_array")
+        scalar_elapsed = _time(lambda: [scalar(x, y) for x, y in zip(a_list, b_list)])
+        bulk_elapsed = _time(lambda: bulk(a, b, out=out))
+        print(
+            f"{name:<10} スカラー {scalar_elapsed:8.3f} 秒  一括 {bulk_elapsed:8.4f} 秒"
+            f"  速度比: {scalar_elapsed / bulk_elapsed:8.1f} 倍"
+        )
+
+
+if __name__ == "__main__":
+    main()
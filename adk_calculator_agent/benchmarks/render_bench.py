@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+応答文の作成と /ask の応答のエンコードのマイクロベンチマーク。
+
+render.* は組み込みの演算プラグインの応答文1件あたりの時間で、従来の str.format (format) と
+コンパイルした書式 (compiled)、ADK_RESPONSE_PRECISION を設定した場合 (compiled_precision) を比較します。
+response.* は /ask の応答1件あたりの時間で、レスポンスモデル (AskResponse) を FastAPI が検証・シリアライズ
+して JSONResponse にする従来の経路 (model) と、JSON のバイト列を直接作成して返す経路 (raw_json) を比較します。
+
+実行例 (adk_calculator_agent ディレクトリで実行):
+    python -m benchmarks.render_bench --save-baseline benchmarks/baselines/render.json
+    python -m benchmarks.render_bench --compare benchmarks/baselines/render.json
+"""
+
+import argparse
+import importlib
+import os
+import sys
+
+from calculator_agent.plugins import BUILTIN_PLUGINS
+from calculator_agent.rendering import ResponseRenderer
+
+from .report import BenchmarkReport, Metric, add_baseline_arguments, best_ns_per_op, finish
+
+# 応答文に埋め込む数値 (整数の float と、表記が長くなる小数)
+_SAMPLE_VALUES = {
+    "integer": (523.0, 87.0, 610.0),
+    "decimal": (0.1, 0.2, 0.30000000000000004),
+}
+
+# 応答のエンコードの計測用の応答文
+_SAMPLE_RESPONSE = "523.0 たす 87.0 は 610.0 です。"
+
+# 応答文の書式をコンパイルする際の小数点以下の桁数 (compiled_precision)
+_PRECISION = 10
+
+
+def import_api():
+    """api をパッケージ (adk_calculator_agent.api) としてインポートします (inprocess_bench と同じ方法)。"""
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    return importlib.import_module("adk_calculator_agent.api")
+
+
+def run_coroutine(coroutine):
+    """待機せずに完了するコルーチンを、イベントループを使わずに実行して結果を返します。"""
+    try:
+        coroutine.send(None)
+    except StopIteration as e:
+        return e.value
+    raise RuntimeError("コルーチンが待機しました。")
+
+
+def _render_metrics(number: int, repeat: int):
+    compiled = ResponseRenderer()
+    rounded = ResponseRenderer(precision=_PRECISION)
+    for kind, (a, b, result) in _SAMPLE_VALUES.items():
+        for variant, render in (
+            ("format", lambda template: lambda a, b, result: template.format(a=a, b=b, result=result)),
+            ("compiled", compiled.compile),
+            ("compiled_precision", rounded.compile),
+        ):
+            functions = [render(plugin.formatter) for plugin in BUILTIN_PLUGINS]
+
+            def render_all():
+                for function in functions:
+                    function(a, b, result)
+
+            yield Metric(
+                f"render.{kind}.{variant}",
+                best_ns_per_op(render_all, number, repeat) / len(functions),
+                "ns/op",
+            )
+
+
+def _response_metrics(number: int, repeat: int):
+    from fastapi.responses import JSONResponse, Response
+    from fastapi.routing import serialize_response
+
+    api = import_api()
+    field = next(route.response_field for route in api.app.routes if getattr(route, "path", None) == "/ask")
+    renderer = ResponseRenderer()
+
+    def model():
+        content = run_coroutine(serialize_response(
+            field=field, response_content=api.AskResponse(response=_SAMPLE_RESPONSE), is_coroutine=True,
+        ))
+        return JSONResponse(content)
+
+    def raw_json():
+        return Response(renderer.encode_response(_SAMPLE_RESPONSE), media_type="application/json")
+
+    # 2つの経路が同じバイト列を返すことを確認してから計測する
+    if model().body != raw_json().body:
+        raise AssertionError("raw_json の応答が model の応答と一致しません。")
+    yield Metric("response.model", best_ns_per_op(model, number, repeat), "ns/op")
+    yield Metric("response.raw_json", best_ns_per_op(raw_json, number, repeat), "ns/op")
+
+
+def run(number: int, repeat: int) -> BenchmarkReport:
+    metrics = list(_render_metrics(number, repeat))
+    metrics.extend(_response_metrics(number, repeat))
+    return BenchmarkReport("render", metrics, {"number": number, "repeat": repeat, "precision": _PRECISION})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="応答文の作成と /ask の応答のエンコードのマイクロベンチマーク")
+    parser.add_argument("--number", type=int, default=20000, help="1回の計測での呼び出し回数")
+    parser.add_argument("--repeat", type=int, default=5, help="計測の繰り返し回数 (最速の回を採用)")
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+    finish(run(args.number, args.repeat), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+ベンチマーク結果の集計・表示と、JSON のベースラインとの比較を行うモジュール。
+
+各ベンチマークは計測値を Metric のリストにまとめ、BenchmarkReport として表示・保存します。
+--save-baseline で保存した JSON と --compare で比較し、許容範囲 (--tolerance) を超えて
+悪化した計測値があれば終了コード 1 で終了します (CI での性能劣化の検出に使えます)。
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+from typing import Callable, List, NamedTuple, Optional, Sequence
+
+# 性能劣化とみなす悪化の割合のデフォルト (10%)
+DEFAULT_TOLERANCE = 0.10
+
+
+class Metric(NamedTuple):
+    """
+    計測値1件分。
+
+    Attributes:
+        name (str): 計測値の名前 (ベンチマーク内で一意)。
+        value (float): 計測値。
+        unit (str): 単位 ("ns/op", "ms", "req/s" など)。
+        lower_is_better (bool): 値が小さいほど良い計測値かどうか (レイテンシは True、スループットは False)。
+    """
+    name: str
+    value: float
+    unit: str
+    lower_is_better: bool = True
+
+
+def best_ns_per_op(func: Callable[[], object], number: int, repeat: int = 5) -> float:
+    """
+    func を number 回呼び出す計測を repeat 回行い、最も速かった回の1回あたりの時間 (ナノ秒) を返します。
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter_ns() - start)
+    return best / number
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """
+    昇順に並んだ値の q パーセンタイル (0〜100) を線形補間で求めます。
+    """
+    if not sorted_values:
+        return float("nan")
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def latency_metrics(prefix: str, latencies: List[float], unit: str) -> List[Metric]:
+    """レイテンシのリストから p50 / p95 / p99 / 最大値の計測値を作成します。"""
+    values = sorted(latencies)
+    return [
+        Metric(f"{prefix}.p50", percentile(values, 50), unit),
+        Metric(f"{prefix}.p95", percentile(values, 95), unit),
+        Metric(f"{prefix}.p99", percentile(values, 99), unit),
+        Metric(f"{prefix}.max", values[-1] if values else float("nan"), unit),
+    ]
+
+
+class BenchmarkReport:
+    """1回のベンチマーク実行の結果。"""
+
+    def __init__(self, benchmark: str, metrics: List[Metric], parameters: Optional[dict] = None):
+        """
+        Args:
+            benchmark (str): ベンチマークの名前。
+            metrics (List[Metric]): 計測値。
+            parameters (Optional[dict]): 実行条件 (件数・シード・コーパスのハッシュなど)。
+        """
+        self.benchmark = benchmark
+        self.metrics = metrics
+        self.parameters = parameters or {}
+
+    def to_dict(self) -> dict:
+        return {
+            "benchmark": self.benchmark,
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "environment": {
+                "python": platform.python_version(),
+                "implementation": platform.python_implementation(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+            },
+            "parameters": self.parameters,
+            "metrics": {
+                m.name: {"value": m.value, "unit": m.unit, "lower_is_better": m.lower_is_better}
+                for m in self.metrics
+            },
+        }
+
+    def print(self) -> None:
+        """計測値を表形式で表示します。"""
+        print(f"== {self.benchmark} ==")
+        for key, value in self.parameters.items():
+            print(f"  {key}: {value}")
+        width = max((len(m.name) for m in self.metrics), default=0)
+        for m in self.metrics:
+            print(f"  {m.name:<{width}}  {m.value:14.2f} {m.unit}")
+
+    def save(self, path: str) -> None:
+        """結果をベースラインとして JSON ファイルに保存します。"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"ベースラインを保存しました: {path}")
+
+    def compare(self, baseline_path: str, tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+        """
+        ベースラインと比較し、許容範囲を超えて悪化した計測値の説明のリストを返します (なければ空)。
+
+        Args:
+            baseline_path (str): --save-baseline で保存した JSON ファイルのパス。
+            tolerance (float): 悪化とみなす割合 (0.1 なら 10% を超える悪化)。
+        """
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("benchmark") != self.benchmark:
+            raise ValueError(f"ベースラインのベンチマーク名が異なります: {baseline.get('benchmark')} != {self.benchmark}")
+        for key in ("corpus_digest", "count"):
+            if key in self.parameters and baseline["parameters"].get(key) != self.parameters[key]:
+                print(f"警告: ベースラインと {key} が異なります ({baseline['parameters'].get(key)} != {self.parameters[key]})")
+
+        regressions = []
+        print(f"-- ベースラインとの比較 ({baseline_path}, 許容範囲 {tolerance:.0%}) --")
+        for m in self.metrics:
+            base = baseline["metrics"].get(m.name)
+            if base is None or not base["value"]:
+                continue
+            change = (m.value - base["value"]) / base["value"]
+            worse = change if m.lower_is_better else -change
+            mark = "悪化" if worse > tolerance else ""
+            print(f"  {m.name:<32} {base['value']:14.2f} -> {m.value:14.2f} {m.unit:<6} {change:+7.1%} {mark}")
+            if worse > tolerance:
+                regressions.append(f"{m.name}: {base['value']:.2f} -> {m.value:.2f} {m.unit} ({change:+.1%})")
+        return regressions
+
+
+def add_baseline_arguments(parser: argparse.ArgumentParser) -> None:
+    """ベースラインの保存・比較用のコマンドライン引数を追加します。"""
+    parser.add_argument("--save-baseline", metavar="PATH", help="結果をベースラインとして JSON に保存する")
+    parser.add_argument("--compare", metavar="PATH", help="ベースラインの JSON と比較し、悪化していれば終了コード 1 で終了する")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"悪化とみなす割合 (デフォルト: {DEFAULT_TOLERANCE})")
+
+
+def finish(report: BenchmarkReport, args: argparse.Namespace) -> None:
+    """結果を表示し、引数に応じてベースラインの保存・比較を行います。悪化があれば終了コード 1 で終了します。"""
+    report.print()
+    if args.save_baseline:
+        report.save(args.save_baseline)
+    if args.compare:
+        regressions = report.compare(args.compare, args.tolerance)
+        if regressions:
+            print("性能劣化を検出しました:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("性能劣化はありません。")
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+トークナイザーのマイクロベンチマーク。
+
+従来の方式 (各ハンドラーの can_handle でキーワードを順に検索し、handle で re.findall を実行して
+すべての数値を float に変換する) と、共通トークナイザーで1回だけ走査する方式を比較します。
+
+実行例 (adk_calculator_agent ディレクトリで実行):
+    python -m benchmarks.tokenizer_bench --count 1000000
+"""
+
+import argparse
+import re
+import time
+
+from calculator_agent.agent import router
+
+from .corpus import make_corpus
+
+# 従来の各ハンドラーの can_handle と同じキーワード (判定順)
+_LEGACY_KEYWORDS = (
+    ("AddIntent", ("たす", "足し算", "+", "足して")),
+    ("SubtractIntent", ("ひく", "引き算", "-", "引いて")),
+    ("MultiplyIntent", ("かける", "掛け算", "*", "掛けて")),
+)
+
+def legacy_path(text: str):
+    """従来の処理 (can_handle の順次判定 + 未コンパイルの re.findall + 全数値の float 変換)。"""
+    intent_name = "FallbackIntent"
+    for name, keywords in _LEGACY_KEYWORDS:
+        lowered = text.lower()
+        if any(k in lowered for k in keywords):
+            intent_name = name
+            break
+    numbers = re.findall(r"[-+]?\d*\.\d+|[-+]?\d+", text)
+    num_list = [float(n) for n in numbers]
+    return intent_name, num_list[:2]
+
+
+def tokenizer_path(text: str, tokenize=router.tokenizer.tokenize, intent_for=router.intent_for):
+    """共通トークナイザーによる処理 (1回の走査でインテント判定と数値抽出を行う。メモ化は使わない)。"""
+    stream = tokenize(text)
+    return intent_for(stream) or "FallbackIntent", stream.number_values(2)
+
+
+def _run(label: str, func, corpus: list) -> float:
+    start = time.perf_counter()
+    for text in corpus:
+        func(text)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {elapsed:8.3f} 秒  {elapsed / len(corpus) * 1e9:8.0f} ns/発話")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="トークナイザーのマイクロベンチマーク")
+    parser.add_argument("--count", type=int, default=1_000_000, help="コーパスの発話数")
+    parser.add_argument("--seed", type=int, default=0, help="コーパス生成の乱数シード")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.count, args.seed)
+    print(f"コーパス: {len(corpus)} 発話 (seed={args.seed})")
+    legacy = _run("findall", legacy_path, corpus)
+    current = _run("tokenizer", tokenizer_path, corpus)
+    print(f"速度比: {legacy / current:.2f} 倍")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+/ask と /ask/batch のワイヤーフォーマット (wire.py) のマイクロベンチマーク。
+
+リクエスト1件あたりの、リクエストボディの解析と応答のボディの作成 (エージェントの処理を除く) の時間を
+形式ごとに計測します。json は AskRequest.model_validate_json と、/ask は JSON のバイト列の直接作成
+(ADK_RESPONSE_RAW_JSON のデフォルト)、/ask/batch はレスポンスモデル (AskBatchResponse) を FastAPI が
+シリアライズして JSONResponse にする経路です。msgpack / struct は Content-Type・Accept からの形式の選択を含みます。
+json との差がリクエスト1件あたりに節約できる CPU 時間です。
+
+実行例 (adk_calculator_agent ディレクトリで実行):
+    python -m benchmarks.wire_bench --save-baseline benchmarks/baselines/wire.json
+    python -m benchmarks.wire_bench --compare benchmarks/baselines/wire.json
+"""
+
+import argparse
+import importlib
+import json
+
+from .render_bench import import_api, run_coroutine
+from .report import BenchmarkReport, Metric, add_baseline_arguments, best_ns_per_op, finish
+
+# 計測用のリクエストと応答
+_SAMPLE_TEXT = "523たす87は？"
+_SAMPLE_RESPONSE = "523.0 たす 87.0 は 610.0 です。"
+# /ask/batch の計測での1リクエストあたりの件数
+_BATCH_SIZE = 100
+
+
+def _formats(wire):
+    """計測するバイナリ形式の (名前, メディアタイプ) を返します。"""
+    return (("msgpack", wire.MSGPACK_MEDIA_TYPE), ("struct", wire.STRUCT_MEDIA_TYPE))
+
+
+def _ask_metrics(api, wire, number: int, repeat: int):
+    from fastapi.responses import Response
+
+    from calculator_agent.rendering import renderer
+
+    json_body = json.dumps({"text": _SAMPLE_TEXT}, ensure_ascii=False).encode("utf-8")
+
+    def json_path():
+        api.AskRequest.model_validate_json(json_body)
+        return Response(renderer.encode_response(_SAMPLE_RESPONSE), media_type="application/json")
+
+    yield Metric("ask.json", best_ns_per_op(json_path, number, repeat), "ns/op")
+    for name, media_type in _formats(wire):
+        codec = wire.CODECS[media_type]
+        body = codec.encode_ask_request(_SAMPLE_TEXT)
+
+        def binary_path():
+            request_codec = wire.request_codec(media_type)
+            request_codec.decode_ask(body)
+            reply_codec = wire.response_codec(media_type, request_codec)
+            return Response(reply_codec.encode_ask(_SAMPLE_RESPONSE), media_type=reply_codec.media_type)
+
+        if codec.decode_ask_response(binary_path().body) != _SAMPLE_RESPONSE:
+            raise AssertionError(f"{media_type} の応答を読み戻せません。")
+        yield Metric(f"ask.{name}", best_ns_per_op(binary_path, number, repeat), "ns/op")
+
+
+def _batch_metrics(api, wire, number: int, repeat: int):
+    from fastapi.responses import JSONResponse, Response
+    from fastapi.routing import serialize_response
+
+    field = next(route.response_field for route in api.app.routes if getattr(route, "path", None) == "/ask/batch")
+    texts = [_SAMPLE_TEXT] * _BATCH_SIZE
+    results = [(_SAMPLE_RESPONSE, None)] * _BATCH_SIZE
+    json_body = json.dumps({"texts": texts}, ensure_ascii=False).encode("utf-8")
+
+    def json_path():
+        api.AskBatchRequest.model_validate_json(json_body)
+        response = api.AskBatchResponse(
+            results=[api.AskBatchItem(response=response, error=error) for response, error in results]
+        )
+        return JSONResponse(run_coroutine(serialize_response(field=field, response_content=response, is_coroutine=True)))
+
+    yield Metric("batch.json", best_ns_per_op(json_path, number, repeat) / _BATCH_SIZE, "ns/item")
+    for name, media_type in _formats(wire):
+        codec = wire.CODECS[media_type]
+        body = codec.encode_batch_request(texts)
+
+        def binary_path():
+            request_codec = wire.request_codec(media_type)
+            request_codec.decode_batch(body)
+            reply_codec = wire.response_codec(media_type, request_codec)
+            return Response(reply_codec.encode_batch(results), media_type=reply_codec.media_type)
+
+        if codec.decode_batch_response(binary_path().body) != results:
+            raise AssertionError(f"{media_type} の応答を読み戻せません。")
+        yield Metric(f"batch.{name}", best_ns_per_op(binary_path, number, repeat) / _BATCH_SIZE, "ns/item")
+
+
+def run(number: int, repeat: int) -> BenchmarkReport:
+    api = import_api()
+    wire = importlib.import_module("adk_calculator_agent.wire")
+    metrics = list(_ask_metrics(api, wire, number, repeat))
+    metrics.extend(_batch_metrics(api, wire, max(number // _BATCH_SIZE, 10), repeat))
+    return BenchmarkReport("wire", metrics, {"number": number, "repeat": repeat, "batch_size": _BATCH_SIZE})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/ask と /ask/batch のワイヤーフォーマットのマイクロベンチマーク")
+    parser.add_argument("--number", type=int, default=20000, help="1回の計測での呼び出し回数")
+    parser.add_argument("--repeat", type=int, default=5, help="計測の繰り返し回数 (最速の回を採用)")
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+    finish(run(args.number, args.repeat), args)
+
+
+if __name__ == "__main__":
+    main()
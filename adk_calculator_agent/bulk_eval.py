@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""
+発話ファイルの一括評価ツール。
+ログに記録した大量の発話を、API サーバーを介さずに共通のインテントハンドラー (adk_logic.get_agent_responses) で
+処理し、結果を入力の順に JSONL で書き出します (回帰テスト・監査用)。
+
+入力は JSONL (1行に1件。`{"text": ...}` のオブジェクトか文字列) または CSV (ヘッダー行の --column の列) です。
+JSONL はファイルをメモリマップして行を切り出し、JSON の解析はワーカーで行います。CSV は1行ずつ読み込みます。
+発話は --chunk-size 件ずつワーカープロセス (デフォルト: 利用できる CPU コア数) に送り、処理中のチャンクは
+ワーカー数の --window 倍までに制限します。結果は入力の順に書き出すため、入力の大きさによらずメモリの使用量は一定です。
+
+出力の1行は `{"index": 入力の通し番号, "text": 発話, "response": 応答, "error": エラー}` です。
+--resume を指定すると、既存の出力の最後の完全な行の index の次から処理を再開し、出力に追記します
+(書きかけの行は切り詰めます)。--offset で先頭から指定した件数を読み飛ばすこともできます。
+処理済みの件数とスループットは --progress-interval 秒ごとに標準エラー出力に表示します。
+
+実行例 (リポジトリのルートで実行):
+    python -m adk_calculator_agent.bulk_eval utterances.jsonl -o results.jsonl
+    python -m adk_calculator_agent.bulk_eval utterances.csv --column utterance -o results.jsonl --resume
+"""
+
+import argparse
+import csv
+import json
+import mmap
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+# 1回にワーカーに送る発話の件数
+DEFAULT_CHUNK_SIZE = 1000
+# 処理中 (ワーカーに送った結果を書き出していない) のチャンク数の上限 (ワーカー数の倍数)
+DEFAULT_WINDOW = 4
+# 進捗を表示する間隔 (秒)
+DEFAULT_PROGRESS_INTERVAL = 5.0
+# --resume で出力の最後の行を探すために末尾から読む単位 (バイト)
+_TAIL_BLOCK = 64 * 1024
+
+# チャンク: (先頭の発話の通し番号, 入力の種類 ("jsonl" / "csv"), 発話 (JSONL は行のバイト列、CSV は文字列) のリスト)
+Chunk = Tuple[int, str, List[Union[bytes, str]]]
+
+
+def _available_cores() -> int:
+    """このプロセスが利用できる CPU コア数を返します。"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# --- 入力の読み込み ---
+
+def _iter_jsonl_records(path: str, field: str) -> Iterator[bytes]:
+    """JSONL ファイルをメモリマップし、空行を除く行をバイト列のまま順に返します。"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            find = mm.find
+            size = len(mm)
+            position = 0
+            while position < size:
+                end = find(b"\n", position)
+                if end < 0:
+                    end = size
+                line = mm[position:end]
+                position = end + 1
+                if line.strip():
+                    yield line
+
+
+def _iter_csv_records(path: str, field: str) -> Iterator[str]:
+    """CSV ファイルのヘッダー行で field の列を探し、その列の値を順に返します (空の値は除く)。"""
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        if field not in header:
+            raise ValueError(f"CSV のヘッダー行に列 {field!r} がありません。(ヘッダー: {header})")
+        column = header.index(field)
+        for row in reader:
+            if len(row) > column and row[column]:
+                yield row[column]
+
+
+_READERS = {"jsonl": _iter_jsonl_records, "csv": _iter_csv_records}
+
+
+def _input_format(path: str, specified: Optional[str]) -> str:
+    """入力の種類を返します (指定がない場合は拡張子から判断し、.csv 以外は JSONL とします)。"""
+    if specified:
+        return specified
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def iter_chunks(path: str, input_format: str, field: str, chunk_size: int, offset: int = 0) -> Iterator[Chunk]:
+    """
+    入力ファイルの発話を chunk_size 件ずつのチャンクにして順に返します。
+
+    Args:
+        path (str): 入力ファイルのパス。
+        input_format (str): "jsonl" または "csv"。
+        field (str): 発話のフィールド名 (JSONL のオブジェクトのキー、CSV の列名)。
+        chunk_size (int): 1チャンクの発話の件数。
+        offset (int): 読み飛ばす先頭の発話の件数。
+    """
+    records = _READERS[input_format](path, field)
+    index = 0
+    for _ in range(offset):
+        if next(records, None) is None:
+            return
+        index += 1
+    chunk: List[Union[bytes, str]] = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield index, input_format, chunk
+            index += len(chunk)
+            chunk = []
+    if chunk:
+        yield index, input_format, chunk
+
+
+# --- ワーカー ---
+
+# ワーカープロセスで読み込む adk_logic.get_agent_responses と、JSONL のフィールド名
+_get_agent_responses = None
+_field = "text"
+
+
+def _init_worker(field: str) -> None:
+    """ワーカープロセスの初期化。共通のハンドラーを読み込み、ウォームアップします。"""
+    global _get_agent_responses, _field
+    # /metrics を提供しないため、計測は行わない
+    os.environ.setdefault("ADK_METRICS", "0")
+    from .adk_logic import get_agent_responses, warm_up
+
+    warm_up()
+    _get_agent_responses = get_agent_responses
+    _field = field
+
+
+def _decode_jsonl_record(line: bytes) -> str:
+    """JSONL の1行から発話を取り出します。"""
+    value = json.loads(line)
+    if isinstance(value, dict):
+        value = value[_field]
+    if not isinstance(value, str):
+        raise ValueError(f"発話が文字列ではありません。({type(value).__name__})")
+    return value
+
+
+def evaluate_chunk(chunk: Chunk) -> Tuple[int, bytes]:
+    """
+    チャンクの発話を処理し、(件数, 出力の JSONL のバイト列) を返します (ワーカープロセスで実行)。
+    解析できなかった行は text を元の行、error を解析のエラーとして出力します。
+    """
+    start, input_format, records = chunk
+    texts: List[str] = []
+    decode_errors = {}
+    if input_format == "jsonl":
+        for position, line in enumerate(records):
+            try:
+                texts.append(_decode_jsonl_record(line))
+            except (ValueError, KeyError) as e:
+                texts.append(line.decode("utf-8", "replace"))
+                decode_errors[position] = f"入力を解析できませんでした: {e!r}"
+    else:
+        texts = records
+    if decode_errors:
+        valid = [text for position, text in enumerate(texts) if position not in decode_errors]
+        results = iter(_get_agent_responses(valid))
+    else:
+        results = iter(_get_agent_responses(texts))
+    lines = []
+    dumps = json.dumps
+    for position, text in enumerate(texts):
+        error = decode_errors.get(position)
+        if error is None:
+            response, error = next(results)
+        else:
+            response = None
+        item = {"index": start + position, "text": text, "response": response, "error": error}
+        lines.append(dumps(item, ensure_ascii=False))
+    lines.append("")
+    return len(texts), "\n".join(lines).encode("utf-8")
+
+
+# --- 出力 ---
+
+def resume_offset(path: str) -> Optional[int]:
+    """
+    既存の出力の最後の完全な行の index の次の通し番号を返します (出力がない・空の場合は None)。
+    末尾の書きかけの行 (改行で終わっていない部分) は切り詰めます。
+    """
+    try:
+        f = open(path, "r+b")
+    except FileNotFoundError:
+        return None
+    with f:
+        size = f.seek(0, os.SEEK_END)
+        tail = b""
+        position = size
+        # 最後の完全な行 (改行で終わる行) の全体が読めるまで末尾から読み進める
+        while position > 0:
+            read_from = max(0, position - _TAIL_BLOCK)
+            f.seek(read_from)
+            tail = f.read(position - read_from) + tail
+            position = read_from
+            last_newline = tail.rfind(b"\n")
+            if last_newline >= 0 and (tail.rfind(b"\n", 0, last_newline) >= 0 or position == 0):
+                break
+        last_newline = tail.rfind(b"\n")
+        if last_newline < 0:
+            f.truncate(0)
+            return None
+        complete_size = position + last_newline + 1
+        if complete_size < size:
+            f.truncate(complete_size)
+        line = tail[tail.rfind(b"\n", 0, last_newline) + 1:last_newline]
+        return json.loads(line)["index"] + 1
+
+
+class ProgressReporter:
+    """処理済みの件数とスループットを一定の間隔で標準エラー出力に表示します。"""
+
+    def __init__(self, interval: float, stream=sys.stderr):
+        self.interval = interval
+        self.stream = stream
+        self.count = 0
+        self.started = time.perf_counter()
+        self._last_report = self.started
+        self._last_count = 0
+
+    def add(self, count: int) -> None:
+        self.count += count
+        now = time.perf_counter()
+        if self.interval > 0 and now - self._last_report >= self.interval:
+            recent = (self.count - self._last_count) / (now - self._last_report)
+            print(
+                f"処理済み: {self.count} 件 ({recent:,.0f} 件/秒、平均 {self.count / (now - self.started):,.0f} 件/秒)",
+                file=self.stream,
+            )
+            self._last_report = now
+            self._last_count = self.count
+
+    def finish(self) -> None:
+        elapsed = time.perf_counter() - self.started
+        rate = self.count / elapsed if elapsed > 0 else 0.0
+        print(f"完了: {self.count} 件 ({elapsed:.1f} 秒、{rate:,.0f} 件/秒)", file=self.stream)
+
+
+def run(
+    chunks: Iterator[Chunk],
+    output: BinaryIO,
+    workers: int,
+    field: str = "text",
+    window: int = DEFAULT_WINDOW,
+    progress: Optional[ProgressReporter] = None,
+) -> int:
+    """
+    チャンクを処理し、結果を入力の順に output に書き出します。処理した発話の件数を返します。
+
+    Args:
+        chunks (Iterator[Chunk]): iter_chunks で作成したチャンク。
+        output (BinaryIO): 出力先。
+        workers (int): ワーカープロセス数 (0 の場合はこのプロセスで処理する)。
+        field (str): JSONL のオブジェクトの発話のキー。
+        window (int): 処理中のチャンク数の上限 (ワーカー数の倍数)。
+        progress (Optional[ProgressReporter]): 進捗の表示。
+    """
+    progress = progress or ProgressReporter(0)
+
+    def write(result: Tuple[int, bytes]) -> None:
+        count, data = result
+        output.write(data)
+        progress.add(count)
+
+    if workers <= 0:
+        _init_worker(field)
+        for chunk in chunks:
+            write(evaluate_chunk(chunk))
+        return progress.count
+    # fork できる環境では fork でワーカーを起動する (spawn よりも起動が速い)
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    with context.Pool(workers, initializer=_init_worker, initargs=(field,)) as pool:
+        # Pool.imap は入力を先読みし続けるため、処理中のチャンク数を制限して順に結果を書き出す
+        pending = deque()
+        limit = max(1, workers * window)
+        for chunk in chunks:
+            if len(pending) >= limit:
+                write(pending.popleft().get())
+            pending.append(pool.apply_async(evaluate_chunk, (chunk,)))
+        while pending:
+            write(pending.popleft().get())
+    return progress.count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="発話ファイルを一括で評価し、結果を JSONL で書き出す")
+    parser.add_argument("input", help="入力ファイル (JSONL または CSV)")
+    parser.add_argument("-o", "--output", default="-", help="出力ファイル (JSONL。デフォルト: 標準出力)")
+    parser.add_argument("--format", choices=sorted(_READERS), help="入力の種類 (デフォルト: 拡張子から判断)")
+    parser.add_argument("--column", default="text", help="発話のフィールド名 (JSONL のキー、CSV の列名)")
+    parser.add_argument("--workers", type=int, default=_available_cores(),
+                        help="ワーカープロセス数 (デフォルト: 利用できる CPU コア数。0 でこのプロセスで処理)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="1回にワーカーに送る発話の件数")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="処理中のチャンク数の上限 (ワーカー数の倍数)")
+    parser.add_argument("--offset", type=int, default=0, help="読み飛ばす先頭の発話の件数")
+    parser.add_argument("--resume", action="store_true", help="既存の出力の続きから再開して追記する")
+    parser.add_argument("--progress-interval", type=float, default=DEFAULT_PROGRESS_INTERVAL,
+                        help="進捗を表示する間隔 (秒。0 で表示しない)")
+    args = parser.parse_args()
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size には 1 以上を指定してください。")
+
+    offset = args.offset
+    if args.resume:
+        if args.output == "-":
+            parser.error("--resume には --output を指定してください。")
+        resumed = resume_offset(args.output)
+        if resumed is not None:
+            offset = resumed
+            print(f"{offset} 件目から再開します。", file=sys.stderr)
+    input_format = _input_format(args.input, args.format)
+    chunks = iter_chunks(args.input, input_format, args.column, args.chunk_size, offset)
+    progress = ProgressReporter(args.progress_interval)
+    try:
+        if args.output == "-":
+            run(chunks, sys.stdout.buffer, args.workers, args.column, args.window, progress)
+            sys.stdout.flush()
+        else:
+            with open(args.output, "ab" if args.resume else "wb") as output:
+                run(chunks, output, args.workers, args.column, args.window, progress)
+    except ValueError as e:
+        # 入力の形式の誤り (CSV の列がないなど)
+        sys.exit(f"エラー: {e}")
+    except BrokenPipeError:
+        # 標準出力の読み手 (head など) が先に終了した場合は、残りを処理せずに終了する
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    progress.finish()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,17 @@
 """
 calculator_agent モジュールの初期化ファイル。
 エージェントと関連モジュールをエクスポートします。
+
+agent モジュール (LLM のモデル設定を持つ root_agent を作成する) は、最初に参照されたときにインポートします。
+handlers や router だけを使う場合 (API サーバーやコンソールのキーワード計算) はエージェントを作成しません。
 """
 
-from . import agent 
\ No newline at end of file
+import importlib
+
+__all__ = ["agent"]
+
+
+def __getattr__(name: str):
+    if name == "agent":
+        return importlib.import_module(".agent", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,507 @@
+# -*- coding: utf-8 -*-
+"""
+算術式エンジンモジュール。
+トークナイザーが作成したトークン列を、演算子の優先順位と括弧を考慮した構文木に変換し、評価します。
+
+"5たす3" や "(2+3)*4" のような中置記法に加えて、"1と2と3を足して" や "2の3乗" のように
+演算を表す動詞が被演算子の後に来る日本語の表現にも対応します。
+
+式の形 (TokenStream.layout) ごとに、構文木から生成した Python 関数をキャッシュするため、
+同じ形の式 (例: "5たす3" と "2たす7") は再解析せずに数値だけを当てはめて評価できます。
+float 以外の数値モード (calculator_agent/numeric.py) 用に、累乗と剰余を誤差の出ない型向けの関数で
+計算する評価関数も同時に生成します (evaluate_exact)。
+
+演算子の記号ごとの優先順位・結合性・計算関数は演算プラグイン (calculator_agent/plugins.py) の定義を使います。
+組み込みの演算は Python の演算子のまま、プラグインで追加した演算は計算関数の呼び出しとしてコードを生成します。
+単項演算のプラグインのキーワードは、直前の被演算子に作用します ("9の平方根" は √(9))。
+プラグインの計算関数は、float モードでは事前計算の表とメモ (calculator_agent/operations.py の OperationMemo) を
+参照してから呼び出します。
+"""
+
+import threading
+from typing import Callable, Dict, FrozenSet, List, Mapping, NamedTuple, Optional, Tuple
+
+from .numeric import Number, modulo_exact, numeric, power_exact
+from .operations import operation_memo
+from .plugins import BUILTIN_PLUGINS, OperationPlugin
+from .tokenizer import NUMBER_SLOT, TokenStream
+
+# 組み込みの演算子の記号から演算プラグインへの対応表 (ExpressionEngine で symbols を省略した場合に使う)
+BUILTIN_SYMBOLS: Dict[str, OperationPlugin] = {plugin.symbol: plugin for plugin in BUILTIN_PLUGINS}
+# float 以外の数値モードの評価関数で、Python の演算子の代わりに使う関数
+_EXACT_FUNCTIONS = {"**": "_pow", "%": "_mod"}
+_EXACT_GLOBALS = {"__builtins__": {}, "_pow": power_exact, "_mod": modulo_exact}
+# 単項マイナスの優先順位 (累乗より弱く、乗除より強い: -2^2 = -4)
+_UNARY_PRECEDENCE = 3
+
+# 生成した評価関数をキャッシュする式の形の最大数
+COMPILED_CACHE_SIZE = 4096
+# 式として解析するトークン数の上限 (構文木の深さと、生成するコードの括弧の入れ子を抑える)
+MAX_EXPRESSION_TOKENS = 128
+# 括弧・符号・単項演算・右結合の累乗の入れ子の深さの上限 (再帰下降パーサーの再帰の深さを抑える)
+MAX_NESTING_DEPTH = 32
+
+
+class ExpressionError(ValueError):
+    """トークン列を算術式として解釈できない場合に送出されます。"""
+
+
+class OperatorSpec(NamedTuple):
+    """
+    キーワード1つ分の演算子の定義。
+
+    Attributes:
+        symbol (str): 演算子の記号 ("+", "-", "*", "/", "%", "^" またはプラグインの記号)。
+        infix (bool): 2つの被演算子の間に置ける (中置の) キーワードかどうか。
+            False のキーワード ("足して", "乗" など) は、それより前に並んだ被演算子をまとめて演算します。
+        order (int): インテントの優先順位 (小さいほど優先)。動詞が連続する場合に使います。
+        arity (int): 被演算子の数 (1 の場合は直前の被演算子に作用する単項演算)。
+    """
+    symbol: str
+    infix: bool
+    order: int
+    arity: int = 2
+
+
+class Evaluation(NamedTuple):
+    """
+    式の評価結果。
+
+    Attributes:
+        value (Number): 計算結果 (型は数値モードによる。float モードでは float)。
+        expression (str): 正規化した式の表記 (例: "(2.0 + 3.0) * 4.0")。
+        operands (List[Number]): 式に含まれる数値。
+        binary_operator (Optional[str]): 式が数値に対する1つの演算だけ (2つの数値の二項演算、または1つの数値の
+            単項演算) の場合はその記号、それ以外は None。
+    """
+    value: Number
+    expression: str
+    operands: List[Number]
+    binary_operator: Optional[str]
+
+
+class _CompiledExpression(NamedTuple):
+    """式の形1つ分のコンパイル結果。"""
+    function: Callable[..., float]
+    display: str
+    binary_operator: Optional[str]
+    arity: int
+    # float 以外の数値モード用の評価関数 (累乗・剰余に power_exact / modulo_exact を使う)
+    exact_function: Callable[..., Number]
+    # 式に含まれる演算子の記号 (auto モードで数値の型を選ぶために使う)
+    symbols: frozenset
+
+
+# --- 構文木 ---
+# ("num", index) / ("neg", node) / ("un", symbol, node) / ("bin", symbol, left, right)
+
+def _precedence(node, symbols: Mapping[str, OperationPlugin]) -> int:
+    if node[0] == "bin":
+        return symbols[node[1]].precedence
+    if node[0] == "neg":
+        return _UNARY_PRECEDENCE
+    # 数値と、関数の形 ("√(9)") で表示する単項演算
+    return 99
+
+
+class _Parser:
+    """TokenStream.layout を構文木に変換する再帰下降パーサー。"""
+
+    def __init__(
+        self, layout: Tuple[str, ...], operators: Mapping[str, OperatorSpec], symbols: Mapping[str, OperationPlugin]
+    ):
+        self.layout = layout
+        self.operators = operators
+        self.symbols = symbols
+        self.pos = 0
+        self.operand_count = 0
+        self.unary_count = 0
+        self.depth = 0
+
+    def _at_operand_start(self, pos: int) -> bool:
+        """指定位置から被演算子 (数値・括弧・符号付きの被演算子) が始まるかどうか。"""
+        layout = self.layout
+        while pos < len(layout):
+            item = layout[pos]
+            if item == NUMBER_SLOT or item == "(":
+                return True
+            spec = self.operators.get(item)
+            # 符号と、被演算子の前に置いた単項演算 (例: "ルート9") は読み飛ばす
+            if spec is None or not (spec.arity == 1 or (spec.infix and spec.symbol in ("+", "-"))):
+                return False
+            pos += 1
+        return False
+
+    def _parse_postfix(self, node):
+        """被演算子の後に続く単項演算のキーワード (例: "9の平方根") を適用します。"""
+        layout = self.layout
+        while self.pos < len(layout):
+            spec = self.operators.get(layout[self.pos])
+            if spec is None or spec.arity != 1:
+                break
+            self.pos += 1
+            self.unary_count += 1
+            node = ("un", spec.symbol, node)
+        return node
+
+    def _parse_primary(self):
+        layout = self.layout
+        if self.pos >= len(layout):
+            raise ExpressionError("式が途中で終わっています。")
+        item = layout[self.pos]
+        if item == NUMBER_SLOT:
+            self.pos += 1
+            self.operand_count += 1
+            return ("num", self.operand_count - 1)
+        if item == "(":
+            self.pos += 1
+            node = self._parse_binary(0)
+            if self.pos >= len(layout) or layout[self.pos] != ")":
+                raise ExpressionError("括弧が閉じられていません。")
+            self.pos += 1
+            return node
+        spec = self.operators.get(item)
+        if spec is not None and spec.infix and spec.symbol in ("+", "-"):
+            # 単項の符号 (例: "-(2+3)")
+            self.pos += 1
+            operand = self._parse_binary(_UNARY_PRECEDENCE + 1)
+            return ("neg", operand) if spec.symbol == "-" else operand
+        if spec is not None and spec.arity == 1:
+            # 被演算子の前に置いた単項演算 (例: "ルート9")
+            self.pos += 1
+            self.unary_count += 1
+            self.depth += 1
+            if self.depth > MAX_NESTING_DEPTH:
+                raise ExpressionError(f"式の入れ子が深すぎます (上限 {MAX_NESTING_DEPTH})。")
+            node = ("un", spec.symbol, self._parse_postfix(self._parse_primary()))
+            self.depth -= 1
+            return node
+        raise ExpressionError(f"被演算子が必要な位置に {item!r} があります。")
+
+    def _parse_binary(self, min_precedence: int, left=None):
+        """
+        中置の演算子の式を解析します。left を指定した場合は、それを左辺として続く中置の演算子の式を解析します。
+        """
+        # 括弧・符号・右結合の演算の右辺はこのメソッドの再帰になるため、入れ子の深さをここで制限する
+        self.depth += 1
+        if self.depth > MAX_NESTING_DEPTH:
+            raise ExpressionError(f"式の入れ子が深すぎます (上限 {MAX_NESTING_DEPTH})。")
+        if left is None:
+            left = self._parse_postfix(self._parse_primary())
+        layout = self.layout
+        while self.pos < len(layout):
+            spec = self.operators.get(layout[self.pos])
+            if spec is None or not spec.infix or not self._at_operand_start(self.pos + 1):
+                break
+            plugin = self.symbols[spec.symbol]
+            precedence = plugin.precedence
+            if precedence < min_precedence:
+                break
+            self.pos += 1
+            right = self._parse_binary(precedence if plugin.right_assoc else precedence + 1)
+            left = ("bin", spec.symbol, left, right)
+        self.depth -= 1
+        return left
+
+    def parse(self, fold_symbol: Optional[str]):
+        """
+        式全体を解析します。
+
+        中置の演算子でつながっていない被演算子が並んだ場合 (例: "5と3を足して") は、
+        その後の動詞キーワードの演算でまとめます (まとめた式の後に中置の演算子が続く場合は、まとめた式を左辺にします)。
+        動詞がない場合は、数値だけが並んでいる場合 (例: "5と3") に限り
+        fold_symbol の演算でまとめます。中置の演算の式の前後に余った数値がある場合 (例: "1e3たす1" の "1") は、
+        無関係な数値を計算しないよう ExpressionError を送出します。
+        """
+        layout = self.layout
+        pending: List[tuple] = []
+        prefix_symbol = None
+        while self.pos < len(layout):
+            if self._at_operand_start(self.pos):
+                pending.append(self._parse_binary(0))
+                continue
+            # 連続する動詞キーワード (例: "割ったあまり") は、最も優先順位の高いものを採用する
+            best: Optional[OperatorSpec] = None
+            while self.pos < len(layout) and not self._at_operand_start(self.pos):
+                spec = self.operators.get(layout[self.pos])
+                if spec is None:
+                    raise ExpressionError(f"{layout[self.pos]!r} を解釈できません。")
+                if spec.arity == 1:
+                    # 被演算子の後の単項演算は _parse_postfix で適用済みのため、ここに来るのは被演算子がない場合
+                    raise ExpressionError(f"{layout[self.pos]!r} の被演算子が見つかりません。")
+                if best is not None and spec.infix and self._at_operand_start(self.pos + 1):
+                    # 動詞の後の中置の演算子 (例: "5と3を足して*2" の "*") は、まとめた式に続く演算
+                    break
+                if best is None or spec.order < best.order:
+                    best = spec
+                self.pos += 1
+            if len(pending) >= 2:
+                # 動詞でまとめた式の後に中置の演算子が続く場合 (例: "2の3乗-1") は、まとめた式を左辺として続ける
+                pending = [self._parse_binary(0, _fold(best.symbol, pending, self.symbols))]
+            elif not pending:
+                # 被演算子より前にある動詞 (例: "足し算 5 と 3")
+                prefix_symbol = best.symbol
+        if len(pending) == 1:
+            if self.operand_count < 2 and not self.unary_count:
+                raise ExpressionError("演算する2つの数値が見つかりません。")
+            return pending[0]
+        if prefix_symbol is None and any(node[0] == "bin" for node in pending):
+            raise ExpressionError("演算子でつながっていない数値があります。")
+        symbol = prefix_symbol or fold_symbol
+        if len(pending) >= 2 and symbol is not None and self.symbols[symbol].arity == 2:
+            return _fold(symbol, pending, self.symbols)
+        raise ExpressionError("演算する2つの数値が見つかりません。")
+
+
+def _fold(symbol: str, operands: List[tuple], symbols: Mapping[str, OperationPlugin]):
+    """被演算子の並びを左から順に同じ演算でまとめます (累乗は右から)。"""
+    if symbols[symbol].right_assoc:
+        node = operands[-1]
+        for operand in reversed(operands[:-1]):
+            node = ("bin", symbol, operand, node)
+        return node
+    node = operands[0]
+    for operand in operands[1:]:
+        node = ("bin", symbol, node, operand)
+    return node
+
+
+def _symbols(node) -> frozenset:
+    """構文木に含まれる演算子の記号を返します。"""
+    if node[0] == "num":
+        return frozenset()
+    if node[0] == "neg":
+        return _symbols(node[1])
+    if node[0] == "un":
+        return frozenset((node[1],)) | _symbols(node[2])
+    return frozenset((node[1],)) | _symbols(node[2]) | _symbols(node[3])
+
+
+class _CodeGenerator:
+    """
+    構文木から (Python の式, 表示用の書式文字列) を生成します。
+    exact が True の場合、累乗と剰余は _EXACT_FUNCTIONS の関数呼び出しにします。
+    Python の演算子を持たない (プラグインで追加した) 演算と、float モードで事前計算の表を読み込んだ演算は、
+    functions に登録した計算関数の呼び出しにします。
+    """
+
+    def __init__(self, symbols: Mapping[str, OperationPlugin], exact: bool = False):
+        self.symbols = symbols
+        self.exact = exact
+        # 生成するコードで使う関数名から計算関数への対応表 (評価関数のグローバル変数になる)
+        self.functions: Dict[str, Callable[..., Number]] = {}
+        self._names: Dict[str, str] = {}
+
+    def _function_name(self, plugin: OperationPlugin) -> str:
+        name = self._names.get(plugin.symbol)
+        if name is None:
+            name = self._names[plugin.symbol] = f"_f{len(self._names)}"
+            if self.exact:
+                self.functions[name] = plugin.exact_evaluator or plugin.evaluator
+            else:
+                # float モードでは、事前計算の表とメモ (memoize を指定したプラグイン) を参照してから計算する
+                self.functions[name] = operation_memo.wrap(plugin.symbol, plugin.evaluator, plugin.arity, plugin.memoize)
+        return name
+
+    def generate(self, node) -> Tuple[str, str]:
+        kind = node[0]
+        if kind == "num":
+            return f"a{node[1]}", "{" + str(node[1]) + "}"
+        if kind == "neg":
+            code, display = self.generate(node[1])
+            if node[1][0] == "bin":
+                display = f"({display})"
+            return f"(-{code})", f"-{display}"
+        if kind == "un":
+            _, symbol, operand = node
+            code, display = self.generate(operand)
+            return f"{self._function_name(self.symbols[symbol])}({code})", f"{symbol}({display})"
+        _, symbol, left, right = node
+        plugin = self.symbols[symbol]
+        precedence, right_assoc, python_operator = plugin.precedence, plugin.right_assoc, plugin.python_operator
+        left_code, left_display = self.generate(left)
+        right_code, right_display = self.generate(right)
+        left_precedence, right_precedence = _precedence(left, self.symbols), _precedence(right, self.symbols)
+        if left_precedence < precedence or (right_assoc and left_precedence == precedence):
+            left_display = f"({left_display})"
+        if right_precedence < precedence or (not right_assoc and right_precedence == precedence):
+            right_display = f"({right_display})"
+        display = f"{left_display} {symbol} {right_display}"
+        # 組み込みの演算も、float モードで事前計算の表を読み込んだ場合は表を参照する計算関数を呼び出す
+        if not python_operator or (not self.exact and operation_memo.wraps(symbol, 2, plugin.memoize)):
+            return f"{self._function_name(plugin)}({left_code}, {right_code})", display
+        if self.exact and python_operator in _EXACT_FUNCTIONS:
+            return f"{_EXACT_FUNCTIONS[python_operator]}({left_code}, {right_code})", display
+        return f"({left_code} {python_operator} {right_code})", display
+
+
+class ExpressionEngine:
+    """
+    キーワードと演算子の対応表を元に、トークン列を式として評価するエンジン。
+
+    式の形ごとの解析・コード生成の結果はキャッシュに保持し、2回目以降は数値を当てはめるだけで評価します。
+    演算プラグインを追加・削除した場合は、updated で変更のあったキーワード・記号を含まない式の形の
+    コンパイル結果を引き継いだエンジンを作成します。
+    """
+
+    def __init__(
+        self, operators: Mapping[str, OperatorSpec], symbols: Optional[Mapping[str, OperationPlugin]] = None
+    ):
+        """
+        Args:
+            operators (Mapping[str, OperatorSpec]): 正規化したキーワードから演算子の定義への対応表。
+            symbols (Optional[Mapping[str, OperationPlugin]]): 演算子の記号から演算プラグインへの対応表
+                (省略時は組み込みの演算のみ)。
+        """
+        self.operators: Dict[str, OperatorSpec] = dict(operators)
+        self.symbols: Dict[str, OperationPlugin] = dict(BUILTIN_SYMBOLS if symbols is None else symbols)
+        # (式の形, fold_symbol) からコンパイル結果へのキャッシュ。参照はロックなしで行い、追加と追い出しだけロックを取る
+        self._compiled: Dict[Tuple[Tuple[str, ...], Optional[str]], _CompiledExpression] = {}
+        self._compiled_lock = threading.Lock()
+
+    def _compile_layout(self, layout: Tuple[str, ...], fold_symbol: Optional[str]) -> _CompiledExpression:
+        """
+        式の形を解析し、数値を引数に取る Python 関数を生成します。
+
+        長すぎる式・入れ子が深すぎる式は、解析・コード生成の再帰やコンパイルで RecursionError・MemoryError に
+        ならないよう、解析の前に ExpressionError にします。
+        """
+        if len(layout) > MAX_EXPRESSION_TOKENS:
+            raise ExpressionError(f"式が長すぎます (上限 {MAX_EXPRESSION_TOKENS} トークン)。")
+        parser = _Parser(layout, self.operators, self.symbols)
+        tree = parser.parse(fold_symbol)
+        arguments = ", ".join(f"a{i}" for i in range(parser.operand_count))
+        # 生成するコードは引数名・演算子・括弧と、計算関数 (_EXACT_FUNCTIONS と _CodeGenerator.functions) の
+        # 関数名のみで構成され、発話の文字列は含まない
+        generator = _CodeGenerator(self.symbols)
+        exact_generator = _CodeGenerator(self.symbols, exact=True)
+        try:
+            code, display = generator.generate(tree)
+            function = eval(f"lambda {arguments}: {code}", {"__builtins__": {}, **generator.functions})
+            exact_code, _ = exact_generator.generate(tree)
+            exact_function = eval(f"lambda {arguments}: {exact_code}", {**_EXACT_GLOBALS, **exact_generator.functions})
+        except (RecursionError, MemoryError, SyntaxError) as e:
+            # 上限の範囲内の式では起きないが、Python のコンパイラの入れ子の上限に達した場合も式の誤りとして扱う
+            raise ExpressionError("式が複雑すぎます。") from e
+        binary_operator = None
+        if tree[0] == "bin" and tree[2][0] == "num" and tree[3][0] == "num":
+            binary_operator = tree[1]
+        elif tree[0] == "un" and tree[2][0] == "num":
+            binary_operator = tree[1]
+        return _CompiledExpression(
+            function, display, binary_operator, parser.operand_count, exact_function, _symbols(tree)
+        )
+
+    def _compile_and_store(self, key: Tuple[Tuple[str, ...], Optional[str]]) -> _CompiledExpression:
+        compiled = self._compile_layout(*key)
+        with self._compiled_lock:
+            if len(self._compiled) >= COMPILED_CACHE_SIZE:
+                # 上限に達した場合は最も古く追加したものを追い出す
+                del self._compiled[next(iter(self._compiled))]
+            self._compiled[key] = compiled
+        return compiled
+
+    def compile(self, layout: Tuple[str, ...], fold_symbol: Optional[str] = None) -> _CompiledExpression:
+        """
+        式の形をコンパイルします (結果はキャッシュされます)。
+
+        Raises:
+            ExpressionError: 式として解釈できない場合。
+        """
+        key = (layout, fold_symbol)
+        compiled = self._compiled.get(key)
+        return self._compile_and_store(key) if compiled is None else compiled
+
+    def updated(
+        self,
+        operators: Mapping[str, OperatorSpec],
+        symbols: Mapping[str, OperationPlugin],
+        changed_keywords: FrozenSet[str],
+        changed_symbols: FrozenSet[str],
+    ) -> "ExpressionEngine":
+        """
+        キーワードと演算子の対応表を変更したエンジンを作成します。
+        変更のあったキーワードを含まず、変更のあった記号を使わない式の形のコンパイル結果は、
+        解析し直しても同じ結果になるため引き継ぎます。
+
+        Args:
+            operators (Mapping[str, OperatorSpec]): 変更後のキーワードから演算子の定義への対応表。
+            symbols (Mapping[str, OperationPlugin]): 変更後の演算子の記号から演算プラグインへの対応表。
+            changed_keywords (FrozenSet[str]): 追加・削除・定義の変更があったキーワード。
+            changed_symbols (FrozenSet[str]): 追加・削除・定義の変更があった記号。
+
+        Returns:
+            ExpressionEngine: 変更後のエンジン。
+        """
+        engine = ExpressionEngine(operators, symbols)
+        with self._compiled_lock:
+            entries = list(self._compiled.items())
+        engine._compiled.update(
+            (key, compiled) for key, compiled in entries
+            if key[1] not in changed_symbols
+            and changed_keywords.isdisjoint(key[0])
+            and changed_symbols.isdisjoint(compiled.symbols)
+        )
+        return engine
+
+    def evaluate(
+        self, stream: TokenStream, fold_symbol: Optional[str] = None, operands: Optional[List[float]] = None
+    ) -> Evaluation:
+        """
+        トークン列を式として評価します。
+
+        Args:
+            stream (TokenStream): トークナイザーの出力。
+            fold_symbol (Optional[str]): 演算子でつながっていない数値が並んでいる場合に使う演算子の記号
+                (例: "5と3" に対してインテントから決まる "+")。
+            operands (Optional[List[float]]): 変換済みの数値 (省略時は stream.number_values() で変換します)。
+
+        Returns:
+            Evaluation: 評価結果。
+
+        Raises:
+            ExpressionError: 式として解釈できない場合。
+            ZeroDivisionError: 0 で割った場合。
+            OverflowError: 結果が大きすぎる場合。
+            ValueError: 結果が実数にならない場合 (例: 負の数の分数乗)。
+        """
+        key = (tuple(stream.layout), fold_symbol)
+        compiled = self._compiled.get(key) or self._compile_and_store(key)
+        if operands is None:
+            operands = stream.number_values()
+        value = compiled.function(*operands)
+        if isinstance(value, complex):
+            raise ValueError("計算結果が実数になりません。")
+        return Evaluation(value, compiled.display.format(*operands), operands, compiled.binary_operator)
+
+    def evaluate_exact(self, stream: TokenStream, fold_symbol: Optional[str] = None, backend=None) -> Evaluation:
+        """
+        トークン列を float 以外の数値モード (auto / decimal / fraction) で評価します。
+        数値リテラルは数値モードの型に変換し、式の表記の数値は backend.format_number で表示します。
+
+        Args:
+            stream (TokenStream): トークナイザーの出力。
+            fold_symbol (Optional[str]): 演算子でつながっていない数値が並んでいる場合に使う演算子の記号。
+            backend (Optional[NumericBackend]): 数値モード (省略時はプロセス共通の numeric)。
+
+        Returns:
+            Evaluation: 評価結果。
+
+        Raises:
+            ExpressionError: 式として解釈できない場合。
+            ZeroDivisionError: 0 で割った場合。
+            OverflowError: 結果が大きすぎる場合 (数値モードの桁数の上限を超える場合を含む)。
+            ValueError: 結果が実数にならない場合。
+        """
+        backend = numeric if backend is None else backend
+        key = (tuple(stream.layout), fold_symbol)
+        compiled = self._compiled.get(key) or self._compile_and_store(key)
+        value, operands = backend.evaluate(compiled.exact_function, stream.numbers, compiled.symbols)
+        if isinstance(value, complex):
+            raise ValueError("計算結果が実数になりません。")
+        if operands and type(operands[0]) is not int:
+            # Fraction の str() は "1/10"、Decimal は "1E-7" のような表記になる場合があるため、小数の表記にする
+            display = compiled.display.format(*[backend.format_number(operand) for operand in operands])
+        else:
+            display = compiled.display.format(*operands)
+        return Evaluation(value, display, operands, compiled.binary_operator)
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""
+インテントハンドラーモジュール。
+adk_logic.py、main_agent.py、calculator_agent/agent.py の各エージェントで共通に使う
+インテントハンドラーを定義します。
+
+ハンドラーは演算プラグイン (calculator_agent/plugins.py) のレジストリから作成し、キーワードと演算子は
+プラグインの定義を使います。インテントの判定は IntentRouter が、計算は算術式エンジン (calculator_agent/expression.py) が行います。
+create_intent_router で作成したルーターは、実行中のプラグインの追加・削除をそのまま反映します。
+"""
+
+from time import perf_counter_ns
+from typing import Dict, List, NamedTuple, Optional, Type
+
+from adk.intents import IntentHandler
+from adk.messages import Message
+
+from .expression import ExpressionError
+from .metrics import metrics, record_handler
+from .numeric import InexactPowerError, Number, numeric
+from .plugins import (
+    ADD_PLUGIN,
+    DIVIDE_PLUGIN,
+    MODULO_PLUGIN,
+    MULTIPLY_PLUGIN,
+    POWER_PLUGIN,
+    SUBTRACT_PLUGIN,
+    OperationPlugin,
+    PluginRegistry,
+    plugin_registry,
+)
+from .profiler import profiler
+from .rendering import RenderFunction, renderer
+from .router import IntentRouter, KeywordRoutingMixin
+
+
+class HandlerResult(NamedTuple):
+    """
+    インテントハンドラーの処理結果。
+
+    Attributes:
+        text (str): 応答テキスト。
+        resolved (bool): 入力をハンドラーで確定できたかどうか (False の場合、TieredPipeline はモデルの段に回す)。
+        value (Optional[Number]): 計算結果 (計算できなかった場合は None。型は数値モードによる)。セッションの直前の結果として使う。
+    """
+    text: str
+    resolved: bool
+    value: Optional[Number] = None
+
+
+class ArithmeticIntentHandler(KeywordRoutingMixin, IntentHandler):
+    """
+    算術演算インテントのハンドラー。
+
+    演算プラグイン (OperationPlugin) を指定して作成するか、サブクラスでクラス属性 plugin を宣言します。
+    以下の属性はプラグインの定義から設定します。
+        intent_name: インテント名。
+        keywords: インテントを示すキーワード。
+        infix_keywords: keywords のうち、2つの数値の間に置ける (中置の) キーワード。
+        operator: 演算子の記号 ("+", "-", "*", "/", "%", "^" またはプラグインの記号)。
+        arity: 被演算子の数 (2: 二項演算、1: 単項演算)。
+        formatter: 単純な演算の場合の応答文 ({a}, {b}, {result} を含む書式文字列、または関数)。
+        operation_label: 数値を認識できなかった場合の応答文で使う演算の名前。
+    """
+    plugin: Optional[OperationPlugin] = None
+    infix_keywords = ()
+    operator = ""
+    arity = 2
+    formatter = ""
+    operation_label = ""
+
+    def __init__(self, plugin: Optional[OperationPlugin] = None):
+        """
+        Args:
+            plugin (Optional[OperationPlugin]): 演算プラグイン (省略時はクラス属性 plugin)。
+        """
+        super().__init__()
+        plugin = self.plugin if plugin is None else plugin
+        if plugin is not None:
+            self.plugin = plugin
+            self.intent_name = plugin.name
+            self.keywords = plugin.keywords
+            self.infix_keywords = plugin.infix_keywords
+            self.operator = plugin.symbol
+            self.arity = plugin.arity
+            self.formatter = plugin.formatter
+            self.operation_label = plugin.operation_label
+        # 書式文字列の応答文は作成時に一度だけ f-string の関数にコンパイルしておく
+        self._render: Optional[RenderFunction] = (
+            renderer.compile(self.formatter) if type(self.formatter) is str else None
+        )
+
+    def handle(self, message: Message) -> Message:
+        """
+        メッセージを算術式として評価し、結果を返します。
+
+        "5たす3" のような数値に対する単純な演算はプラグインの formatter の形式 ("5.0 たす 3.0 は 8.0 です。") で、
+        "1たす2たす3" や "(2+3)*4" のような式は "{式} は {結果} です。" の形式で応答します。
+
+        Args:
+            message (Message): 処理するメッセージ
+
+        Returns:
+            Message: 応答メッセージ
+        """
+        return Message(text=self.respond(message.text).text)
+
+    def respond(self, text: str) -> HandlerResult:
+        """
+        テキストを算術式として評価し、応答テキスト・確定したかどうか・計算結果を返します。
+
+        演算に必要な数の数値を認識できなかった場合や式を解釈できなかった場合は、確定しなかった (False) として
+        お詫びの応答テキストを返します (TieredPipeline はこの場合にモデルの段に回します)。
+        0 除算などの計算エラーは、入力から一意に決まる応答のため確定した (True) ものとして扱います。
+
+        Args:
+            text (str): 処理するテキスト
+
+        Returns:
+            HandlerResult: 応答テキスト、入力をこのハンドラーで確定できたかどうか、計算結果。
+        """
+        if profiler.enabled:
+            profiler.set_intent(self.intent_name)
+        router = self.router
+        stream = router.tokenize(text)
+        # 処理段階 (数値の抽出・式の評価・応答文の作成) ごとの所要時間を計測する
+        started = perf_counter_ns()
+        # float 以外の数値モードでは、数値リテラルの変換は数値モードの型の選択と合わせて評価時に行う
+        exact = numeric.exact
+        operands = stream.numbers if exact else stream.number_values()
+        extracted = perf_counter_ns()
+        if len(operands) < self.arity:
+            target = "2つの数値" if self.arity == 2 else "数値"
+            response_text = f"すみません、{self.operation_label}する{target}を認識できませんでした。"
+            if metrics.enabled:
+                record_handler(self.intent_name, extract_ns=extracted - started, error=True)
+            return HandlerResult(response_text, False)
+
+        evaluation = None
+        resolved = True
+        try:
+            if exact:
+                evaluation = router.expressions.evaluate_exact(stream, self.operator)
+            else:
+                evaluation = router.expressions.evaluate(stream, self.operator, operands)
+        except ZeroDivisionError:
+            response_text = "すみません、0 で割ることはできません。"
+        except OverflowError:
+            response_text = "すみません、計算結果が大きすぎて表現できません。"
+        except ExpressionError:
+            response_text = "すみません、計算式を解釈できませんでした。（例：「(2+3)*4」「1たす2たす3」）"
+            resolved = False
+        except InexactPowerError:
+            response_text = "すみません、計算結果が無理数になるため、誤差の出ない数値モードでは計算できません。"
+        except ValueError:
+            response_text = "すみません、計算結果が実数になりませんでした。"
+        evaluated = perf_counter_ns()
+        if evaluation is not None:
+            value = evaluation.value
+            if exact and type(value) is not int:
+                # 誤差の出ない型の数値は、指数表記 ("1E-7") や分数の表記 ("1/10") にならないように表示する
+                value = numeric.format_number(value)
+            if evaluation.binary_operator == self.operator:
+                values = evaluation.operands
+                if exact and type(values[0]) is not int:
+                    values = [numeric.format_number(operand) for operand in values]
+                render = self._render
+                if render is not None:
+                    response_text = render(values[0], values[1] if len(values) > 1 else None, value)
+                else:
+                    response_text = self.formatter(values, value)
+            else:
+                if renderer.precision is not None:
+                    value = renderer.format_number(value)
+                response_text = f"{evaluation.expression} は {value} です。"
+        if metrics.enabled:
+            record_handler(
+                self.intent_name,
+                extract_ns=extracted - started,
+                evaluate_ns=evaluated - extracted,
+                format_ns=perf_counter_ns() - evaluated,
+                error=evaluation is None,
+            )
+        return HandlerResult(response_text, resolved, None if evaluation is None else evaluation.value)
+
+
+class AddIntentHandler(ArithmeticIntentHandler):
+    """足し算インテントを処理するハンドラー"""
+    plugin = ADD_PLUGIN
+
+
+class SubtractIntentHandler(ArithmeticIntentHandler):
+    """引き算インテントを処理するハンドラー"""
+    plugin = SUBTRACT_PLUGIN
+
+
+class MultiplyIntentHandler(ArithmeticIntentHandler):
+    """掛け算インテントを処理するハンドラー"""
+    plugin = MULTIPLY_PLUGIN
+
+
+class ModuloIntentHandler(ArithmeticIntentHandler):
+    """剰余インテントを処理するハンドラー ("10を3で割ったあまり" を割り算より優先するため、割り算より先に登録する)"""
+    plugin = MODULO_PLUGIN
+
+
+class DivideIntentHandler(ArithmeticIntentHandler):
+    """割り算インテントを処理するハンドラー"""
+    plugin = DIVIDE_PLUGIN
+
+
+class PowerIntentHandler(ArithmeticIntentHandler):
+    """累乗インテントを処理するハンドラー ("2の3乗"、"2^3" など)"""
+    plugin = POWER_PLUGIN
+
+
+# 組み込みの演算のインテント名からハンドラーのクラスへの対応表 (それ以外のプラグインは ArithmeticIntentHandler で処理する)
+_HANDLER_CLASSES: Dict[str, Type[ArithmeticIntentHandler]] = {
+    handler_class.plugin.name: handler_class
+    for handler_class in (
+        AddIntentHandler, SubtractIntentHandler, MultiplyIntentHandler,
+        ModuloIntentHandler, DivideIntentHandler, PowerIntentHandler,
+    )
+}
+
+
+class FallbackIntentHandler(KeywordRoutingMixin, IntentHandler):
+    """どのインテントにもマッチしなかった場合のフォールバックハンドラー"""
+    intent_name = "FallbackIntent"
+    keywords = () # キーワードなし = どのインテントにもマッチしなかった場合に処理する
+
+    def handle(self, message: Message) -> Message:
+        """
+        どの計算処理も実行できなかった場合の応答を返します。
+
+        Args:
+            message (Message): 処理するメッセージ
+
+        Returns:
+            Message: 応答メッセージ
+        """
+        return Message(text=self.respond(message.text).text)
+
+    def respond(self, text: str) -> HandlerResult:
+        """どの計算処理も実行できなかった場合の応答テキストを、確定しなかった (False) ものとして返します。"""
+        if profiler.enabled:
+            profiler.set_intent(self.intent_name)
+        response_text = "すみません、よく分かりませんでした。足し算、引き算、掛け算、割り算、累乗、余りのいずれかを含む形で質問してください。（例：「5たす3は？」）"
+        if metrics.enabled:
+            record_handler(self.intent_name)
+        return HandlerResult(response_text, False)
+
+
+class RoutedIntentHandler(IntentHandler):
+    """
+    ADK の Agent に登録するハンドラー。ルーターで選択したハンドラーに処理を委ねます。
+    Agent にはこのハンドラーだけを登録するため、ルーターへのプラグインの追加・削除がそのまま Agent にも反映されます。
+    """
+    intent_name = "RoutedIntent"
+
+    def __init__(self, router: IntentRouter):
+        super().__init__()
+        self.router = router
+
+    def can_handle(self, message: Message) -> bool:
+        """どのメッセージも処理します (該当するインテントがない場合はフォールバックハンドラーが応答します)。"""
+        return True
+
+    def handle(self, message: Message) -> Message:
+        """ルーターで選択したハンドラーでメッセージを処理します。"""
+        return self.router.handler_for(message.text).handle(message)
+
+
+def create_handler(plugin: OperationPlugin) -> ArithmeticIntentHandler:
+    """演算プラグインのインテントハンドラーを作成します。"""
+    return _HANDLER_CLASSES.get(plugin.name, ArithmeticIntentHandler)(plugin)
+
+
+def create_intent_handlers(registry: Optional[PluginRegistry] = None) -> List[IntentHandler]:
+    """
+    演算プラグインのレジストリに登録された演算のインテントハンドラーを優先順に並べたリストを作成します (フォールバックは最後)。
+    エージェントごとに新しいインスタンスを作成し、IntentRouter に登録して使います。
+
+    Args:
+        registry (Optional[PluginRegistry]): 演算プラグインのレジストリ (省略時はプロセス共通の plugin_registry)。
+
+    Returns:
+        List[IntentHandler]: インテントハンドラーのリスト。
+    """
+    registry = plugin_registry if registry is None else registry
+    return [create_handler(plugin) for plugin in registry.plugins()] + [FallbackIntentHandler()]
+
+
+def create_intent_router(registry: Optional[PluginRegistry] = None) -> IntentRouter:
+    """
+    演算プラグインのレジストリのハンドラーを登録したルーターを作成します。
+    ルーターはレジストリの変更を購読し、プラグインの追加・削除・置き換えを実行中に反映します
+    (ルーターはプロセスの存続期間中使うことを想定しています)。
+
+    Args:
+        registry (Optional[PluginRegistry]): 演算プラグインのレジストリ (省略時はプロセス共通の plugin_registry)。
+
+    Returns:
+        IntentRouter: ルーター。
+    """
+    registry = plugin_registry if registry is None else registry
+    router = None
+
+    def on_change(old: Optional[OperationPlugin], new: Optional[OperationPlugin]) -> None:
+        router.update(
+            removed=() if old is None else (old.name,),
+            added=() if new is None else (create_handler(new),),
+        )
+
+    # 購読と同じロックの中で取得したプラグインからルーターを作るため、その後の変更は取りこぼさない。
+    # 通知はレジストリのロックの中で行うため、ルーターの作成が終わるまで on_change は呼ばれない
+    with registry.lock:
+        plugins = registry.subscribe(on_change)
+        router = IntentRouter([create_handler(plugin) for plugin in plugins] + [FallbackIntentHandler()])
+    return router
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+計測モジュール。
+リクエストの処理段階ごとの所要時間のヒストグラムと、インテントごとの件数のカウンターを保持し、
+Prometheus のテキスト形式で出力します。
+
+ヒストグラムは固定のバケット (ナノ秒の整数) に二分探索で振り分けるだけなので、1回の記録は
+数百ナノ秒以下で済みます。計測は環境変数 ADK_METRICS=0 で無効にできます。
+
+処理段階 (stage):
+    parse     リクエストボディの解析 (pydantic)
+    route     インテントの判定 (トークン化を含む)
+    extract   数値の抽出 (float への変換)
+    evaluate  算術式の評価
+    format    応答文の作成
+"""
+
+import bisect
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# ヒストグラムのバケットの上限 (秒)。1 マイクロ秒から 2.5 秒まで
+DEFAULT_BUCKETS = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Histogram:
+    """ラベル値1つ分のヒストグラム。"""
+    __slots__ = ("counts", "sum_ns", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum_ns = 0
+        self.count = 0
+
+
+class HistogramFamily:
+    """ラベル (1つ) ごとのヒストグラムの集まり。値はナノ秒で記録し、秒で出力します。"""
+
+    def __init__(self, lock: threading.Lock, name: str, help_text: str, label: str, buckets: Iterable[float]):
+        self._lock = lock
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._bounds_ns = [int(b * 1e9) for b in self.buckets]
+        self._histograms: Dict[str, _Histogram] = {}
+
+    def _observe(self, label_value: str, value_ns: int) -> None:
+        """ロックを取得済みの状態で1件記録します。"""
+        histogram = self._histograms.get(label_value)
+        if histogram is None:
+            histogram = self._histograms[label_value] = _Histogram(len(self._bounds_ns) + 1)
+        histogram.counts[bisect.bisect_left(self._bounds_ns, value_ns)] += 1
+        histogram.sum_ns += value_ns
+        histogram.count += 1
+
+    def observe_ns(self, label_value: str, value_ns: int) -> None:
+        """所要時間 (ナノ秒) を1件記録します。"""
+        with self._lock:
+            self._observe(label_value, value_ns)
+
+    def render(self, lines: List[str]) -> None:
+        lines.append(f"# HELP {self.name} {self.help_text}")
+        lines.append(f"# TYPE {self.name} histogram")
+        for label_value, histogram in sorted(self._histograms.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="{bound!r}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{self.name}_sum{{{self.label}="{label_value}"}} {_format_value(histogram.sum_ns / 1e9)}')
+            lines.append(f'{self.name}_count{{{self.label}="{label_value}"}} {histogram.count}')
+
+
+class CounterFamily:
+    """ラベル (1つ) ごとのカウンターの集まり。"""
+
+    def __init__(self, lock: threading.Lock, name: str, help_text: str, label: str):
+        self._lock = lock
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values: Dict[str, int] = {}
+
+    def _inc(self, label_value: str, amount: int = 1) -> None:
+        """ロックを取得済みの状態でカウンターを増やします。"""
+        self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def inc(self, label_value: str, amount: int = 1) -> None:
+        """カウンターを増やします。"""
+        with self._lock:
+            self._inc(label_value, amount)
+
+    def values(self) -> Dict[str, int]:
+        """ラベル値ごとの現在の値を返します。"""
+        with self._lock:
+            return dict(self._values)
+
+    def render(self, lines: List[str]) -> None:
+        lines.append(f"# HELP {self.name} {self.help_text}")
+        lines.append(f"# TYPE {self.name} counter")
+        for label_value, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{{{self.label}="{label_value}"}} {value}')
+
+
+class MetricsRegistry:
+    """
+    ヒストグラムとカウンターをまとめて保持するレジストリ。
+
+    すべての計測値で1つのロックを共有するため、1回の処理で複数の計測値を記録する場合は
+    `with registry.lock:` の中でまとめて記録するとロックの取得が1回で済みます。
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self._families: List[object] = []
+
+    def histogram(self, name: str, help_text: str, label: str, buckets: Iterable[float] = DEFAULT_BUCKETS) -> HistogramFamily:
+        """ヒストグラムを登録して返します。"""
+        family = HistogramFamily(self.lock, name, help_text, label, buckets)
+        self._families.append(family)
+        return family
+
+    def counter(self, name: str, help_text: str, label: str) -> CounterFamily:
+        """カウンターを登録して返します。"""
+        family = CounterFamily(self.lock, name, help_text, label)
+        self._families.append(family)
+        return family
+
+    def render(self, gauges: Iterable[Tuple[str, str, float]] = ()) -> str:
+        """
+        登録されている計測値を Prometheus のテキスト形式で出力します。
+
+        Args:
+            gauges (Iterable[Tuple[str, str, float]]): 一緒に出力するゲージ (名前, 説明, 値)。
+        """
+        lines: List[str] = []
+        with self.lock:
+            for family in self._families:
+                family.render(lines)
+        for name, help_text, value in gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# --- 計算エージェント共通の計測値 ---
+
+metrics = MetricsRegistry(enabled=os.getenv("ADK_METRICS", "1") != "0")
+
+STAGE_DURATION = metrics.histogram(
+    "adk_stage_duration_seconds", "処理段階 (parse, route, extract, evaluate, format) ごとの所要時間", "stage"
+)
+REQUEST_DURATION = metrics.histogram(
+    "adk_request_duration_seconds", "エンドポイントごとのリクエスト全体の処理時間", "endpoint"
+)
+INTENT_REQUESTS = metrics.counter("adk_intent_requests_total", "インテントごとの処理件数", "intent")
+INTENT_ERRORS = metrics.counter(
+    "adk_intent_errors_total", "計算できなかった件数 (数値不足・0 除算・式の解釈エラーなど)", "intent"
+)
+TIER_REQUESTS = metrics.counter(
+    "adk_tier_requests_total",
+    "処理した段ごとの件数 (local: 手元のハンドラーで確定、model: モデルの段で応答、unresolved: 確定できず手元の応答を返した)",
+    "tier",
+)
+
+COALESCED_REQUESTS = metrics.counter(
+    "adk_coalesced_requests_total",
+    "同じ発話の処理の共有 (single-flight) の件数 (leader: 処理を開始、shared: 処理中の結果を共有、timeout: 期限までに完了しなかった処理)",
+    "outcome",
+)
+
+# フォールバックハンドラーのインテント名 (フォールバック率の算出に使用)
+FALLBACK_INTENT = "FallbackIntent"
+
+
+def record_handler(
+    intent_name: str,
+    extract_ns: int = 0,
+    evaluate_ns: int = 0,
+    format_ns: int = 0,
+    error: bool = False,
+) -> None:
+    """
+    インテントハンドラー1回分の計測値 (段階ごとの所要時間とインテントの件数) を、1回のロックで記録します。
+    0 の段階は記録しません。
+    """
+    with metrics.lock:
+        INTENT_REQUESTS._inc(intent_name)
+        if error:
+            INTENT_ERRORS._inc(intent_name)
+        if extract_ns:
+            STAGE_DURATION._observe("extract", extract_ns)
+        if evaluate_ns:
+            STAGE_DURATION._observe("evaluate", evaluate_ns)
+        if format_ns:
+            STAGE_DURATION._observe("format", format_ns)
+
+
+def fallback_ratio() -> Optional[float]:
+    """処理件数のうちフォールバックハンドラーが処理した割合を返します (まだ処理がない場合は None)。"""
+    counts = INTENT_REQUESTS.values()
+    total = sum(counts.values())
+    return counts.get(FALLBACK_INTENT, 0) / total if total else None
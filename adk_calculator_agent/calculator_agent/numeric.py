@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+"""
+数値モードモジュール。
+計算に使う数値の型 (数値モード) を選択し、発話中の数値リテラルの変換と計算結果の表示を行います。
+
+    float     すべて float で計算する (従来の動作。"0.1たす0.2" は 0.30000000000000004)
+    auto      リクエストごとに誤差の出ない最も安い型を選ぶ
+              (整数だけで割り算がない場合は int、それ以外は decimal.Decimal、Decimal で丸めが発生する場合は fractions.Fraction)
+    decimal   すべて decimal.Decimal で計算する (精度・丸め方は ADK_DECIMAL_PRECISION / ADK_DECIMAL_ROUNDING)
+    fraction  すべて fractions.Fraction で計算する
+
+数値モードは環境変数 ADK_NUMERIC_MODE (デフォルト: float) で設定し、プロセス全体で共通です (numeric)。
+float 以外のモードでは、巨大な整数の累乗で時間やメモリを使い果たさないよう、
+計算結果の桁数を ADK_MAX_DIGITS (デフォルト: 4000 桁) までに制限します。
+auto / fraction モードの整数でない指数の累乗は、結果が有理数になる場合 ("4の0.5乗") だけ正確に計算し、
+無理数になる場合 ("2の0.5乗") は float に丸めずに InexactPowerError を送出します。
+"""
+
+import decimal
+import math
+import os
+from decimal import Context, Decimal, DivisionByZero, Inexact, InvalidOperation, localcontext
+from fractions import Fraction
+from typing import Callable, List, Optional, Sequence, Tuple, Union
+
+# 数値モード
+FLOAT_MODE = "float"
+AUTO_MODE = "auto"
+DECIMAL_MODE = "decimal"
+FRACTION_MODE = "fraction"
+NUMERIC_MODES = (FLOAT_MODE, AUTO_MODE, DECIMAL_MODE, FRACTION_MODE)
+
+# 計算結果の桁数の上限のデフォルト (int の文字列変換の上限 4300 桁より小さくする)
+DEFAULT_MAX_DIGITS = 4000
+
+# 1桁あたりのビット数 (log2(10))
+_BITS_PER_DIGIT = 3.3219280948873626
+
+# 計算に使う数値の型
+Number = Union[int, float, Decimal, Fraction]
+
+
+class InexactPowerError(ValueError):
+    """誤差の出ない型 (int・Fraction) の累乗の結果が無理数になり、正確に計算できない場合に送出されます。"""
+
+
+def _int_bits(value: int) -> int:
+    """整数の大きさ (ビット数)。0, 1, -1 は累乗しても大きくならないため 0 とします。"""
+    return value.bit_length() if value > 1 or value < -1 else 0
+
+
+def _is_integral(value: Number) -> bool:
+    if isinstance(value, int):
+        return True
+    if isinstance(value, Fraction):
+        return value.denominator == 1
+    if isinstance(value, Decimal):
+        return value.is_finite() and value == value.to_integral_value()
+    return False
+
+
+def check_power(base: Number, exponent: Number) -> None:
+    """
+    int・Fraction の整数乗の結果が numeric.max_digits 桁を超える場合に OverflowError を送出します
+    (巨大な累乗を計算する前に、底の大きさと指数から結果の大きさを見積もって拒否します)。
+    float と Decimal は計算のコストが精度で抑えられるため検査しません。
+    """
+    if isinstance(exponent, Decimal) or not _is_integral(exponent):
+        return
+    if isinstance(base, int):
+        bits = _int_bits(base)
+    elif isinstance(base, Fraction):
+        bits = _int_bits(base.numerator) + _int_bits(base.denominator)
+    else:
+        return
+    if bits * abs(int(exponent)) > numeric.max_bits:
+        raise OverflowError(f"累乗の結果が {numeric.max_digits} 桁を超えます。")
+
+
+def _exact_root(value: int, degree: int) -> Optional[int]:
+    """0 以上の整数の degree 乗根が整数になる場合はその値を、ならない場合は None を返します。"""
+    if value < 2:
+        return value
+    # 2 以上の整数の degree 乗根は、degree がビット数以上なら 1 と 2 の間 (整数にならない)
+    if degree >= value.bit_length():
+        return None
+    if degree == 2:
+        root = math.isqrt(value)
+    else:
+        # ニュートン法 (上から近づける)
+        root = 1 << -(-value.bit_length() // degree)
+        while True:
+            smaller = ((degree - 1) * root + value // root ** (degree - 1)) // degree
+            if smaller >= root:
+                break
+            root = smaller
+    return root if root ** degree == value else None
+
+
+def _rational_power(base: Fraction, exponent: Fraction) -> Fraction:
+    """
+    有理数の整数でない有理数乗を正確に計算します。
+
+    Raises:
+        ValueError: 底が負の数の場合 (結果が実数にならない)。
+        InexactPowerError: 結果が無理数になる場合。
+        OverflowError: 結果が numeric.max_digits 桁を超える場合。
+    """
+    if base < 0:
+        raise ValueError("計算結果が実数になりません。")
+    numerator = _exact_root(base.numerator, exponent.denominator)
+    denominator = _exact_root(base.denominator, exponent.denominator)
+    if numerator is None or denominator is None:
+        raise InexactPowerError("累乗の結果が無理数になるため、正確に計算できません。")
+    root = Fraction(numerator, denominator)
+    check_power(root, exponent.numerator)
+    return root ** exponent.numerator
+
+
+def power_exact(base: Number, exponent: Number) -> Number:
+    """
+    誤差の出ない型の累乗 (算術式エンジンが float 以外のモードで "^" に使う)。
+
+    整数乗は結果の大きさを検査してから計算し、int の負の整数乗は Fraction で返します。
+    Decimal の累乗は decimal の精度で丸めます (0 の負の数乗は他の型と同じく ZeroDivisionError)。int・Fraction の整数でない指数の累乗は、結果が有理数になる
+    場合だけ Fraction で返し、無理数になる場合は float に丸めずに InexactPowerError を送出します。
+    """
+    if type(exponent) is int and type(base) is int and exponent >= 0:
+        # int の非負の整数乗 (auto モードで最も多い形) は検査を1回の掛け算で済ませる
+        if (base > 1 or base < -1) and base.bit_length() * exponent > numeric.max_bits:
+            raise OverflowError(f"累乗の結果が {numeric.max_digits} 桁を超えます。")
+        return base ** exponent
+    if isinstance(base, Decimal) or isinstance(exponent, Decimal):
+        if not base:
+            # Decimal は 0 の負の数乗を Infinity、0 の 0 乗を InvalidOperation にするため、他のモードと揃える
+            if exponent < 0:
+                raise ZeroDivisionError("0 を負の数で累乗することはできません。")
+            if not exponent:
+                return Decimal(1)
+        return base ** exponent
+    if not _is_integral(exponent):
+        return _rational_power(Fraction(base), Fraction(exponent))
+    check_power(base, exponent)
+    exponent = int(exponent)
+    if exponent < 0 and isinstance(base, int):
+        return Fraction(base) ** exponent
+    return base ** exponent
+
+
+def modulo_exact(a: Number, b: Number) -> Number:
+    """
+    誤差の出ない型の剰余 (算術式エンジンが float 以外のモードで "%" に使う)。
+    Decimal の剰余は被除数の符号になるため、int・float と同じく除数の符号に揃えます。
+    """
+    if isinstance(a, Decimal):
+        if not b:
+            raise ZeroDivisionError("0 で割ることはできません。")
+        remainder = a % b
+        if remainder and (remainder < 0) != (b < 0):
+            remainder += b
+        return remainder
+    return a % b
+
+
+class NumericBackend:
+    """数値モードの設定と、数値リテラルの変換・式の評価・計算結果の表示。"""
+
+    def __init__(
+        self,
+        mode: str = FLOAT_MODE,
+        precision: int = 28,
+        rounding: str = decimal.ROUND_HALF_EVEN,
+        max_digits: int = DEFAULT_MAX_DIGITS,
+    ):
+        """
+        Args:
+            mode (str): 数値モード (float / auto / decimal / fraction)。
+            precision (int): decimal モードの有効桁数 (auto モードで Decimal から Fraction に切り替える桁数も兼ねる)。
+            rounding (str): decimal モードの丸め方 (decimal.ROUND_HALF_EVEN など)。
+            max_digits (int): float 以外のモードでの計算結果の桁数の上限。
+        """
+        self.configure(mode, precision, rounding, max_digits)
+
+    def configure(
+        self,
+        mode: str = FLOAT_MODE,
+        precision: int = 28,
+        rounding: str = decimal.ROUND_HALF_EVEN,
+        max_digits: int = DEFAULT_MAX_DIGITS,
+    ) -> None:
+        """
+        数値モードを変更します。
+
+        Raises:
+            ValueError: 数値モード・丸め方の指定が正しくない場合。
+        """
+        if mode not in NUMERIC_MODES:
+            raise ValueError(f"数値モードは {' / '.join(NUMERIC_MODES)} のいずれかを指定してください。(指定: {mode})")
+        traps = [DivisionByZero, InvalidOperation, decimal.Overflow]
+        try:
+            self.context = Context(prec=precision, rounding=rounding, traps=traps)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"decimal の精度・丸め方の指定が正しくありません。(精度: {precision}, 丸め方: {rounding})") from e
+        # auto モードでは、丸めが発生したら (Inexact) Fraction で計算し直す
+        self._exact_context = Context(prec=precision, rounding=rounding, traps=traps + [Inexact])
+        self.mode = mode
+        self.exact = mode != FLOAT_MODE
+        self.max_digits = max_digits
+        self.max_bits = int(max_digits * _BITS_PER_DIGIT)
+
+    # --- 評価 ---
+
+    def _check_size(self, value: Number) -> None:
+        """計算結果が max_digits 桁を超える場合に OverflowError を送出します。"""
+        if isinstance(value, int):
+            bits = value.bit_length()
+        elif isinstance(value, Fraction):
+            bits = max(value.numerator.bit_length(), value.denominator.bit_length())
+        else:
+            return
+        if bits > self.max_bits:
+            raise OverflowError(f"計算結果が {self.max_digits} 桁を超えます。")
+
+    def _check_literals(self, literals: Sequence[str]) -> None:
+        """数値リテラルの桁数の合計が max_digits 桁を超える場合に OverflowError を送出します。"""
+        if sum(map(len, literals)) > self.max_digits:
+            raise OverflowError(f"数値の桁数の合計が {self.max_digits} 桁を超えるため計算できません。")
+
+    def _call_decimal(self, function: Callable[..., Number], operands: List[Decimal]) -> Number:
+        """Decimal で式を評価し、decimal の例外を int・float と同じ種類の例外に変換します。"""
+        try:
+            return function(*operands)
+        except ZeroDivisionError:
+            raise
+        except decimal.Overflow as e:
+            raise OverflowError("計算結果が大きすぎて表現できません。") from e
+        except InvalidOperation as e:
+            raise ValueError("計算結果が実数になりません。") from e
+
+    def evaluate(self, function: Callable[..., Number], literals: Sequence[str], symbols: frozenset) -> Tuple[Number, list]:
+        """
+        数値リテラルを数値モードの型に変換して式を評価します (float モードでは使いません)。
+
+        Args:
+            function: 算術式エンジンが生成した評価関数 (累乗・剰余は power_exact / modulo_exact を使うもの)。
+            literals (Sequence[str]): 発話中の数値リテラル (TokenStream.numbers)。
+            symbols (frozenset): 式に含まれる演算子の記号。
+
+        Returns:
+            Tuple[Number, list]: 計算結果と、変換した数値のリスト。
+
+        Raises:
+            ZeroDivisionError: 0 で割った場合。
+            OverflowError: 数値リテラルの桁数の合計・計算結果が max_digits 桁を超える場合。
+            ValueError: 結果が実数にならない場合。
+        """
+        mode = self.mode
+        if mode == AUTO_MODE:
+            # 割り算がなく、数値がすべて整数なら int (割り算以外の演算と整数乗は int で閉じている。負の整数乗は Fraction になる)。
+            # 小数のリテラル (と int の文字列変換の上限を超える桁数のリテラル) は int() が ValueError を送出するため、
+            # 走査して調べずに変換を試みる
+            operands = None
+            if "/" not in symbols:
+                try:
+                    operands = list(map(int, literals))
+                except ValueError:
+                    pass
+            if operands is not None:
+                value = function(*operands)
+                if type(value) is not int or value.bit_length() > self.max_bits:
+                    self._check_size(value)
+                return value, operands
+        self._check_literals(literals)
+        if mode == AUTO_MODE:
+            try:
+                with localcontext(self._exact_context):
+                    operands = [Decimal(literal) for literal in literals]
+                    return self._call_decimal(function, operands), operands
+            except Inexact:
+                pass  # Decimal では丸めが発生するため Fraction で計算し直す
+        elif mode == DECIMAL_MODE:
+            with localcontext(self.context):
+                operands = [Decimal(literal) for literal in literals]
+                return self._call_decimal(function, operands), operands
+        operands = [Fraction(literal) for literal in literals]
+        value = function(*operands)
+        self._check_size(value)
+        return value, operands
+
+    # --- 表示 ---
+
+    def format_number(self, value: Number) -> str:
+        """
+        計算結果を表示用の文字列にします。
+
+        int はそのまま、Decimal は指数表記を使わずに (桁数が極端な場合を除く)、
+        Fraction は有限小数になる場合は正確な小数で、循環小数になる場合は decimal の精度で丸めた小数で表示します。
+        float は従来どおり str() の表記です。
+        """
+        if isinstance(value, int):
+            return str(value)
+        if isinstance(value, Decimal):
+            return _format_decimal(value)
+        if isinstance(value, Fraction):
+            numerator, denominator = value.numerator, value.denominator
+            if denominator == 1:
+                return str(numerator)
+            places = _terminating_places(denominator)
+            if places is not None:
+                # 文字列から作成した Decimal は文脈の精度で丸められない
+                return _format_decimal(Decimal(f"{numerator * 10 ** places // denominator}E-{places}"))
+            with localcontext(self.context):
+                return _format_decimal(Decimal(numerator) / Decimal(denominator))
+        return str(value)
+
+    def to_literal(self, value: Number) -> str:
+        """
+        計算結果を、発話に埋め込んでトークナイザーで読み戻せる数値リテラルにします
+        (セッションの「それ」を直前の計算結果に置き換えるために使う)。
+        循環小数になる Fraction は "(1/3)" のように括弧付きの割り算にして、値を変えずに埋め込みます。
+        """
+        if isinstance(value, float):
+            if value.is_integer():
+                return str(int(value))
+            return _format_decimal(Decimal(repr(value)))
+        if isinstance(value, Fraction) and value.denominator != 1 and _terminating_places(value.denominator) is None:
+            return f"({value.numerator}/{value.denominator})"
+        return self.format_number(value)
+
+
+def _terminating_places(denominator: int):
+    """分母が 2 と 5 だけの積 (有限小数になる) の場合は小数点以下の桁数を、それ以外は None を返します。"""
+    twos = fives = 0
+    while denominator % 2 == 0:
+        denominator //= 2
+        twos += 1
+    while denominator % 5 == 0:
+        denominator //= 5
+        fives += 1
+    return max(twos, fives) if denominator == 1 else None
+
+
+def _format_decimal(value: Decimal) -> str:
+    text = str(value)
+    # 指数表記は、桁数が極端でなければ通常の小数表記にする (例: 1E+3 -> 1000)
+    if "E" in text and value.is_finite() and abs(value.adjusted()) <= 100:
+        text = format(value, "f")
+    return text
+
+
+def create_numeric_backend_from_env() -> NumericBackend:
+    """環境変数 ADK_NUMERIC_MODE / ADK_DECIMAL_PRECISION / ADK_DECIMAL_ROUNDING / ADK_MAX_DIGITS の設定で作成します。"""
+    return NumericBackend(
+        mode=os.getenv("ADK_NUMERIC_MODE", FLOAT_MODE).strip().lower() or FLOAT_MODE,
+        precision=int(os.getenv("ADK_DECIMAL_PRECISION", "28")),
+        rounding=os.getenv("ADK_DECIMAL_ROUNDING", decimal.ROUND_HALF_EVEN),
+        max_digits=int(os.getenv("ADK_MAX_DIGITS", str(DEFAULT_MAX_DIGITS))),
+    )
+
+
+# プロセス全体で共通の数値モード
+numeric = create_numeric_backend_from_env()
@@ -1,62 +1,695 @@
 # -*- coding: utf-8 -*-
 """
 計算操作モジュール。
-各種の数学的演算機能（足し算、引き算、掛け算）を提供します。
+各種の数学的演算機能（足し算、引き算、掛け算、割り算、累乗、剰余）を提供します。
+
+スカラー版 (add など) は int・float に加えて、誤差の出ない decimal.Decimal・fractions.Fraction も受け付けます
+(数値モードは calculator_agent/numeric.py を参照)。int・Fraction の整数乗は、結果の桁数が
+数値モードの上限 (ADK_MAX_DIGITS) を超える場合に計算せずに OverflowError を送出します。
+
+スカラー版に加えて、NumPy 配列・memoryview・array.array をまとめて演算する
+一括演算版 (add_array など) を提供します。一括演算版は NumPy がインストールされている場合のみ使えます。
+
+演算プラグインの計算関数の結果のメモ (OperationMemo) と、小さな整数の被演算子の結果を事前計算してファイルから
+メモリマップで読み込む表 (SmallIntegerTable) も提供します。表のファイルは以下で作成します
+(adk_calculator_agent ディレクトリで実行):
+    python -m calculator_agent.operations build-table √ 1000 tables/sqrt.bin
 """
 
-def add(a: float, b: float) -> float:
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from decimal import Decimal
+from fractions import Fraction
+from typing import Callable, Dict, Optional, Tuple
+
+from .numeric import Number, check_power
+
+# スカラー版で受け付ける数値の型
+_SCALAR_TYPES = (int, float, Decimal, Fraction)
+
+# NumPy は一括演算版でのみ使う任意の依存のため、インポートに時間がかかるスカラー版の利用者に負担させないよう、
+# 最初の一括演算の呼び出し時にインポートする (_import_numpy)
+np = None
+
+def add(a: Number, b: Number) -> Number:
     """
     2つの数値を加算します。
 
     Args:
-        a (float): 1番目の数値。
-        b (float): 2番目の数値。
+        a (Number): 1番目の数値。
+        b (Number): 2番目の数値。
 
     Returns:
-        float: 加算結果。
+        Number: 加算結果。
 
     Raises:
         TypeError: 引数が数値でない場合。
     """
-    if not isinstance(a, (int, float)) or not isinstance(b, (int, float)):
+    if not isinstance(a, _SCALAR_TYPES) or not isinstance(b, _SCALAR_TYPES):
         error_message = f"数値以外の引数が指定されました。関数名: add, 引数a: {a} (型: {type(a)}), 引数b: {b} (型: {type(b)})"
         raise TypeError(error_message)
     return a + b
 
-def subtract(a: float, b: float) -> float:
+def subtract(a: Number, b: Number) -> Number:
     """
     1番目の数値から2番目の数値を減算します。
 
     Args:
-        a (float): 1番目の数値 (被減数)。
-        b (float): 2番目の数値 (減数)。
+        a (Number): 1番目の数値 (被減数)。
+        b (Number): 2番目の数値 (減数)。
 
     Returns:
-        float: 減算結果。
+        Number: 減算結果。
 
     Raises:
         TypeError: 引数が数値でない場合。
     """
-    if not isinstance(a, (int, float)) or not isinstance(b, (int, float)):
+    if not isinstance(a, _SCALAR_TYPES) or not isinstance(b, _SCALAR_TYPES):
         error_message = f"数値以外の引数が指定されました。関数名: subtract, 引数a: {a} (型: {type(a)}), 引数b: {b} (型: {type(b)})"
         raise TypeError(error_message)
     return a - b
 
-def multiply(a: float, b: float) -> float:
+def multiply(a: Number, b: Number) -> Number:
     """
     2つの数値を乗算します。
 
     Args:
-        a (float): 1番目の数値。
-        b (float): 2番目の数値。
+        a (Number): 1番目の数値。
+        b (Number): 2番目の数値。
 
     Returns:
-        float: 乗算結果。
+        Number: 乗算結果。
 
     Raises:
         TypeError: 引数が数値でない場合。
     """
-    if not isinstance(a, (int, float)) or not isinstance(b, (int, float)):
+    if not isinstance(a, _SCALAR_TYPES) or not isinstance(b, _SCALAR_TYPES):
         error_message = f"数値以外の引数が指定されました。関数名: multiply, 引数a: {a} (型: {type(a)}), 引数b: {b} (型: {type(b)})"
         raise TypeError(error_message)
-    return a * b 
\ No newline at end of file
+    return a * b
+
+def divide(a: Number, b: Number) -> Number:
+    """
+    1番目の数値を2番目の数値で除算します。
+
+    Args:
+        a (Number): 1番目の数値 (被除数)。
+        b (Number): 2番目の数値 (除数)。
+
+    Returns:
+        Number: 除算結果。
+
+    Raises:
+        TypeError: 引数が数値でない場合。
+        ZeroDivisionError: 除数が 0 の場合。
+    """
+    if not isinstance(a, _SCALAR_TYPES) or not isinstance(b, _SCALAR_TYPES):
+        error_message = f"数値以外の引数が指定されました。関数名: divide, 引数a: {a} (型: {type(a)}), 引数b: {b} (型: {type(b)})"
+        raise TypeError(error_message)
+    return a / b
+
+def power(a: Number, b: Number) -> Number:
+    """
+    1番目の数値を2番目の数値で累乗します。
+
+    Args:
+        a (Number): 底。
+        b (Number): 指数。
+
+    Returns:
+        Number: 累乗結果。
+
+    Raises:
+        TypeError: 引数が数値でない場合。
+        OverflowError: 結果が大きすぎて表現できない場合 (int・Fraction の整数乗は結果の桁数が上限を超える場合)。
+    """
+    if not isinstance(a, _SCALAR_TYPES) or not isinstance(b, _SCALAR_TYPES):
+        error_message = f"数値以外の引数が指定されました。関数名: power, 引数a: {a} (型: {type(a)}), 引数b: {b} (型: {type(b)})"
+        raise TypeError(error_message)
+    check_power(a, b)
+    return a ** b
+
+def modulo(a: Number, b: Number) -> Number:
+    """
+    1番目の数値を2番目の数値で割った余りを求めます。
+
+    Args:
+        a (Number): 1番目の数値 (被除数)。
+        b (Number): 2番目の数値 (除数)。
+
+    Returns:
+        Number: 剰余。
+
+    Raises:
+        TypeError: 引数が数値でない場合。
+        ZeroDivisionError: 除数が 0 の場合。
+    """
+    if not isinstance(a, _SCALAR_TYPES) or not isinstance(b, _SCALAR_TYPES):
+        error_message = f"数値以外の引数が指定されました。関数名: modulo, 引数a: {a} (型: {type(a)}), 引数b: {b} (型: {type(b)})"
+        raise TypeError(error_message)
+    return a % b
+
+
+# --- 一括演算 (NumPy) ---
+
+# 一括演算で受け付ける dtype の種類 (符号付き整数, 符号なし整数, 浮動小数点数)
+_BULK_DTYPE_KINDS = "iuf"
+
+
+def _import_numpy(function_name: str):
+    """NumPy をインポートして返します (2回目以降はインポート済みのモジュールを返します)。"""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError(f"{function_name} を使うには NumPy が必要です。`pip install numpy` を実行してください。") from None
+        np = numpy
+    return np
+
+
+def _as_operand_array(function_name: str, name: str, value):
+    """
+    一括演算の引数を NumPy 配列に変換し、dtype を1回だけ検査します。
+    NumPy 配列・memoryview・array.array はコピーせずにそのまま参照します。
+    """
+    if isinstance(value, (int, float)):
+        # スカラーは配列全体にブロードキャストする
+        return value
+    try:
+        array = np.asarray(value)
+    except (TypeError, ValueError):
+        array = None
+    if array is None or array.dtype.kind not in _BULK_DTYPE_KINDS:
+        dtype = None if array is None else array.dtype
+        error_message = f"数値以外の引数が指定されました。関数名: {function_name}, 引数{name}: (型: {type(value)}, dtype: {dtype})"
+        raise TypeError(error_message)
+    return array
+
+
+def _bulk(function_name: str, ufunc_name: str, a, b, out, check_zero_divisor: bool = False, check_overflow: bool = False):
+    """一括演算の共通処理。引数の dtype を1回だけ検査し、NumPy の ufunc を1回だけ呼び出します。"""
+    np = _import_numpy(function_name)
+    a = _as_operand_array(function_name, "a", a)
+    b = _as_operand_array(function_name, "b", b)
+    if check_zero_divisor and np.count_nonzero(b) != np.size(b):
+        raise ZeroDivisionError(f"0 で割ることはできません。関数名: {function_name}")
+    ufunc = getattr(np, ufunc_name)
+    if not check_overflow:
+        return ufunc(a, b, out=out)
+    # スカラー版の float の累乗と同様に、オーバーフローは inf ではなく OverflowError にする
+    with np.errstate(over="raise"):
+        try:
+            return ufunc(a, b, out=out)
+        except FloatingPointError as e:
+            raise OverflowError(f"計算結果が大きすぎて表現できません。関数名: {function_name}") from e
+
+
+def add_array(a, b, out=None):
+    """
+    2つの数値の配列を要素ごとに加算します。
+
+    Args:
+        a: 1番目の数値の配列 (NumPy 配列, memoryview, array.array) またはスカラー。
+        b: 2番目の数値の配列またはスカラー。
+        out (Optional[numpy.ndarray]): 結果を書き込む配列。指定すると一時配列を作成しません。
+
+    Returns:
+        numpy.ndarray: 加算結果 (out を指定した場合は out)。
+
+    Raises:
+        TypeError: 引数の dtype が数値でない場合。
+        ImportError: NumPy がインストールされていない場合。
+    """
+    return _bulk("add_array", "add", a, b, out)
+
+
+def subtract_array(a, b, out=None):
+    """
+    1番目の配列から2番目の配列を要素ごとに減算します。
+
+    Args:
+        a: 被減数の配列 (NumPy 配列, memoryview, array.array) またはスカラー。
+        b: 減数の配列またはスカラー。
+        out (Optional[numpy.ndarray]): 結果を書き込む配列。指定すると一時配列を作成しません。
+
+    Returns:
+        numpy.ndarray: 減算結果 (out を指定した場合は out)。
+
+    Raises:
+        TypeError: 引数の dtype が数値でない場合。
+        ImportError: NumPy がインストールされていない場合。
+    """
+    return _bulk("subtract_array", "subtract", a, b, out)
+
+
+def multiply_array(a, b, out=None):
+    """
+    2つの数値の配列を要素ごとに乗算します。
+
+    Args:
+        a: 1番目の数値の配列 (NumPy 配列, memoryview, array.array) またはスカラー。
+        b: 2番目の数値の配列またはスカラー。
+        out (Optional[numpy.ndarray]): 結果を書き込む配列。指定すると一時配列を作成しません。
+
+    Returns:
+        numpy.ndarray: 乗算結果 (out を指定した場合は out)。
+
+    Raises:
+        TypeError: 引数の dtype が数値でない場合。
+        ImportError: NumPy がインストールされていない場合。
+    """
+    return _bulk("multiply_array", "multiply", a, b, out)
+
+
+def divide_array(a, b, out=None):
+    """
+    1番目の配列を2番目の配列で要素ごとに除算します。
+
+    Args:
+        a: 被除数の配列 (NumPy 配列, memoryview, array.array) またはスカラー。
+        b: 除数の配列またはスカラー。
+        out (Optional[numpy.ndarray]): 結果を書き込む配列。指定すると一時配列を作成しません。
+
+    Returns:
+        numpy.ndarray: 除算結果 (out を指定した場合は out)。
+
+    Raises:
+        TypeError: 引数の dtype が数値でない場合。
+        ZeroDivisionError: 除数に 0 が含まれる場合。
+        ImportError: NumPy がインストールされていない場合。
+    """
+    return _bulk("divide_array", "true_divide", a, b, out, check_zero_divisor=True)
+
+
+def power_array(a, b, out=None):
+    """
+    1番目の配列を2番目の配列で要素ごとに累乗します。
+
+    Args:
+        a: 底の配列 (NumPy 配列, memoryview, array.array) またはスカラー。
+        b: 指数の配列またはスカラー。
+        out (Optional[numpy.ndarray]): 結果を書き込む配列。指定すると一時配列を作成しません。
+
+    Returns:
+        numpy.ndarray: 累乗結果 (out を指定した場合は out)。
+
+    Raises:
+        TypeError: 引数の dtype が数値でない場合。
+        OverflowError: 浮動小数点数の結果が大きすぎて表現できない場合。
+        ImportError: NumPy がインストールされていない場合。
+    """
+    return _bulk("power_array", "power", a, b, out, check_overflow=True)
+
+
+def modulo_array(a, b, out=None):
+    """
+    1番目の配列を2番目の配列で割った余りを要素ごとに求めます。
+
+    Args:
+        a: 被除数の配列 (NumPy 配列, memoryview, array.array) またはスカラー。
+        b: 除数の配列またはスカラー。
+        out (Optional[numpy.ndarray]): 結果を書き込む配列。指定すると一時配列を作成しません。
+
+    Returns:
+        numpy.ndarray: 剰余 (out を指定した場合は out)。
+
+    Raises:
+        TypeError: 引数の dtype が数値でない場合。
+        ZeroDivisionError: 除数に 0 が含まれる場合。
+        ImportError: NumPy がインストールされていない場合。
+    """
+    return _bulk("modulo_array", "remainder", a, b, out, check_zero_divisor=True)
+
+
+# --- 演算結果のメモ化 ---
+# 言い回しの異なる発話 ("9の平方根"・"9のルート" など) も、正規化すると同じ (演算, a, b) になります。
+# 時間のかかる計算関数の結果を (演算, a, b) をキーに保持し、2回目以降は計算関数を呼び出さずに返します。
+# 件数が多くても (数千万件) メモリを抑えられるよう、タプルの辞書ではなく array の列 (演算の番号・a・b・結果)
+# による開番地法のハッシュ表にします (1件あたり 28 バイト)。表の大きさは固定で、探索の範囲 (_MEMO_PROBES) に
+# 空きがなければ既存の1件を上書きします。
+# 組み込みの演算は評価関数の中で Python の演算子のまま計算する (メモを引くより速い) ため、対象は
+# memoize を指定した演算プラグインの計算関数と、事前計算の表 (SmallIntegerTable) を読み込んだ演算です
+# (組み込みの演算も、表を読み込んだ場合は演算子の代わりに表を参照する計算関数の呼び出しにします)。
+# メモと事前計算の表は float モードの数値 (float) のみに使います。0 を含む計算は 0 と -0 を区別するため、
+# NaN を含む計算は一致しないため、常に計算関数で計算します。
+
+# 1つのキーで調べる (空きを探す) 位置の数
+_MEMO_PROBES = 8
+# 演算の番号の上限 (番号は振り直さない。使い切った後に現れた計算関数はメモしない)
+_MAX_OPERATION_IDS = 0xFFFFFFFF
+
+# 事前計算の表のファイルのヘッダー: マジック, バイト順 (1: リトルエンディアン), 被演算子の数, 記号のバイト数, 表の一辺
+_TABLE_MAGIC = b"ADKOPTB1"
+_TABLE_HEADER = struct.Struct("<8sBBHI")
+
+
+def _table_data_offset(symbol_size: int) -> int:
+    """事前計算の表のファイルで、結果の並びが始まる位置 (8 バイト境界) を返します。"""
+    return (_TABLE_HEADER.size + symbol_size + 7) // 8 * 8
+
+
+class SmallIntegerTable:
+    """
+    0〜size-1 の整数の被演算子の計算結果を事前計算した表。
+
+    ファイル (write_table で作成) をメモリマップで読み込むため、起動時には読み込まず、参照した部分だけが
+    ページキャッシュから読まれます (複数のワーカープロセスで同じ物理メモリを共有します)。
+    二項演算は size × size 件、単項演算は size 件の float64 を並べたもので、計算できなかった組み合わせは NaN です。
+    """
+
+    __slots__ = ("path", "symbol", "arity", "size", "values", "_mmap")
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): write_table で作成した表のファイル。
+
+        Raises:
+            ValueError: 表のファイルの形式が正しくない場合。
+        """
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, byteorder, arity, symbol_size, size = _TABLE_HEADER.unpack_from(self._mmap)
+            if magic != _TABLE_MAGIC:
+                raise ValueError(f"演算結果の表のファイルではありません: {path}")
+            if (byteorder == 1) != (sys.byteorder == "little"):
+                raise ValueError(f"演算結果の表のバイト順がこのマシンと異なります: {path}")
+            if arity not in (1, 2):
+                raise ValueError(f"演算結果の表の被演算子の数が正しくありません: {path}")
+            offset = _table_data_offset(symbol_size)
+            count = size ** arity
+            if len(self._mmap) != offset + count * 8:
+                raise ValueError(f"演算結果の表の大きさが正しくありません: {path}")
+        except (ValueError, struct.error):
+            self._mmap.close()
+            raise
+        self.path = path
+        self.symbol = bytes(self._mmap[_TABLE_HEADER.size:_TABLE_HEADER.size + symbol_size]).decode("utf-8")
+        self.arity = arity
+        self.size = size
+        # memoryview の添字の参照は、mmap から struct で読み出すより速い
+        self.values = memoryview(self._mmap)[offset:].cast("d")
+
+    def close(self) -> None:
+        """メモリマップを閉じます。"""
+        self.values.release()
+        self._mmap.close()
+
+
+def write_table(path: str, symbol: str, evaluator: Callable[..., Number], arity: int, size: int) -> int:
+    """
+    計算関数の 0〜size-1 の整数 (float) の被演算子の結果を事前計算し、SmallIntegerTable のファイルに書き込みます。
+
+    計算関数が例外を送出した組み合わせと、結果が float でない組み合わせは NaN (事前計算なし) にします。
+
+    Returns:
+        int: 事前計算できた件数。
+    """
+    symbol_bytes = symbol.encode("utf-8")
+    nan = float("nan")
+    values = array("d")
+    computed = 0
+    for a in range(size):
+        for b in range(size if arity == 2 else 1):
+            try:
+                result = evaluator(float(a), float(b)) if arity == 2 else evaluator(float(a))
+            except (ArithmeticError, ValueError, TypeError):
+                result = nan
+            if type(result) is not float:
+                result = nan
+            elif result == result:
+                computed += 1
+            values.append(result)
+    header = _TABLE_HEADER.pack(_TABLE_MAGIC, sys.byteorder == "little", arity, len(symbol_bytes), size)
+    with open(path, "wb") as f:
+        f.write(header + symbol_bytes)
+        f.write(bytes(_table_data_offset(len(symbol_bytes)) - len(header) - len(symbol_bytes)))
+        values.tofile(f)
+    return computed
+
+
+class OperationMemo:
+    """
+    (演算, a, b) -> 結果 のメモ (array による開番地法のハッシュ表) と、演算の記号ごとの事前計算の表。
+
+    参照はロックを取らずに行い、登録だけをロックの中で行います。登録の前後で版 (_version) を 1 ずつ進め
+    (登録中は奇数)、参照の前後で版が変わっていた場合は見つからなかったものとして扱うため、書き換え中の
+    項目から誤った結果を返すことはありません。
+
+    メモは (演算の記号, 計算関数) ごとの番号をキーにするため、プラグインを再読み込みして計算関数が
+    置き換わると別の項目になります。事前計算の表は記号だけで選ぶため、プラグインを置き換えた・削除した
+    場合は forget で表と置き換え前の計算関数のメモを破棄します。
+    """
+
+    __slots__ = (
+        "capacity", "tables", "entries", "hits", "misses", "table_hits",
+        "_mask", "_ops", "_a", "_b", "_results", "_lock", "_version", "_operation_ids", "_next_operation_id",
+    )
+
+    def __init__(self, capacity: int = 0, tables=()):
+        """
+        Args:
+            capacity (int): メモの件数の上限 (2 のべき乗に切り上げます。0 の場合はメモを使わない)。
+            tables: 読み込む事前計算の表 (SmallIntegerTable)。
+        """
+        capacity = 1 << (capacity - 1).bit_length() if capacity > 0 else 0
+        self.capacity = capacity
+        self._mask = capacity - 1
+        # 演算の番号 (0 は空き)・a・b・結果の列
+        self._ops = array("I", bytes(4 * capacity))
+        self._a = array("d", bytes(8 * capacity))
+        self._b = array("d", bytes(8 * capacity))
+        self._results = array("d", bytes(8 * capacity))
+        self._lock = threading.Lock()
+        self._version = 0
+        # (演算の記号, 計算関数) -> 演算の番号 (1 以上)。プラグインの計算関数を置き換えると新しい番号になる
+        self._operation_ids: Dict[Tuple[str, Callable], int] = {}
+        # 次に振る演算の番号 (forget で破棄した番号はメモに項目が残っていても再利用しない)
+        self._next_operation_id = 1
+        self.tables: Dict[str, SmallIntegerTable] = {table.symbol: table for table in tables}
+        # 件数とヒット数 (ヒット数はロックを取らずに数える概算)
+        self.entries = 0
+        self.hits = 0
+        self.misses = 0
+        self.table_hits = 0
+
+    def _operation_id(self, symbol: str, evaluator: Callable) -> Optional[int]:
+        """
+        (演算の記号, 計算関数) の演算の番号を返します (番号を使い切った場合は None)。
+
+        wrap で作成済みの関数は番号を保持し続けるため、番号は振り直しません (振り直すと、破棄した計算関数の
+        関数が同じ番号の別の計算関数の結果を返してしまう)。
+        """
+        with self._lock:
+            key = (symbol, evaluator)
+            operation_id = self._operation_ids.get(key)
+            if operation_id is None:
+                if self._next_operation_id > _MAX_OPERATION_IDS:
+                    return None
+                operation_id = self._operation_ids[key] = self._next_operation_id
+                self._next_operation_id += 1
+            return operation_id
+
+    def forget(self, symbol: str) -> None:
+        """
+        演算の記号の事前計算の表と、その記号のメモを破棄します。
+
+        プラグインを置き換えた (再読み込みした) 場合と削除した場合に呼び出します。事前計算の表は置き換え前の
+        計算関数で作成したものなので、置き換え後の計算関数には使いません。wrap で作成済みの関数は
+        置き換え前の表とメモを参照し続けるため、式の評価関数は作り直してください (ルーターが変更のあった記号の
+        評価関数を作り直します)。
+        """
+        with self._lock:
+            self.tables.pop(symbol, None)
+            forgotten = {self._operation_ids.pop(key) for key in list(self._operation_ids) if key[0] == symbol}
+            if not forgotten:
+                return
+            # 空きにした位置より後ろの同じ探索範囲の項目は見つからなくなるが、計算し直して登録し直すだけで誤りにはならない
+            self._version += 1
+            ops = self._ops
+            for index in range(self.capacity):
+                if ops[index] in forgotten:
+                    ops[index] = 0
+                    self.entries -= 1
+            self._version += 1
+
+    def get(self, operation_id: int, a: float, b: float) -> Optional[float]:
+        """メモから結果を返します (ない場合は None)。"""
+        version = self._version
+        if version & 1:
+            return None
+        ops, keys_a, keys_b, mask = self._ops, self._a, self._b, self._mask
+        index = (hash(a) * 1000003 ^ hash(b) ^ operation_id * 0x9E3779B1) & mask
+        for _ in range(_MEMO_PROBES):
+            found = ops[index]
+            if found == operation_id and keys_a[index] == a and keys_b[index] == b:
+                result = self._results[index]
+                return result if self._version == version else None
+            if not found:
+                return None
+            index = (index + 1) & mask
+        return None
+
+    def put(self, operation_id: int, a: float, b: float, result: float) -> None:
+        """メモに結果を登録します (探索の範囲に空きがない場合は既存の1件を上書きします)。"""
+        with self._lock:
+            ops, mask = self._ops, self._mask
+            start = (hash(a) * 1000003 ^ hash(b) ^ operation_id * 0x9E3779B1) & mask
+            index = start
+            for _ in range(_MEMO_PROBES):
+                found = ops[index]
+                if not found:
+                    self.entries += 1
+                    break
+                if found == operation_id and self._a[index] == a and self._b[index] == b:
+                    return
+                index = (index + 1) & mask
+            else:
+                # 空きがない場合は、探索の範囲のうちキーから決まる1件を上書きする
+                index = (start + (hash(b) & (_MEMO_PROBES - 1))) & mask
+            self._version += 1
+            ops[index] = operation_id
+            self._a[index] = a
+            self._b[index] = b
+            self._results[index] = result
+            self._version += 1
+
+    def wraps(self, symbol: str, arity: int, memoize: bool = False) -> bool:
+        """wrap が計算関数を事前計算の表かメモを参照する関数にするかどうかを返します。"""
+        table = self.tables.get(symbol)
+        return (table is not None and table.arity == arity) or (memoize and self.capacity > 0)
+
+    def wrap(self, symbol: str, evaluator: Callable[..., Number], arity: int, memoize: bool = False) -> Callable[..., Number]:
+        """
+        計算関数を、事前計算の表とメモを参照してから呼び出す関数にします。
+
+        演算の記号の事前計算の表がなく、memoize が False (またはメモが無効) の場合は evaluator をそのまま返します。
+
+        Args:
+            symbol (str): 演算の記号 (事前計算の表の選択とメモのキーに使う)。
+            evaluator: 計算関数。
+            arity (int): 被演算子の数 (1 または 2)。
+            memoize (bool): 計算結果をメモに登録するかどうか。
+        """
+        if not self.wraps(symbol, arity, memoize):
+            return evaluator
+        table = self.tables.get(symbol)
+        if table is not None and table.arity != arity:
+            table = None
+        memoize = memoize and self.capacity > 0
+        operation_id = self._operation_id(symbol, evaluator) if memoize else 0
+        if operation_id is None:
+            # 演算の番号を使い切った場合はメモせず、事前計算の表だけを参照する
+            if table is None:
+                return evaluator
+            memoize, operation_id = False, 0
+        # 表がない場合は size = 0 で表の範囲の判定が常に偽になる
+        values = None if table is None else table.values
+        size = 0.0 if table is None else float(table.size)
+        width = int(size)
+        get, put = self.get, self.put
+        memo = self
+
+        def memoized(a, b):
+            if type(a) is not float or type(b) is not float or not a or not b:
+                return evaluator(a, b)
+            if 0.0 < a < size and 0.0 < b < size and a.is_integer() and b.is_integer():
+                result = values[int(a) * width + int(b)]
+                if result == result:
+                    memo.table_hits += 1
+                    return result
+            if not memoize:
+                return evaluator(a, b)
+            result = get(operation_id, a, b)
+            if result is not None:
+                memo.hits += 1
+                return result
+            memo.misses += 1
+            result = evaluator(a, b)
+            # NaN はキーが一致しないため登録しない
+            if type(result) is float and a == a and b == b:
+                put(operation_id, a, b, result)
+            return result
+
+        def memoized_unary(a):
+            if type(a) is not float or not a:
+                return evaluator(a)
+            if 0.0 < a < size and a.is_integer():
+                result = values[int(a)]
+                if result == result:
+                    memo.table_hits += 1
+                    return result
+            if not memoize:
+                return evaluator(a)
+            result = get(operation_id, a, 0.0)
+            if result is not None:
+                memo.hits += 1
+                return result
+            memo.misses += 1
+            result = evaluator(a)
+            if type(result) is float and a == a:
+                put(operation_id, a, 0.0, result)
+            return result
+
+        return memoized_unary if arity == 1 else memoized
+
+    def stats(self) -> dict:
+        """メモの件数・上限・メモリ量 (バイト)・ヒット数、読み込んだ事前計算の表の記号を返します。"""
+        return {
+            "entries": self.entries,
+            "capacity": self.capacity,
+            "bytes": self.capacity * (self._ops.itemsize + 24),
+            "hits": self.hits,
+            "misses": self.misses,
+            "table_hits": self.table_hits,
+            "tables": sorted(self.tables),
+        }
+
+
+def create_operation_memo_from_env() -> OperationMemo:
+    """
+    環境変数の設定で OperationMemo を作成します。
+
+        ADK_OPERATION_MEMO_SIZE     メモの件数の上限 (デフォルト 65536。0 でメモを使わない)
+        ADK_OPERATION_TABLES        起動時にメモリマップで読み込む事前計算の表のファイル (カンマ区切り)
+    """
+    tables = [SmallIntegerTable(path.strip()) for path in os.getenv("ADK_OPERATION_TABLES", "").split(",") if path.strip()]
+    return OperationMemo(int(os.getenv("ADK_OPERATION_MEMO_SIZE", "65536")), tables)
+
+
+# プロセス共通の演算結果のメモ
+operation_memo = create_operation_memo_from_env()
+
+
+def main():
+    """事前計算の表のファイルを作成するコマンド (build-table 演算の記号 表の一辺 出力先)。"""
+    import argparse
+
+    # plugins.py はこのモジュールを読み込むため、コマンドの実行時に読み込む
+    from .plugins import plugin_registry
+
+    parser = argparse.ArgumentParser(description="演算結果の事前計算の表を作成します")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build-table", help="0〜SIZE-1 の整数の被演算子の計算結果の表を作成します")
+    build.add_argument("symbol", help="演算の記号 (ADK_PLUGINS で読み込んだプラグインの記号も指定できます)")
+    build.add_argument("size", type=int, help="表の一辺 (二項演算は SIZE × SIZE 件、単項演算は SIZE 件)")
+    build.add_argument("output", help="出力先のファイル (ADK_OPERATION_TABLES に指定します)")
+    args = parser.parse_args()
+
+    plugin = next((plugin for plugin in plugin_registry.plugins() if plugin.symbol == args.symbol), None)
+    if plugin is None or plugin.evaluator is None:
+        parser.error(f"演算の記号が見つかりません: {args.symbol}")
+    if args.size <= 0:
+        parser.error("表の一辺は 1 以上にしてください。")
+    computed = write_table(args.output, plugin.symbol, plugin.evaluator, plugin.arity, args.size)
+    print(f"{args.output}: {plugin.name} ({plugin.symbol}) の {args.size ** plugin.arity} 件中 {computed} 件を事前計算しました。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+段階的な応答パイプラインモジュール。
+
+入力はまず手元の段 (local: トークナイザーと算術式エンジンによるインテントハンドラー) で処理し、
+手元で確定できた入力 (計算できた、または 0 除算などの一意に決まる応答) はその場で応答します。
+確定できなかった入力 (数値や演算を認識できない、式を解釈できない) だけをモデルの段 (ModelTier) に回します。
+
+モデルの段は ModelTier を実装したオブジェクトで差し替えられます。
+    AgentModelTier  LLM のモデル設定を持つ ADK エージェント (calculator_agent/agent.py) に問い合わせる
+    StubModelTier   決まった応答を返す (テストやモデルを使わない環境向け)
+
+各段で処理した件数は adk_tier_requests_total (tier="local" / "model" / "unresolved") で数えます。
+"""
+
+import importlib
+import os
+from typing import Callable, Dict, Mapping, Optional
+
+from .handlers import HandlerResult
+from .metrics import TIER_REQUESTS, metrics
+from .router import IntentRouter
+
+# 段の名前 (adk_tier_requests_total のラベル)
+LOCAL_TIER = "local"
+MODEL_TIER = "model"
+UNRESOLVED_TIER = "unresolved"
+
+
+class ModelTier:
+    """
+    モデルの段のインターフェース。
+
+    サブクラスは answer を実装します。応答できない場合は None を返し、その場合は手元の段の
+    応答 (お詫びの応答) を返します。
+    """
+    name = "model"
+
+    def answer(self, text: str) -> Optional[str]:
+        """
+        手元の段で確定できなかった入力に応答します。
+
+        Args:
+            text (str): ユーザーからの入力テキスト (応答キャッシュのキーの正規化は行わず、入力のまま渡します)。
+
+        Returns:
+            Optional[str]: 応答テキスト (応答できない場合は None)。
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """終了時に呼び出されます (保存や接続の解放が必要な実装で上書きします)。"""
+
+
+class StubModelTier(ModelTier):
+    """決まった応答を返すモデルの段 (テストやモデルを使わない環境向け)。"""
+    name = "stub"
+
+    def __init__(self, responses: Optional[Mapping[str, str]] = None, default: Optional[str] = None):
+        """
+        Args:
+            responses (Optional[Mapping[str, str]]): 入力テキストごとの応答。
+            default (Optional[str]): responses にない入力への応答 (None の場合は手元の段の応答を返す)。
+        """
+        self.responses: Dict[str, str] = dict(responses or {})
+        self.default = default
+        self.calls = 0
+
+    def answer(self, text: str) -> Optional[str]:
+        self.calls += 1
+        return self.responses.get(text, self.default)
+
+
+class AgentModelTier(ModelTier):
+    """
+    LLM のモデル設定を持つ ADK エージェントに問い合わせるモデルの段。
+
+    エージェントは最初の問い合わせのときに agent_factory で作成します (起動を遅くしないため)。
+    """
+    name = "agent"
+
+    def __init__(self, agent_factory: Optional[Callable[[], object]] = None):
+        """
+        Args:
+            agent_factory (Optional[Callable[[], object]]): エージェントを作成する関数
+                (省略時は calculator_agent/agent.py の create_model_agent)。
+        """
+        self._agent_factory = agent_factory
+        self._agent = None
+
+    def _get_agent(self):
+        if self._agent is None:
+            factory = self._agent_factory
+            if factory is None:
+                from .agent import create_model_agent
+                factory = create_model_agent
+            self._agent = factory()
+        return self._agent
+
+    def answer(self, text: str) -> Optional[str]:
+        from adk.messages import Message
+
+        response = self._get_agent().handle_message(Message(text=text))
+        return None if response is None else response.text
+
+
+class TieredPipeline:
+    """手元の段で確定できた入力はその場で応答し、確定できなかった入力だけをモデルの段に回すパイプライン。"""
+
+    def __init__(self, router: IntentRouter, model_tier: Optional[ModelTier] = None):
+        """
+        Args:
+            router (IntentRouter): 手元の段のハンドラーを選択するルーター。
+            model_tier (Optional[ModelTier]): モデルの段 (None の場合は確定できなかった入力にも手元の段の応答を返す)。
+        """
+        self.router = router
+        self.model_tier = model_tier
+
+    def respond(self, text: str, handler=None) -> str:
+        """
+        入力に応答します。
+
+        Args:
+            text (str): ユーザーからの入力テキスト。
+            handler: ルーターで選択済みのハンドラー (省略時はここで選択する)。
+
+        Returns:
+            str: 応答テキスト。
+        """
+        return self.resolve(text, handler).text
+
+    def resolve(self, text: str, handler=None) -> HandlerResult:
+        """
+        入力に応答し、応答テキストと計算結果 (手元の段で計算できた場合) を返します。
+        モデルの段が応答した場合は、text をモデルの段の応答に置き換えた結果を返します (value は None)。
+
+        Args:
+            text (str): ユーザーからの入力テキスト。
+            handler: ルーターで選択済みのハンドラー (省略時はここで選択する)。
+
+        Returns:
+            HandlerResult: 処理結果。
+        """
+        if handler is None:
+            handler = self.router.handler_for(text)
+        result = handler.respond(text)
+        if result.resolved:
+            tier = LOCAL_TIER
+        else:
+            tier = UNRESOLVED_TIER
+            if self.model_tier is not None:
+                # モデルの段の失敗は手元の段の応答で代替する (例外は呼び出し元に伝えない)
+                try:
+                    model_response = self.model_tier.answer(text)
+                except Exception:
+                    model_response = None
+                if model_response is not None:
+                    result, tier = HandlerResult(model_response, False), MODEL_TIER
+        if metrics.enabled:
+            TIER_REQUESTS.inc(tier)
+        return result
+
+    def close(self) -> None:
+        """モデルの段の終了処理 (意味的キャッシュのスナップショットの保存など) を行います。"""
+        if self.model_tier is not None:
+            self.model_tier.close()
+
+
+def tier_counts() -> Dict[str, int]:
+    """段ごとの処理件数 (local / model / unresolved) を返します。"""
+    counts = TIER_REQUESTS.values()
+    return {tier: counts.get(tier, 0) for tier in (LOCAL_TIER, MODEL_TIER, UNRESOLVED_TIER)}
+
+
+def create_model_tier_from_env(router: Optional[IntentRouter] = None) -> Optional[ModelTier]:
+    """
+    環境変数 ADK_MODEL_TIER からモデルの段を作成します。
+    router を指定した場合は、モデルの段の前に意味的キャッシュ (ADK_SEMANTIC_CACHE_*) を置きます。
+
+        未設定 / "none"  モデルの段を使わない
+        "stub"           StubModelTier (ADK_MODEL_TIER_STUB_RESPONSE の応答を返す。未設定なら手元の段の応答)
+        "agent"          AgentModelTier (calculator_agent/agent.py の LLM のモデル設定)
+        "モジュール:名前"  ModelTier を返す関数またはクラスをインポートして呼び出す
+    """
+    spec = os.getenv("ADK_MODEL_TIER", "").strip()
+    if spec in ("", "none"):
+        return None
+    if spec == "stub":
+        model_tier = StubModelTier(default=os.getenv("ADK_MODEL_TIER_STUB_RESPONSE") or None)
+    elif spec == "agent":
+        model_tier = AgentModelTier()
+    else:
+        module_name, _, attribute = spec.partition(":")
+        if not attribute:
+            raise ValueError(f"ADK_MODEL_TIER は none / stub / agent / モジュール:名前 のいずれかを指定してください。(指定: {spec})")
+        model_tier = getattr(importlib.import_module(module_name), attribute)()
+    if router is None:
+        return model_tier
+    from .semantic_cache import wrap_with_semantic_cache_from_env
+    return wrap_with_semantic_cache_from_env(model_tier, router)
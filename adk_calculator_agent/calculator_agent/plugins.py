@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""
+演算プラグインのレジストリモジュール。
+
+演算 (足し算・引き算などの組み込みの演算と、後から追加する演算) は、キーワード・被演算子の数 (arity)・
+計算関数 (evaluator)・応答文の書式 (formatter) を OperationPlugin として1か所に登録します。
+インテントハンドラー (calculator_agent/handlers.py) とルーターの対応表は登録内容から作成し、
+実行中にプラグインを追加・削除した場合も、ルーター (create_intent_router で作成したもの) は
+変更のあったキーワードの分だけ対応表を更新します (プロセスの再起動は不要です)。
+
+起動時に読み込むプラグインのモジュールは環境変数 ADK_PLUGINS (カンマ区切り) で指定します。
+モジュールは PLUGINS (OperationPlugin または同じ項目を持つ辞書のリスト) を定義します。
+    PLUGINS = [
+        {"name": "SqrtIntent", "symbol": "√", "keywords": ("平方根", "ルート"), "arity": 1,
+         "evaluator": math.sqrt, "formatter": "{a} の平方根は {result} です。", "operation_label": "平方根の計算"},
+    ]
+"""
+
+import importlib
+import os
+import sys
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from .numeric import Number
+from .operations import add, divide, modulo, multiply, operation_memo, power, subtract
+from .rendering import renderer
+
+# (置き換えまたは削除されたプラグイン, 追加されたプラグイン) を受け取るリスナー
+PluginListener = Callable[[Optional["OperationPlugin"], Optional["OperationPlugin"]], None]
+
+
+class OperationPlugin(NamedTuple):
+    """
+    演算1つ分の定義。
+
+    Attributes:
+        name (str): インテント名 (例: "AddIntent")。プラグインの識別にも使います。
+        symbol (str): 式の表記で使う演算子の記号 (例: "+")。プラグインごとに異なる記号にします。
+        keywords (Tuple[str, ...]): 演算を示すキーワード。
+        infix_keywords (Tuple[str, ...]): keywords のうち、2つの数値の間に置ける (中置の) キーワード。
+        arity (int): 被演算子の数 (2: 二項演算、1: 単項演算。単項演算のキーワードは "9の平方根" のように被演算子の後に置く)。
+        evaluator (Optional[Callable[..., Number]]): 計算関数 (被演算子を引数に取り、結果を返す)。
+        exact_evaluator (Optional[Callable[..., Number]]): float 以外の数値モードで使う計算関数 (省略時は evaluator)。
+        formatter (Union[str, Callable[..., str]]): 単純な演算 (数値に対する1つの演算だけの式) の場合の応答文。
+            {a}, {b}, {result} を含む書式文字列、または (被演算子のリスト, 結果) を受け取って応答文を返す関数。
+        operation_label (str): 数値を認識できなかった場合の応答文で使う演算の名前。
+        precedence (int): 二項演算の優先順位 (足し算・引き算は 1、掛け算・割り算・剰余は 2、累乗は 4)。
+        right_assoc (bool): 右結合かどうか (累乗は True)。
+        python_operator (str): 評価関数の生成で evaluator の呼び出しの代わりに使う Python の演算子
+            (evaluator と同じ結果になる組み込みの演算のみ指定します)。
+        memoize (bool): float モードで evaluator の結果を (演算, a, b) ごとにメモするかどうか
+            (operations.py の OperationMemo。時間のかかる計算関数に指定します)。
+    """
+    name: str
+    symbol: str
+    keywords: Tuple[str, ...]
+    infix_keywords: Tuple[str, ...] = ()
+    arity: int = 2
+    evaluator: Optional[Callable[..., Number]] = None
+    exact_evaluator: Optional[Callable[..., Number]] = None
+    formatter: Union[str, Callable[..., str]] = ""
+    operation_label: str = ""
+    precedence: int = 2
+    right_assoc: bool = False
+    python_operator: str = ""
+    memoize: bool = False
+
+
+# 組み込みの演算 (登録順 = 優先順。"10を3で割ったあまり" を割り算より優先するため、剰余は割り算より先に登録する)
+ADD_PLUGIN = OperationPlugin(
+    "AddIntent", "+", ("たす", "足し算", "+", "足して", "たして"), ("たす", "+"),
+    evaluator=add, formatter="{a} たす {b} は {result} です。", operation_label="足し算",
+    precedence=1, python_operator="+",
+)
+SUBTRACT_PLUGIN = OperationPlugin(
+    "SubtractIntent", "-", ("ひく", "引き算", "-", "引いて", "ひいて"), ("ひく", "-"),
+    evaluator=subtract, formatter="{a} ひく {b} は {result} です。", operation_label="引き算",
+    precedence=1, python_operator="-",
+)
+MULTIPLY_PLUGIN = OperationPlugin(
+    "MultiplyIntent", "*", ("かける", "掛け算", "*", "×", "掛けて", "かけて"), ("かける", "*", "×"),
+    evaluator=multiply, formatter="{a} かける {b} は {result} です。", operation_label="掛け算",
+    python_operator="*",
+)
+MODULO_PLUGIN = OperationPlugin(
+    "ModuloIntent", "%", ("%", "あまり", "余り"), ("%",),
+    evaluator=modulo, formatter="{a} を {b} で割った余りは {result} です。", operation_label="余りの計算",
+    python_operator="%",
+)
+DIVIDE_PLUGIN = OperationPlugin(
+    "DivideIntent", "/", ("わる", "割る", "割り算", "/", "÷", "割って", "割った", "わって"), ("わる", "割る", "/", "÷"),
+    evaluator=divide, formatter="{a} わる {b} は {result} です。", operation_label="割り算",
+    python_operator="/",
+)
+POWER_PLUGIN = OperationPlugin(
+    "PowerIntent", "^", ("^", "**", "乗"), ("^", "**"),
+    evaluator=power, formatter="{a} の {b} 乗は {result} です。", operation_label="累乗",
+    precedence=4, right_assoc=True, python_operator="**",
+)
+BUILTIN_PLUGINS: Tuple[OperationPlugin, ...] = (
+    ADD_PLUGIN, SUBTRACT_PLUGIN, MULTIPLY_PLUGIN, MODULO_PLUGIN, DIVIDE_PLUGIN, POWER_PLUGIN,
+)
+
+# 演算子の記号として使えない文字 (括弧は式の括弧、波括弧は表示用の書式文字列で使う)
+_RESERVED_SYMBOL_CHARS = frozenset("(){}（）")
+
+
+def validate_plugin(plugin: OperationPlugin) -> OperationPlugin:
+    """
+    プラグインの定義を検証します。
+
+    Raises:
+        ValueError: 定義が正しくない場合。
+    """
+    if not plugin.name:
+        raise ValueError("プラグインの name を指定してください。")
+    if not plugin.symbol or _RESERVED_SYMBOL_CHARS.intersection(plugin.symbol):
+        raise ValueError(f"プラグイン {plugin.name} の symbol には括弧以外の1文字以上を指定してください。(指定: {plugin.symbol!r})")
+    if not plugin.keywords or not all(plugin.keywords):
+        raise ValueError(f"プラグイン {plugin.name} の keywords を指定してください。")
+    if not set(plugin.infix_keywords) <= set(plugin.keywords):
+        raise ValueError(f"プラグイン {plugin.name} の infix_keywords は keywords に含まれるものだけを指定してください。")
+    if plugin.arity not in (1, 2):
+        raise ValueError(f"プラグイン {plugin.name} の arity は 1 または 2 を指定してください。(指定: {plugin.arity})")
+    if plugin.arity == 1 and plugin.infix_keywords:
+        raise ValueError(f"単項演算のプラグイン {plugin.name} には infix_keywords を指定できません。")
+    if plugin.evaluator is None and not plugin.python_operator:
+        raise ValueError(f"プラグイン {plugin.name} の evaluator を指定してください。")
+    if type(plugin.formatter) is str:
+        try:
+            renderer.compile(plugin.formatter)
+        except (ValueError, SyntaxError) as e:
+            raise ValueError(f"プラグイン {plugin.name} の formatter の書式が正しくありません: {e}")
+    return plugin
+
+
+def _as_plugin(definition) -> OperationPlugin:
+    """OperationPlugin または同じ項目を持つ辞書を OperationPlugin に変換します。"""
+    if isinstance(definition, OperationPlugin):
+        return definition
+    if isinstance(definition, dict):
+        definition = dict(definition)
+        for key in ("keywords", "infix_keywords"):
+            if key in definition:
+                definition[key] = tuple(definition[key])
+        return OperationPlugin(**definition)
+    raise TypeError(f"プラグインには OperationPlugin または辞書を指定してください。(指定: {type(definition)})")
+
+
+class PluginRegistry:
+    """
+    演算プラグインのレジストリ。スレッドセーフです。
+
+    登録順が優先順位になります (同じキーワードを複数のプラグインが持つ場合や、"割ったあまり" のように
+    動詞が連続する場合は先に登録されたものが選ばれます)。同じ名前のプラグインを登録すると、
+    優先順位を保ったまま置き換えます。変更はリスナー (subscribe) に通知します。
+    """
+
+    def __init__(self, plugins=()):
+        """
+        Args:
+            plugins: 最初に登録するプラグイン (優先順)。
+        """
+        # 登録と変更の通知に使うロック (再入可能)。購読と同時に初期状態から何かを作る場合に使う
+        self.lock = threading.RLock()
+        self._plugins: Dict[str, OperationPlugin] = {}
+        # プラグインを読み込んだモジュール名から、そのモジュールが登録したプラグイン名への対応表
+        self._modules: Dict[str, Tuple[str, ...]] = {}
+        self._listeners: List[PluginListener] = []
+        self.version = 0
+        for plugin in plugins:
+            self.register(plugin)
+
+    def plugins(self) -> Tuple[OperationPlugin, ...]:
+        """登録済みのプラグインを優先順に返します。"""
+        with self.lock:
+            return tuple(self._plugins.values())
+
+    def get(self, name: str) -> Optional[OperationPlugin]:
+        """名前でプラグインを返します (登録されていない場合は None)。"""
+        return self._plugins.get(name)
+
+    def module_of(self, name: str) -> Optional[str]:
+        """プラグインを読み込んだモジュール名を返します (load 以外で登録した場合は None)。"""
+        with self.lock:
+            for module_name, names in self._modules.items():
+                if name in names:
+                    return module_name
+            return None
+
+    def subscribe(self, listener: PluginListener) -> Tuple[OperationPlugin, ...]:
+        """
+        変更の通知を受け取るリスナーを登録し、その時点の登録済みのプラグインを優先順に返します
+        (返したプラグインと通知の間で変更を取りこぼさないよう、同じロックの中で行います)。
+
+        リスナーは (置き換えまたは削除されたプラグイン, 追加されたプラグイン) を受け取ります。
+        追加の場合は (None, 追加), 削除の場合は (削除, None), 置き換えの場合は (置き換え前, 置き換え後) です。
+        """
+        with self.lock:
+            self._listeners.append(listener)
+            return tuple(self._plugins.values())
+
+    def unsubscribe(self, listener: PluginListener) -> None:
+        """リスナーの登録を解除します。"""
+        with self.lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _notify(self, old: Optional[OperationPlugin], new: Optional[OperationPlugin]) -> None:
+        self.version += 1
+        for listener in list(self._listeners):
+            listener(old, new)
+
+    def register(self, plugin) -> OperationPlugin:
+        """
+        プラグインを登録します (同じ名前のプラグインがあれば置き換えます)。
+
+        Args:
+            plugin: OperationPlugin または同じ項目を持つ辞書。
+
+        Returns:
+            OperationPlugin: 登録したプラグイン。
+
+        Raises:
+            ValueError: 定義が正しくない場合、または記号が他のプラグインと重複する場合。
+        """
+        plugin = validate_plugin(_as_plugin(plugin))
+        with self.lock:
+            for other in self._plugins.values():
+                if other.symbol == plugin.symbol and other.name != plugin.name:
+                    raise ValueError(f"記号 {plugin.symbol!r} はプラグイン {other.name} が使っています。")
+            old = self._plugins.get(plugin.name)
+            self._plugins[plugin.name] = plugin
+            self._notify(old, plugin)
+        return plugin
+
+    def unregister(self, name: str) -> OperationPlugin:
+        """
+        プラグインの登録を解除します。
+
+        Raises:
+            KeyError: プラグインが登録されていない場合。
+        """
+        with self.lock:
+            plugin = self._plugins.pop(name)
+            for module_name, names in self._modules.items():
+                if name in names:
+                    self._modules[module_name] = tuple(n for n in names if n != name)
+            self._notify(plugin, None)
+            return plugin
+
+    def load(self, module_name: str) -> List[str]:
+        """
+        モジュールの PLUGINS を登録します。読み込み済みのモジュールは再読み込みし (実行中にプラグインを更新する場合)、
+        前回そのモジュールが登録して今回の PLUGINS にないプラグインは登録を解除します。
+
+        Args:
+            module_name (str): モジュール名 (例: "my_plugins.sqrt")。
+
+        Returns:
+            List[str]: 登録したプラグインの名前。
+
+        Raises:
+            ImportError: モジュールをインポートできない場合。
+            ValueError, TypeError: PLUGINS の定義が正しくない場合 (この場合は何も登録しません)。
+        """
+        module = sys.modules.get(module_name)
+        module = importlib.import_module(module_name) if module is None else importlib.reload(module)
+        definitions = getattr(module, "PLUGINS", None)
+        if definitions is None:
+            raise ValueError(f"モジュール {module_name} に PLUGINS が定義されていません。")
+        # 登録の途中で失敗して一部だけが登録されないよう、先にすべて検証する
+        plugins = [validate_plugin(_as_plugin(definition)) for definition in definitions]
+        with self.lock:
+            for name in self._modules.get(module_name, ()):
+                if name in self._plugins and all(plugin.name != name for plugin in plugins):
+                    self.unregister(name)
+            for plugin in plugins:
+                self.register(plugin)
+            self._modules[module_name] = tuple(plugin.name for plugin in plugins)
+        return [plugin.name for plugin in plugins]
+
+
+def create_plugin_registry_from_env() -> PluginRegistry:
+    """組み込みの演算と、環境変数 ADK_PLUGINS (カンマ区切りのモジュール名) のプラグインを登録したレジストリを作成します。"""
+    registry = PluginRegistry(BUILTIN_PLUGINS)
+    for module_name in os.getenv("ADK_PLUGINS", "").split(","):
+        module_name = module_name.strip()
+        if module_name:
+            registry.load(module_name)
+    return registry
+
+
+# プロセス共通のプラグインレジストリ
+plugin_registry = create_plugin_registry_from_env()
+
+
+def _on_plugin_change(old: Optional[OperationPlugin], new: Optional[OperationPlugin]) -> None:
+    # 演算の記号の事前計算の表は置き換え前の計算関数で作成したものなので、プラグインを置き換えた
+    # (計算関数が変わった)・削除した場合は、表とメモを破棄する
+    if old is not None and (new is None or new.symbol != old.symbol or new.evaluator is not old.evaluator):
+        operation_memo.forget(old.symbol)
+
+
+plugin_registry.subscribe(_on_plugin_change)
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+サンプリングプロファイラーモジュール。
+
+リクエストのうち rate の割合 (例: 0.01 = 1%) を抽出して追跡し、別スレッドが interval 秒ごとに
+追跡中のスレッドのスタックを採取します。採取したスタックは、そのメッセージを処理したインテント
+(インテントハンドラーの intent_name) ごとに集計し、collapsed 形式 (flamegraph.pl などの入力) または
+speedscope 形式 (https://www.speedscope.app) で出力できます。
+
+無効 (rate = 0) の場合、リクエストごとの処理は `profiler.enabled` の確認のみです。
+設定は環境変数 ADK_PROFILE_RATE / ADK_PROFILE_INTERVAL、または実行中に configure() で変更します。
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+from threading import get_ident
+from typing import Dict, List, Optional, Tuple
+
+# スタックを採取する間隔 (秒) のデフォルト
+DEFAULT_INTERVAL = 0.005
+# 採取するスタックの深さの上限 (呼び出し元側を切り捨てる)
+DEFAULT_MAX_DEPTH = 64
+# インテントが判定される前に終わったリクエスト (共有キャッシュのヒットなど) のインテント名
+UNKNOWN_INTENT = "unknown"
+
+
+class ProfiledRequest:
+    """追跡中のリクエスト1件分。"""
+    __slots__ = ("thread_id", "intent", "samples")
+
+    def __init__(self, thread_id: int):
+        self.thread_id = thread_id
+        self.intent = UNKNOWN_INTENT
+        self.samples: List[Tuple[str, ...]] = []
+
+
+class SamplingProfiler:
+    """
+    リクエスト単位で抽出したスレッドのスタックを定期的に採取するプロファイラー。
+
+    使い方:
+        request = profiler.begin()          # 抽出されなかった場合は None
+        try:
+            ...                             # ハンドラーの中で profiler.set_intent(intent_name) を呼ぶ
+        finally:
+            profiler.end(request)
+    """
+
+    def __init__(self, rate: float = 0.0, interval: float = DEFAULT_INTERVAL, max_depth: int = DEFAULT_MAX_DEPTH):
+        """
+        Args:
+            rate (float): 追跡するリクエストの割合 (0〜1。0 で無効)。
+            interval (float): スタックを採取する間隔 (秒)。
+            max_depth (int): 採取するスタックの深さの上限。
+        """
+        self.rate = 0.0
+        self.enabled = False
+        self.interval = DEFAULT_INTERVAL
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        self._active: Dict[int, ProfiledRequest] = {}  # スレッド ID -> 追跡中のリクエスト
+        self._stacks: Dict[Tuple[str, Tuple[str, ...]], int] = {}  # (インテント, スタック) -> 採取数
+        self._requests = 0
+        self._frame_names: Dict[object, str] = {}  # コードオブジェクト -> フレーム名
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.configure(rate, interval, start=False)
+
+    # --- 設定 ---
+
+    def configure(self, rate: float, interval: Optional[float] = None, start: bool = True) -> None:
+        """
+        抽出率と採取間隔を変更します。rate > 0 かつ start=True の場合は採取スレッドを開始し、
+        rate = 0 の場合は停止します (集計済みのスタックは残ります)。
+
+        Raises:
+            ValueError: rate が 0〜1 の範囲外、または interval が正でない場合。
+        """
+        if not 0.0 <= rate <= 1.0:
+            raise ValueError(f"rate は 0〜1 の範囲で指定してください。(指定: {rate})")
+        if interval is not None:
+            if interval <= 0:
+                raise ValueError(f"interval は正の値を指定してください。(指定: {interval})")
+            self.interval = interval
+        self.rate = rate
+        self.enabled = rate > 0
+        if not self.enabled:
+            self.stop()
+        elif start:
+            self.start()
+
+    def start(self) -> None:
+        """有効な場合、採取スレッドを開始します (実行中の場合は何もしません)。"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="adk-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """採取スレッドを停止します。"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stop.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    # --- リクエストの追跡 ---
+
+    def begin(self) -> Optional[ProfiledRequest]:
+        """
+        rate の割合で現在のスレッドのリクエストを追跡対象にします。
+        抽出されなかった場合・すでに追跡中の場合は None を返します。
+        """
+        if not self.enabled or random.random() >= self.rate:
+            return None
+        thread_id = get_ident()
+        request = ProfiledRequest(thread_id)
+        with self._lock:
+            if thread_id in self._active:
+                return None
+            self._active[thread_id] = request
+        return request
+
+    def set_intent(self, intent_name: str) -> None:
+        """現在のスレッドで追跡中のリクエストに、処理したインテントを設定します。"""
+        request = self._active.get(get_ident())
+        if request is not None:
+            request.intent = intent_name
+
+    def end(self, request: Optional[ProfiledRequest]) -> None:
+        """リクエストの追跡を終了し、採取したスタックをインテントごとに集計します。"""
+        if request is None:
+            return
+        with self._lock:
+            self._active.pop(request.thread_id, None)
+            self._requests += 1
+            for stack in request.samples:
+                key = (request.intent, stack)
+                self._stacks[key] = self._stacks.get(key, 0) + 1
+
+    # --- 採取 ---
+
+    def _frame_name(self, code) -> str:
+        name = self._frame_names.get(code)
+        if name is None:
+            name = self._frame_names[code] = (
+                f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            )
+        return name
+
+    def _stack(self, frame) -> Tuple[str, ...]:
+        """フレームから呼び出し元へたどり、ルート側から並べたフレーム名のタプルを返します。"""
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            names.append(self._frame_name(frame.f_code))
+            frame = frame.f_back
+        names.reverse()
+        return tuple(names)
+
+    def _run(self) -> None:
+        stop = self._stop
+        while not stop.wait(self.interval):
+            if not self._active:
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, request in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        request.samples.append(self._stack(frame))
+            del frames
+
+    # --- 出力 ---
+
+    def stats(self) -> dict:
+        """設定と集計の状況を返します。"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "rate": self.rate,
+                "interval": self.interval,
+                "requests": self._requests,
+                "samples": sum(self._stacks.values()),
+                "stacks": len(self._stacks),
+            }
+
+    def reset(self) -> None:
+        """集計済みのスタックを破棄します。"""
+        with self._lock:
+            self._stacks.clear()
+            self._requests = 0
+
+    def _snapshot(self) -> List[Tuple[Tuple[str, Tuple[str, ...]], int]]:
+        with self._lock:
+            return sorted(self._stacks.items())
+
+    def collapsed(self) -> str:
+        """
+        collapsed 形式 ("インテント;フレーム;...;フレーム 採取数" を1行に1件) で出力します。
+        flamegraph.pl や speedscope で読み込めます。
+        """
+        return "".join(
+            f"{';'.join((intent,) + stack)} {count}\n" for (intent, stack), count in self._snapshot()
+        )
+
+    def speedscope(self) -> dict:
+        """speedscope 形式の辞書を返します (インテントごとに1つのプロファイル)。"""
+        frames: List[dict] = []
+        frame_index: Dict[str, int] = {}
+        profiles: Dict[str, dict] = {}
+        for (intent, stack), count in self._snapshot():
+            profile = profiles.get(intent)
+            if profile is None:
+                profile = profiles[intent] = {
+                    "type": "sampled", "name": intent, "unit": "none",
+                    "startValue": 0, "endValue": 0, "samples": [], "weights": [],
+                }
+            indexes = []
+            for name in stack:
+                index = frame_index.get(name)
+                if index is None:
+                    index = frame_index[name] = len(frames)
+                    frames.append({"name": name})
+                indexes.append(index)
+            profile["samples"].append(indexes)
+            profile["weights"].append(count)
+            profile["endValue"] += count
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": "adk_calculator_agent",
+            "exporter": "adk_calculator_agent.calculator_agent.profiler",
+            "shared": {"frames": frames},
+            "profiles": list(profiles.values()),
+        }
+
+    def save(self, directory: str) -> List[str]:
+        """
+        collapsed 形式と speedscope 形式のファイルを directory に保存し、そのパスのリストを返します。
+        ファイル名にはプロセス ID を含めます (複数のワーカーが同じディレクトリに保存できるように)。
+        """
+        os.makedirs(directory, exist_ok=True)
+        prefix = os.path.join(directory, f"profile-{os.getpid()}")
+        with open(f"{prefix}.collapsed.txt", "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+        with open(f"{prefix}.speedscope.json", "w", encoding="utf-8") as f:
+            json.dump(self.speedscope(), f, ensure_ascii=False)
+        return [f"{prefix}.collapsed.txt", f"{prefix}.speedscope.json"]
+
+
+profiler = SamplingProfiler(
+    rate=float(os.getenv("ADK_PROFILE_RATE", "0")),
+    interval=float(os.getenv("ADK_PROFILE_INTERVAL", str(DEFAULT_INTERVAL))),
+)
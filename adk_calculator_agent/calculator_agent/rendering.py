@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+応答文の作成 (レンダリング) モジュール。
+
+演算プラグインの応答文の書式 ("{a} たす {b} は {result} です。") は、ハンドラーの作成時に一度だけ
+固定の文字列の断片と数値を埋め込む位置に分解し、f-string の関数にコンパイルしておきます。
+リクエストごとの str.format (書式の解析とキーワード引数の辞書の作成) が不要になります。
+
+数値の表記は従来どおり str() (float は往復可能な最短の表記) です。ADK_RESPONSE_PRECISION で
+小数点以下の桁数を指定すると、float をその桁数に丸めて表示します (例: 0.1たす0.2 -> "0.3")。
+
+encode_response は /ask の応答の JSON を UTF-8 のバイト列として直接作成します
+(FastAPI のレスポンスモデルによる検証と再シリアライズを省くため)。
+"""
+
+import json
+import os
+import re
+import string
+from typing import Any, Callable, Optional
+
+# 応答文の書式で使える項目 (a: 1つ目の数値, b: 2つ目の数値 (単項演算では None), result: 計算結果)
+TEMPLATE_FIELDS = ("a", "b", "result")
+
+# 応答文の書式の関数: (a, b, result) -> 応答文
+RenderFunction = Callable[[Any, Any, Any], str]
+
+_FORMATTER = string.Formatter()
+# f-string のソースにそのまま埋め込めない文字 (引用符・バックスラッシュ・制御文字)
+_UNSAFE_SOURCE = re.compile(r'["\\\x00-\x1f\x7f]')
+# JSON の文字列でエスケープが必要な文字
+_JSON_ESCAPED = re.compile(r'["\\\x00-\x1f]')
+
+
+def _number_formatter(precision: Optional[int]) -> Callable[[Any], str]:
+    """数値を表示用の文字列にする関数を返します (precision が None の場合は str)。"""
+    if precision is None:
+        return str
+
+    limit = precision + 1
+
+    def format_number(value: Any) -> str:
+        if type(value) is float:
+            text = repr(value)
+            # 小数部が桁数以内の表記 (整数の float など、ほとんどの数値) は丸めても変わらない
+            if len(text) - text.find(".") <= limit and "e" not in text:
+                return text
+            # 丸めで -0.0 になった場合 (例: -1e-20) は 0.0 として表示する
+            return repr(round(value, precision) + 0.0)
+        return str(value)
+
+    return format_number
+
+
+def _source_literal(text: str) -> Optional[str]:
+    """固定の文字列を f-string のソースに埋め込める形にします (埋め込めない文字を含む場合は None)。"""
+    if _UNSAFE_SOURCE.search(text):
+        return None
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+class ResponseRenderer:
+    """応答文の書式のコンパイル、数値の表示、応答の JSON のエンコードを行います。"""
+
+    def __init__(self, precision: Optional[int] = None, raw_json: bool = True):
+        """
+        Args:
+            precision (Optional[int]): float を表示する小数点以下の桁数 (None の場合は丸めずに表示する)。
+            raw_json (bool): /ask の応答を encode_response で作成したバイト列で直接返すかどうか。
+        """
+        self.precision = precision
+        self.raw_json = raw_json
+        self.format_number = _number_formatter(precision)
+
+    def compile(self, template: str) -> RenderFunction:
+        """
+        応答文の書式を (a, b, result) から応答文を作成する関数にコンパイルします。
+
+        書式は str.format と同じ形式で、項目は TEMPLATE_FIELDS です。書式指定 ("{result:.2f}") や変換 ("{a!r}")
+        のない項目の数値は format_number で表示します。f-string にできない書式 (項目の属性・添字の参照など) は
+        従来どおり str.format で作成する関数になります (数値は format_number を通さずに渡します)。
+
+        Raises:
+            ValueError: 書式の構文が正しくない場合。
+        """
+        parts = []
+        namespace = {"_n": self.format_number}
+        for index, (literal, field, spec, conversion) in enumerate(_FORMATTER.parse(template)):
+            if literal:
+                source = _source_literal(literal)
+                if source is None:
+                    # 埋め込めない文字を含む断片は定数として参照する
+                    namespace[f"_l{index}"] = literal
+                    source = f"{{_l{index}}}"
+                parts.append(source)
+            if field is None:
+                continue
+            if field not in TEMPLATE_FIELDS or (spec and _source_literal(spec) != spec):
+                return lambda a, b, result: template.format(a=a, b=b, result=result)
+            if spec or conversion:
+                parts.append("{" + field + (f"!{conversion}" if conversion else "") + (f":{spec}" if spec else "") + "}")
+            elif self.precision is None:
+                parts.append("{" + field + "}")
+            else:
+                parts.append("{_n(" + field + ")}")
+        source = 'lambda a, b, result: f"' + "".join(parts) + '"'
+        return eval(compile(source, "<response template>", "eval"), namespace)
+
+    def encode_response(self, text: str) -> bytes:
+        """
+        /ask の応答 {"response": text} の JSON を UTF-8 のバイト列にします
+        (FastAPI の JSONResponse と同じバイト列になります)。
+        """
+        if _JSON_ESCAPED.search(text) is None:
+            # 応答文のほとんどはエスケープの必要がないため、json.dumps を使わずに組み立てる
+            return b'{"response":"' + text.encode("utf-8") + b'"}'
+        return b'{"response":' + json.dumps(text, ensure_ascii=False).encode("utf-8") + b"}"
+
+
+def create_renderer_from_env() -> ResponseRenderer:
+    """環境変数 ADK_RESPONSE_PRECISION / ADK_RESPONSE_RAW_JSON の設定でレンダラーを作成します。"""
+    precision = os.getenv("ADK_RESPONSE_PRECISION", "")
+    return ResponseRenderer(
+        precision=int(precision) if precision else None,
+        raw_json=os.getenv("ADK_RESPONSE_RAW_JSON", "1") != "0",
+    )
+
+
+# プロセス共通のレンダラー
+renderer = create_renderer_from_env()
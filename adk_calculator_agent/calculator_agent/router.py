@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+インテントルーターモジュール。
+各インテントハンドラーのキーワードをトークナイザーの1つの正規表現 (キーワードのトライ木) にまとめてコンパイルし、
+メッセージを1回の走査でインテントに振り分けます。
+走査は数値の抽出と同時に行い、その結果はハンドラーの処理 (算術式の評価) でも再利用されます。
+"""
+
+import threading
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from .expression import BUILTIN_SYMBOLS, ExpressionEngine, OperatorSpec
+from .plugins import OperationPlugin
+from .tokenizer import KEYWORD, Token, Tokenizer, TokenStream
+
+# トークン化結果を保持しておく発話の最大数 (ルーティングとハンドラー処理で同じ結果を共有するため)
+_TOKEN_MEMO_SIZE = 1024
+
+
+class RouteMatch(NamedTuple):
+    """ルーティング結果。intent_name が None の場合はどのキーワードにもマッチしなかったことを示します。"""
+    intent_name: Optional[str]
+    tokens: TokenStream
+
+    @property
+    def keywords(self) -> Tuple[Token, ...]:
+        """見つかったキーワードトークン (位置情報付き)。"""
+        return tuple(t for t in self.tokens.tokens if t.kind is KEYWORD)
+
+
+class IntentRouter:
+    """
+    キーワードベースのインテントルーター。
+
+    ハンドラーは `intent_name` と `keywords` を宣言するだけで登録できます。
+    さらに `operator` (演算子の記号) と `infix_keywords` (中置で使えるキーワード) を宣言すると、
+    そのキーワードが算術式エンジン (expressions) の演算子として使われます
+    (`plugin` (演算プラグイン) を持つハンドラーは、その記号の優先順位・計算関数も式エンジンに登録します)。
+    登録順が優先順位になり、複数のインテントのキーワードが含まれる場合は先に登録された方が選ばれます
+    (従来の can_handle を順に呼ぶ方式と同じ結果になります)。
+    キーワードを持たないハンドラーはフォールバックとして扱われます。
+
+    実行中のハンドラーの追加・削除 (update) は、変更のあったキーワードの分だけ対応表を更新し、
+    トークナイザーと式エンジンを作り直してから入れ替えます (処理中のリクエストは入れ替え前のものを使い終えます)。
+    """
+
+    def __init__(self, handlers: Iterable[object] = ()):
+        self._intent_order: Dict[str, int] = {}
+        # インテント名から、そのインテントのキーワード (小文字化したもの) と演算子の定義への対応表
+        self._intent_keywords: Dict[str, Tuple[str, ...]] = {}
+        self._intent_operators: Dict[str, Dict[str, OperatorSpec]] = {}
+        self._keyword_to_intent: Dict[str, str] = {}
+        self._handlers: Dict[str, object] = {}
+        self.fallback_handler: Optional[object] = None
+        self._operators: Dict[str, OperatorSpec] = {}
+        self._symbols: Dict[str, OperationPlugin] = dict(BUILTIN_SYMBOLS)
+        self._token_memo: Dict[str, TokenStream] = {}
+        self._update_lock = threading.Lock()
+        # 起動を速くするため、全ハンドラーを登録してから正規表現を1回だけコンパイルする
+        for handler in handlers:
+            self.register_handler(handler, compile=False)
+        self._compile()
+
+    def register(self, intent_name: str, keywords: Iterable[str], compile: bool = True) -> None:
+        """
+        インテントとそのキーワードを登録し、ルーティング用の正規表現を再コンパイルします。
+
+        Args:
+            intent_name (str): インテント名。
+            keywords (Iterable[str]): インテントを示すキーワード (大文字小文字は区別しません)。
+            compile (bool): False の場合は再コンパイルしません (複数登録する場合に最後に _compile を呼ぶ)。
+        """
+        self._intent_order.setdefault(intent_name, len(self._intent_order))
+        keywords = tuple(keyword.lower() for keyword in keywords)
+        self._intent_keywords[intent_name] = self._intent_keywords.get(intent_name, ()) + keywords
+        for keyword in keywords:
+            # 同じキーワードを複数のインテントが持つ場合は、先に登録された方を優先する
+            self._keyword_to_intent.setdefault(keyword, intent_name)
+        if compile:
+            self._compile()
+
+    def register_handler(self, handler: object, compile: bool = True) -> None:
+        """
+        `intent_name` と `keywords` 属性を持つハンドラーを登録します。
+        キーワードが空のハンドラーはフォールバックハンドラーになります。
+        compile が False の場合はルーティング用の正規表現を再コンパイルしません。
+        """
+        keywords = tuple(getattr(handler, "keywords", ()))
+        handler.router = self
+        if keywords:
+            symbol = getattr(handler, "operator", None)
+            if symbol is not None:
+                order = self._intent_order.setdefault(handler.intent_name, len(self._intent_order))
+                infix_keywords = set(getattr(handler, "infix_keywords", ()))
+                plugin = getattr(handler, "plugin", None)
+                arity = 2
+                if plugin is not None and plugin.symbol == symbol:
+                    self._symbols[symbol] = plugin
+                    arity = plugin.arity
+                operators = self._intent_operators.setdefault(handler.intent_name, {})
+                for keyword in keywords:
+                    spec = OperatorSpec(symbol, keyword in infix_keywords, order, arity)
+                    operators.setdefault(keyword.lower(), spec)
+                    self._operators.setdefault(keyword.lower(), spec)
+            self.register(handler.intent_name, keywords, compile)
+            self._handlers[handler.intent_name] = handler
+        else:
+            self.fallback_handler = handler
+
+    def _compile(self) -> None:
+        """登録済みの全キーワードを、数値の抽出と合わせて1つの正規表現にまとめてコンパイルし、式エンジンを作り直します。"""
+        self._tokenizer = self._create_tokenizer()
+        self.expressions = ExpressionEngine(self._operators, self._symbols)
+        self._token_memo = {}
+
+    def _create_tokenizer(self) -> Tokenizer:
+        # 中置でない演算のキーワード ("乗"・"足して"・"平方根" など) は被演算子の後に置くため、直後の符号は二項演算子
+        postfix_keywords = [keyword for keyword, spec in self._operators.items() if not spec.infix]
+        return Tokenizer(self._keyword_to_intent, self._intent_order, postfix_keywords)
+
+    def _owners(self, keywords: Iterable[str]) -> None:
+        """キーワードを持つインテントのうち、最も優先順位の高いものを対応表に設定し直します (持つものがなければ削除)。"""
+        ranked = sorted(self._intent_order.items(), key=lambda item: item[1])
+        for keyword in keywords:
+            intent_name = next((name for name, _ in ranked if keyword in self._intent_keywords.get(name, ())), None)
+            if intent_name is None:
+                self._keyword_to_intent.pop(keyword, None)
+            else:
+                self._keyword_to_intent[keyword] = intent_name
+            spec = next(
+                (self._intent_operators[name][keyword] for name, _ in ranked
+                 if keyword in self._intent_operators.get(name, {})),
+                None,
+            )
+            if spec is None:
+                self._operators.pop(keyword, None)
+            else:
+                self._operators[keyword] = spec
+
+    def update(self, removed: Iterable[str] = (), added: Iterable[object] = ()) -> None:
+        """
+        実行中にハンドラーを削除・追加します (プロセスを再起動せずに演算を入れ替えるために使います)。
+
+        変更のあったキーワードの対応表だけを更新し、トークナイザーは新しいキーワードで作り直します
+        (キーワードの正規表現は1つにまとめているため、再コンパイルは避けられません)。式エンジンは、
+        変更のあったキーワード・記号を含まない式の形のコンパイル結果を引き継ぎます。
+        削除したインテントと同じ名前のハンドラーを追加した場合は、元の優先順位のまま置き換えます。
+        追加したハンドラーは、それ以外の場合は最も低い優先順位になります。
+
+        Args:
+            removed (Iterable[str]): 削除するインテント名。
+            added (Iterable[object]): 追加するハンドラー。
+        """
+        added = list(added)
+        # 登録済みのインテントと同じ名前のハンドラーを追加する場合は置き換える
+        removed = set(removed) | {handler.intent_name for handler in added if handler.intent_name in self._handlers}
+        with self._update_lock:
+            old_operators, old_symbols = dict(self._operators), dict(self._symbols)
+            affected = set()
+            freed_orders: Dict[str, int] = {}
+            for intent_name in removed:
+                if intent_name not in self._handlers:
+                    continue
+                handler = self._handlers.pop(intent_name)
+                freed_orders[intent_name] = self._intent_order.pop(intent_name)
+                affected.update(self._intent_keywords.pop(intent_name, ()))
+                self._intent_operators.pop(intent_name, None)
+                plugin = getattr(handler, "plugin", None)
+                if plugin is not None and self._symbols.get(plugin.symbol) is plugin:
+                    # 組み込みの記号は組み込みの定義に戻す
+                    builtin = BUILTIN_SYMBOLS.get(plugin.symbol)
+                    if builtin is None:
+                        del self._symbols[plugin.symbol]
+                    else:
+                        self._symbols[plugin.symbol] = builtin
+            for handler in added:
+                if not getattr(handler, "keywords", ()):
+                    self.register_handler(handler, compile=False)
+                    continue
+                order = freed_orders.get(handler.intent_name)
+                if order is None:
+                    order = max(self._intent_order.values(), default=-1) + 1
+                self._intent_order[handler.intent_name] = order
+                self.register_handler(handler, compile=False)
+                affected.update(self._intent_keywords.get(handler.intent_name, ()))
+            # 登録済みのキーワードは register_handler では上書きされないため、優先順位の順に設定し直す
+            self._owners(affected)
+            changed_symbols = frozenset(
+                symbol for symbol in old_symbols.keys() | self._symbols.keys()
+                if old_symbols.get(symbol) is not self._symbols.get(symbol)
+            )
+            changed_keywords = frozenset(
+                keyword for keyword in old_operators.keys() | self._operators.keys()
+                if old_operators.get(keyword) != self._operators.get(keyword)
+                or self._operators[keyword].symbol in changed_symbols
+            )
+            tokenizer = self._create_tokenizer()
+            expressions = self.expressions.updated(self._operators, self._symbols, changed_keywords, changed_symbols)
+            # 作り終えてから入れ替える (トークン列は作成したトークナイザーの対応表でインテントを判定する)
+            self._tokenizer, self.expressions = tokenizer, expressions
+            self._token_memo = {}
+
+    def handlers(self) -> Tuple[object, ...]:
+        """登録済みのハンドラーを優先順に返します (フォールバックハンドラーは含みません)。"""
+        order = self._intent_order
+        return tuple(sorted(self._handlers.values(), key=lambda handler: order[handler.intent_name]))
+
+    @property
+    def tokenizer(self) -> Tokenizer:
+        """登録済みのキーワードでコンパイルされたトークナイザー。"""
+        return self._tokenizer
+
+    def tokenize(self, text: str) -> TokenStream:
+        """
+        テキストをトークン化します。
+
+        直近にトークン化したテキストの結果は保持しておき、ルーティングとハンドラーの処理で
+        同じ発話を再走査しないようにします (スレッドをまたいでも共有されます)。
+
+        Args:
+            text (str): トークン化するテキスト。
+
+        Returns:
+            TokenStream: トークン化の結果。
+        """
+        memo = self._token_memo
+        stream = memo.get(text)
+        if stream is None:
+            stream = self._tokenizer.tokenize(text)
+            if len(memo) >= _TOKEN_MEMO_SIZE:
+                memo.clear()
+            memo[text] = stream
+        return stream
+
+    def route(self, text: str) -> RouteMatch:
+        """
+        テキストを1回走査してインテントを判定します。
+
+        Args:
+            text (str): 判定するテキスト。
+
+        Returns:
+            RouteMatch: 判定されたインテント名とトークン列。
+        """
+        stream = self.tokenize(text)
+        return RouteMatch(self.intent_for(stream), stream)
+
+    def intent_for(self, stream: TokenStream) -> Optional[str]:
+        """トークン列に含まれるキーワードのうち、最も優先順位の高いインテント名を返します。"""
+        keywords = stream.keywords
+        if not keywords:
+            return None
+        # トークン列を作成した時点の対応表を使う (実行中にキーワードが変更されても一貫した結果になる)
+        keyword_rank = stream.tokenizer.keyword_rank
+        if len(keywords) == 1:
+            return keyword_rank[keywords[0]][1]
+        return min(keyword_rank[k] for k in keywords)[1]
+
+    def handler_for(self, text: str) -> Optional[object]:
+        """テキストを処理すべきハンドラーを返します。マッチしない場合はフォールバックハンドラーを返します。"""
+        intent_name = self.route(text).intent_name
+        if intent_name is None:
+            return self.fallback_handler
+        return self._handlers.get(intent_name, self.fallback_handler)
+
+
+class KeywordRoutingMixin:
+    """
+    IntentHandler と組み合わせて使うミックスイン。
+    クラス属性 `keywords` を宣言するだけで、can_handle が IntentRouter による判定になります。
+    `keywords` が空のハンドラーは、どのキーワードにもマッチしなかったメッセージを処理します。
+    """
+    keywords: Tuple[str, ...] = ()
+    router: Optional[IntentRouter] = None
+
+    def can_handle(self, message) -> bool:
+        """ルーターの判定結果がこのハンドラーのインテントと一致するかどうかを返します。"""
+        intent_name = self.router.route(message.text).intent_name
+        if intent_name is None:
+            return not self.keywords
+        return intent_name == self.intent_name
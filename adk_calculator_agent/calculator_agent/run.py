@@ -2,18 +2,58 @@
 """
 計算エージェントの実行スクリプト。
 コンソールチャネルを使用してエージェントを実行します。
+
+発話を引数で指定した場合は、エージェント (LLM のモデル設定を持つ root_agent) を作成せずに
+キーワードによる計算だけを行い、応答を1行ずつ出力して終了します。手元で確定できなかった発話は、
+環境変数 ADK_MODEL_TIER でモデルの段を設定した場合のみモデルに問い合わせます (TieredPipeline)。
+    python run.py "5たす3は？" "(2+3)*4"
 """
 
-from adk.channels import ConsoleChannel
-from .agent import root_agent
+import sys
+from typing import List, Optional
+
+
+def answer(utterances: List[str]) -> List[str]:
+    """
+    エージェントを作成せずに、共通のインテントハンドラーとルーターで発話に応答します。
+    手元で確定できなかった発話は、ADK_MODEL_TIER で設定したモデルの段に回します。
 
+    Args:
+        utterances (List[str]): ユーザーからの入力テキストのリスト。
 
-def main():
+    Returns:
+        List[str]: 入力と同じ順序の応答テキストのリスト。
+    """
+    from .handlers import create_intent_router
+    from .pipeline import TieredPipeline, create_model_tier_from_env
+
+    router = create_intent_router()
+    pipeline = TieredPipeline(router, create_model_tier_from_env(router))
+    try:
+        return [pipeline.respond(text) for text in utterances]
+    finally:
+        pipeline.close()
+
+
+def main(argv: Optional[List[str]] = None):
     """
     エージェントをコンソールチャネルで実行します。
     ユーザーはコンソールからテキストを入力し、エージェントが応答します。
     終了するには 'quit' と入力します。
+
+    Args:
+        argv (Optional[List[str]]): コマンドライン引数 (省略時は sys.argv[1:])。発話を指定した場合はそれらに応答して終了します。
     """
+    utterances = sys.argv[1:] if argv is None else argv
+    if utterances:
+        for response in answer(utterances):
+            print(response)
+        return
+
+    # エージェントとコンソールチャネルは、対話モードで実行する場合にのみ作成する
+    from adk.channels import ConsoleChannel
+    from .agent import root_agent
+
     channel = ConsoleChannel()
     print("計算エージェントを開始します。「5たす3は？」のように話しかけてください。終了するには 'quit' と入力してください。")
     root_agent.run(channel)
@@ -21,4 +61,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
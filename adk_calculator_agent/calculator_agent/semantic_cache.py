@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+"""
+モデルの段の応答の意味的キャッシュモジュール。
+
+手元で確定できずにモデルの段に回る発話のうち、言い換え (例: "5と3を足すと？" と "5 と 3 を足すといくつ") には
+モデルに問い合わせずにキャッシュから応答します。
+
+発話は数値をスロットに、演算キーワードをインテント名に置き換えたテンプレートにしてから、文字 n-gram の
+特徴ハッシュ (ネットワークを使わないローカルの埋め込み) でベクトル化し、転置インデックスで
+コサイン類似度が閾値以上の最も近いテンプレートを探します。
+
+キャッシュが誤った数値を返さないよう、数値は次のように扱います。
+    * 発話のテンプレート (数値以外の部分。演算を表す語を含む) と数値がキャッシュした発話と同じ場合は、
+      応答をそのまま返します。数値が同じでもテンプレートが異なる場合 ("5と3の差は？" と "5と3の和は？") は、
+      別の計算の応答を返さないよう、キャッシュにないものとして扱います。
+    * 数値が異なる場合は、応答に含まれる数値がキャッシュした発話の数値 (被演算子) と1つずつ対応する
+      (どの数値も被演算子のいずれかと一致し、どの被演算子もちょうど1回だけ現れる) ときだけ、新しい発話の
+      数値に置き換えて返します。計算結果など被演算子以外の数値を含む応答は、数値が同じ発話にしか使いません
+      (計算結果がたまたま被演算子と同じ値の応答 ("5と0を足すと" への "答えは 5 です") も置き換えません)。
+"""
+
+import json
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from math import sqrt
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from .metrics import metrics
+from .pipeline import ModelTier
+from .tokenizer import KEYWORD, NUMBER
+
+# 埋め込みの次元数 (特徴ハッシュのバケット数)
+DEFAULT_DIMENSIONS = 4096
+# 埋め込みに使う文字 n-gram の長さ
+DEFAULT_NGRAM_SIZES = (1, 2, 3)
+# キャッシュから応答するコサイン類似度の閾値
+DEFAULT_THRESHOLD = 0.9
+# キャッシュの最大件数
+DEFAULT_MAX_ENTRIES = 1024
+
+# テンプレート中の数値のスロット
+_NUMBER_MARK = "#"
+# テンプレートから除く句読点・疑問符 (発話の意味を変えない記号)
+_PUNCTUATION = str.maketrans("", "", "？?！!。、,，．")
+# 応答に含まれる数値
+_RESPONSE_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+SEMANTIC_CACHE_LOOKUPS = metrics.counter(
+    "adk_semantic_cache_lookups_total", "モデルの段の意味的キャッシュの参照件数 (result: hit / miss)", "result"
+)
+
+
+class HashingEmbedder:
+    """
+    文字 n-gram の特徴ハッシュによる埋め込み。
+
+    ハッシュには CRC32 を使うため、プロセスをまたいでも同じテキストは同じベクトルになります
+    (スナップショットにはベクトルを保存せず、読み込み時に計算し直します)。
+    ベクトルは {次元: 値} の疎な辞書で、L2 ノルムが 1 になるように正規化します。
+    """
+
+    def __init__(self, dimensions: int = DEFAULT_DIMENSIONS, ngram_sizes: Tuple[int, ...] = DEFAULT_NGRAM_SIZES):
+        self.dimensions = dimensions
+        self.ngram_sizes = ngram_sizes
+
+    def embed(self, text: str) -> Dict[int, float]:
+        """テキストを正規化した疎ベクトルに変換します。"""
+        counts: Dict[int, float] = {}
+        dimensions = self.dimensions
+        for size in self.ngram_sizes:
+            for i in range(len(text) - size + 1):
+                bucket = zlib.crc32(text[i:i + size].encode("utf-8")) % dimensions
+                counts[bucket] = counts.get(bucket, 0.0) + 1.0
+        norm = sqrt(sum(v * v for v in counts.values()))
+        return {k: v / norm for k, v in counts.items()} if norm else {}
+
+
+class _Entry(NamedTuple):
+    """キャッシュ1件分。"""
+    template: str
+    operands: Tuple[str, ...]
+    response: str
+    vector: Dict[int, float]
+    # 応答中の数値を被演算子に置き換えた応答のテンプレート (置き換えられない応答は None)
+    response_slots: Optional[Tuple[Tuple[int, int, int, bool], ...]]
+
+
+class SemanticCacheStats(NamedTuple):
+    """意味的キャッシュの統計情報。"""
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+
+
+def _same_number(a: str, b: str) -> bool:
+    try:
+        return float(a) == float(b)
+    except ValueError:
+        return False
+
+
+def _response_slots(response: str, operands: Tuple[str, ...]) -> Optional[Tuple[Tuple[int, int, int, bool], ...]]:
+    """
+    応答中の数値と被演算子が1つずつ対応する場合、(開始位置, 終了位置, 被演算子の位置, 小数表記か) のタプルを返します。
+    対応しない数値 (計算結果など) を含む場合、同じ被演算子が2回以上現れる場合・現れない被演算子がある場合
+    (被演算子と同じ値の計算結果を含む可能性がある)、同じ値の被演算子がある場合は None を返します。
+    """
+    if len(set(float(o) for o in operands)) != len(operands):
+        return None
+    slots = []
+    for m in _RESPONSE_NUMBER.finditer(response):
+        literal = m.group()
+        index = next((i for i, o in enumerate(operands) if _same_number(literal, o)), None)
+        if index is None:
+            return None
+        slots.append((m.start(), m.end(), index, "." in literal))
+    if sorted(index for _, _, index, _ in slots) != list(range(len(operands))):
+        return None
+    return tuple(slots)
+
+
+def _format_operand(operand: str, decimal: bool) -> str:
+    """被演算子を、置き換え前の応答の数値と同じ表記 (整数 / 小数) で文字列にします。"""
+    value = float(operand)
+    if decimal:
+        return str(value)
+    return str(int(value)) if value.is_integer() else str(value)
+
+
+class SemanticCache:
+    """
+    モデルの段の応答を、発話のテンプレートの類似度で検索するキャッシュ (LRU で追い出し)。
+    スレッドセーフです。
+    """
+
+    def __init__(
+        self,
+        router,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        threshold: float = DEFAULT_THRESHOLD,
+        embedder: Optional[HashingEmbedder] = None,
+    ):
+        """
+        Args:
+            router (IntentRouter): 発話のテンプレートを作るためのトークナイザーを持つルーター。
+            max_entries (int): 最大件数。
+            threshold (float): キャッシュから応答するコサイン類似度の閾値 (0〜1)。
+            embedder (Optional[HashingEmbedder]): 埋め込み (省略時は HashingEmbedder())。
+        """
+        self.router = router
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.embedder = embedder or HashingEmbedder()
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._by_key: Dict[Tuple[str, Tuple[str, ...]], int] = {}
+        self._postings: Dict[int, Dict[int, float]] = {}  # 次元 -> {エントリー ID: 値}
+        self._next_id = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def template(self, text: str) -> Tuple[str, Tuple[str, ...]]:
+        """
+        発話を (テンプレート, 数値のタプル) に分解します。
+        テンプレートは数値をスロットに、演算キーワードをインテント名に置き換え、空白と句読点・疑問符を除いて
+        小文字にしたものです。
+        """
+        parts = []
+        operands = []
+        position = 0
+        for token in self.router.tokenizer.iter_tokens(text):
+            parts.append(text[position:token.start])
+            if token.kind == NUMBER:
+                parts.append(_NUMBER_MARK)
+                operands.append(token.text)
+            elif token.kind == KEYWORD:
+                parts.append(f"<{token.intent_name}>")
+            else:
+                parts.append(token.text)
+            position = token.end
+        parts.append(text[position:])
+        template = "".join("".join(parts).split()).translate(_PUNCTUATION).lower()
+        return template, tuple(operands)
+
+    def _nearest(self, vector: Dict[int, float], operand_count: int) -> Tuple[Optional[int], float]:
+        """ロックを取得済みの状態で、被演算子の数が同じエントリーのうち最も類似度が高いものを探します。"""
+        scores: Dict[int, float] = {}
+        postings = self._postings
+        for dimension, value in vector.items():
+            for entry_id, entry_value in postings.get(dimension, {}).items():
+                scores[entry_id] = scores.get(entry_id, 0.0) + value * entry_value
+        best_id, best_score = None, 0.0
+        entries = self._entries
+        for entry_id, score in scores.items():
+            if score > best_score and len(entries[entry_id].operands) == operand_count:
+                best_id, best_score = entry_id, score
+        return best_id, best_score
+
+    def get(self, text: str) -> Optional[str]:
+        """
+        発話に対するキャッシュ済みの応答を返します (ない場合・数値を安全に置き換えられない場合は None)。
+        """
+        template, operands = self.template(text)
+        vector = self.embedder.embed(template)
+        with self._lock:
+            entry_id = self._by_key.get((template, operands))
+            if entry_id is None:
+                entry_id, score = self._nearest(vector, len(operands))
+                if score < self.threshold:
+                    entry_id = None
+            response = None
+            if entry_id is not None:
+                entry = self._entries[entry_id]
+                response = self._rebind(entry, template, operands)
+                if response is not None:
+                    self._entries.move_to_end(entry_id)
+            if response is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        if metrics.enabled:
+            SEMANTIC_CACHE_LOOKUPS.inc("miss" if response is None else "hit")
+        return response
+
+    @staticmethod
+    def _rebind(entry: _Entry, template: str, operands: Tuple[str, ...]) -> Optional[str]:
+        """キャッシュした応答の数値を発話の数値に置き換えます (安全に置き換えられない場合は None)。"""
+        if len(operands) == len(entry.operands) and all(map(_same_number, operands, entry.operands)):
+            # 数値が同じでも、テンプレートが異なる発話 (別の演算) には応答をそのまま使わない
+            return entry.response if template == entry.template else None
+        if entry.response_slots is None:
+            return None
+        parts = []
+        position = 0
+        for start, end, index, decimal in entry.response_slots:
+            parts.append(entry.response[position:start])
+            parts.append(_format_operand(operands[index], decimal))
+            position = end
+        parts.append(entry.response[position:])
+        return "".join(parts)
+
+    def set(self, text: str, response: str) -> None:
+        """発話とモデルの段の応答を登録します。"""
+        template, operands = self.template(text)
+        self._add(template, operands, response)
+
+    def _add(self, template: str, operands: Tuple[str, ...], response: str) -> None:
+        if self.max_entries <= 0:
+            return
+        vector = self.embedder.embed(template)
+        entry = _Entry(template, operands, response, vector, _response_slots(response, operands))
+        with self._lock:
+            key = (template, operands)
+            if key in self._by_key:
+                self._remove(self._by_key[key])
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._by_key[key] = entry_id
+            for dimension, value in vector.items():
+                self._postings.setdefault(dimension, {})[entry_id] = value
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def _remove(self, entry_id: int) -> None:
+        """ロックを取得済みの状態でエントリーを削除します。"""
+        entry = self._entries.pop(entry_id)
+        del self._by_key[(entry.template, entry.operands)]
+        for dimension in entry.vector:
+            posting = self._postings[dimension]
+            del posting[entry_id]
+            if not posting:
+                del self._postings[dimension]
+
+    def stats(self) -> SemanticCacheStats:
+        """統計情報を返します。"""
+        with self._lock:
+            return SemanticCacheStats(self._hits, self._misses, self._evictions, len(self._entries))
+
+    def save(self, path: str) -> None:
+        """
+        キャッシュの内容をスナップショットとして JSON に保存します (古いものから順に。ベクトルは保存しません)。
+        書き込み中に停止しても既存のスナップショットが壊れないよう、一時ファイルに書いてから置き換えます。
+        """
+        with self._lock:
+            items = [
+                {"template": e.template, "operands": list(e.operands), "response": e.response}
+                for e in self._entries.values()
+            ]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "entries": items}, f, ensure_ascii=False)
+        os.replace(temporary, path)
+
+    def load(self, path: str) -> int:
+        """スナップショットを読み込み、読み込んだ件数を返します (ファイルがない場合は 0)。"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return 0
+        items = snapshot.get("entries", [])
+        for item in items:
+            self._add(item["template"], tuple(item["operands"]), item["response"])
+        return len(items)
+
+
+class SemanticCacheModelTier(ModelTier):
+    """モデルの段の前に意味的キャッシュを置くモデルの段。キャッシュにない発話だけをモデルの段に問い合わせます。"""
+
+    def __init__(self, model_tier: ModelTier, cache: SemanticCache, snapshot_path: Optional[str] = None):
+        """
+        Args:
+            model_tier (ModelTier): キャッシュにない発話を問い合わせるモデルの段。
+            cache (SemanticCache): 意味的キャッシュ。
+            snapshot_path (Optional[str]): スナップショットのパス。指定した場合は作成時に読み込み、close で保存します。
+        """
+        self.model_tier = model_tier
+        self.cache = cache
+        self.snapshot_path = snapshot_path
+        self.name = f"semantic_cache+{model_tier.name}"
+        if snapshot_path:
+            cache.load(snapshot_path)
+
+    def answer(self, text: str) -> Optional[str]:
+        response = self.cache.get(text)
+        if response is not None:
+            return response
+        response = self.model_tier.answer(text)
+        if response is not None:
+            self.cache.set(text, response)
+        return response
+
+    def close(self) -> None:
+        if self.snapshot_path:
+            self.cache.save(self.snapshot_path)
+        self.model_tier.close()
+
+
+def wrap_with_semantic_cache_from_env(model_tier: ModelTier, router) -> ModelTier:
+    """
+    環境変数 ADK_SEMANTIC_CACHE_* の設定で、モデルの段の前に意味的キャッシュを置きます
+    (ADK_SEMANTIC_CACHE_SIZE=0 の場合は model_tier をそのまま返します)。
+    """
+    max_entries = int(os.getenv("ADK_SEMANTIC_CACHE_SIZE", str(DEFAULT_MAX_ENTRIES)))
+    if max_entries <= 0:
+        return model_tier
+    threshold = float(os.getenv("ADK_SEMANTIC_CACHE_THRESHOLD", str(DEFAULT_THRESHOLD)))
+    cache = SemanticCache(router, max_entries=max_entries, threshold=threshold)
+    return SemanticCacheModelTier(model_tier, cache, os.getenv("ADK_SEMANTIC_CACHE_SNAPSHOT") or None)
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+トークナイザーモジュール。
+ユーザーの発話を1回の走査で数値トークンと演算キーワードトークンの列に分解します。
+全角数字 (例: "５") や漢数字 (例: "三", "二十五") も数値として扱います。
+漢数字は、前後に語を作る漢字が続く場合 (例: "一体", "一緒", "一番", "十分", "統一") は語の一部として数値に
+しません (演算キーワードの漢字 ("乗", "割る" など) と助数詞 ("個", "円" など) が隣り合う場合は数値として扱います)。
+"""
+
+import re
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+# トークンの種類
+NUMBER = "NUMBER"
+KEYWORD = "KEYWORD"
+PAREN = "PAREN"
+
+# TokenStream.layout で数値の位置を表す値
+NUMBER_SLOT = ""
+
+# 全角の数字・記号を半角に変換するテーブル
+_WIDTH_TABLE = str.maketrans(
+    "０１２３４５６７８９．＋－＊／（）−",
+    "0123456789.+-*/()-",
+)
+# 半角の記号を全角に変換するテーブル (記号のキーワードの全角表記も受け付けるために使用)
+_FULL_WIDTH_TABLE = str.maketrans("+-*/()", "＋－＊／（）")
+
+_KANJI_DIGITS = {
+    "〇": 0, "零": 0, "一": 1, "二": 2, "三": 3, "四": 4,
+    "五": 5, "六": 6, "七": 7, "八": 8, "九": 9,
+}
+_KANJI_UNITS = {"十": 10, "百": 100, "千": 1000}
+_KANJI_LARGE_UNITS = {"万": 10000}
+
+# 全角数字はパターンで直接受け付け、マッチした部分だけを半角に変換する (発話全体は変換しない)。
+# 数値・閉じ括弧 (と1つの空白) の直後の符号は単項の符号ではなく二項演算子なので、数値には含めない
+# (例: "10-3" や "10 -3" は 10, "-", 3、"(2+3)-1" は ..., ")", "-", 1 になり、"5と-3" は 5, -3 になる)。
+_SIGN_CHARS = "-+＋－−"
+_NUMBER_BODY = r"(?:[0-9０-９]*[.．][0-9０-９]+|[0-9０-９]+)"
+_SIGN_PRECEDED_BY = "[0-9０-９)）]"
+_NUMBER_FIRST_CHARS = _SIGN_CHARS + ".．0123456789０１２３４５６７８９"
+_KANJI_CHARS = "".join(_KANJI_DIGITS) + "".join(_KANJI_UNITS) + "".join(_KANJI_LARGE_UNITS)
+# 漢数字の直後に続いても数値として扱う助数詞
+_KANJI_COUNTERS = "個円本枚回倍件台匹歳冊杯点"
+# 語を作る漢字 (CJK 統合漢字と "々")
+_WORD_KANJI = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff々"
+_PAREN_CHARS = "()（）"
+_PAREN_SOURCE = "(?P<paren>[()（）])"
+
+
+def _number_source(postfix_keywords: Iterable[str]) -> str:
+    """
+    数値のパターンを返します。
+
+    符号は、数値・閉じ括弧 (と1つの空白) と後置のキーワード (例: "2の3乗-1" の "乗") の直後では二項演算子なので
+    数値に含めません。後置のキーワードの後に空白がある場合 (例: "足し算 -5 と 3") は単項の符号として数値に含めます。
+    """
+    lookbehinds = "".join(f"(?<!{re.escape(keyword)})" for keyword in sorted(set(postfix_keywords)))
+    return (
+        f"(?P<num>(?:(?=[{_SIGN_CHARS}])(?<!{_SIGN_PRECEDED_BY})(?<!{_SIGN_PRECEDED_BY}\\s){lookbehinds}[{_SIGN_CHARS}])?"
+        f"{_NUMBER_BODY})"
+    )
+
+
+def _kanji_source(keyword_pattern: str, keywords: Iterable[str]) -> str:
+    """
+    漢数字のパターンを返します。漢数字は前後が語の一部でない場合だけ数値にします。
+
+    * 漢数字の並びは最長のものだけを数値とし、途中から数値にしません。
+    * 直前に語を作る漢字がある場合 (例: "統一") は、その漢字が演算キーワードの末尾 (例: "足し算五" の "算") で
+      ない限り数値にしません。
+    * 直後に語を作る漢字が続く場合 (例: "一体", "一緒", "一番") は、その漢字が演算キーワードの先頭
+      (例: "二乗" の "乗") か助数詞でない限り数値にしません。
+    """
+    keyword_ends = "".join(sorted({keyword[-1] for keyword in keywords if re.match(f"[{_WORD_KANJI}]", keyword[-1])}))
+    before = f"(?<!(?=[{_WORD_KANJI}])[^{re.escape(keyword_ends)}])" if keyword_ends else f"(?<![{_WORD_KANJI}])"
+    allowed = f"[{_KANJI_COUNTERS}]"
+    if keyword_pattern:
+        allowed = f"(?:{allowed}|{keyword_pattern})"
+    return (
+        "(?P<kanji>" + before + "[" + _KANJI_CHARS + "]+"
+        "(?![" + _KANJI_CHARS + "])"
+        "(?!(?!" + allowed + ")[" + _WORD_KANJI + "]))"
+    )
+
+
+def build_keyword_pattern(words: Iterable[str]) -> str:
+    """
+    キーワード群を共通接頭辞でまとめたトライ木形式の正規表現に変換します。
+    単純な `a|b|c` の選択よりも分岐が少なく、最長一致のキーワードが選ばれます。
+    """
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def walk(node: Dict[str, dict]) -> str:
+        is_end = "" in node
+        branches = [re.escape(ch) + walk(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if is_end:
+            # ここで終わるキーワードもあるため、続きは省略可能 (貪欲なので長い方が優先される)
+            return "(?:" + body + ")?" if len(branches) == 1 else body + "?"
+        return body
+
+    return walk(trie)
+
+
+class Token(NamedTuple):
+    """
+    位置情報付きのトークン1件分の情報。
+
+    NUMBER トークンの text は半角に正規化した数値リテラル ("5", "-2.5" など)、
+    KEYWORD トークンの text は正規化したキーワード、intent_name はそのキーワードが属するインテント名、
+    PAREN トークンの text は半角の括弧です。
+    start / end は元の発話中の位置を表します。
+    """
+    kind: str
+    text: str
+    start: int
+    end: int
+    intent_name: str = ""
+
+
+def parse_kanji_number(text: str) -> int:
+    """
+    漢数字を整数に変換します。
+
+    "二十五" のような位取りの表記と "二〇二五" のような1文字ずつの表記の両方に対応します。
+
+    Args:
+        text (str): 漢数字のみからなる文字列。
+
+    Returns:
+        int: 変換結果。
+    """
+    total = 0
+    section = 0
+    digit = None
+    for ch in text:
+        if ch in _KANJI_DIGITS:
+            value = _KANJI_DIGITS[ch]
+            digit = value if digit is None else digit * 10 + value
+        elif ch in _KANJI_UNITS:
+            section += (1 if digit is None else digit) * _KANJI_UNITS[ch]
+            digit = None
+        else:
+            section += 0 if digit is None else digit
+            total += (section or 1) * _KANJI_LARGE_UNITS[ch]
+            section = 0
+            digit = None
+    return total + section + (0 if digit is None else digit)
+
+
+class TokenStream:
+    """
+    1つの発話をトークン化した結果。
+
+    数値は半角に正規化したリテラル文字列のまま保持し、float への変換は必要になったときに
+    必要な個数だけ行います。位置情報付きのトークン列 (tokens) は参照されたときに作成します。
+
+    layout は出現順のトークンの並びで、数値は NUMBER_SLOT、キーワードと括弧はその文字列で表します。
+    数値の値を含まないため、同じ形の式 (例: "5たす3" と "2たす7") は同じ layout になります。
+    """
+    __slots__ = ("text", "numbers", "keywords", "layout", "_tokenizer", "_tokens")
+
+    def __init__(
+        self,
+        text: str,
+        numbers: List[str],
+        keywords: List[str],
+        layout: List[str],
+        tokenizer: "Tokenizer",
+    ):
+        self.text = text
+        self.numbers = numbers
+        self.keywords = keywords
+        self.layout = layout
+        self._tokenizer = tokenizer
+        self._tokens: Optional[Tuple[Token, ...]] = None
+
+    @property
+    def tokenizer(self) -> "Tokenizer":
+        """このトークン列を作成したトークナイザー (キーワードの対応表はトークン化した時点のもの)。"""
+        return self._tokenizer
+
+    @property
+    def tokens(self) -> Tuple[Token, ...]:
+        """位置情報付きのトークンを出現順に並べたもの (初回参照時に作成)。"""
+        if self._tokens is None:
+            self._tokens = tuple(self._tokenizer.iter_tokens(self.text))
+        return self._tokens
+
+    def number_values(self, limit: int = -1) -> List[float]:
+        """
+        数値を先頭から float に変換して返します。
+
+        Args:
+            limit (int): 変換する最大個数。負の値の場合はすべて変換します。
+
+        Returns:
+            List[float]: 変換された数値のリスト。
+        """
+        numbers = self.numbers if limit < 0 else self.numbers[:limit]
+        return [float(n) for n in numbers]
+
+    def __repr__(self) -> str:
+        return f"TokenStream({self.text!r}, numbers={self.numbers!r}, keywords={self.keywords!r})"
+
+
+class Tokenizer:
+    """
+    数値とキーワードを1つの正規表現で同時に抽出するトークナイザー。
+
+    走査は正規表現エンジンの findall で行い、トークンごとの Python 側の処理は
+    正規化とリストへの追加だけにしています。
+    """
+
+    def __init__(
+        self,
+        keyword_to_intent: Mapping[str, str],
+        intent_order: Optional[Mapping[str, int]] = None,
+        postfix_keywords: Iterable[str] = (),
+    ):
+        """
+        Args:
+            keyword_to_intent (Mapping[str, str]): 小文字化したキーワードからインテント名への対応表。
+            intent_order (Optional[Mapping[str, int]]): インテント名から優先順位 (小さいほど優先) への対応表
+                (省略時はすべて 0)。keyword_rank の作成に使います。
+            postfix_keywords (Iterable[str]): 被演算子の後に置くキーワード (中置でない演算のキーワード。例: "乗")。
+                直後の符号を数値に含めず、二項演算子として扱います。
+        """
+        self.keyword_to_intent: Dict[str, str] = dict(keyword_to_intent)
+        # キーワードから (インテントの優先順位, インテント名) への対応表。トークン列と同じ時点の対応表で
+        # インテントを判定できるよう、トークナイザーと一緒に作成する
+        intent_order = intent_order or {}
+        self.keyword_rank: Dict[str, Tuple[int, str]] = {
+            keyword: (intent_order.get(intent_name, 0), intent_name)
+            for keyword, intent_name in self.keyword_to_intent.items()
+        }
+        # 発話中の表記から正規化したキーワードへの対応表。記号のキーワード ("+" など) は全角表記 ("＋") も受け付ける
+        self._canonical_keywords: Dict[str, str] = {k: k for k in keyword_to_intent}
+        for keyword in keyword_to_intent:
+            for variant in (keyword.translate(_FULL_WIDTH_TABLE), keyword.replace("-", "−")):
+                self._canonical_keywords.setdefault(variant, keyword)
+        keyword_pattern = build_keyword_pattern(self._canonical_keywords)
+        postfix_keywords = set(postfix_keywords)
+        postfix_variants = [variant for variant, keyword in self._canonical_keywords.items() if keyword in postfix_keywords]
+        sources = [_number_source(postfix_variants), _kanji_source(keyword_pattern, self._canonical_keywords)]
+        first_chars = set(_NUMBER_FIRST_CHARS + _KANJI_CHARS + _PAREN_CHARS)
+        if keyword_pattern:
+            sources.append(f"(?P<kw>{keyword_pattern})")
+            for keyword in self._canonical_keywords:
+                first_chars.update((keyword[0], keyword[0].upper()))
+        else:
+            # findall の結果の形 (数値, 漢数字, キーワード, 括弧) を揃えるため、マッチしないグループを置く
+            sources.append("(?P<kw>(?!))")
+        sources.append(_PAREN_SOURCE)
+        # トークンの先頭になり得る文字の先読みを付けておくと、トークン以外の位置で各分岐を試さずに済む
+        lookahead = "(?=[" + "".join(re.escape(ch) for ch in sorted(first_chars)) + "])"
+        # 大文字小文字の区別があるキーワードを含む場合のみ IGNORECASE を使う (不要な場合は走査が速くなる)
+        flags = re.IGNORECASE if any(k.lower() != k.upper() for k in self._canonical_keywords) else 0
+        self._pattern = re.compile(lookahead + "(?:" + "|".join(sources) + ")", flags)
+
+    def _canonical_keyword(self, literal: str) -> str:
+        """発話中のキーワード表記を正規化したキーワードに変換します。"""
+        canonical = self._canonical_keywords.get(literal)
+        if canonical is None:
+            canonical = self._canonical_keywords.get(literal.lower(), literal.lower())
+        return canonical
+
+    def tokenize(self, text: str) -> TokenStream:
+        """
+        発話をトークン化します。
+
+        Args:
+            text (str): ユーザーの発話。
+
+        Returns:
+            TokenStream: トークン化の結果。
+        """
+        numbers: List[str] = []
+        keywords: List[str] = []
+        layout: List[str] = []
+        canonical_keywords = self._canonical_keywords
+        for num, kanji, keyword, paren in self._pattern.findall(text):
+            if num:
+                numbers.append(num if num.isascii() else num.translate(_WIDTH_TABLE))
+                layout.append(NUMBER_SLOT)
+            elif kanji:
+                numbers.append(str(parse_kanji_number(kanji)))
+                layout.append(NUMBER_SLOT)
+            elif keyword:
+                keyword = canonical_keywords.get(keyword) or self._canonical_keyword(keyword)
+                keywords.append(keyword)
+                layout.append(keyword)
+            else:
+                layout.append(paren if paren.isascii() else paren.translate(_WIDTH_TABLE))
+        return TokenStream(text, numbers, keywords, layout, self)
+
+    def iter_tokens(self, text: str):
+        """
+        発話を位置情報付きのトークンとして順に返します。
+
+        Args:
+            text (str): ユーザーの発話。
+
+        Yields:
+            Token: 出現順のトークン。
+        """
+        keyword_to_intent = self.keyword_to_intent
+        for m in self._pattern.finditer(text):
+            kind = m.lastgroup
+            literal = m.group()
+            if kind == "num":
+                yield Token(NUMBER, literal.translate(_WIDTH_TABLE), m.start(), m.end())
+            elif kind == "kanji":
+                yield Token(NUMBER, str(parse_kanji_number(literal)), m.start(), m.end())
+            elif kind == "paren":
+                yield Token(PAREN, literal.translate(_WIDTH_TABLE), m.start(), m.end())
+            else:
+                keyword = self._canonical_keyword(literal)
+                yield Token(KEYWORD, keyword, m.start(), m.end(), keyword_to_intent[keyword])
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+リクエストログモジュール。
+
+ログの出力 (標準出力への書き込み) は QueueListener の別スレッドで行い、リクエストを処理するスレッドは
+キューに積むだけにします。通常のリクエストのログは ADK_LOG_SAMPLE_RATE の割合だけ抽出して出力し
+(デフォルト 1%)、エラーは常に出力します。
+"""
+
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# 通常のリクエストのログを出力する割合 (0〜1)
+LOG_SAMPLE_RATE = float(os.getenv("ADK_LOG_SAMPLE_RATE", "0.01"))
+
+logger = logging.getLogger("adk_calculator_agent")
+
+_listener: Optional[QueueListener] = None
+
+
+def start_logging() -> None:
+    """ログ出力用のスレッドを開始します (2回目以降の呼び出しは何もしません)。"""
+    global _listener
+    if _listener is not None:
+        return
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    _listener = QueueListener(log_queue, stream_handler)
+    logger.addHandler(QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """キューに残っているログを出力し、ログ出力用のスレッドを停止します。"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in list(logger.handlers):
+        if isinstance(handler, QueueHandler):
+            logger.removeHandler(handler)
+    _listener = None
+
+
+def log_sampled(message: str, *args) -> None:
+    """
+    通常のリクエストのログを、LOG_SAMPLE_RATE の割合で抽出して出力します。
+    抽出されなかった場合は文字列の組み立ても行いません (message は % 形式、args はその引数)。
+    """
+    if LOG_SAMPLE_RATE > 0 and random.random() < LOG_SAMPLE_RATE:
+        logger.info(message, *args)
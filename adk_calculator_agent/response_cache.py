@@ -0,0 +1,466 @@
+# -*- coding: utf-8 -*-
+"""
+応答キャッシュモジュール。
+正規化した発話をキーにして、エージェントの応答テキストをキャッシュします。
+
+プロセス内の LRU キャッシュ (件数・メモリ上限、任意の TTL 付き) に加えて、
+ローカルソケットで接続するキャッシュサーバー (SharedResponseCache) を使うと、
+複数の uvicorn ワーカー間でキャッシュのヒットを共有できます。
+
+キャッシュサーバーとの通信は pickle を使うため、ソケットは所有者だけがアクセスできるディレクトリ (0700) に置き、
+接続認証キーは起動ごとに乱数で生成します。キャッシュサーバーの後に起動するコマンドを指定すると、ソケットのパスと
+認証キーを環境変数 (ADK_RESPONSE_CACHE_SOCKET / ADK_RESPONSE_CACHE_AUTHKEY) で引き継いで実行します
+(adk_calculator_agent ディレクトリで実行):
+    python response_cache.py -- uvicorn api:app --workers 4
+
+キャッシュサーバーだけを起動する場合、認証キーはソケットと同じディレクトリの authkey (0600) に書き出し、
+ワーカーはそこから読み込みます:
+    python response_cache.py --socket "$XDG_RUNTIME_DIR/adk/cache.sock"
+"""
+
+import argparse
+import logging
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional, Tuple
+
+# 全角英数字・記号 (U+FF01〜U+FF5E) と全角空白を半角に変換するテーブル
+_WIDTH_FOLD_TABLE = {code: code - 0xFEE0 for code in range(0xFF01, 0xFF5F)}
+_WIDTH_FOLD_TABLE[0x3000] = 0x20
+
+# 共有キャッシュの接続認証キー (16進数) を渡す環境変数
+AUTHKEY_ENV = "ADK_RESPONSE_CACHE_AUTHKEY"
+# キャッシュサーバーのソケットと同じディレクトリに書き出す認証キーのファイル名
+AUTHKEY_FILENAME = "authkey"
+# --socket を省略した場合に作成するディレクトリの中のソケットのファイル名
+SOCKET_FILENAME = "cache.sock"
+
+logger = logging.getLogger("adk_calculator_agent.response_cache")
+
+
+def normalize_utterance(text: str) -> str:
+    """
+    発話をキャッシュのキーに使う正規形に変換します。
+
+    全角英数字・記号を半角に、英字を小文字に変換し、連続する空白を1つにまとめて前後の空白を除きます。
+    (例: "　５たす３は？ " → "5たす3は?")
+
+    Args:
+        text (str): ユーザーの発話。
+
+    Returns:
+        str: 正規化した発話。
+    """
+    if not text.isascii():
+        text = text.translate(_WIDTH_FOLD_TABLE)
+    return " ".join(text.casefold().split())
+
+
+class CacheStats(NamedTuple):
+    """キャッシュの統計情報。"""
+    hits: int  # ヒット数
+    misses: int  # ミス数
+    evictions: int  # 件数・メモリ上限による追い出し数
+    expirations: int  # TTL 切れによる削除数
+    entries: int  # 現在の件数
+    bytes: int  # 現在の推定メモリ使用量 (バイト)
+
+
+class LRUResponseCache:
+    """
+    件数とメモリ使用量に上限を持つ、スレッドセーフな LRU キャッシュ。
+
+    メモリ使用量はキーと値の文字列オブジェクトのサイズ (sys.getsizeof) の合計で見積もります。
+    ttl を指定すると、登録から ttl 秒を過ぎた項目は参照時に削除されます。
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024, ttl: Optional[float] = None):
+        """
+        Args:
+            max_entries (int): 保持する最大件数。
+            max_bytes (int): 保持する項目の推定メモリ使用量の上限 (バイト)。
+            ttl (Optional[float]): 項目の有効期間 (秒)。None または 0 の場合は期限なし。
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl or None
+        # キー -> (値, 推定サイズ, 有効期限 (time.monotonic() の値。期限なしの場合は None))
+        self._entries: "OrderedDict[str, Tuple[str, int, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """キーに対応する値を返します。ない場合 (期限切れを含む) は None を返します。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        """キーと値を登録します。上限を超える場合は最も長く使われていない項目から追い出します。"""
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+
+    def clear(self) -> None:
+        """すべての項目を削除します (統計情報は保持します)。"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> CacheStats:
+        """統計情報を返します。"""
+        with self._lock:
+            return CacheStats(
+                self._hits, self._misses, self._evictions, self._expirations, len(self._entries), self._bytes
+            )
+
+
+# --- 共有キャッシュ (ローカルソケット) ---
+
+def private_socket_directory() -> str:
+    """
+    キャッシュサーバーのソケットを置く、所有者だけがアクセスできる (0700) ディレクトリを新しく作成して返します。
+    $XDG_RUNTIME_DIR があればその下に、なければ一時ディレクトリの下に作成します。
+    """
+    runtime_directory = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_directory and os.path.isdir(runtime_directory):
+        return tempfile.mkdtemp(prefix="adk-response-cache-", dir=runtime_directory)
+    return tempfile.mkdtemp(prefix="adk-response-cache-")
+
+
+def check_private_directory(directory: str) -> None:
+    """
+    ディレクトリが現在のユーザーの所有で、他のユーザーがアクセスできない (グループ・その他の権限がない) ことを確認します。
+
+    Raises:
+        ValueError: ディレクトリが他のユーザーからアクセスできる場合、または所有者が異なる場合。
+    """
+    status = os.stat(directory)
+    if hasattr(os, "getuid") and status.st_uid != os.getuid():
+        raise ValueError(f"ソケットのディレクトリの所有者が異なります: {directory}")
+    if status.st_mode & 0o077:
+        raise ValueError(f"ソケットのディレクトリは所有者だけがアクセスできるようにしてください (chmod 700): {directory}")
+
+
+def load_authkey(address: str) -> Optional[bytes]:
+    """
+    共有キャッシュの接続認証キーを、環境変数 ADK_RESPONSE_CACHE_AUTHKEY (16進数)、またはソケットと同じ
+    ディレクトリの authkey ファイルから読み込みます (どちらもない場合は None)。
+
+    Raises:
+        ValueError: 環境変数の値が16進数でない場合、または authkey ファイルのディレクトリが他のユーザーから
+            アクセスできる場合。
+    """
+    value = os.getenv(AUTHKEY_ENV)
+    if value:
+        return bytes.fromhex(value)
+    directory = os.path.dirname(os.path.abspath(address))
+    path = os.path.join(directory, AUTHKEY_FILENAME)
+    if not os.path.exists(path):
+        return None
+    check_private_directory(directory)
+    with open(path, encoding="ascii") as f:
+        return bytes.fromhex(f.read().strip())
+
+
+@lru_cache(maxsize=None)
+def _cache_manager_class():
+    """
+    キャッシュサーバーとの接続に使うマネージャーのクラスを返します。
+    共有キャッシュを使わないプロセスの起動を遅くしないよう、multiprocessing.managers は初回の呼び出し時にインポートします。
+    """
+    from multiprocessing.managers import BaseManager
+
+    class _CacheManager(BaseManager):
+        """キャッシュサーバーとの接続に使うマネージャー。"""
+
+    _CacheManager.register("get_cache")
+    return _CacheManager
+
+
+class _CacheEndpoint:
+    """キャッシュサーバー側で LRUResponseCache を公開するオブジェクト (戻り値は組み込み型のみにする)。"""
+
+    def __init__(self, cache: LRUResponseCache):
+        self._cache = cache
+
+    def get(self, key: str) -> Optional[str]:
+        return self._cache.get(key)
+
+    def set(self, key: str, value: str) -> None:
+        self._cache.set(key, value)
+
+    def stats(self) -> tuple:
+        return tuple(self._cache.stats())
+
+
+class SharedResponseCache:
+    """
+    キャッシュサーバー (serve) の LRUResponseCache にローカルソケット経由でアクセスするクライアント。
+
+    接続はスレッドごとに作成されます。サーバーに接続できない場合や通信に失敗した場合は、
+    キャッシュにない (get は None、set は何もしない) ものとして扱い、応答の生成は止めません。
+    """
+
+    def __init__(self, address: str, authkey: bytes):
+        """
+        Args:
+            address (str): キャッシュサーバーの Unix ドメインソケットのパス。
+            authkey (bytes): 接続認証キー (キャッシュサーバーの起動時に生成したもの)。
+        """
+        self.address = address
+        self.authkey = authkey
+        self._local = threading.local()
+        self.errors = 0
+
+    def _proxy(self):
+        proxy = getattr(self._local, "proxy", None)
+        if proxy is None:
+            from multiprocessing import AuthenticationError
+
+            manager = _cache_manager_class()(address=self.address, authkey=self.authkey)
+            try:
+                manager.connect()
+            except AuthenticationError as e:
+                raise ConnectionError(f"認証に失敗しました ({e})") from e
+            proxy = self._local.proxy = manager.get_cache()
+        return proxy
+
+    def _call(self, method: str, *args):
+        try:
+            return getattr(self._proxy(), method)(*args)
+        except (OSError, EOFError, ConnectionError) as e:
+            # 次回の呼び出しで接続し直す
+            self._local.proxy = None
+            self.errors += 1
+            if self.errors == 1:
+                # サーバー停止中に毎回出力しないよう、最初の失敗のみ出力する (以降は errors で数える)
+                logger.warning("共有キャッシュへのアクセスに失敗しました: %s", e)
+            return None
+
+    def get(self, key: str) -> Optional[str]:
+        """キーに対応する値をキャッシュサーバーから取得します。"""
+        return self._call("get", key)
+
+    def set(self, key: str, value: str) -> None:
+        """キーと値をキャッシュサーバーに登録します。"""
+        self._call("set", key, value)
+
+    def stats(self) -> Optional[CacheStats]:
+        """キャッシュサーバーの統計情報を返します (取得できない場合は None)。"""
+        stats = self._call("stats")
+        return None if stats is None else CacheStats(*stats)
+
+
+class ResponseCache:
+    """
+    エージェントの応答キャッシュ。
+
+    プロセス内の LRU キャッシュ (local) を先に参照し、ない場合は共有キャッシュ (shared) を参照します。
+    共有キャッシュでヒットした値はプロセス内のキャッシュにも登録します。
+    """
+
+    def __init__(self, local: LRUResponseCache, shared: Optional[SharedResponseCache] = None):
+        self.local = local
+        self.shared = shared
+
+    @property
+    def enabled(self) -> bool:
+        """キャッシュが有効かどうか (プロセス内キャッシュの最大件数が 0 の場合は無効)。"""
+        return self.local.max_entries > 0
+
+    def get_local(self, key: str) -> Optional[str]:
+        """プロセス内のキャッシュのみを参照します (ソケット通信を行わないため、イベントループ上でも呼び出せます)。"""
+        return self.local.get(key)
+
+    def get(self, key: str) -> Optional[str]:
+        """プロセス内のキャッシュ、共有キャッシュの順に参照します。"""
+        value = self.local.get(key)
+        if value is None:
+            value = self.get_shared(key)
+        return value
+
+    def get_shared(self, key: str) -> Optional[str]:
+        """
+        共有キャッシュのみを参照し、ヒットした値はプロセス内のキャッシュにも登録します。
+        get_local でヒットしなかった場合に、スレッドプール上で呼び出します。
+        """
+        if self.shared is None:
+            return None
+        value = self.shared.get(key)
+        if value is not None:
+            self.local.set(key, value)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """プロセス内のキャッシュと共有キャッシュの両方に登録します。"""
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value)
+
+    def stats(self) -> Dict[str, Optional[CacheStats]]:
+        """プロセス内のキャッシュと共有キャッシュの統計情報を返します。"""
+        return {
+            "local": self.local.stats(),
+            "shared": None if self.shared is None else self.shared.stats(),
+        }
+
+
+def create_response_cache_from_env() -> ResponseCache:
+    """
+    環境変数の設定から応答キャッシュを作成します。
+
+    ADK_RESPONSE_CACHE_SIZE: プロセス内キャッシュの最大件数 (0 で無効。デフォルト 10000)
+    ADK_RESPONSE_CACHE_MAX_BYTES: プロセス内キャッシュのメモリ上限 (バイト。デフォルト 64MB)
+    ADK_RESPONSE_CACHE_TTL: 項目の有効期間 (秒。0 で期限なし。デフォルト 0)
+    ADK_RESPONSE_CACHE_SOCKET: 共有キャッシュサーバーのソケットのパス (未設定の場合は共有しない)
+    ADK_RESPONSE_CACHE_AUTHKEY: 共有キャッシュサーバーの接続認証キー (16進数。未設定の場合はソケットと同じ
+        ディレクトリの authkey ファイルから読み込む)
+    """
+    local = LRUResponseCache(
+        max_entries=int(os.getenv("ADK_RESPONSE_CACHE_SIZE", "10000")),
+        max_bytes=int(os.getenv("ADK_RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+        ttl=float(os.getenv("ADK_RESPONSE_CACHE_TTL", "0")),
+    )
+    address = os.getenv("ADK_RESPONSE_CACHE_SOCKET")
+    shared = None
+    if address and local.max_entries > 0:
+        try:
+            authkey = load_authkey(address)
+        except (OSError, ValueError) as e:
+            logger.warning("共有キャッシュの認証キーを読み込めないため、共有キャッシュを使いません: %s", e)
+            authkey = None
+        if authkey is None:
+            logger.warning(
+                "共有キャッシュの認証キー (%s または %s) がないため、共有キャッシュを使いません。", AUTHKEY_ENV, AUTHKEY_FILENAME
+            )
+        else:
+            shared = SharedResponseCache(address, authkey)
+    return ResponseCache(local, shared)
+
+
+def start_server(address: str, cache: LRUResponseCache, authkey: bytes):
+    """
+    ローカルソケットで待ち受けるキャッシュサーバーを作成します (serve_forever で処理を開始します)。
+
+    Args:
+        address (str): Unix ドメインソケットのパス (所有者だけがアクセスできるディレクトリに置く)。
+        cache (LRUResponseCache): 共有するキャッシュ。
+        authkey (bytes): 接続認証キー。
+    """
+    endpoint = _CacheEndpoint(cache)
+    manager_class = _cache_manager_class()
+    manager_class.register("get_cache", callable=lambda: endpoint)
+    if os.path.exists(address):
+        os.unlink(address)
+    return manager_class(address=address, authkey=authkey).get_server()
+
+
+def serve(address: str, cache: LRUResponseCache, authkey: bytes) -> None:
+    """ローカルソケットでキャッシュサーバーを起動します (戻りません)。"""
+    start_server(address, cache, authkey).serve_forever()
+
+
+def _write_authkey(directory: str, authkey: bytes) -> str:
+    """認証キーを所有者だけが読めるファイル (0600) に書き出し、そのパスを返します。"""
+    path = os.path.join(directory, AUTHKEY_FILENAME)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="ascii") as f:
+        f.write(authkey.hex())
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="複数のワーカーで共有する応答キャッシュサーバー")
+    parser.add_argument("--socket", default=os.getenv("ADK_RESPONSE_CACHE_SOCKET"),
+                        help="Unix ドメインソケットのパス (所有者だけがアクセスできるディレクトリ。"
+                             "省略時は $XDG_RUNTIME_DIR または一時ディレクトリの下に作成します)")
+    parser.add_argument("--size", type=int, default=100000, help="最大件数")
+    parser.add_argument("--max-bytes", type=int, default=256 * 1024 * 1024, help="メモリ上限 (バイト)")
+    parser.add_argument("--ttl", type=float, default=0, help="項目の有効期間 (秒。0 で期限なし)")
+    parser.add_argument("command", nargs=argparse.REMAINDER,
+                        help="-- の後に、ソケットのパスと認証キーを環境変数で引き継いで実行するコマンド (例: -- uvicorn api:app)")
+    args = parser.parse_args()
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+
+    if args.socket:
+        address = os.path.abspath(args.socket)
+        directory = os.path.dirname(address)
+        try:
+            check_private_directory(directory)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        created_directory = None
+    else:
+        directory = created_directory = private_socket_directory()
+        address = os.path.join(directory, SOCKET_FILENAME)
+    # 認証キーは起動ごとに生成する (ADK_RESPONSE_CACHE_AUTHKEY を設定した場合はその値を使う)
+    authkey = bytes.fromhex(os.environ[AUTHKEY_ENV]) if os.getenv(AUTHKEY_ENV) else secrets.token_bytes(32)
+    authkey_path = _write_authkey(directory, authkey)
+    # SIGTERM でも認証キーのファイルとソケットを削除してから終了する
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    server = start_server(address, LRUResponseCache(args.size, args.max_bytes, args.ttl), authkey)
+    print(f"応答キャッシュサーバーを起動しました: {address} (認証キー: {authkey_path})")
+    try:
+        if not command:
+            server.serve_forever()
+            return
+        threading.Thread(target=server.serve_forever, name="response-cache-server", daemon=True).start()
+        environment = dict(os.environ, ADK_RESPONSE_CACHE_SOCKET=address, **{AUTHKEY_ENV: authkey.hex()})
+        sys.exit(subprocess.call(command, env=environment))
+    finally:
+        try:
+            os.unlink(authkey_path)
+        except OSError:
+            pass
+        if created_directory:
+            from multiprocessing.util import Finalize
+
+            # ソケットはサーバーの終了処理 (優先度 0) で削除されるため、その後 (優先度 -1) にディレクトリを削除する
+            Finalize(None, _remove_directory, args=(created_directory,), exitpriority=-1)
+
+
+def _remove_directory(directory: str) -> None:
+    try:
+        os.rmdir(directory)
+    except OSError:
+        pass
+
+
+if __name__ == "__main__":
+    main()
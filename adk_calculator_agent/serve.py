@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+本番用のランチャー。
+待ち受けソケットを親プロセスで作成し、ワーカープロセスを fork して共有させます (プリフォーク)。
+
+各ワーカーは fork 後にアプリケーションをインポートし、起動処理 (api.py の startup でのウォームアップ) が
+完了してから親プロセスに準備完了を通知します。親プロセスは以下のシグナルを扱います。
+
+    SIGHUP: グレースフルリロード。新しい世代のワーカーを起動し、全員の準備完了を待ってから
+            古いワーカーに SIGTERM を送ります。待ち受けソケットは親プロセスが保持し続けるため、
+            接続は取りこぼされず、古いワーカーは処理中のリクエストを終えてから終了します。
+    SIGTERM / SIGINT: 全ワーカーをグレースフルに停止して終了します。
+
+想定外に終了したワーカーは自動的に起動し直します。起動に失敗した場合・起動直後に終了した場合は、
+待ち時間を倍にしながら (指数バックオフ)、設定したワーカー数に戻るまで再試行します。
+
+実行例 (リポジトリのルートで実行):
+    python -m adk_calculator_agent.serve --workers 32 --host 0.0.0.0 --port 8000
+"""
+
+import argparse
+import os
+import select
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import uvicorn
+from uvicorn.importer import import_from_string
+
+# ワーカーごとの同期ハンドラー用スレッド数のデフォルト (プロセス数で並列化するため、スレッドは少なくする)
+DEFAULT_WORKER_DISPATCH_THREADS = "4"
+
+# 想定外に終了したワーカーを起動し直すまでの待ち時間 (秒) の初期値と上限
+RESPAWN_BACKOFF_INITIAL = 0.5
+RESPAWN_BACKOFF_MAX = 30.0
+# 起動からこの秒数以内に終了したワーカーは起動に失敗したものとして扱い、次の起動までの待ち時間を倍にする
+RESPAWN_STABLE_SECONDS = 10.0
+
+
+class _ReadyNotifyingServer(uvicorn.Server):
+    """起動処理の完了時にパイプへ1バイト書き込み、親プロセスに準備完了を通知する uvicorn サーバー。"""
+
+    def __init__(self, config: uvicorn.Config, ready_fd: int):
+        super().__init__(config)
+        self._ready_fd = ready_fd
+
+    async def startup(self, sockets=None) -> None:
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            os.write(self._ready_fd, b"1")
+        os.close(self._ready_fd)
+
+
+def _run_worker(app_path: str, sock: socket.socket, ready_fd: int, options: dict, workers: int) -> None:
+    """ワーカープロセスの本体 (fork 後の子プロセスで実行)。"""
+    # 親プロセスのシグナルハンドラーを解除する (uvicorn が自身のハンドラーを設定する)
+    for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+        signal.signal(signum, signal.SIG_DFL)
+    os.environ.setdefault("ADK_DISPATCH_WORKERS", DEFAULT_WORKER_DISPATCH_THREADS)
+    # ワーカー数をアプリケーションに伝える (ワーカーごとに保持するセッションは、複数のワーカーでは使えないため)
+    os.environ["ADK_WORKER_PROCESSES"] = str(workers)
+    app = import_from_string(app_path)
+    config = uvicorn.Config(app, **options)
+    _ReadyNotifyingServer(config, ready_fd).run(sockets=[sock])
+
+
+class PreforkLauncher:
+    """
+    ワーカープロセスをプリフォークして管理する親プロセス。
+
+    Args:
+        app_path (str): "モジュール:属性" 形式のアプリケーションの場所。
+        host (str): 待ち受けるホスト。
+        port (int): 待ち受けるポート。
+        workers (int): ワーカー数。
+        ready_timeout (float): ワーカーの準備完了を待つ最大秒数。
+        graceful_timeout (float): 停止時に処理中のリクエストの完了を待つ最大秒数。
+        backlog (int): 待ち受けソケットのバックログ。
+    """
+
+    def __init__(
+        self,
+        app_path: str,
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        workers: int = 1,
+        ready_timeout: float = 60.0,
+        graceful_timeout: float = 30.0,
+        backlog: int = 2048,
+    ):
+        self.app_path = app_path
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.ready_timeout = ready_timeout
+        self.graceful_timeout = graceful_timeout
+        self.backlog = backlog
+        self._worker_options = {
+            "backlog": backlog,
+            "timeout_graceful_shutdown": graceful_timeout,
+            "log_level": "info",
+            "access_log": False,
+        }
+        self._socket: Optional[socket.socket] = None
+        self._workers: Dict[int, Tuple[int, float]] = {}  # 現在の世代のワーカー (pid -> (世代番号, 起動した時刻))
+        self._retiring: Dict[int, float] = {}  # 停止中のワーカー (pid -> SIGTERM を送った時刻)
+        self._generation = 0
+        self._reload_requested = False
+        self._stop_requested = False
+        self._respawn_delay = RESPAWN_BACKOFF_INITIAL  # 次にワーカーを起動し直すまでの待ち時間
+        self._respawn_at = 0.0  # ワーカーを起動し直せる時刻 (time.monotonic)
+
+    # --- ソケット・ワーカーの起動 ---
+
+    def _bind(self) -> socket.socket:
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(self.backlog)
+        sock.set_inheritable(True)
+        return sock
+
+    def _spawn(self) -> Optional[int]:
+        """ワーカーを1つ起動し、準備完了を待ちます。準備完了にならなかった場合は None を返します。"""
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            exit_code = 0
+            try:
+                _run_worker(self.app_path, self._socket, write_fd, self._worker_options, self.workers)
+            except BaseException as e:
+                print(f"ワーカーの起動に失敗しました: {e}", file=sys.stderr)
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        os.close(write_fd)
+        try:
+            ready, _, _ = select.select([read_fd], [], [], self.ready_timeout)
+            if ready and os.read(read_fd, 1) == b"1":
+                self._workers[pid] = (self._generation, time.monotonic())
+                return pid
+        finally:
+            os.close(read_fd)
+        print(f"ワーカー (pid={pid}) が準備完了になりませんでした。", file=sys.stderr)
+        self._terminate(pid)
+        return None
+
+    def _spawn_generation(self) -> Optional[List[int]]:
+        """新しい世代のワーカーを起動します。全員が準備完了にならなかった場合は停止して None を返します。"""
+        self._generation += 1
+        started: List[int] = []
+        for _ in range(self.workers):
+            pid = self._spawn()
+            if pid is None:
+                for started_pid in started:
+                    self._workers.pop(started_pid, None)
+                    self._terminate(started_pid)
+                return None
+            started.append(pid)
+        return started
+
+    # --- 停止 ---
+
+    def _terminate(self, pid: int) -> None:
+        """ワーカーに SIGTERM を送ります (処理中のリクエストを終えてから終了します)。"""
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        self._retiring[pid] = time.monotonic()
+
+    def _reap(self) -> None:
+        """
+        終了したワーカーを回収します。想定外に終了した現在の世代のワーカーは、待ち時間の後に
+        _restore_workers で起動し直します。
+        """
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self._retiring.pop(pid, None)
+            if pid in self._workers:
+                _, started_at = self._workers.pop(pid)
+                if not self._stop_requested:
+                    now = time.monotonic()
+                    if now - started_at < RESPAWN_STABLE_SECONDS:
+                        # 起動直後に終了した場合は、起動し直しても同じ理由で終了する可能性が高いため待ち時間を延ばす
+                        self._increase_respawn_delay()
+                    self._respawn_at = max(self._respawn_at, now + self._respawn_delay)
+                    print(
+                        f"ワーカー (pid={pid}) が終了しました (status={status})。"
+                        f"{self._respawn_delay:.1f} 秒後に起動し直します。",
+                        file=sys.stderr,
+                    )
+
+    def _increase_respawn_delay(self) -> None:
+        self._respawn_delay = min(self._respawn_delay * 2, RESPAWN_BACKOFF_MAX)
+
+    def _restore_workers(self) -> None:
+        """
+        想定外の終了で減ったワーカーを、設定したワーカー数に戻るまで起動し直します。
+        起動に失敗した場合は待ち時間を倍にして (上限 RESPAWN_BACKOFF_MAX 秒)、次の呼び出しで再試行します。
+        """
+        if self._stop_requested:
+            return
+        now = time.monotonic()
+        if len(self._workers) >= self.workers:
+            # すべてのワーカーが安定して動いていれば待ち時間を初期値に戻す
+            if all(now - started_at >= RESPAWN_STABLE_SECONDS for _, started_at in self._workers.values()):
+                self._respawn_delay = RESPAWN_BACKOFF_INITIAL
+            return
+        if now < self._respawn_at:
+            return
+        while len(self._workers) < self.workers:
+            if self._spawn() is None:
+                self._increase_respawn_delay()
+                self._respawn_at = time.monotonic() + self._respawn_delay
+                print(
+                    f"ワーカーを起動し直せませんでした (ワーカー {len(self._workers)}/{self.workers} 個)。"
+                    f"{self._respawn_delay:.1f} 秒後に再試行します。",
+                    file=sys.stderr,
+                )
+                return
+
+    def _kill_stragglers(self) -> None:
+        """猶予時間を過ぎても終了しないワーカーを強制終了します。"""
+        deadline = time.monotonic() - self.graceful_timeout - 5
+        for pid, retired_at in list(self._retiring.items()):
+            if retired_at < deadline:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    # --- リロード・メインループ ---
+
+    def reload(self) -> None:
+        """新しい世代のワーカーが準備完了になってから、古い世代のワーカーを停止します。"""
+        previous = list(self._workers)
+        started = self._spawn_generation()
+        if started is None:
+            print("リロードに失敗しました。現在のワーカーで処理を続けます。", file=sys.stderr)
+            return
+        for pid in previous:
+            self._workers.pop(pid, None)
+            self._terminate(pid)
+        print(f"リロードしました (世代 {self._generation}, ワーカー {len(started)} 個)。")
+
+    def _on_signal(self, signum, frame) -> None:
+        if signum == signal.SIGHUP:
+            self._reload_requested = True
+        else:
+            self._stop_requested = True
+
+    def run(self) -> None:
+        """ワーカーを起動し、停止のシグナルを受け取るまで管理します。"""
+        if not hasattr(os, "fork"):
+            raise RuntimeError("プリフォークには os.fork が必要です (Windows では uvicorn --workers を使ってください)。")
+        self._socket = self._bind()
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._on_signal)
+        if self._spawn_generation() is None:
+            raise RuntimeError("ワーカーを起動できませんでした。")
+        print(f"{self.host}:{self.port} で {self.workers} 個のワーカーを起動しました (pid={os.getpid()})。")
+        try:
+            while not self._stop_requested:
+                if self._reload_requested:
+                    self._reload_requested = False
+                    self.reload()
+                self._reap()
+                self._restore_workers()
+                self._kill_stragglers()
+                time.sleep(0.2)
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        """全ワーカーをグレースフルに停止し、終了を待ちます。"""
+        self._stop_requested = True
+        for pid in list(self._workers):
+            self._terminate(pid)
+        self._workers.clear()
+        while self._retiring:
+            self._reap()
+            self._kill_stragglers()
+            time.sleep(0.1)
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="計算エージェント API の本番用ランチャー (プリフォーク)")
+    parser.add_argument("--app", default="adk_calculator_agent.api:app", help="アプリケーションの場所 (モジュール:属性)")
+    parser.add_argument("--host", default=os.getenv("ADK_HOST", "127.0.0.1"), help="待ち受けるホスト")
+    parser.add_argument("--port", type=int, default=int(os.getenv("ADK_PORT", "8000")), help="待ち受けるポート")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("ADK_WORKERS", str(os.cpu_count() or 1))),
+                        help="ワーカー数 (デフォルト: CPU コア数)")
+    parser.add_argument("--ready-timeout", type=float, default=60.0, help="ワーカーの準備完了を待つ最大秒数")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0, help="停止時に処理中のリクエストを待つ最大秒数")
+    args = parser.parse_args()
+    PreforkLauncher(
+        args.app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        ready_timeout=args.ready_timeout,
+        graceful_timeout=args.graceful_timeout,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""
+会話のセッションの状態を保持するモジュール。
+
+セッション ID ごとに、直前の計算結果・最近の数値 (被演算子) の履歴・直近のやり取り (リングバッファ) を
+コンパクトに保持し、「それに5をかけて」のような前の結果を参照する続きの質問に応答できるようにします。
+
+セッションは LRU で管理し、件数の上限 (max_sessions) とメモリの上限 (max_bytes、概算) を超えると
+最も古いセッションから追い出します。spill_dir を指定した場合、追い出したセッションはディスクに書き出し、
+次にアクセスされたときに読み戻します (終了時にもメモリ上のセッションを書き出します)。
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, NamedTuple, Optional, Sequence, Tuple
+
+# 直近のやり取りとして保持するメッセージ数 (ユーザーとアシスタントの発言を1件ずつ数える)
+DEFAULT_TRANSCRIPT_SIZE = 20
+# 保持する数値 (被演算子) の履歴の件数
+DEFAULT_OPERAND_HISTORY = 10
+# セッション数の上限
+DEFAULT_MAX_SESSIONS = 10000
+# セッションの合計サイズ (概算) の上限 (バイト)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# セッション1件あたりの固定のサイズの見積もり (オブジェクトのヘッダー・deque など)
+_SESSION_OVERHEAD = 512
+# 数値1件あたりのサイズの見積もり (リテラルの文字数を除く)
+_OPERAND_SIZE = 56
+
+# 前の計算結果を指す表現 (長いものから順に置き換える。「それぞれ」は対象外)
+_REFERENCE_PATTERN = re.compile(r"さっきの答え|前の答え|その答え|その結果|答え|それ(?!ぞれ)")
+
+
+def bind_references(text: str, last_result: Optional[str]) -> str:
+    """
+    発話中の前の計算結果を指す表現 (「それ」「その答え」など) を、直前の計算結果の数値リテラルに置き換えます。
+    直前の計算結果がない場合は発話をそのまま返します。
+
+    例: bind_references("それに5をかけて", "8") -> "8に5をかけて"
+    """
+    if last_result is None:
+        return text
+    return _REFERENCE_PATTERN.sub(last_result, text)
+
+
+class SessionState:
+    """セッション1件分の状態。"""
+    __slots__ = ("session_id", "last_result", "operands", "transcript", "last_request_id", "last_response",
+                 "updated_at", "size")
+
+    def __init__(self, session_id: str, transcript_size: int, operand_history: int):
+        self.session_id = session_id
+        # 直前の計算結果の数値リテラル (数値モードの精度のまま、発話に埋め込める表記で保持する)
+        self.last_result: Optional[str] = None
+        self.operands: Deque[str] = deque(maxlen=operand_history)
+        # (役割 ("user" / "assistant"), テキスト) のリングバッファ
+        self.transcript: Deque[Tuple[str, str]] = deque(maxlen=transcript_size)
+        # 再試行で同じリクエストが再送された場合に、状態を二重に更新せずに同じ応答を返すための記録
+        self.last_request_id: Optional[str] = None
+        self.last_response: Optional[str] = None
+        self.updated_at = time.time()
+        self.size = _SESSION_OVERHEAD
+
+    def estimate_size(self) -> int:
+        """セッションのサイズ (バイト) を概算します。"""
+        texts = sum(len(text) for _, text in self.transcript) * 4  # UTF-8 の最大長で見積もる
+        operands = sum(_OPERAND_SIZE + len(operand) for operand in self.operands)
+        return _SESSION_OVERHEAD + texts + operands + len(self.last_result or "") + len(self.last_response or "") * 4
+
+    def to_dict(self, transcript_limit: Optional[int] = None) -> dict:
+        transcript = list(self.transcript)
+        if transcript_limit is not None:
+            transcript = transcript[-transcript_limit:] if transcript_limit > 0 else []
+        return {
+            "session_id": self.session_id,
+            "last_result": self.last_result,
+            "operands": list(self.operands),
+            "transcript": [{"role": role, "content": text} for role, text in transcript],
+            "last_request_id": self.last_request_id,
+            "last_response": self.last_response,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, transcript_size: int, operand_history: int) -> "SessionState":
+        state = cls(data["session_id"], transcript_size, operand_history)
+        state.last_result = data.get("last_result")
+        state.operands.extend(data.get("operands", []))
+        state.transcript.extend((item["role"], item["content"]) for item in data.get("transcript", []))
+        state.last_request_id = data.get("last_request_id")
+        state.last_response = data.get("last_response")
+        state.updated_at = data.get("updated_at", state.updated_at)
+        state.size = state.estimate_size()
+        return state
+
+
+class SessionStoreStats(NamedTuple):
+    """セッションストアの統計情報。"""
+    sessions: int
+    bytes: int
+    evictions: int
+    spilled: int
+    restored: int
+
+
+class SessionStore:
+    """
+    セッション ID ごとの会話の状態を保持するストア (LRU、件数とメモリの上限、任意でディスクへの退避)。
+    スレッドセーフです。
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        transcript_size: int = DEFAULT_TRANSCRIPT_SIZE,
+        operand_history: int = DEFAULT_OPERAND_HISTORY,
+        spill_dir: Optional[str] = None,
+    ):
+        """
+        Args:
+            max_sessions (int): メモリ上に保持するセッション数の上限。
+            max_bytes (int): メモリ上のセッションの合計サイズ (概算) の上限 (バイト)。
+            transcript_size (int): セッションごとに保持する直近のメッセージ数。
+            operand_history (int): セッションごとに保持する数値の履歴の件数。
+            spill_dir (Optional[str]): 追い出したセッションを書き出すディレクトリ (None の場合は破棄する)。
+        """
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.transcript_size = transcript_size
+        self.operand_history = operand_history
+        self.spill_dir = spill_dir
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+        self._bytes = 0
+        self._evictions = 0
+        self._spilled = 0
+        self._restored = 0
+
+    # --- ディスクへの退避 ---
+
+    def _spill_path(self, session_id: str) -> str:
+        # セッション ID をそのままファイル名にしないよう、ハッシュ値をファイル名にする
+        digest = hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.spill_dir, f"{digest}.json")
+
+    def _spill(self, state: SessionState) -> None:
+        path = self._spill_path(state.session_id)
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(state.to_dict(), f, ensure_ascii=False)
+        os.replace(temporary, path)
+        self._spilled += 1
+
+    def _restore(self, session_id: str) -> Optional[SessionState]:
+        """ディスクに退避したセッションを読み戻します (読み戻したファイルは削除します)。"""
+        path = self._spill_path(session_id)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        os.unlink(path)
+        self._restored += 1
+        return SessionState.from_dict(data, self.transcript_size, self.operand_history)
+
+    # --- 追加・参照 ---
+
+    def _evict(self) -> None:
+        """ロックを取得済みの状態で、上限を超えている間、最も古いセッションを追い出します。"""
+        while self._sessions and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            _, state = self._sessions.popitem(last=False)
+            self._bytes -= state.size
+            self._evictions += 1
+            if self.spill_dir:
+                self._spill(state)
+
+    def _lookup(self, session_id: str) -> Optional[SessionState]:
+        """ロックを取得済みの状態でセッションを探し、最近使ったものにします (退避済みなら読み戻す)。"""
+        state = self._sessions.get(session_id)
+        if state is not None:
+            self._sessions.move_to_end(session_id)
+            return state
+        if not self.spill_dir:
+            return None
+        state = self._restore(session_id)
+        if state is not None:
+            self._sessions[session_id] = state
+            self._bytes += state.size
+            self._evict()
+        return state
+
+    def get(self, session_id: str, transcript_limit: Optional[int] = None) -> Optional[dict]:
+        """
+        セッションの状態を辞書で返します (存在しない場合は None)。
+
+        Args:
+            session_id (str): セッション ID。
+            transcript_limit (Optional[int]): 返す直近のメッセージ数 (None の場合は保持しているすべて)。
+        """
+        with self._lock:
+            state = self._lookup(session_id)
+            return None if state is None else state.to_dict(transcript_limit)
+
+    def last_result(self, session_id: str) -> Optional[str]:
+        """セッションの直前の計算結果の数値リテラルを返します (セッションがない場合・結果がない場合は None)。"""
+        with self._lock:
+            state = self._lookup(session_id)
+            return None if state is None else state.last_result
+
+    def replayed_response(self, session_id: str, request_id: Optional[str]) -> Optional[str]:
+        """request_id が直前に処理したリクエストと同じ場合 (再試行)、そのときの応答を返します。"""
+        if not request_id:
+            return None
+        with self._lock:
+            state = self._lookup(session_id)
+            if state is not None and state.last_request_id == request_id:
+                return state.last_response
+            return None
+
+    def record(
+        self,
+        session_id: str,
+        user_text: str,
+        response: str,
+        result: Optional[str] = None,
+        operands: Sequence[str] = (),
+        request_id: Optional[str] = None,
+    ) -> None:
+        """
+        1往復分のやり取りをセッションに記録します (セッションがなければ作成します)。
+
+        Args:
+            session_id (str): セッション ID。
+            user_text (str): ユーザーの発話。
+            response (str): 応答テキスト。
+            result (Optional[str]): 計算結果の数値リテラル (計算できなかった場合は None。直前の計算結果は更新しない)。
+            operands (Sequence[str]): 発話に含まれていた数値リテラル。
+            request_id (Optional[str]): リクエスト ID (再試行の検出に使う)。
+        """
+        with self._lock:
+            state = self._lookup(session_id)
+            if state is None:
+                state = SessionState(session_id, self.transcript_size, self.operand_history)
+                self._sessions[session_id] = state
+            if result is not None:
+                state.last_result = result
+            state.operands.extend(operands)
+            state.transcript.append(("user", user_text))
+            state.transcript.append(("assistant", response))
+            state.last_request_id = request_id
+            state.last_response = response
+            state.updated_at = time.time()
+            size = state.estimate_size()
+            self._bytes += size - state.size
+            state.size = size
+            self._evict()
+
+    def delete(self, session_id: str) -> bool:
+        """セッションを削除します (退避したファイルも削除します)。削除した場合は True を返します。"""
+        with self._lock:
+            state = self._sessions.pop(session_id, None)
+            if state is not None:
+                self._bytes -= state.size
+            removed = state is not None
+            if self.spill_dir:
+                try:
+                    os.unlink(self._spill_path(session_id))
+                    removed = True
+                except FileNotFoundError:
+                    pass
+            return removed
+
+    def stats(self) -> SessionStoreStats:
+        """統計情報を返します。"""
+        with self._lock:
+            return SessionStoreStats(len(self._sessions), self._bytes, self._evictions, self._spilled, self._restored)
+
+    def close(self) -> None:
+        """spill_dir を指定している場合、メモリ上のセッションをすべてディスクに書き出します (再起動後に引き継ぐため)。"""
+        if not self.spill_dir:
+            return
+        with self._lock:
+            for state in self._sessions.values():
+                self._spill(state)
+            self._sessions.clear()
+            self._bytes = 0
+
+
+def create_session_store_from_env() -> SessionStore:
+    """環境変数 ADK_SESSION_* の設定でセッションストアを作成します。"""
+    return SessionStore(
+        max_sessions=int(os.getenv("ADK_SESSION_MAX_SESSIONS", str(DEFAULT_MAX_SESSIONS))),
+        max_bytes=int(os.getenv("ADK_SESSION_MAX_BYTES", str(DEFAULT_MAX_BYTES))),
+        transcript_size=int(os.getenv("ADK_SESSION_TRANSCRIPT_SIZE", str(DEFAULT_TRANSCRIPT_SIZE))),
+        operand_history=int(os.getenv("ADK_SESSION_OPERAND_HISTORY", str(DEFAULT_OPERAND_HISTORY))),
+        spill_dir=os.getenv("ADK_SESSION_SPILL_DIR") or None,
+    )
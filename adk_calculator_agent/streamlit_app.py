@@ -4,25 +4,78 @@ ADK計算エージェントと対話するためのStreamlit Web UI。
 FastAPIバックエンド (api.py) と通信します。
 """
 
+import uuid
+from collections import deque
+
+import httpx
 import streamlit as st
-import requests # FastAPIへのリクエスト用
+
+# FastAPIへのリクエスト用の共通クライアント (コネクションプール・タイムアウト・再試行・重複送信の集約)
+from api_client import CalculatorClient
 
 # --- 定数 ---
-# FastAPIサーバーのアドレス (api.py を実行している場所に合わせて変更)
-API_URL = "http://127.0.0.1:8000/ask"
+# FastAPIサーバーのアドレス (api.py を実行している場所に合わせて変更。環境変数 ADK_API_URL でも指定可能)
+API_BASE_URL = None # None の場合は環境変数 ADK_API_URL (デフォルト: http://127.0.0.1:8000)
+# 画面に表示する (ブラウザのセッションに保持する) 直近のメッセージ数。
+# それより古い履歴は API サーバー側のセッション (GET /sessions/{id}) に直近の分だけ残る
+HISTORY_WINDOW = 50
+
+
+@st.cache_resource
+def get_client() -> CalculatorClient:
+    """
+    API クライアントを返します。
+    st.cache_resource により Streamlit の再実行 (rerun) やセッションをまたいで1つのインスタンスを共有し、
+    キープアライブの接続を再利用します。
+    """
+    return CalculatorClient(API_BASE_URL)
+
+
+def stream_answers(questions):
+    """
+    質問のリストを /ask/stream に送信し、届いた結果を (位置, 応答テキスト) として順に返します。
+    応答全体を待たずに、1件届くごとに返します。
+    """
+    for index, response, error in get_client().stream(questions):
+        yield index, response if error is None else f"エラー: {error}"
 
 # --- Streamlit UI 設定 ---
 st.set_page_config(page_title="計算エージェント", layout="wide")
 st.title("🧮 計算エージェント (ADK + FastAPI + Streamlit)")
-st.caption("足し算、引き算、掛け算ができます。「5たす3は？」のように入力してください。")
+st.caption("足し算、引き算、掛け算、割り算、累乗、余りの計算ができます。「5たす3は？」のように入力してください。「それに2をかけて」のように前の答えを使えます。複数行で入力すると、1行ずつ計算して届いた順に表示します。")
 
 # --- チャット履歴の初期化 ---
-# st.session_state を使って、セッション間で履歴を保持
+# st.session_state を使って、セッション間で履歴を保持する。
+# 履歴は直近 HISTORY_WINDOW 件だけを保持し (deque)、再実行のたびに描画する量が会話の長さに比例して増えないようにする
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    st.session_state.messages = deque(maxlen=HISTORY_WINDOW)
+    st.session_state.message_count = 0
+# API サーバー側のセッション ID (前の計算結果を参照するため、1件ずつの質問で送る)
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+
+def add_message(role: str, content: str) -> None:
+    """メッセージを履歴に追加します (HISTORY_WINDOW 件を超えた古いメッセージは捨てる)。"""
+    st.session_state.messages.append({"role": role, "content": content})
+    st.session_state.message_count += 1
+
+
+with st.sidebar:
+    if st.button("会話をリセット"):
+        try:
+            get_client().delete_session(st.session_state.session_id)
+        except httpx.HTTPError:
+            pass  # サーバー側のセッションは LRU で追い出されるため、削除に失敗しても新しいセッションで続けられる
+        st.session_state.session_id = uuid.uuid4().hex
+        st.session_state.messages.clear()
+        st.session_state.message_count = 0
 
 # --- チャット履歴の表示 ---
-# 既存のメッセージをループして表示
+# 保持している直近のメッセージだけを表示
+omitted = st.session_state.message_count - len(st.session_state.messages)
+if omitted > 0:
+    st.caption(f"古いメッセージ {omitted} 件は表示していません (直近 {HISTORY_WINDOW} 件を表示)。")
 for message in st.session_state.messages:
     with st.chat_message(message["role"]): # "user" または "assistant"
         st.markdown(message["content"])
@@ -31,29 +84,51 @@ for message in st.session_state.messages:
 # st.chat_input でユーザーからの入力を受け付ける
 if prompt := st.chat_input("計算式を入力してください (例: 10 ひく 4)"):
     # 1. ユーザーメッセージを履歴に追加して表示
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    add_message("user", prompt)
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # 2. FastAPIエンドポイントにリクエストを送信
-    try:
-        response = requests.post(API_URL, json={"text": prompt})
-        response.raise_for_status() # HTTPエラーがあれば例外を発生させる
-
-        # 3. FastAPIからの応答を取得
-        api_response_data = response.json()
-        assistant_response = api_response_data.get("response", "エラー: 応答を取得できませんでした。")
-
-    except requests.exceptions.RequestException as e:
-        # ネットワークエラーやAPIサーバーのエラー
-        st.error(f"APIへの接続中にエラーが発生しました: {e}")
-        assistant_response = "APIとの通信に失敗しました。"
-    except Exception as e:
-        # その他の予期せぬエラー
-        st.error(f"予期せぬエラーが発生しました: {e}")
-        assistant_response = "不明なエラーが発生しました。"
-
-    # 4. アシスタント（エージェント）の応答を履歴に追加して表示
-    st.session_state.messages.append({"role": "assistant", "content": assistant_response})
+    # 2. FastAPIエンドポイントにリクエストを送信し、届いた結果から順に表示する
+    #    (1行に1つの質問。複数行の場合はまとめて送信する)
+    questions = [line for line in prompt.splitlines() if line.strip()] or [prompt]
+    answers = [None] * len(questions)
     with st.chat_message("assistant"):
-        st.markdown(assistant_response)
+        placeholder = st.empty()
+
+        def render():
+            """届いている結果までを表示します (未着の項目は「計算中…」と表示)。"""
+            if len(questions) == 1:
+                content = answers[0] if answers[0] is not None else "計算中…"
+            else:
+                content = "\n".join(
+                    f"{i + 1}. {q} → {a if a is not None else '計算中…'}"
+                    for i, (q, a) in enumerate(zip(questions, answers))
+                )
+            placeholder.markdown(content)
+            return content
+
+        render()
+        try:
+            # 3. FastAPIからの応答を取得して表示を更新
+            if len(questions) == 1:
+                # 1件の場合は /ask をセッション付きで使う (再試行あり。前の計算結果を参照できる)
+                answers[0] = get_client().ask(questions[0], session_id=st.session_state.session_id)
+            else:
+                # 複数件の場合は /ask/stream で1件ずつ受け取る (セッションは参照・更新しない)
+                for index, text in stream_answers(questions):
+                    answers[index] = text
+                    render()
+            answers = [a if a is not None else "エラー: 応答を取得できませんでした。" for a in answers]
+
+        except httpx.HTTPError as e:
+            # ネットワークエラーやAPIサーバーのエラー
+            st.error(f"APIへの接続中にエラーが発生しました: {e}")
+            answers = [a if a is not None else "APIとの通信に失敗しました。" for a in answers]
+        except Exception as e:
+            # その他の予期せぬエラー
+            st.error(f"予期せぬエラーが発生しました: {e}")
+            answers = [a if a is not None else "不明なエラーが発生しました。" for a in answers]
+
+        # 4. アシスタント（エージェント）の応答を表示して履歴に追加
+        assistant_response = render()
+    add_message("assistant", assistant_response)
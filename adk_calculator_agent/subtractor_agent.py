@@ -1,23 +1,9 @@
 # -*- coding: utf-8 -*-
 """
 引き算を実行する子エージェントのロジック。
+計算関数は calculator_agent/operations.py の subtract (演算プラグインの引き算の evaluator) と共通です。
 """
 
-def subtract(a: float, b: float) -> float:
-    """
-    1番目の数値から2番目の数値を減算します。
+from calculator_agent.operations import subtract
 
-    Args:
-        a (float): 1番目の数値 (被減数)。
-        b (float): 2番目の数値 (減数)。
-
-    Returns:
-        float: 減算結果。
-
-    Raises:
-        TypeError: 引数が数値でない場合。
-    """
-    if not isinstance(a, (int, float)) or not isinstance(b, (int, float)):
-        error_message = f"数値以外の引数が指定されました。関数名: subtract, 引数a: {a} (型: {type(a)}), 引数b: {b} (型: {type(b)})"
-        raise TypeError(error_message)
-    return a - b
+__all__ = ["subtract"]
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""
+テストの共通設定。
+
+api などのモジュールはパッケージ (adk_calculator_agent.api)、calculator_agent はベンチマークと同じく
+adk_calculator_agent ディレクトリからインポートできるようにします。
+"""
+
+import os
+import sys
+
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.dirname(_PACKAGE_DIR), _PACKAGE_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
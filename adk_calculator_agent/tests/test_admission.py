@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""受け付けの制御 (admission.py) のクライアントの識別のテスト。"""
+
+import pytest
+
+from adk_calculator_agent.admission import AdmissionController
+
+
+def _scope(*forwarded_for):
+    return {"headers": [(b"x-forwarded-for", value) for value in forwarded_for], "client": ("10.0.0.1", 50000)}
+
+
+@pytest.mark.parametrize("trusted_hops, headers, expected", [
+    # 先頭の値はクライアントが偽装できるため、プロキシが追加した右端の値を使う
+    (1, (b"1.2.3.4, 203.0.113.7",), "203.0.113.7"),
+    (1, (b"203.0.113.7",), "203.0.113.7"),
+    (2, (b"1.2.3.4, 203.0.113.7, 10.0.0.2",), "203.0.113.7"),
+    # 信頼するプロキシの数より値が少ない場合は先頭の値
+    (3, (b"203.0.113.7, 10.0.0.2",), "203.0.113.7"),
+    # 複数行のヘッダーは順につなげる
+    (1, (b"1.2.3.4", b"203.0.113.7"), "203.0.113.7"),
+    (1, (), "10.0.0.1"),
+])
+def test_client_of_uses_the_value_added_by_trusted_proxies(trusted_hops, headers, expected):
+    controller = AdmissionController(client_header="X-Forwarded-For", trusted_hops=trusted_hops)
+    assert controller.client_of(_scope(*headers)) == expected
+
+
+def test_forged_forwarded_for_does_not_change_the_client():
+    controller = AdmissionController(client_header="X-Forwarded-For")
+    clients = {controller.client_of(_scope(f"198.51.100.{i}, 203.0.113.7".encode())) for i in range(10)}
+    assert clients == {"203.0.113.7"}
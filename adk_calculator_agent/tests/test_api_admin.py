@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""管理用エンドポイント (/admin/*) の管理用トークンの確認のテスト。"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from adk_calculator_agent import api
+
+
+@pytest.fixture
+def client():
+    return TestClient(api.app)
+
+
+def test_delete_plugin_requires_configured_admin_token(client, monkeypatch):
+    monkeypatch.setattr(api, "ADMIN_TOKEN", "")
+    response = client.delete("/admin/plugins/AddIntent")
+    assert response.status_code == 403
+    # 組み込みの演算は登録されたまま
+    assert any(plugin["name"] == "AddIntent" for plugin in api.list_plugins())
+    assert client.post("/ask", json={"text": "5たす3"}).json()["response"] == "5.0 たす 3.0 は 8.0 です。"
+
+
+def test_delete_plugin_rejects_wrong_admin_token(client, monkeypatch):
+    monkeypatch.setattr(api, "ADMIN_TOKEN", "secret")
+    response = client.delete("/admin/plugins/AddIntent", headers={"X-Admin-Token": "wrong"})
+    assert response.status_code == 403
+    assert any(plugin["name"] == "AddIntent" for plugin in api.list_plugins())
+
+
+@pytest.mark.parametrize("method, path", [
+    ("GET", "/admin/profile"),
+    ("PUT", "/admin/profile"),
+    ("DELETE", "/admin/profile"),
+    ("GET", "/admin/profile/export"),
+])
+def test_profile_requires_configured_admin_token(client, monkeypatch, method, path):
+    monkeypatch.setattr(api, "ADMIN_TOKEN", "")
+    assert client.request(method, path, json={"rate": 1.0}).status_code == 403
+    assert api.profiler.stats()["rate"] != 1.0
+
+
+def test_profile_accepts_admin_token(client, monkeypatch):
+    monkeypatch.setattr(api, "ADMIN_TOKEN", "secret")
+    assert client.get("/admin/profile").status_code == 403
+    assert client.get("/admin/profile", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get("/admin/profile", headers={"X-Admin-Token": "secret"}).status_code == 200
+
+
+def test_admission_requires_configured_admin_token(client, monkeypatch):
+    monkeypatch.setattr(api, "ADMIN_TOKEN", "")
+    assert client.get("/admin/admission").status_code == 403
+    monkeypatch.setattr(api, "ADMIN_TOKEN", "secret")
+    assert client.get("/admin/admission").status_code == 403
+    assert client.get("/admin/admission", headers={"X-Admin-Token": "secret"}).status_code == 200
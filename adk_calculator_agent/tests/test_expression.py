@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""算術式エンジン (calculator_agent/expression.py) のテスト。"""
+
+import pytest
+
+from calculator_agent.expression import ExpressionError
+from calculator_agent.handlers import create_intent_router
+
+
+@pytest.fixture(scope="module")
+def router():
+    return create_intent_router()
+
+
+def _evaluate(router, text, fold_symbol="+"):
+    return router.expressions.evaluate(router.tokenize(text), fold_symbol)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("5たす3", 8.0),
+    ("(2+3)*4", 20.0),
+    ("1と2と3を足して", 6.0),
+    ("足し算 5 と 3", 8.0),
+    ("5と3", 8.0),
+    ("2^3^2", 512.0),
+    # 閉じ括弧・後置のキーワードの直後の符号は二項演算子
+    ("(2+3)-1", 4.0),
+    ("4*(2+3)-1", 19.0),
+    ("2の3乗-1", 7.0),
+    ("(5)-3", 2.0),
+    ("（5）－3", 2.0),
+    ("5と3を足して-1", 7.0),
+    ("5と3を足して*2", 16.0),
+    # 演算子の後の符号は単項の符号
+    ("5たす-3", 2.0),
+    ("5*-3", -15.0),
+    ("(-2)+(-3)", -5.0),
+])
+def test_evaluate(router, text, expected):
+    assert _evaluate(router, text).value == expected
+
+
+@pytest.mark.parametrize("text", ["1e3たす1", "5たす3と2", "4 5たす3"])
+def test_stray_operands_are_not_folded_into_the_expression(router, text):
+    with pytest.raises(ExpressionError):
+        _evaluate(router, text)
+
+
+@pytest.mark.parametrize("text", [
+    "(" * 500 + "1+1" + ")" * 500,
+    "1+" * 3000 + "1",
+    "2^" * 200 + "2",
+    "-" * 300 + "1+1",
+])
+def test_oversized_expressions_raise_expression_error(router, text):
+    with pytest.raises(ExpressionError):
+        _evaluate(router, text)
+
+
+@pytest.mark.parametrize("text", ["(" * 500 + "1+1" + ")" * 500, "1+" * 3000 + "1", "2^" * 200 + "2"])
+def test_oversized_expressions_are_answered_as_unresolved(router, text):
+    result = router.handler_for(text).respond(text)
+    assert not result.resolved
+
+
+def test_expressions_within_the_limits_are_evaluated(router):
+    assert _evaluate(router, "1+" * 63 + "1").value == 64.0
+    assert _evaluate(router, "(" * 30 + "1+1" + ")" * 30).value == 2.0
+
+
+@pytest.mark.parametrize("text, expected", [("(5)-3", "5.0 ひく 3.0 は 2.0 です。"), ("2の3乗-1", "2.0 ^ 3.0 - 1.0 は 7.0 です。")])
+def test_binary_sign_after_bracket_or_postfix_keyword_is_answered_locally(router, text, expected):
+    result = router.handler_for(text).respond(text)
+    assert result.resolved and result.text == expected
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""数値モード (calculator_agent/numeric.py) の累乗 (整数でない指数・0 の累乗) のテスト。"""
+
+from decimal import Decimal
+from fractions import Fraction
+
+import pytest
+
+from calculator_agent.handlers import create_intent_router
+from calculator_agent.numeric import InexactPowerError, NumericBackend, numeric
+
+
+@pytest.fixture(scope="module")
+def router():
+    return create_intent_router()
+
+
+def _evaluate(router, text, mode):
+    return router.expressions.evaluate_exact(router.tokenize(text), "^", NumericBackend(mode)).value
+
+
+@pytest.mark.parametrize("mode", ["auto", "fraction"])
+@pytest.mark.parametrize("text, expected", [
+    ("4の0.5乗", 2),
+    ("0.25の1.5乗", Fraction(1, 8)),
+    ("27の2/3乗", 9),
+    ("0.0625^-0.25", 2),
+])
+def test_rational_results_are_exact(router, mode, text, expected):
+    value = _evaluate(router, text, mode)
+    assert value == expected and type(value) is not float
+
+
+@pytest.mark.parametrize("mode", ["auto", "fraction"])
+@pytest.mark.parametrize("text", ["2の0.5乗", "2^0.5たす1", "10の0.3乗"])
+def test_irrational_results_are_not_rounded_to_float(router, mode, text):
+    with pytest.raises(InexactPowerError):
+        _evaluate(router, text, mode)
+
+
+def test_negative_base_is_not_real(router):
+    with pytest.raises(ValueError) as e:
+        _evaluate(router, "(-4)^0.5", "fraction")
+    assert not isinstance(e.value, InexactPowerError)
+
+
+def test_decimal_mode_rounds_to_precision(router):
+    assert _evaluate(router, "2の0.5乗", "decimal") == Decimal("1.414213562373095048801688724")
+
+
+@pytest.mark.parametrize("mode", ["decimal", "auto", "fraction"])
+@pytest.mark.parametrize("text", ["0の-1乗", "0^-0.5", "0.0の-2乗"])
+def test_zero_to_negative_power_is_division_by_zero(router, mode, text):
+    with pytest.raises(ZeroDivisionError):
+        _evaluate(router, text, mode)
+
+
+@pytest.mark.parametrize("mode", ["decimal", "auto", "fraction"])
+def test_zero_to_zero_power_is_one(router, mode):
+    assert _evaluate(router, "0^0", mode) == 1
+
+
+@pytest.fixture
+def decimal_mode():
+    numeric.configure("decimal")
+    yield
+    numeric.configure()
+
+
+def test_decimal_zero_to_negative_power_is_not_infinity(router, decimal_mode):
+    assert router.handler_for("0の-1乗").respond("0の-1乗").text == "すみません、0 で割ることはできません。"
+
+
+@pytest.fixture
+def fraction_mode():
+    numeric.configure("fraction")
+    yield
+    numeric.configure()
+
+
+def test_irrational_power_is_answered_without_a_float(router, fraction_mode):
+    result = router.handler_for("2の0.5乗").respond("2の0.5乗")
+    assert result.resolved
+    assert "無理数" in result.text and "1.414" not in result.text
+    assert "2" in router.handler_for("4の0.5乗").respond("4の0.5乗").text
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""演算結果のメモと事前計算の表 (calculator_agent/operations.py の OperationMemo) のテスト。"""
+
+import importlib
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from adk_calculator_agent import api
+from adk_calculator_agent.calculator_agent import operations
+from adk_calculator_agent.calculator_agent.handlers import create_intent_router
+from adk_calculator_agent.calculator_agent.operations import OperationMemo, SmallIntegerTable, add, operation_memo, write_table
+
+_PLUGIN_MODULE = "reloaded_half_plugin"
+
+# 計算関数の意味だけが異なる2つの版 (半分 → 3分の1)
+_PLUGIN_SOURCE = '''
+PLUGINS = [
+    {{"name": "HalfIntent", "symbol": "½", "keywords": ("半分",), "arity": 1, "memoize": True,
+     "evaluator": lambda a: a / {divisor}, "formatter": "{{a}} の半分は {{result}} です。", "operation_label": "半分の計算"}},
+]
+'''
+
+
+def _half(a):
+    return a / 2
+
+
+def _third(a):
+    return a / 3
+
+
+def test_forget_drops_table_and_memo(tmp_path):
+    path = str(tmp_path / "half.bin")
+    write_table(path, "½", _half, 1, 16)
+    memo = OperationMemo(64, [SmallIntegerTable(path)])
+    half = memo.wrap("½", _half, 1, memoize=True)
+    assert half(9.0) == 4.5 and half(100.0) == 50.0
+    assert memo.entries == 1
+
+    memo.forget("½")
+    assert memo.stats()["tables"] == [] and memo.entries == 0
+    third = memo.wrap("½", _third, 1, memoize=True)
+    assert third(9.0) == 3.0 and third(100.0) == 100.0 / 3
+
+
+def test_operation_ids_are_not_reused_when_exhausted(monkeypatch):
+    monkeypatch.setattr(operations, "_MAX_OPERATION_IDS", 2)
+    memo = OperationMemo(64)
+    half = memo.wrap("½", _half, 1, memoize=True)
+    assert half(9.0) == 4.5
+    memo.forget("½")
+    third = memo.wrap("½", _third, 1, memoize=True)
+    assert third(9.0) == 3.0
+
+    # 番号を使い切った後の計算関数はメモせず、作成済みの関数は自分の結果だけを返し続ける
+    def quarter(a):
+        return a / 4
+
+    assert memo.wrap("½", quarter, 1, memoize=True) is quarter
+    assert quarter(9.0) == 2.25 and third(9.0) == 3.0 and half(9.0) == 4.5
+    assert memo.entries == 2
+
+
+def test_builtin_operation_reads_its_table(tmp_path, monkeypatch):
+    path = str(tmp_path / "add.bin")
+    write_table(path, "+", add, 2, 16)
+    monkeypatch.setitem(operation_memo.tables, "+", SmallIntegerTable(path))
+    monkeypatch.setattr(operation_memo, "table_hits", 0)
+    router = create_intent_router()
+
+    for text in ("5+3", "5たす3", "5と3を足して"):
+        assert router.expressions.evaluate(router.tokenize(text), "+").value == 8.0
+    assert operation_memo.table_hits == 3
+    # 表の範囲外は演算子と同じく計算する
+    assert router.expressions.evaluate(router.tokenize("50+3"), "+").value == 53.0
+    assert operation_memo.table_hits == 3
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "ADMIN_TOKEN", "secret")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    # 同じ秒に書き換えたモジュールを古いバイトコードから読み込まないようにする
+    monkeypatch.setattr(sys, "dont_write_bytecode", True)
+    yield TestClient(api.app)
+    api.unload_plugin("HalfIntent")
+    sys.modules.pop(_PLUGIN_MODULE, None)
+
+
+def _load_plugin(client, tmp_path, divisor):
+    (tmp_path / f"{_PLUGIN_MODULE}.py").write_text(_PLUGIN_SOURCE.format(divisor=divisor), encoding="utf-8")
+    importlib.invalidate_caches()
+    response = client.post("/admin/plugins", json={"module": _PLUGIN_MODULE}, headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+
+
+def _ask(client, text):
+    return client.post("/ask", json={"text": text}).json()["response"]
+
+
+def test_reloaded_plugin_does_not_reuse_previous_results(client, tmp_path, monkeypatch):
+    path = str(tmp_path / "half.bin")
+    write_table(path, "½", _half, 1, 16)
+    monkeypatch.setitem(operation_memo.tables, "½", SmallIntegerTable(path))
+
+    _load_plugin(client, tmp_path, 2)
+    # 9 は事前計算の表、100 はメモから返す
+    assert _ask(client, "9の半分") == "9.0 の半分は 4.5 です。"
+    assert _ask(client, "100の半分") == "100.0 の半分は 50.0 です。"
+    assert _ask(client, "100の半分") == "100.0 の半分は 50.0 です。"
+
+    _load_plugin(client, tmp_path, 3)
+    assert "½" not in operation_memo.tables
+    assert _ask(client, "9の半分") == "9.0 の半分は 3.0 です。"
+    assert _ask(client, "100の半分") == f"100.0 の半分は {100.0 / 3} です。"
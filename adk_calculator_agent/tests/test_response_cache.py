@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+応答キャッシュ (response_cache.py) のテスト。
+共有キャッシュサーバーの接続認証とソケットの置き場所、正規化した発話をキーにだけ使うことを確認します。
+"""
+
+import os
+import secrets
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from adk_calculator_agent import adk_logic, api, response_cache
+from adk_calculator_agent.calculator_agent.pipeline import StubModelTier
+from adk_calculator_agent.response_cache import LRUResponseCache, ResponseCache, SharedResponseCache
+
+
+@pytest.fixture
+def server(tmp_path):
+    directory = tmp_path / "cache"
+    directory.mkdir(mode=0o700)
+    address = str(directory / response_cache.SOCKET_FILENAME)
+    authkey = secrets.token_bytes(32)
+    server = response_cache.start_server(address, LRUResponseCache(), authkey)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return address, authkey
+
+
+def test_shared_cache_round_trip_with_generated_authkey(server):
+    address, authkey = server
+    cache = SharedResponseCache(address, authkey)
+    cache.set("5たす3", "8")
+    assert cache.get("5たす3") == "8"
+    assert cache.errors == 0
+
+
+def test_wrong_authkey_is_treated_as_a_miss(server):
+    address, _ = server
+    cache = SharedResponseCache(address, b"wrong-key")
+    assert cache.get("5たす3") is None
+    assert cache.errors == 1
+
+
+def test_private_socket_directory_is_owner_only(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    directory = response_cache.private_socket_directory()
+    assert os.path.dirname(directory) == str(tmp_path)
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+
+
+def test_authkey_file_in_shared_directory_is_refused(monkeypatch, tmp_path):
+    monkeypatch.delenv(response_cache.AUTHKEY_ENV, raising=False)
+    (tmp_path / response_cache.AUTHKEY_FILENAME).write_text(secrets.token_hex(32))
+    tmp_path.chmod(0o777)
+    with pytest.raises(ValueError):
+        response_cache.load_authkey(str(tmp_path / response_cache.SOCKET_FILENAME))
+
+
+def test_authkey_from_environment(monkeypatch, tmp_path):
+    authkey = secrets.token_bytes(32)
+    monkeypatch.setenv(response_cache.AUTHKEY_ENV, authkey.hex())
+    assert response_cache.load_authkey(str(tmp_path / response_cache.SOCKET_FILENAME)) == authkey
+
+
+class _RecordingModelTier(StubModelTier):
+    def __init__(self):
+        super().__init__(default="モデルの応答")
+        self.texts = []
+
+    def answer(self, text):
+        self.texts.append(text)
+        return super().answer(text)
+
+
+@pytest.mark.parametrize("max_entries", [0, 100])
+def test_handlers_receive_the_original_utterance(monkeypatch, max_entries):
+    tier = _RecordingModelTier()
+    monkeypatch.setattr(adk_logic.pipeline, "model_tier", tier)
+    monkeypatch.setattr(adk_logic, "response_cache", ResponseCache(LRUResponseCache(max_entries=max_entries)))
+    client = TestClient(api.app)
+
+    assert client.post("/ask", json={"text": "ＨＥＬＬＯ　Ｗｏｒｌｄ"}).json()["response"] == "モデルの応答"
+    assert tier.texts == ["ＨＥＬＬＯ　Ｗｏｒｌｄ"]
+    # キャッシュが有効な場合は、正規化すると同じになる発話にキャッシュから応答する
+    assert client.post("/ask", json={"text": "hello world"}).json()["response"] == "モデルの応答"
+    assert tier.texts == (["ＨＥＬＬＯ　Ｗｏｒｌｄ"] if max_entries else ["ＨＥＬＬＯ　Ｗｏｒｌｄ", "hello world"])
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""モデルの段の意味的キャッシュ (calculator_agent/semantic_cache.py) のテスト。"""
+
+import pytest
+
+from calculator_agent.handlers import create_intent_router
+from calculator_agent.semantic_cache import SemanticCache
+
+# 演算を表す語 (和・差・積) だけが異なる、類似度の高い発話
+_UTTERANCES = {
+    "和": "5と3の和はいったいいくつになりますか？教えてください。",
+    "差": "5と3の差はいったいいくつになりますか？教えてください。",
+    "積": "5と3の積はいったいいくつになりますか？教えてください。",
+}
+_RESPONSES = {"和": "5と3の和は8です。", "差": "5と3の差は2です。", "積": "5と3の積は15です。"}
+
+
+@pytest.fixture
+def cache():
+    # 閾値を下げて、演算を表す語だけが異なる発話が最も近いエントリーとして見つかるようにする
+    return SemanticCache(create_intent_router(), threshold=0.5)
+
+
+def test_same_template_and_operands_returns_cached_response(cache):
+    cache.set(_UTTERANCES["差"], _RESPONSES["差"])
+    assert cache.get(_UTTERANCES["差"]) == _RESPONSES["差"]
+    assert cache.get(_UTTERANCES["差"].replace("と", " と ")) == _RESPONSES["差"]
+
+
+@pytest.mark.parametrize("cached", sorted(_UTTERANCES))
+@pytest.mark.parametrize("asked", sorted(_UTTERANCES))
+def test_same_operands_with_another_operation_is_a_miss(cache, cached, asked):
+    cache.set(_UTTERANCES[cached], _RESPONSES[cached])
+    if cached == asked:
+        assert cache.get(_UTTERANCES[asked]) == _RESPONSES[cached]
+    else:
+        assert cache.get(_UTTERANCES[asked]) is None
+        assert cache.stats().misses == 1
+
+
+def test_each_operation_keeps_its_own_response(cache):
+    for operation, text in _UTTERANCES.items():
+        cache.set(text, _RESPONSES[operation])
+    for operation, text in _UTTERANCES.items():
+        assert cache.get(text) == _RESPONSES[operation]
+
+
+def test_spacing_and_punctuation_do_not_change_the_template(cache):
+    cache.set("5と3ってどう", "5と3はどちらも整数です。")
+    assert cache.get("5 と 3 ってどう？") == "5と3はどちらも整数です。"
+
+
+def test_operands_in_response_are_rebound(cache):
+    cache.set("5と3ってどう", "5と3はどちらも整数です。")
+    assert cache.get("7と2ってどう") == "7と2はどちらも整数です。"
+
+
+@pytest.mark.parametrize("response", ["答えは 5 です", "5 と 0 を足すと 5 です", "0 と 5 です。答えは 5"])
+def test_result_equal_to_an_operand_is_not_rebound(cache, response):
+    # 計算結果 (5) がたまたま被演算子と同じ値の応答を、別の数値の発話に使わない
+    cache.set("5と0を足すといくつ", response)
+    assert cache.get("7と2を足すといくつ") is None
+    assert cache.get("5と0を足すといくつ") == response
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""本番用ランチャー (serve.py) の、想定外に終了したワーカーの起動し直しのテスト。"""
+
+import pytest
+
+from adk_calculator_agent import serve
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(serve.time, "monotonic", clock)
+    return clock
+
+
+def _launcher(monkeypatch, results):
+    """_spawn が results の順に成功 (True)・失敗 (False) するランチャーを作成します。"""
+    launcher = serve.PreforkLauncher("app:app", workers=2)
+    pids = iter(range(100, 200))
+
+    def spawn():
+        if not results.pop(0):
+            return None
+        pid = next(pids)
+        launcher._workers[pid] = (launcher._generation, serve.time.monotonic())
+        return pid
+
+    monkeypatch.setattr(launcher, "_spawn", spawn)
+    return launcher
+
+
+def test_restore_workers_backs_off_until_worker_count_is_restored(monkeypatch, clock):
+    launcher = _launcher(monkeypatch, [False, False, True, True])
+
+    launcher._restore_workers()
+    assert len(launcher._workers) == 0 and launcher._respawn_delay == 1.0
+    # 待ち時間が過ぎるまでは起動しない
+    clock.now += 0.5
+    launcher._restore_workers()
+    assert launcher._respawn_delay == 1.0
+    clock.now += 0.5
+    launcher._restore_workers()
+    assert len(launcher._workers) == 0 and launcher._respawn_delay == 2.0
+    clock.now += 2.0
+    launcher._restore_workers()
+    assert len(launcher._workers) == 2
+
+    # ワーカーが安定して動けば待ち時間を初期値に戻す
+    clock.now += serve.RESPAWN_STABLE_SECONDS
+    launcher._restore_workers()
+    assert launcher._respawn_delay == serve.RESPAWN_BACKOFF_INITIAL
+
+
+def test_respawn_delay_grows_for_workers_that_exit_right_after_start(monkeypatch, clock):
+    launcher = _launcher(monkeypatch, [True] * 10)
+    launcher._restore_workers()
+    delays = []
+    for _ in range(8):
+        # 直前に起動し直したワーカーが起動直後に終了する
+        pid = list(launcher._workers)[-1]
+        monkeypatch.setattr(serve.os, "waitpid", lambda *args, pid=iter([(pid, 256), (0, 0)]): next(pid))
+        clock.now += 1.0
+        launcher._reap()
+        delays.append(launcher._respawn_delay)
+        clock.now = launcher._respawn_at
+        launcher._restore_workers()
+        assert len(launcher._workers) == 2
+    assert delays == [1.0, 2.0, 4.0, 8.0, 16.0, 30.0, 30.0, 30.0]
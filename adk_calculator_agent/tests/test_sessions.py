@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""会話のセッション (/ask の session_id と /sessions/{session_id}) のテスト。"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from adk_calculator_agent import adk_logic, api
+
+
+@pytest.fixture
+def client():
+    return TestClient(api.app)
+
+
+def test_session_refers_to_previous_result(client, monkeypatch):
+    monkeypatch.setattr(adk_logic, "WORKER_PROCESSES", 1)
+    client.delete("/sessions/test-single")
+    assert client.post("/ask", json={"text": "5たす3", "session_id": "test-single"}).status_code == 200
+    response = client.post("/ask", json={"text": "それに5をかけて", "session_id": "test-single"})
+    assert "40" in response.json()["response"]
+    assert client.get("/sessions/test-single").json()["last_result"] == "40"
+    assert client.delete("/sessions/test-single").status_code == 200
+
+
+def test_sessions_are_refused_with_multiple_workers(client, monkeypatch):
+    monkeypatch.setattr(adk_logic, "WORKER_PROCESSES", 4)
+    response = client.post("/ask", json={"text": "5たす3", "session_id": "test-multi"})
+    assert response.status_code == 501
+    assert "ワーカー" in response.json()["detail"]
+    assert client.get("/sessions/test-multi").status_code == 501
+    assert client.delete("/sessions/test-multi").status_code == 501
+    # セッションを使わないリクエストは処理する
+    assert client.post("/ask", json={"text": "5たす3"}).status_code == 200
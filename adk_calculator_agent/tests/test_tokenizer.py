@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""トークナイザー (calculator_agent/tokenizer.py) の漢数字の扱いのテスト。"""
+
+import pytest
+
+from calculator_agent.handlers import create_intent_router
+
+
+@pytest.fixture(scope="module")
+def router():
+    return create_intent_router()
+
+
+@pytest.mark.parametrize("text", ["5たす3は一体いくつ？", "一緒に5たす3", "一番目の5たす3", "十分に5たす3", "唯一の5たす3"])
+def test_kanji_numerals_inside_words_are_not_numbers(router, text):
+    assert router.tokenize(text).numbers == ["5", "3"]
+    assert router.handler_for(text).respond(text).value == 8.0
+
+
+@pytest.mark.parametrize("text, numbers", [
+    ("三たす五", ["3", "5"]),
+    ("二十五かける三", ["25", "3"]),
+    ("3の二乗", ["3", "2"]),
+    ("三割る二", ["3", "2"]),
+    ("足し算五と三", ["5", "3"]),
+    ("三個と五個を足して", ["3", "5"]),
+    ("一万円たす二千円", ["10000", "2000"]),
+])
+def test_kanji_numerals_next_to_numeric_or_operator_context(router, text, numbers):
+    assert router.tokenize(text).numbers == numbers
+
+
+def test_kanji_numeral_run_is_not_split(router):
+    # "二十体" の "十" だけを数値にしない
+    assert router.tokenize("二十体").numbers == []
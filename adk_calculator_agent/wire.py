@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+/ask と /ask/batch のバイナリ形式 (ワイヤーフォーマット) のモジュール。
+
+サービス間の通信で JSON とレスポンスモデルの処理を省くため、以下の形式に対応します (デフォルトは JSON のまま)。
+リクエストの形式は Content-Type で、応答の形式は Accept で選びます (Accept の指定がない場合・*/* の場合は
+リクエストと同じ形式で応答します)。エラーの応答 (4xx) は形式によらず JSON です。
+
+    application/msgpack (MessagePack):
+        リクエスト・応答とも JSON と同じ構造のマップ。リクエストの解析に `pip install msgpack` が必要です。
+        応答は固定の部分 ({"response": の部分など) を作成済みのバイト列にしておき、応答テキストだけを連結します
+        (応答の作成にはライブラリを使いません)。
+
+    application/x-adk-struct (固定レイアウト、リトルエンディアン):
+        /ask のリクエスト:  uint32 text の長さ, uint16 session_id の長さ, uint16 request_id の長さ, 各 UTF-8 のバイト列
+                            (長さ 0 は指定なし)
+        /ask の応答:        uint32 応答テキストの長さ, UTF-8 のバイト列
+        /ask/batch のリクエスト: uint32 件数 n, uint32 × n 各テキストの長さ, UTF-8 のバイト列を連結したもの
+        /ask/batch の応答:  uint32 件数 n, uint8 × n 種類 (0: 応答, 1: エラー), uint32 × n 長さ, UTF-8 のバイト列を連結したもの
+
+リクエストの解析では、ヘッダーの長さからボディ中の各文字列の位置を求め、その部分を直接 str にします
+(辞書やモデルのような中間のオブジェクトを作成しません。memoryview を介すよりも、数百バイト以下の文字列では
+bytes のスライスの方が速いためスライスを使います)。
+各形式のクライアント側の変換 (encode_ask_request など) もこのモジュールで提供します。
+"""
+
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+STRUCT_MEDIA_TYPE = "application/x-adk-struct"
+
+# /ask のリクエストの内容: (text, session_id, request_id)
+AskFields = Tuple[str, Optional[str], Optional[str]]
+# /ask/batch の結果1件分: (response, error)
+BatchItem = Tuple[Optional[str], Optional[str]]
+
+_ASK_HEADER = struct.Struct("<IHH")
+_LENGTH = struct.Struct("<I")
+
+# MessagePack は任意の依存のため、最初に使うときにインポートする (_import_msgpack)
+msgpack = None
+
+
+class WireFormatError(ValueError):
+    """リクエストのボディがワイヤーフォーマットとして正しくない場合に送出されます。"""
+
+
+class WireFormatUnavailable(RuntimeError):
+    """ワイヤーフォーマットに必要なライブラリがインストールされていない場合に送出されます。"""
+
+
+def _import_msgpack():
+    """MessagePack をインポートして返します (2回目以降はインポート済みのモジュールを返します)。"""
+    global msgpack
+    if msgpack is None:
+        try:
+            import msgpack as module
+        except ImportError:
+            raise WireFormatUnavailable(
+                f"{MSGPACK_MEDIA_TYPE} を使うには MessagePack が必要です。`pip install msgpack` を実行してください。"
+            ) from None
+        msgpack = module
+    return msgpack
+
+
+def _optional_str(value, name: str) -> Optional[str]:
+    if value is None or type(value) is str:
+        return value
+    raise WireFormatError(f"{name} には文字列を指定してください。")
+
+
+# --- MessagePack ---
+
+def _msgpack_str_header(length: int) -> bytes:
+    """MessagePack の str 型のヘッダー (長さに応じて fixstr / str8 / str16 / str32) を返します。"""
+    if length < 32:
+        return bytes((0xA0 | length,))
+    if length < 0x100:
+        return bytes((0xD9, length))
+    if length < 0x10000:
+        return b"\xda" + length.to_bytes(2, "big")
+    return b"\xdb" + length.to_bytes(4, "big")
+
+
+def _msgpack_array_header(length: int) -> bytes:
+    """MessagePack の array 型のヘッダー (長さに応じて fixarray / array16 / array32) を返します。"""
+    if length < 16:
+        return bytes((0x90 | length,))
+    if length < 0x10000:
+        return b"\xdc" + length.to_bytes(2, "big")
+    return b"\xdd" + length.to_bytes(4, "big")
+
+
+def _msgpack_optional_str(value: Optional[str]) -> bytes:
+    if value is None:
+        return b"\xc0"
+    data = value.encode("utf-8")
+    return _msgpack_str_header(len(data)) + data
+
+
+# 応答の固定の部分を作成済みのバイト列にしておく ({"response": / {"results": / 結果1件分の {"response": と "error":)
+_MSGPACK_RESPONSE_PREFIX = b"\x81\xa8response"
+_MSGPACK_RESULTS_PREFIX = b"\x81\xa7results"
+_MSGPACK_ITEM_PREFIX = b"\x82\xa8response"
+_MSGPACK_ERROR_KEY = b"\xa5error"
+
+
+class MsgpackCodec:
+    """MessagePack 形式の変換。"""
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def _unpack(self, body) -> dict:
+        unpackb = _import_msgpack().unpackb
+        try:
+            value = unpackb(body, raw=False)
+        except (ValueError, TypeError) as e:
+            # msgpack の解析エラー (ExtraData, FormatError など) は ValueError のサブクラス。TypeError はマップのキーが不正な場合
+            raise WireFormatError(f"MessagePack として解析できませんでした: {e!r}")
+        if type(value) is not dict:
+            raise WireFormatError("リクエストのボディはマップにしてください。")
+        return value
+
+    def decode_ask(self, body) -> AskFields:
+        value = self._unpack(body)
+        text = value.get("text")
+        if type(text) is not str:
+            raise WireFormatError("text には文字列を指定してください。")
+        return text, _optional_str(value.get("session_id"), "session_id"), _optional_str(value.get("request_id"), "request_id")
+
+    def decode_batch(self, body) -> List[str]:
+        texts = self._unpack(body).get("texts")
+        if type(texts) is not list or not all(type(text) is str for text in texts):
+            raise WireFormatError("texts には文字列のリストを指定してください。")
+        return texts
+
+    def encode_ask(self, text: str) -> bytes:
+        data = text.encode("utf-8")
+        return _MSGPACK_RESPONSE_PREFIX + _msgpack_str_header(len(data)) + data
+
+    def encode_batch(self, results: Sequence[BatchItem]) -> bytes:
+        parts = [_MSGPACK_RESULTS_PREFIX, _msgpack_array_header(len(results))]
+        append = parts.append
+        for response, error in results:
+            append(_MSGPACK_ITEM_PREFIX)
+            append(_msgpack_optional_str(response))
+            append(_MSGPACK_ERROR_KEY)
+            append(_msgpack_optional_str(error))
+        return b"".join(parts)
+
+    # --- クライアント側 ---
+
+    def encode_ask_request(self, text: str, session_id: Optional[str] = None, request_id: Optional[str] = None) -> bytes:
+        payload = {"text": text}
+        if session_id is not None:
+            payload["session_id"] = session_id
+        if request_id is not None:
+            payload["request_id"] = request_id
+        return _import_msgpack().packb(payload)
+
+    def decode_ask_response(self, body) -> str:
+        return _import_msgpack().unpackb(body, raw=False)["response"]
+
+    def encode_batch_request(self, texts: Sequence[str]) -> bytes:
+        return _import_msgpack().packb({"texts": list(texts)})
+
+    def decode_batch_response(self, body) -> List[BatchItem]:
+        results = _import_msgpack().unpackb(body, raw=False)["results"]
+        return [(item["response"], item["error"]) for item in results]
+
+
+# --- 固定レイアウト ---
+
+def _utf8(body, start: int, end: int) -> str:
+    try:
+        return str(body[start:end], "utf-8")
+    except UnicodeDecodeError as e:
+        raise WireFormatError(f"文字列が UTF-8 ではありません: {e}")
+
+
+def _lengths(body, offset: int, count: int) -> Tuple[int, ...]:
+    """offset の位置から count 個の uint32 の長さを読み取ります。"""
+    try:
+        return struct.unpack_from(f"<{count}I", body, offset)
+    except struct.error:
+        raise WireFormatError("ボディが短すぎます。")
+
+
+class StructCodec:
+    """固定レイアウト形式の変換。"""
+    media_type = STRUCT_MEDIA_TYPE
+
+    def decode_ask(self, body) -> AskFields:
+        try:
+            text_length, session_length, request_length = _ASK_HEADER.unpack_from(body)
+        except struct.error:
+            raise WireFormatError("ボディが短すぎます。")
+        start = _ASK_HEADER.size
+        text_end = start + text_length
+        session_end = text_end + session_length
+        if session_end + request_length != len(body):
+            raise WireFormatError("ボディの長さがヘッダーの長さと一致しません。")
+        return (
+            _utf8(body, start, text_end),
+            _utf8(body, text_end, session_end) if session_length else None,
+            _utf8(body, session_end, session_end + request_length) if request_length else None,
+        )
+
+    def decode_batch(self, body) -> List[str]:
+        (count,) = _lengths(body, 0, 1)
+        lengths = _lengths(body, _LENGTH.size, count)
+        start = _LENGTH.size * (count + 1)
+        if start + sum(lengths) != len(body):
+            raise WireFormatError("ボディの長さがヘッダーの長さと一致しません。")
+        texts = []
+        append = texts.append
+        try:
+            for length in lengths:
+                end = start + length
+                append(str(body[start:end], "utf-8"))
+                start = end
+        except UnicodeDecodeError as e:
+            raise WireFormatError(f"文字列が UTF-8 ではありません: {e}")
+        return texts
+
+    def encode_ask(self, text: str) -> bytes:
+        data = text.encode("utf-8")
+        return _LENGTH.pack(len(data)) + data
+
+    def encode_batch(self, results: Sequence[BatchItem]) -> bytes:
+        count = len(results)
+        kinds = bytearray(count)
+        payloads = []
+        for index, (response, error) in enumerate(results):
+            if response is None:
+                kinds[index] = 1
+                payloads.append((error or "").encode("utf-8"))
+            else:
+                payloads.append(response.encode("utf-8"))
+        lengths = struct.pack(f"<{count}I", *map(len, payloads))
+        return _LENGTH.pack(count) + kinds + lengths + b"".join(payloads)
+
+    # --- クライアント側 ---
+
+    def encode_ask_request(self, text: str, session_id: Optional[str] = None, request_id: Optional[str] = None) -> bytes:
+        fields = [value.encode("utf-8") for value in (text, session_id or "", request_id or "")]
+        return _ASK_HEADER.pack(*map(len, fields)) + b"".join(fields)
+
+    def decode_ask_response(self, body) -> str:
+        (length,) = _LENGTH.unpack_from(body)
+        return str(body[_LENGTH.size:_LENGTH.size + length], "utf-8")
+
+    def encode_batch_request(self, texts: Sequence[str]) -> bytes:
+        payloads = [text.encode("utf-8") for text in texts]
+        return _LENGTH.pack(len(payloads)) + struct.pack(f"<{len(payloads)}I", *map(len, payloads)) + b"".join(payloads)
+
+    def decode_batch_response(self, body) -> List[BatchItem]:
+        (count,) = _LENGTH.unpack_from(body)
+        kinds = body[_LENGTH.size:_LENGTH.size + count]
+        lengths = struct.unpack_from(f"<{count}I", body, _LENGTH.size + count)
+        start = _LENGTH.size * (count + 1) + count
+        results = []
+        for kind, length in zip(kinds, lengths):
+            text = str(body[start:start + length], "utf-8")
+            start += length
+            results.append((None, text) if kind else (text, None))
+        return results
+
+
+# メディアタイプから変換への対応表 (JSON は含まない)
+_MSGPACK_CODEC = MsgpackCodec()
+CODECS: Dict[str, object] = {
+    MSGPACK_MEDIA_TYPE: _MSGPACK_CODEC,
+    "application/x-msgpack": _MSGPACK_CODEC,
+    STRUCT_MEDIA_TYPE: StructCodec(),
+}
+
+
+def _media_type(value: str) -> str:
+    return value.partition(";")[0].strip().lower()
+
+
+def request_codec(content_type: Optional[str]):
+    """
+    Content-Type に対応する変換を返します (JSON・未指定・その他の場合は None。従来どおり JSON として解析します)。
+    """
+    if not content_type:
+        return None
+    codec = CODECS.get(content_type)
+    if codec is not None:
+        return codec
+    return CODECS.get(_media_type(content_type))
+
+
+def response_codec(accept: Optional[str], request_codec=None):
+    """
+    Accept に対応する応答の変換を返します (JSON の場合は None)。
+
+    Accept に列挙された順に最初に対応しているメディアタイプを選びます (q 値は考慮しません)。
+    Accept の指定がない場合・*/* の場合はリクエストと同じ形式で応答します。
+    """
+    if not accept or accept == "*/*":
+        return request_codec
+    codec = CODECS.get(accept)
+    if codec is not None:
+        return codec
+    for part in accept.split(","):
+        media_type = _media_type(part)
+        codec = CODECS.get(media_type)
+        if codec is not None:
+            return codec
+        if media_type == "application/json":
+            return None
+        if media_type in ("*/*", "application/*"):
+            return request_codec
+    return None